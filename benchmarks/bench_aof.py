@@ -0,0 +1,75 @@
+'''
+Measure the write throughput with the append only file for every appendfsync policy, with clients
+sending their commands concurrently, the number of fsyncs it took, and the replay throughput of the
+file in commands/s and MB/s.
+
+The clients are driven on an event loop like the network clients, through the same deferred
+replies, without the sockets.
+
+Usage::
+
+    $ python benchmarks/bench_aof.py [commands] [clients]
+'''
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server_impl import server
+
+
+@asyncio.coroutine
+def run_client(client, index, count):
+    for i in range(count):
+        client.suspendable = True
+        reply = server.exec_command([b'SET', ('key:%d:%d' % (index, i)).encode(), b'value'], client)
+        client.suspendable = False
+        if isinstance(reply, asyncio.Future):
+            yield from reply
+        else:
+            # Let the other clients run, like between two reads of a socket
+            yield from asyncio.sleep(0)
+
+
+def main(commands=100000, clients=50):
+    with tempfile.TemporaryDirectory() as directory:
+        server.config['dir'] = directory
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        server.loop = loop
+        for policy in ('no', 'everysec', 'always'):
+            for db in server.all_databases():
+                db.flush()
+            path = os.path.join(directory, 'appendonly.aof')
+            if os.path.exists(path):
+                os.unlink(path)
+            server.config['appendfsync'] = policy
+            server.start_aof()
+            test_clients = [server.get_test_client() for i in range(clients)]
+
+            begin = time.perf_counter()
+            loop.run_until_complete(asyncio.gather(
+                *[run_client(client, i, commands // clients) for i, client in enumerate(test_clients)]))
+            elapsed = time.perf_counter() - begin
+            print('{:<9} {:>10,.0f} SET/s {:>7} writes {:>7} fsyncs'.format(
+                policy, commands / elapsed, server.aof.stat_writes, server.aof.stat_fsyncs))
+            server.stop_aof()
+
+        for db in server.all_databases():
+            db.flush()
+        size = os.path.getsize(path)
+        begin = time.perf_counter()
+        server.aof_load()
+        elapsed = time.perf_counter() - begin
+        print('replay    {:>10,.0f} commands/s {:>7.1f} MB/s'.format(
+            commands / elapsed, size / elapsed / 1024 ** 2))
+        server.loop = None
+        loop.close()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,52 @@
+'''
+Compare the time and the bytes written by a full snapshot and by delta checkpoints, after a share
+of the keys changed, to check the deltas follow the number of changes rather than the dataset.
+
+Usage::
+
+    $ python benchmarks/bench_checkpoint.py [keys]
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.common.objects import RedisStringObject
+from redis.server_impl import server
+
+
+def report(name, keys, size, elapsed):
+    print('{:<24} {:>10,} keys {:>8.2f} s {:>10.1f} MB'.format(name, keys, elapsed, size / 1024 ** 2))
+
+
+def main(count=1000000):
+    with tempfile.TemporaryDirectory() as directory:
+        server.config['dir'] = directory
+        server.config['checkpoint-deltas'] = True
+        server.configure_checkpoints()
+        db = server.default_database()
+        for i in range(count):
+            db.put_key(b'key:%d' % i, RedisStringObject(b'value:%d' % i))
+
+        begin = time.perf_counter()
+        server.rdb_save()
+        report('full snapshot', count, server.checkpoints.base_size, time.perf_counter() - begin)
+
+        for share in (0.001, 0.01, 0.1):
+            changed = int(count * share)
+            for i in range(changed):
+                db.set_key(b'key:%d' % (i * 7919 % count), RedisStringObject(b'changed:%d' % i))
+            checkpoints = server.checkpoints
+            begin = time.perf_counter()
+            current = checkpoints.begin(full=False)
+            keys, size = server.write_snapshot(current)
+            elapsed = time.perf_counter() - begin
+            checkpoints.finish(current, True)
+            report('delta {:.1%} changed'.format(share), keys, size, elapsed)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
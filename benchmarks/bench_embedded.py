@@ -0,0 +1,57 @@
+'''
+Compare the embedded client with the RESP test client.
+
+Usage::
+
+    $ python benchmarks/bench_embedded.py [operations]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server_impl import server
+
+
+def bench(name, operations, func):
+    begin = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - begin
+    print('{:<40} {:>10.0f} ops/sec'.format(name, operations / elapsed))
+
+
+def main(operations=100000):
+    test_client = server.get_test_client()
+    embedded_client = server.get_embedded_client()
+    keys = ['key:%d' % i for i in range(operations)]
+    set_commands = [('SET', key, 'value') for key in keys]
+    get_commands = [('GET', key) for key in keys]
+
+    def test_set():
+        for key in keys:
+            test_client.execute('*3\r\n$3\r\nSET\r\n${}\r\n{}\r\n$5\r\nvalue\r\n'.format(len(key), key))
+
+    def test_get():
+        for key in keys:
+            test_client.execute('*2\r\n$3\r\nGET\r\n${}\r\n{}\r\n'.format(len(key), key))
+
+    def embedded_set():
+        for key in keys:
+            embedded_client.execute('SET', key, 'value')
+
+    def embedded_get():
+        for key in keys:
+            embedded_client.execute('GET', key)
+
+    bench('RedisTestClient SET', operations, test_set)
+    bench('RedisTestClient GET', operations, test_get)
+    bench('RedisEmbeddedClient SET', operations, embedded_set)
+    bench('RedisEmbeddedClient GET', operations, embedded_get)
+    bench('RedisEmbeddedClient SET (execute_many)', operations, lambda: embedded_client.execute_many(set_commands))
+    bench('RedisEmbeddedClient GET (execute_many)', operations, lambda: embedded_client.execute_many(get_commands))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,106 @@
+'''
+Measure the accuracy and the overhead of the eviction policies, with a cache workload following a
+zipfian distribution: every GET miss is followed by a SET of the key.
+
+The hit ratio of each policy is compared with the one of an exact LRU cache holding the same number of
+keys.
+
+Usage::
+
+    $ python benchmarks/bench_eviction.py [operations] [keys] [zipf exponent]
+'''
+
+import bisect
+import collections
+import itertools
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server_impl import server
+from redis.server.evict import MAXMEMORY_POLICIES
+
+
+def zipf_keys(operations, keys, exponent):
+    cum_weights = list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, keys + 1)))
+    total = cum_weights[-1]
+    ranks = [bisect.bisect(cum_weights, random.random() * total) for i in range(operations)]
+    # Spread the popular keys over the keyspace
+    names = ['key:%d' % i for i in range(keys)]
+    random.shuffle(names)
+    return [names[rank] for rank in ranks]
+
+
+def run(client, workload):
+    hits = 0
+    begin = time.perf_counter()
+    for key in workload:
+        if client.execute('GET', key) is None:
+            client.execute('SET', key, 'value')
+        else:
+            hits += 1
+    return hits / len(workload), len(workload) / (time.perf_counter() - begin)
+
+
+def exact_lru(workload, capacity):
+    cache = collections.OrderedDict()
+    hits = 0
+    for key in workload:
+        if key in cache:
+            cache.move_to_end(key)
+            hits += 1
+        else:
+            cache[key] = True
+            if len(cache) > capacity:
+                cache.popitem(last=False)
+    return hits / len(workload)
+
+
+def main(operations=200000, keys=50000, exponent=1.0):
+    random.seed(0)
+    workload = zipf_keys(operations, keys, exponent)
+    client = server.get_embedded_client()
+
+    client.execute('FLUSHALL')
+    client.execute('SET', 'key:0', 'value')
+    # Room for a tenth of the keys
+    maxmemory = server.used_memory() * keys // 10
+    capacity = keys // 10
+
+    hit_ratio, ops = run(client, workload)
+    print('{:<16} {:>6.1%} hits {:>10.0f} ops/sec'.format('no maxmemory', hit_ratio, ops))
+    print('{:<16} {:>6.1%} hits'.format('exact LRU', exact_lru(workload, capacity)))
+
+    for policy in MAXMEMORY_POLICIES:
+        if policy == 'noeviction':
+            continue
+        client.execute('FLUSHALL')
+        client.execute('CONFIG', 'SET', 'maxmemory', 0)
+        client.execute('CONFIG', 'SET', 'maxmemory-policy', policy)
+        if policy.startswith('volatile-'):
+            # Every key has a timeout, later keys expiring later
+            client.execute('CONFIG', 'SET', 'maxmemory', maxmemory)
+            begin = time.perf_counter()
+            hits = 0
+            for i, key in enumerate(workload):
+                if client.execute('GET', key) is None:
+                    client.execute('SET', key, 'value', 'EX', 3600 + i)
+                else:
+                    hits += 1
+            hit_ratio, ops = hits / len(workload), len(workload) / (time.perf_counter() - begin)
+        else:
+            client.execute('CONFIG', 'SET', 'maxmemory', maxmemory)
+            hit_ratio, ops = run(client, workload)
+        print('{:<16} {:>6.1%} hits {:>10.0f} ops/sec {:>8} keys'.format(
+            policy, hit_ratio, ops, len(server.default_database().key_space)))
+
+    client.execute('CONFIG', 'SET', 'maxmemory', 0)
+    client.execute('CONFIG', 'SET', 'maxmemory-policy', 'noeviction')
+    client.execute('FLUSHALL')
+
+
+if __name__ == '__main__':
+    main(*[float(arg) if '.' in arg else int(arg) for arg in sys.argv[1:]])
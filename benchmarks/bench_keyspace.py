@@ -0,0 +1,64 @@
+'''
+Compare the memory per key and the lookup latency of the keyspace backends, with keys sharing long
+prefixes.
+
+Usage::
+
+    $ python benchmarks/bench_keyspace.py [keys]
+'''
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server.keyspace import KEYSPACE_BACKENDS
+
+
+def make_keys(count):
+    regions = [b'eu-west', b'eu-central', b'us-east', b'ap-south']
+    return [b'session:%s:user:%d' % (regions[i % len(regions)], 100000 + i // len(regions))
+            for i in range(count)]
+
+
+def build(backend, keys):
+    gc.collect()
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    keyspace = KEYSPACE_BACKENDS[backend]()
+    for key in keys:
+        # Copy the key, like a key parsed from a command, so its memory is accounted
+        keyspace[bytes(bytearray(key))] = None
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    return keyspace, used
+
+
+def main(count=200000):
+    keys = make_keys(count)
+    lookups = random.sample(keys, min(count, 100000))
+    print('{} keys, average key length {:.1f} bytes'.format(count, sum(map(len, keys)) / count))
+
+    for backend in sorted(KEYSPACE_BACKENDS):
+        keyspace, used = build(backend, keys)
+
+        begin = time.perf_counter()
+        for key in lookups:
+            keyspace.get(key)
+        lookup = (time.perf_counter() - begin) / len(lookups)
+
+        begin = time.perf_counter()
+        matching = list(keyspace.iter_prefix(b'session:us-east:user:1001'))
+        prefix = time.perf_counter() - begin
+
+        print('{:<6} {:>8.1f} bytes/key {:>8.2f} us/lookup {:>8.2f} ms for {} keys by prefix'.format(
+            backend, used / count, lookup * 1e6, prefix * 1000, len(matching)))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
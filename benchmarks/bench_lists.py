@@ -0,0 +1,51 @@
+'''
+Measure the throughput of list commands against lists of growing sizes: LPUSH/LPOP at the head,
+LINDEX in the middle and LRANGE of the first elements. The head operations should not depend on the
+size of the list, and LINDEX should grow with the number of chunks rather than of elements. The
+commands go through the embedded client.
+
+Usage::
+
+    $ python benchmarks/bench_lists.py [max size] [commands]
+'''
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server_impl import server
+
+
+def throughput(client, commands, rounds=3):
+    best = None
+    for i in range(rounds):
+        begin = time.perf_counter()
+        client.execute_many(commands)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return len(commands) / best
+
+
+def main(max_size=1000000, count=20000):
+    client = server.get_embedded_client()
+    client.execute('FLUSHALL')
+    print('{:>10} {:>14} {:>14} {:>14}'.format('size', 'LPUSH+LPOP/s', 'LINDEX mid/s', 'LRANGE 0 9/s'))
+    size = 0
+    target = 1000
+    while target <= max_size:
+        for start in range(size, target, 10000):
+            client.execute('LPUSH', 'list', *range(start, min(start + 10000, target)))
+        size = target
+        # Every push is popped back, so the size stays the same
+        head = throughput(client, [('LPUSH', 'list', 'value'), ('LPOP', 'list')] * (count // 2))
+        middle = throughput(client, [('LINDEX', 'list', size // 2)] * count)
+        front = throughput(client, [('LRANGE', 'list', 0, 9)] * count)
+        print('{:>10,} {:>14,.0f} {:>14,.0f} {:>14,.0f}'.format(size, head, middle, front))
+        target *= 10
+    client.execute('FLUSHALL')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,94 @@
+'''
+Measure the keys/s moved between two local instances, by a client doing DUMP, RESTORE and DEL for
+every key, and by MIGRATE with one key or batches of keys per command.
+
+Usage::
+
+    $ python benchmarks/bench_migrate.py [keys] [value size]
+'''
+
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from redis.client.connection import RedisConnection
+
+
+def start_server(directory):
+    '''
+    :return: the server process, and a connection to it
+    '''
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, '-c', 'from redis.server_impl import server_main; server_main()',
+         '--port', str(port), '--dir', directory, '--save', ''],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for i in range(200):
+        try:
+            return process, RedisConnection(port=port)
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError('the server did not start')
+
+
+def fill(connection, keys, value):
+    for first in range(0, len(keys), 1000):
+        connection.execute_many([('SET', key, value) for key in keys[first:first + 1000]])
+
+
+def client_move(source, target, keys):
+    for key in keys:
+        payload = source.execute('DUMP', key)
+        target.execute('RESTORE', key, 0, payload)
+        source.execute('DEL', key)
+
+
+def migrate(source, port, keys, batch):
+    if batch == 1:
+        for key in keys:
+            source.execute('MIGRATE', '127.0.0.1', port, key, 0, 5000)
+        return
+    for first in range(0, len(keys), batch):
+        source.execute('MIGRATE', '127.0.0.1', port, '', 0, 5000, 'KEYS', *keys[first:first + batch])
+
+
+def main(count=20000, value_size=100):
+    with tempfile.TemporaryDirectory() as directory:
+        servers = []
+        for name in ('source', 'target'):
+            os.mkdir(os.path.join(directory, name))
+            servers.append(start_server(os.path.join(directory, name)))
+        (source_process, source), (target_process, target) = servers
+        target_port = target.sock.getpeername()[1]
+        value = b'x' * value_size
+        try:
+            runs = [('DUMP/RESTORE/DEL', lambda keys: client_move(source, target, keys))]
+            runs += [('MIGRATE batch=%d' % batch, lambda keys, batch=batch: migrate(source, target_port, keys, batch))
+                     for batch in (1, 10, 100, 1000)]
+            for name, move in runs:
+                keys = ['key:%d' % i for i in range(count)]
+                target.execute('FLUSHALL')
+                fill(source, keys, value)
+                begin = time.perf_counter()
+                move(keys)
+                elapsed = time.perf_counter() - begin
+                assert target.execute('GET', keys[-1]) == value and source.execute('GET', keys[-1]) is None
+                print('{:<18} {:>10,.0f} keys/s'.format(name, count / elapsed))
+        finally:
+            for process, connection in servers:
+                connection.close()
+                process.kill()
+                process.wait()
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
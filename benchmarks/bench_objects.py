@@ -0,0 +1,70 @@
+'''
+Measure the memory per key of small string keys, persistent and volatile, and the throughput of GET
+and SET on them. The commands go through the embedded client, so the numbers can be compared across
+versions of the object model.
+
+Usage::
+
+    $ python benchmarks/bench_objects.py [keys]
+'''
+
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server_impl import server
+
+
+def fill(client, count, volatile=False, chunk=1000):
+    gc.collect()
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    for start in range(0, count, chunk):
+        # The commands are built and released chunk by chunk, so only the stored keys remain
+        if volatile:
+            commands = [('SET', 'key:%d' % i, 'value:%d' % i, 'EX', 3600)
+                        for i in range(start, min(start + chunk, count))]
+        else:
+            commands = [('SET', 'key:%d' % i, 'value:%d' % i)
+                        for i in range(start, min(start + chunk, count))]
+        client.execute_many(commands)
+        del commands
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    return used
+
+
+def throughput(client, commands, rounds=3):
+    best = None
+    for i in range(rounds):
+        begin = time.perf_counter()
+        client.execute_many(commands)
+        elapsed = time.perf_counter() - begin
+        best = elapsed if best is None else min(best, elapsed)
+    return len(commands) / best
+
+
+def main(count=200000):
+    client = server.get_embedded_client()
+
+    for volatile in (False, True):
+        client.execute('FLUSHALL')
+        used = fill(client, count, volatile)
+        print('{:<10} {:>8.1f} bytes/key'.format('volatile' if volatile else 'persistent', used / count))
+
+    keys = ['key:%d' % random.randrange(count) for i in range(200000)]
+    gets = [('GET', key) for key in keys]
+    sets = [('SET', key, 'value') for key in keys]
+    print('{:<10} {:>8.0f} ops/sec'.format('GET', throughput(client, gets)))
+    print('{:<10} {:>8.0f} ops/sec'.format('SET', throughput(client, sets)))
+    client.execute('FLUSHALL')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
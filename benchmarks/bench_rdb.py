@@ -0,0 +1,78 @@
+'''
+Measure the throughput of writing and loading RDB snapshots, in keys/s and MB/s, with and without
+the CRC-64 checksum, the time BGSAVE blocks the event loop to fork, and for a lazy load the time
+until the server could serve the clients and until all the values are loaded.
+
+The keys are filled directly in the database, small strings with a tenth of them volatile and one
+key in a thousand a list of 10 elements.
+
+Usage::
+
+    $ python benchmarks/bench_rdb.py [keys]
+'''
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.common.objects import RedisStringObject, RedisListObject
+from redis.server import rdb
+from redis.server_impl import server
+
+
+def fill(count):
+    db = server.default_database()
+    db.flush()
+    expire_time = time.time() + 3600
+    for i in range(count):
+        key = b'key:%d' % i
+        if i % 1000 == 999:
+            db.put_key(key, RedisListObject([b'item:%d' % j for j in range(10)]))
+        else:
+            db.put_key(key, RedisStringObject(b'value:%d' % i), expire_time if i % 10 == 0 else None)
+
+
+def report(name, count, size, elapsed):
+    print('{:<24} {:>8.2f} s {:>12,.0f} keys/s {:>8.1f} MB/s'.format(
+        name, elapsed, count / elapsed, size / elapsed / 1024 ** 2))
+
+
+def main(count=1000000):
+    begin = time.perf_counter()
+    fill(count)
+    print('{:,} keys filled in {:.1f} s'.format(count, time.perf_counter() - begin))
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'dump.rdb')
+        for checksum in (False, True):
+            begin = time.perf_counter()
+            keys, size = rdb.save([server.default_database()], path, checksum)
+            report('save' + (' +crc64' if checksum else ''), keys, size, time.perf_counter() - begin)
+
+        server.default_database().flush()
+        begin = time.perf_counter()
+        keys = rdb.load(server, path)
+        report('load +crc64', keys, size, time.perf_counter() - begin)
+
+        server.default_database().flush()
+        begin = time.perf_counter()
+        snapshot = rdb.load_lazily(server, path)
+        report('lazy load: key index', keys, size, time.perf_counter() - begin)
+        while snapshot.hydrate(1000):
+            pass
+        report('lazy load: all values', keys, size, time.perf_counter() - begin)
+
+        server.config['dir'] = directory
+        begin = time.perf_counter()
+        server.rdb_bgsave()
+        print('BGSAVE fork: {:.1f} ms'.format((time.perf_counter() - begin) * 1000))
+        server.check_rdb_child(wait=True)
+        print('BGSAVE total: {:.2f} s, status {}'.format(
+            server.rdb_last_save_duration, 'ok' if server.rdb_last_save_ok else 'err'))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
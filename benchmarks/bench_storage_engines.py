@@ -0,0 +1,69 @@
+'''
+Measure the latency of GET on every storage engine, for keys held in memory, keys stored on disk by
+the spill engine, and missing keys. The spill engine keeps a tenth of the dataset in memory.
+
+Usage::
+
+    $ python benchmarks/bench_storage_engines.py [keys] [value size]
+'''
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from redis.server_impl import server
+from redis.server.keyspace import KEYSPACE_BACKENDS
+
+
+def latencies(client, keys):
+    result = []
+    for key in keys:
+        begin = time.perf_counter()
+        client.execute('GET', key)
+        result.append(time.perf_counter() - begin)
+    result.sort()
+    return result
+
+
+def report(engine, name, result):
+    if not result:
+        return
+    print('{:<6} {:<10} {:>8.1f} us p50 {:>8.1f} us p99 {:>8.1f} us max'.format(
+        engine, name, result[len(result) // 2] * 1e6, result[len(result) * 99 // 100] * 1e6,
+        result[-1] * 1e6))
+
+
+def main(count=50000, size=1000):
+    client = server.get_embedded_client()
+    value = os.urandom(size // 2).hex()
+    keys = ['key:%d' % i for i in range(count)]
+    client.execute('CONFIG', 'SET', 'spill-memory', str(count * size // 10))
+
+    for engine in sorted(KEYSPACE_BACKENDS):
+        client.execute('FLUSHALL')
+        client.execute('CONFIG', 'SET', 'keyspace-backend', engine)
+        client.execute_many([('SET', key, value) for key in keys])
+        client.execute('ECHO', 'reclaim')
+
+        key_space = server.default_database().key_space
+        if engine == 'spill':
+            in_memory = [key.decode() for key in key_space.lru]
+            on_disk = [key for key in keys if key.encode() not in key_space.lru]
+            print('spill  {} keys in memory, {} on disk'.format(len(in_memory), len(on_disk)))
+        else:
+            in_memory, on_disk = keys, []
+
+        report(engine, 'memory', latencies(client, random.sample(in_memory, min(10000, len(in_memory)))))
+        report(engine, 'disk', latencies(client, random.sample(on_disk, min(10000, len(on_disk)))))
+        report(engine, 'missing', latencies(client, ['missing:%d' % i for i in range(10000)]))
+
+    client.execute('FLUSHALL')
+    client.execute('CONFIG', 'SET', 'keyspace-backend', 'dict')
+    client.execute('CONFIG', 'SET', 'spill-memory', '64mb')
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,125 @@
+import heapq
+import time
+
+from redis.common.exceptions import CommandError
+
+# Command measuring the size of a key for the big keys report, and its unit
+SIZE_COMMANDS = {
+    b'string': (b'STRLEN', 'bytes'),
+    b'list': (b'LLEN', 'items'),
+}
+
+
+class KeyspaceAnalyzer:
+
+    '''
+    Find the largest keys of each type, like ``redis-cli --bigkeys`` and ``--memkeys``, or the most
+    accessed keys, like ``--hotkeys``.
+
+    The keyspace is walked with SCAN, one page at a time, and the keys of a page are measured with a
+    single batch of commands, so the server keeps serving other clients in between. In ``memkeys``
+    mode the size of a key is its MEMORY USAGE, otherwise its length. The most accessed keys are
+    tracked by the server as they are accessed, in ``hotkeys`` mode they are read with HOTKEYS
+    without walking the keyspace.
+
+    :param client: a ``RedisConnection`` or an embedded client
+    :param interval: seconds to sleep between two pages, to lower the load of the server
+    '''
+
+    def __init__(self, client, memkeys=False, hotkeys=False, top=1, count=100, samples=5, interval=0):
+        self.client = client
+        self.memkeys = memkeys
+        self.hotkeys = hotkeys
+        self.top = top
+        self.count = count
+        self.samples = samples
+        self.interval = interval
+
+        self.scanned = 0
+        # {type name: {'keys': count, 'total': size, 'top': [(size, key), ...]}}
+        self.types = {}
+
+    def run(self):
+        '''
+        Walk the whole keyspace.
+
+        :return: the per type report, see ``types``
+        :rtype: dict
+        '''
+
+        if self.hotkeys:
+            for key, accesses in self.client.execute('HOTKEYS', 'COUNT', self.top):
+                self.add(key, None, accesses)
+            return self.types
+
+        cursor = b'0'
+        while True:
+            cursor, keys = self.client.execute('SCAN', cursor, 'COUNT', self.count)
+            self.analyze(keys)
+            if cursor == b'0':
+                return self.types
+            if self.interval:
+                time.sleep(self.interval)
+
+    def analyze(self, keys):
+        types = self.client.execute_many([('TYPE', key) for key in keys])
+        commands = []
+        measured = []
+        for key, type_name in zip(keys, types):
+            if isinstance(type_name, CommandError) or type_name == b'none':
+                continue
+            if self.memkeys:
+                commands.append(('MEMORY', 'USAGE', key, 'SAMPLES', self.samples))
+            elif type_name in SIZE_COMMANDS:
+                commands.append((SIZE_COMMANDS[type_name][0], key))
+            else:
+                continue
+            measured.append((key, type_name))
+
+        for (key, type_name), size in zip(measured, self.client.execute_many(commands)):
+            if not isinstance(size, int):
+                # Deleted or replaced in between
+                continue
+            self.add(key, type_name, size)
+
+    def add(self, key, type_name, size):
+        self.scanned += 1
+        stats = self.types.get(type_name)
+        if stats is None:
+            stats = self.types[type_name] = {'keys': 0, 'total': 0, 'top': []}
+        stats['keys'] += 1
+        stats['total'] += size
+        if len(stats['top']) < self.top:
+            heapq.heappush(stats['top'], (size, key))
+        elif size > stats['top'][0][0]:
+            heapq.heapreplace(stats['top'], (size, key))
+
+    def unit(self, type_name):
+        if self.memkeys:
+            return 'bytes'
+        return SIZE_COMMANDS[type_name][1]
+
+    def format_report(self):
+        '''
+        :return: the report, as lines of text
+        :rtype: list
+        '''
+
+        if self.hotkeys:
+            lines = ['-------- hottest keys --------']
+            stats = self.types.get(None, {'top': []})
+            for accesses, key in sorted(stats['top'], reverse=True):
+                lines.append('{} accesses: {!r}'.format(accesses, key))
+            return lines
+
+        lines = ['Sampled {} keys in the keyspace'.format(self.scanned)]
+
+        for type_name, stats in sorted(self.types.items()):
+            name, unit = type_name.decode(), self.unit(type_name)
+            lines.append('')
+            lines.append('-------- biggest {} keys --------'.format(name))
+            for size, key in sorted(stats['top'], reverse=True):
+                lines.append('{} {} {}: {!r}'.format(size, unit, name, key))
+            lines.append('{} {}s with {} {} ({:.2f} {} per key)'.format(
+                stats['keys'], name, stats['total'], unit, stats['total'] / stats['keys'], unit))
+        return lines
@@ -0,0 +1,52 @@
+'''
+Command line client. Only the keyspace analysis modes are supported for now.
+
+Usage::
+
+    $ redis-cli [-h host] [-p port] (--bigkeys | --memkeys | --hotkeys) [--memkeys-samples n] [--top n]
+                [-i interval]
+'''
+
+import argparse
+import sys
+
+from .analyzer import KeyspaceAnalyzer
+from .connection import RedisConnection
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='redis-cli', add_help=False)
+    parser.add_argument('--help', action='help', help='show this help message and exit')
+    parser.add_argument('-h', dest='host', default='127.0.0.1', help='server hostname')
+    parser.add_argument('-p', dest='port', type=int, default=8888, help='server port')
+    parser.add_argument('-i', dest='interval', type=float, default=0,
+                        help='seconds to sleep between two SCAN calls')
+    mode = parser.add_mutually_exclusive_group(required=True)
+    mode.add_argument('--bigkeys', action='store_true', help='find the keys with the most elements')
+    mode.add_argument('--memkeys', action='store_true', help='find the keys using the most memory')
+    mode.add_argument('--hotkeys', action='store_true',
+                      help='find the most accessed keys, as tracked by the server')
+    parser.add_argument('--memkeys-samples', type=int, default=5,
+                        help='elements sampled by MEMORY USAGE, 0 for all of them')
+    parser.add_argument('--top', type=int, default=1, help='number of keys reported per type')
+    parser.add_argument('--count', type=int, default=100, help='COUNT of the SCAN calls')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+    connection = RedisConnection(options.host, options.port)
+    try:
+        analyzer = KeyspaceAnalyzer(connection, memkeys=options.memkeys, hotkeys=options.hotkeys,
+                                    top=options.top, count=options.count,
+                                    samples=options.memkeys_samples, interval=options.interval)
+        analyzer.run()
+    finally:
+        connection.close()
+
+    for line in analyzer.format_report():
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import socket
+
+from redis.common.exceptions import CommandError
+from redis.common.utils import make_argv
+
+
+def pack_command(argv):
+    '''
+    :return: the REdis Serialization Protocol representation of a command
+    :rtype: bytes
+    '''
+
+    parts = [('*%d\r\n' % len(argv)).encode()]
+    for arg in argv:
+        parts.append(('$%d\r\n' % len(arg)).encode())
+        parts.append(arg)
+        parts.append(b'\r\n')
+    return b''.join(parts)
+
+
+def read_reply(fp):
+    '''
+    Read a reply from a binary file object, as native Python values like the replies of the embedded
+    client: ``+OK`` becomes True, strings become bytes, nil becomes None and errors become
+    ``CommandError`` instances.
+
+    :raises ConnectionError: the connection was closed
+    '''
+
+    line = fp.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('Connection closed by server')
+
+    kind, body = line[:1], line[1:-2]
+    if kind == b'+':
+        return True if body == b'OK' else body
+    elif kind == b'-':
+        errtype, _, message = body.decode().partition(' ')
+        return CommandError(errtype, message)
+    elif kind == b':':
+        return int(body)
+    elif kind == b'$':
+        length = int(body)
+        if length < 0:
+            return None
+        data = fp.read(length + 2)
+        if len(data) != length + 2:
+            raise ConnectionError('Connection closed by server')
+        return data[:-2]
+    elif kind == b'*':
+        length = int(body)
+        if length < 0:
+            return None
+        return [read_reply(fp) for i in range(length)]
+    else:
+        raise ValueError('Invalid reply %r' % line)
+
+
+class RedisConnection:
+
+    '''
+    Blocking connection to a server, with the interface of ``RedisEmbeddedClient``.
+    '''
+
+    def __init__(self, host='127.0.0.1', port=8888, timeout=None):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.fp = self.sock.makefile('rb')
+
+    def execute(self, *args):
+        '''
+        Execute a single command, e.g. ``connection.execute('SET', 'key', 10)``.
+
+        :return: the native reply
+        :raises CommandError: the command replied with an error
+        '''
+
+        self.sock.sendall(pack_command(make_argv(args)))
+        reply = read_reply(self.fp)
+        if isinstance(reply, CommandError):
+            raise reply
+        return reply
+
+    def execute_many(self, commands):
+        '''
+        Send a batch of commands at once, then read their replies.
+
+        :return: the native replies, in order. Failed commands have their exception in place of a reply.
+        :rtype: list
+        '''
+
+        argvs = [make_argv(args) for args in commands]
+        self.sock.sendall(b''.join(pack_command(argv) for argv in argvs))
+        return [read_reply(self.fp) for argv in argvs]
+
+    def close(self):
+        self.fp.close()
+        self.sock.close()
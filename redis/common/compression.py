@@ -0,0 +1,117 @@
+'''
+Compression of large string values, enabled by the ``compress-min-size`` parameter.
+
+A compressed value is split in blocks compressed independently, so a ranged read only decompresses
+the blocks it covers.
+'''
+
+import bz2
+import lzma
+import sys
+import time
+import zlib
+
+# Size of the uncompressed blocks
+BLOCK_SIZE = 64 * 1024
+
+# A value is stored compressed only when it saves at least this fraction of its size
+MIN_SAVINGS = 0.1
+
+CODECS = {
+    'zlib': (zlib.compress, zlib.decompress),
+    'lzma': (lzma.compress, lzma.decompress),
+    'bz2': (bz2.compress, bz2.decompress),
+}
+
+
+class CompressionStats:
+
+    '''
+    Counters reported by the Compression section of INFO, for all the databases of the process.
+    '''
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.compressed_values = 0
+        self.rejected_values = 0
+        self.input_bytes = 0
+        self.output_bytes = 0
+        self.compression_time = 0.0
+        self.decompressed_bytes = 0
+        self.decompression_time = 0.0
+
+    def ratio(self):
+        if not self.output_bytes:
+            return 0.0
+        return self.input_bytes / self.output_bytes
+
+
+stats = CompressionStats()
+
+
+class CompressedBytes:
+
+    '''
+    Immutable bytes stored compressed with one of the CODECS.
+    '''
+
+    __slots__ = ('codec', 'blocks', 'length')
+
+    def __init__(self, codec, blocks, length):
+        self.codec = codec
+        self.blocks = blocks
+        self.length = length
+
+    @classmethod
+    def compress(cls, data, codec):
+        '''
+        :return: the compressed data, or None when compression does not save enough memory
+        :rtype: CompressedBytes
+        '''
+
+        begin = time.perf_counter()
+        compress = CODECS[codec][0]
+        blocks = tuple(compress(data[i:i + BLOCK_SIZE]) for i in range(0, len(data), BLOCK_SIZE))
+        stats.compression_time += time.perf_counter() - begin
+
+        compressed_size = sum(len(block) for block in blocks)
+        if compressed_size > len(data) * (1 - MIN_SAVINGS):
+            stats.rejected_values += 1
+            return None
+        stats.compressed_values += 1
+        stats.input_bytes += len(data)
+        stats.output_bytes += compressed_size
+        return cls(codec, blocks, len(data))
+
+    def __len__(self):
+        return self.length
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.blocks) + \
+            sum(sys.getsizeof(block) for block in self.blocks)
+
+    def _decompress_blocks(self, first, last):
+        begin = time.perf_counter()
+        decompress = CODECS[self.codec][1]
+        data = b''.join(decompress(block) for block in self.blocks[first:last])
+        stats.decompression_time += time.perf_counter() - begin
+        stats.decompressed_bytes += len(data)
+        return data
+
+    def decompress(self):
+        return self._decompress_blocks(0, len(self.blocks))
+
+    def slice(self, start, stop):
+        '''
+        :return: the same as ``data[start:stop]`` on the uncompressed data
+        :rtype: bytes
+        '''
+
+        start, stop, step = slice(start, stop).indices(self.length)
+        if start >= stop:
+            return b''
+        first, last = start // BLOCK_SIZE, (stop - 1) // BLOCK_SIZE + 1
+        offset = first * BLOCK_SIZE
+        return self._decompress_blocks(first, last)[start - offset:stop - offset]
@@ -0,0 +1,34 @@
+'''
+Hash slots of the keys in cluster mode.
+
+A key belongs to the slot ``CRC16(key) mod 16384``, with the CRC-16/XMODEM checksum (polynomial
+0x1021, initial value 0), so ``key_hash_slot(b'123456789') == 0x31c3``. When the key contains a
+non empty ``{hashtag}``, only the part between the first ``{`` and the next ``}`` is hashed, so keys
+sharing a tag are in the same slot and can be used by the same command.
+'''
+
+from binascii import crc_hqx
+
+CLUSTER_SLOTS = 16384
+
+
+def key_hash_tag(key):
+    '''
+    :return: the part of key that is hashed, its hashtag or the whole key
+    :rtype: bytes
+    '''
+
+    start = key.find(b'{')
+    if start >= 0:
+        end = key.find(b'}', start + 1)
+        if end > start + 1:
+            return key[start + 1:end]
+    return key
+
+
+def key_hash_slot(key):
+    '''
+    :rtype: int
+    '''
+
+    return crc_hqx(key_hash_tag(key), 0) & (CLUSTER_SLOTS - 1)
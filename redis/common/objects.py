@@ -1,36 +1,79 @@
 
+import sys
 import time
 from decimal import Decimal
 import types
 
+from .compression import CompressedBytes
+from .quicklist import QuickList
+
+# Estimated size of a RedisObject instance, without its value
+OBJECT_OVERHEAD = 80
+# Size of a reference held by a list
+POINTER_SIZE = 8
+# Estimated size of a QuickList without its chunks, and of an empty chunk
+QUICKLIST_OVERHEAD = sys.getsizeof(QuickList()) + sys.getsizeof(QuickList().chunks)
+QUICKLIST_CHUNK_OVERHEAD = sys.getsizeof([]) + POINTER_SIZE
+# Integers stored by string values are shared below this value, with their bytes representation
+SHARED_INTEGERS = 10000
+shared_integers = list(range(SHARED_INTEGERS))
+shared_integer_bytes = [str(i).encode() for i in shared_integers]
+# Longest bytes with the embstr encoding
+EMBSTR_SIZE_LIMIT = 44
+INT64_MIN, INT64_MAX = -2 ** 63, 2 ** 63 - 1
+INTEGER_PREFIXES = frozenset(b'-0123456789'[i:i + 1] for i in range(11))
+# Initial access counter, so new keys are not the first ones evicted by the LFU policies
+LFU_INIT_VAL = 5
+
 
 class RedisObject:
 
-    def __init__(self, value, expire_time=None):
-        self._expire_time = expire_time
-        self._value = value
+    # The objects have no __dict__: there is one per key, and attribute access through slots is
+    # faster. The timeout of a key is not stored here but in RedisDatabase.expires, so the
+    # persistent keys do not pay for it.
+    __slots__ = ('value', 'version', 'atime', 'freq', 'memory', 'accounted_memory')
+
+    # Name of the type, as reported by TYPE and used by SCAN TYPE
+    type_name = None
+
+    def __init__(self, value):
+        self.value = value
+        # Stamped by RedisDatabase on every modification, see RedisDatabase.key_version
+        self.version = 0
+        # Time of the last access, as time.monotonic(), and logarithmic access counter, maintained
+        # by RedisDatabase.touch
+        self.atime = time.monotonic()
+        self.freq = LFU_INIT_VAL
+        # Estimated memory usage, kept up to date by the methods modifying the value
+        self.memory = OBJECT_OVERHEAD + self.value_memory(value)
+        # Memory usage of the object and its key, as last accounted by RedisDatabase
+        self.accounted_memory = 0
 
     def __str__(self):
         return str(self.value)
 
-    def expired(self):
-        return True if self.expire_time is not None and time.time() > self.expire_time else False
+    def set_value(self, value):
+        '''
+        Replace the value, the attribute must not be assigned directly so the memory usage stays
+        accurate.
+        '''
 
-    @property
-    def expire_time(self):
-        return self._expire_time
+        self.value = value
+        self.memory = OBJECT_OVERHEAD + self.value_memory(value)
 
-    @expire_time.setter
-    def expire_time(self, value):
-        self._expire_time = value
+    @staticmethod
+    def value_memory(value):
+        return sys.getsizeof(value)
 
-    @property
-    def value(self):
-        return self._value
+    def estimate_memory(self, samples=5):
+        '''
+        Compute the memory used by the object, as reported by MEMORY USAGE.
 
-    @value.setter
-    def value(self, value):
-        self._value = value
+        :param samples: number of elements of aggregate values to measure, the size of the others is
+                        extrapolated. 0 measures all the elements.
+        '''
+
+        return OBJECT_OVERHEAD + self.value_memory(self.value)
 
     def serialize(self):
         '''
@@ -43,45 +86,137 @@ class RedisObject:
 
 class RedisStringObject(RedisObject):
 
-    def __init__(self, value=b'', expire_time=None):
-        if isinstance(value, str):
-            value = value.encode()
-        elif not isinstance(value, bytes):
-            value = str(value).encode()
-        super(RedisStringObject, self).__init__(value, expire_time)
+    '''
+    A string value has one of the encodings reported by OBJECT ENCODING:
 
-    def __str__(self):
-        if isinstance(self.value, str):
-            return self.value
-        elif isinstance(self.value, bytes):
-            return self.value.decode()
+    * ``int``: the string is the canonical representation of a 64 bit signed integer, stored as an
+      int. The integers below SHARED_INTEGERS are shared by all the keys. The bytes representation is
+      computed on the first read and cached until the value changes.
+    * ``embstr``: bytes of at most EMBSTR_SIZE_LIMIT bytes.
+    * ``raw``: longer bytes.
+    * ``compressed``: bytes stored compressed, see ``RedisDatabase.compress_value``.
+    '''
+
+    __slots__ = ('_bytes',)
+
+    type_name = b'string'
+
+    def __init__(self, value=b''):
+        value = self.encode_value(value)
+        self._bytes = None
+        super(RedisStringObject, self).__init__(value)
+
+    @staticmethod
+    def encode_value(value):
+        '''
+        :return: value converted to the int or bytes it is stored as
+        '''
+
+        if isinstance(value, bytes):
+            if len(value) <= 20 and value[:1] in INTEGER_PREFIXES:
+                try:
+                    integer = int(value)
+                except ValueError:
+                    return value
+                if str(integer).encode() != value:
+                    return value
+                value = integer
+            else:
+                return value
+        elif isinstance(value, int):
+            pass
+        elif isinstance(value, str):
+            return RedisStringObject.encode_value(value.encode())
         else:
-            return str(self.value)
+            return RedisStringObject.encode_value(str(value).encode())
+
+        if 0 <= value < SHARED_INTEGERS:
+            return shared_integers[value]
+        if not INT64_MIN <= value <= INT64_MAX:
+            return str(value).encode()
+        return value
+
+    @staticmethod
+    def value_memory(value):
+        if value.__class__ is int and 0 <= value < SHARED_INTEGERS:
+            return 0
+        return sys.getsizeof(value)
+
+    def set_value(self, value):
+        value = self.encode_value(value)
+        self.value = value
+        self._bytes = None
+        self.memory = OBJECT_OVERHEAD + self.value_memory(value)
+
+    def compress(self, codec):
+        '''
+        Store the value compressed, if it is bytes and compression saves memory.
+
+        :return: whether the value was compressed
+        :rtype: bool
+        '''
+
+        if self.value.__class__ is not bytes:
+            return False
+        compressed = CompressedBytes.compress(self.value, codec)
+        if compressed is None:
+            return False
+        self.value = compressed
+        self.memory = OBJECT_OVERHEAD + self.value_memory(compressed)
+        return True
+
+    @property
+    def encoding(self):
+        value = self.value
+        if value.__class__ is int:
+            return 'int'
+        if value.__class__ is CompressedBytes:
+            return 'compressed'
+        return 'embstr' if len(value) <= EMBSTR_SIZE_LIMIT else 'raw'
+
+    def __str__(self):
+        return self.get_bytes().decode()
 
     def __len__(self):
-        return len(self.get_bytes())
+        value = self.value
+        if value.__class__ is int:
+            return len(self.get_bytes())
+        # The length of a compressed value is known without decompressing it
+        return len(value)
 
     def get_bytes(self):
-        if not isinstance(self.value, bytes):
-            return str(self.value).encode()
-        return self.value
+        value = self.value
+        if value.__class__ is bytes:
+            return value
+        if value.__class__ is CompressedBytes:
+            return value.decompress()
+        if 0 <= value < SHARED_INTEGERS:
+            return shared_integer_bytes[value]
+        if self._bytes is None:
+            self._bytes = str(value).encode()
+        return self._bytes
 
     def get_range(self, start=None, stop=None):
+        if self.value.__class__ is CompressedBytes:
+            return RedisStringObject(self.value.slice(start, stop + 1))
         val = self.get_bytes()
         return RedisStringObject(val[start:stop + 1])
 
     def get_integer(self):
-        if isinstance(self.value, Decimal):
-            raise ValueError('Value is a Decimal')
-        return int(self.value)
+        '''
+        :raises ValueError: the value is not an integer
+        '''
+
+        value = self.value
+        if value.__class__ is int:
+            return value
+        return int(value)
 
     def get_decimal(self):
-        if isinstance(self.value, bytes):
-            return Decimal(self.value.decode())
-        return Decimal(str(self.value))
+        return Decimal(self.get_bytes().decode())
 
     def get_float(self):
-        return float(self.value)
+        return float(self.get_bytes())
 
     def serialize(self):
         from .proto import RedisBulkStringSerializationObject
@@ -90,29 +225,84 @@ class RedisStringObject(RedisObject):
 
 class RedisListObject(RedisObject):
 
-    def __init__(self, value=[], expire_time=None):
-        if isinstance(value, types.GeneratorType):
-            value = list(value)
+    '''
+    The elements are stored in a ``QuickList``, so pushing and popping at both ends is O(1).
+    '''
+
+    __slots__ = ()
+
+    type_name = b'list'
+    encoding = 'quicklist'
+
+    def __init__(self, value=None):
+        if value is None:
+            value = QuickList()
+        elif isinstance(value, (list, types.GeneratorType)):
+            value = QuickList(value)
         elif isinstance(value, RedisListObject):
-            value = value.value
-        else:
+            value = QuickList(value.value)
+        elif not isinstance(value, QuickList):
             raise ValueError('Value should be a list or RedisListObject')
-        super(RedisListObject, self).__init__(value, expire_time)
+        super(RedisListObject, self).__init__(value)
+
+    @staticmethod
+    def value_memory(value):
+        return QUICKLIST_OVERHEAD + len(value.chunks) * QUICKLIST_CHUNK_OVERHEAD + \
+            sum(sys.getsizeof(item) + POINTER_SIZE for item in value)
+
+    def estimate_memory(self, samples=5):
+        value = self.value
+        if not samples or len(value) <= samples:
+            return OBJECT_OVERHEAD + self.value_memory(value)
+        sampled = sum(sys.getsizeof(item) + POINTER_SIZE for item in value[:samples])
+        return OBJECT_OVERHEAD + QUICKLIST_OVERHEAD + len(value.chunks) * QUICKLIST_CHUNK_OVERHEAD + \
+            sampled * len(value) // samples
+
+    def set_value(self, value):
+        if not isinstance(value, QuickList):
+            value = QuickList(value)
+        super(RedisListObject, self).set_value(value)
+
+    def account_chunks(self, chunks):
+        '''
+        Update the memory usage after the number of chunks changed from chunks.
+        '''
+
+        self.memory += (len(self.value.chunks) - chunks) * QUICKLIST_CHUNK_OVERHEAD
 
     def push(self, *value):
+        chunks = len(self.value.chunks)
         for val in value:
-            self.value.insert(0, val)
+            self.value.appendleft(val)
+            self.memory += sys.getsizeof(val) + POINTER_SIZE
+        self.account_chunks(chunks)
 
     def pop(self, index=0):
-        return self.value.pop(index)
+        chunks = len(self.value.chunks)
+        if index == 0:
+            val = self.value.popleft()
+        elif index == -1:
+            val = self.value.pop()
+        else:
+            val = self.value[index]
+            del self.value[index]
+        self.memory -= sys.getsizeof(val) + POINTER_SIZE
+        self.account_chunks(chunks)
+        return val
 
     def insert(self, index, value):
-        if index >= len(self.value) or index < 0:
+        if index > len(self.value) or index < 0:
             raise IndexError('Out of range')
-        return self.value.insert(index, value)
+        chunks = len(self.value.chunks)
+        self.value.insert(index, value)
+        self.memory += sys.getsizeof(value) + POINTER_SIZE
+        self.account_chunks(chunks)
 
     def append(self, value):
+        chunks = len(self.value.chunks)
         self.value.append(value)
+        self.memory += sys.getsizeof(value) + POINTER_SIZE
+        self.account_chunks(chunks)
 
     def __len__(self):
         return len(self.value)
@@ -121,19 +311,40 @@ class RedisListObject(RedisObject):
         return self.value[index]
 
     def __setitem__(self, index, value):
+        old_value = self.value[index]
         self.value[index] = value
+        self.memory += sys.getsizeof(value) - sys.getsizeof(old_value)
 
     def splice(self, begin=None, end=None, step=None):
         return RedisListObject(self.value[begin:end:step])
 
     def __iter__(self):
-        return self.value.__iter__()
+        return iter(self.value)
+
+    def remove(self, value, count=0):
+        '''
+        Remove the first count occurrences of value, the last ones when count is negative, or all of
+        them when count is 0.
 
-    def reverse(self):
-        return self.value.reverse()
+        :return: the number of removed elements
+        :rtype: int
+        '''
+
+        chunks = len(self.value.chunks)
+        removed = self.value.remove(value, count)
+        self.memory -= sum(sys.getsizeof(val) + POINTER_SIZE for val in removed)
+        self.account_chunks(chunks)
+        return len(removed)
+
+    def trim(self, start, stop):
+        '''
+        Keep the elements of the slice [start:stop] only.
+        '''
 
-    def remove(self, value):
-        self.value.remove(value)
+        chunks = len(self.value.chunks)
+        removed = self.value.trim(start, stop)
+        self.memory -= sum(sys.getsizeof(val) + POINTER_SIZE for val in removed)
+        self.account_chunks(chunks)
 
     def index(self, value):
         return self.value.index(value)
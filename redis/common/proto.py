@@ -177,24 +177,38 @@ class RedisListSerializationObject(RedisSerializationObject):
         +OK\\r\\n
         $11\\r\\n
         Hello World\\r\\n
+
+    A null list, when value is None::
+
+        *-1\\r\\n
     '''
 
     def __init__(self, value):
+        if value is None:
+            self._value = None
+            return
         self._value = []
 
         for val in value:
             if not isinstance(val, RedisSerializationObject):
                 if isinstance(val, RedisObject):
                     self._value.append(val.serialize())
-                elif val is None:
+                elif val is None or isinstance(val, (bytes, str)):
                     self._value.append(RedisBulkStringSerializationObject(val))
+                elif isinstance(val, int) and not isinstance(val, bool):
+                    self._value.append(RedisIntegerSerializationObject(val))
+                elif isinstance(val, list):
+                    self._value.append(RedisListSerializationObject(val))
                 else:
-                    raise ValueError('Value should be a RedisObject or RedisSerializationObject')
+                    raise ValueError('Value should be a RedisObject, RedisSerializationObject, bytes, int or list')
             else:
                 self._value.append(val)
 
     def __iter__(self):
-        return self._value.__iter__()
+        return iter(self._value or ())
+
+    def is_null(self):
+        return self._value is None
 
     def to_resp(self):
         '''
@@ -212,12 +226,25 @@ class RedisListSerializationObject(RedisSerializationObject):
             Hello World\\r\\n
         '''
 
+        if self._value is None:
+            return b'*-1\r\n'
         parts = [b'*', str(len(self._value)).encode(), b'\r\n']
         for val in self._value:
             parts.append(val.to_resp())
         return b''.join(parts)
 
 
+class RedisNoReplySerializationObject(RedisSerializationObject):
+
+    '''
+    Nothing is sent to the client, for the commands of the replication protocol, which write their
+    own replies or reply to none.
+    '''
+
+    def to_resp(self):
+        return b''
+
+
 class ProtocolError(Exception):
 
     def __init__(self, *args, **kwargs):
@@ -241,6 +268,60 @@ def resp_dumps(respobj):
         raise ValueError('%s is not RESP serializable' % respobj)
 
 
+def dump_command(argv):
+    '''
+    :return: the RESP array of bulk strings of a command, as sent by the clients
+    :rtype: bytes
+    '''
+
+    parts = [('*%d\r\n' % len(argv)).encode()]
+    for arg in argv:
+        parts.append(('$%d\r\n' % len(arg)).encode())
+        parts.append(arg)
+        parts.append(b'\r\n')
+    return b''.join(parts)
+
+
+def parse_commands(data, offset=0):
+    '''
+    Parse consecutive commands, RESP arrays of bulk strings, from a whole buffer such as a memory
+    mapped file. Much faster than RedisProtocol, which parses a stream line by line.
+
+    Parsing stops at the end of the last complete command, so a truncated command at the end of
+    data is not an error: the caller compares the last end offset with the size of data.
+
+    :return: generator of (argv, offset of the end of the command) pairs
+    :raises ProtocolError: data is not a sequence of commands
+    '''
+
+    size = len(data)
+    find = data.find
+    while offset < size:
+        if data[offset] != 0x2a:
+            raise ProtocolError('expected \'*\' at offset %d' % offset)
+        end = find(b'\r\n', offset)
+        if end < 0:
+            return
+        argc = int(data[offset + 1:end])
+        pos = end + 2
+        argv = []
+        for i in range(argc):
+            if pos >= size:
+                return
+            if data[pos] != 0x24:
+                raise ProtocolError('expected \'$\' at offset %d' % pos)
+            end = find(b'\r\n', pos)
+            if end < 0:
+                return
+            start = end + 2
+            pos = start + int(data[pos + 1:end]) + 2
+            if pos > size:
+                return
+            argv.append(data[start:pos - 2])
+        offset = pos
+        yield argv, offset
+
+
 def resp_loads(raw_respstr):
     if not isinstance(raw_respstr, bytes):
         raise ValueError('Value should be bytes')
@@ -277,6 +358,8 @@ def __resp_loads(begin_part, buf):
         # List
         obj_list = []
         length = int(begin_part[1:-2].decode())
+        if length < 0:
+            return RedisListSerializationObject(None)
         while length != 0:
             begin_part = buf.readline()
             if begin_part == b'':
@@ -302,6 +385,7 @@ class RedisProtocol(object):
         self.stream_reader = stream_reader
         self.parser = None
 
+    @asyncio.coroutine
     def get_command(self):
         line = yield from self.stream_reader.readline()
         if not line:
@@ -352,8 +436,9 @@ class BulkProtocolParser(RedisProtocolParser):
                 except ValueError:
                     raise ProtocolError('Invalid length')
 
-                arg = yield from stream_reader.read(arg_length)
-                if len(arg) != length:
+                try:
+                    arg = yield from stream_reader.readexactly(arg_length)
+                except asyncio.IncompleteReadError:
                     raise ProtocolError('Length not match')
                 argv.append(arg)
 
@@ -0,0 +1,247 @@
+'''
+Storage of the list values: a quicklist, a deque of chunks of at most ``QUICKLIST_CHUNK_SIZE``
+elements by default.
+
+Pushing or popping at either end only touches the chunk at that end, so it is O(1) however long the
+list is, where a plain list moves all the elements on every operation at the head. An element is
+reached by skipping whole chunks from the nearest end, so indexing is O(n / chunk size), and the
+chunks are small enough for inserting in the middle of one to stay cheap. A chunk that grows past
+twice the chunk size is split, and the empty chunks are dropped.
+'''
+
+import collections
+import itertools
+
+QUICKLIST_CHUNK_SIZE = 128
+
+
+class QuickList:
+
+    __slots__ = ('chunks', 'length', 'chunk_size')
+
+    def __init__(self, iterable=(), chunk_size=QUICKLIST_CHUNK_SIZE):
+        self.chunks = collections.deque()
+        self.length = 0
+        self.chunk_size = chunk_size
+        self.extend(iterable)
+
+    def __getstate__(self):
+        return list(self), self.chunk_size
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.chunks)
+
+    def __reversed__(self):
+        return itertools.chain.from_iterable(reversed(chunk) for chunk in reversed(self.chunks))
+
+    def __repr__(self):
+        return 'QuickList(%r)' % list(self)
+
+    def __eq__(self, other):
+        if isinstance(other, QuickList):
+            return self.length == other.length and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def extend(self, iterable):
+        chunks = self.chunks
+        for item in iterable:
+            if not chunks or len(chunks[-1]) >= self.chunk_size:
+                chunks.append([])
+            chunks[-1].append(item)
+            self.length += 1
+
+    def append(self, item):
+        chunks = self.chunks
+        if not chunks or len(chunks[-1]) >= self.chunk_size:
+            chunks.append([item])
+        else:
+            chunks[-1].append(item)
+        self.length += 1
+
+    def appendleft(self, item):
+        chunks = self.chunks
+        if not chunks or len(chunks[0]) >= self.chunk_size:
+            chunks.appendleft([item])
+        else:
+            chunks[0].insert(0, item)
+        self.length += 1
+
+    def pop(self):
+        '''
+        :raises IndexError: the list is empty
+        '''
+
+        chunks = self.chunks
+        if not chunks:
+            raise IndexError('pop from an empty list')
+        item = chunks[-1].pop()
+        if not chunks[-1]:
+            chunks.pop()
+        self.length -= 1
+        return item
+
+    def popleft(self):
+        '''
+        :raises IndexError: the list is empty
+        '''
+
+        chunks = self.chunks
+        if not chunks:
+            raise IndexError('pop from an empty list')
+        item = chunks[0].pop(0)
+        if not chunks[0]:
+            chunks.popleft()
+        self.length -= 1
+        return item
+
+    def locate(self, index):
+        '''
+        :param index: index of an element, negative indexes counting from the end
+        :return: the chunk holding the element, the position of the chunk in the deque and the index of
+                 the element in the chunk
+        :rtype: tuple
+        :raises IndexError: index is out of range
+        '''
+
+        length = self.length
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('list index out of range')
+        chunks = self.chunks
+        if index < length // 2:
+            for position, chunk in enumerate(chunks):
+                if index < len(chunk):
+                    return chunk, position, index
+                index -= len(chunk)
+        index = length - 1 - index
+        for position, chunk in enumerate(reversed(chunks)):
+            if index < len(chunk):
+                return chunk, len(chunks) - 1 - position, len(chunk) - 1 - index
+            index -= len(chunk)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.length)
+            if step != 1:
+                return list(self)[index]
+            if start >= stop:
+                return []
+            count = stop - start
+            chunk, position, offset = self.locate(start)
+            items = chunk[offset:offset + count]
+            if len(items) < count:
+                for chunk in itertools.islice(self.chunks, position + 1, None):
+                    items.extend(chunk[:count - len(items)])
+                    if len(items) == count:
+                        break
+            return items
+        chunk, position, offset = self.locate(index)
+        return chunk[offset]
+
+    def __setitem__(self, index, item):
+        chunk, position, offset = self.locate(index)
+        chunk[offset] = item
+
+    def __delitem__(self, index):
+        chunk, position, offset = self.locate(index)
+        del chunk[offset]
+        if not chunk:
+            del self.chunks[position]
+        self.length -= 1
+
+    def insert(self, index, item):
+        '''
+        Insert item before the element at index, or at the end when index is the length of the list.
+        '''
+
+        if index == self.length:
+            self.append(item)
+            return
+        chunk, position, offset = self.locate(index)
+        chunk.insert(offset, item)
+        self.length += 1
+        if len(chunk) > 2 * self.chunk_size:
+            half = len(chunk) // 2
+            self.chunks.insert(position + 1, chunk[half:])
+            del chunk[half:]
+
+    def index(self, item):
+        '''
+        :raises ValueError: item is not in the list
+        '''
+
+        position = 0
+        for chunk in self.chunks:
+            try:
+                return position + chunk.index(item)
+            except ValueError:
+                position += len(chunk)
+        raise ValueError('%r is not in list' % item)
+
+    def remove(self, item, count=0):
+        '''
+        Remove the first count occurrences of item, the last ones when count is negative, or all of
+        them when count is 0.
+
+        :return: the removed elements
+        :rtype: list
+        '''
+
+        limit = abs(count) or self.length
+        removed = []
+        chunks = reversed(self.chunks) if count < 0 else self.chunks
+        for chunk in chunks:
+            if item not in chunk:
+                continue
+            kept = []
+            for element in (reversed(chunk) if count < 0 else chunk):
+                if len(removed) < limit and element == item:
+                    removed.append(element)
+                else:
+                    kept.append(element)
+            if count < 0:
+                kept.reverse()
+            chunk[:] = kept
+            if len(removed) == limit:
+                break
+        if removed:
+            self.length -= len(removed)
+            self.chunks = collections.deque(chunk for chunk in self.chunks if chunk)
+        return removed
+
+    def trim(self, start, stop):
+        '''
+        Keep the elements of the slice [start:stop] only, like ``list[start:stop]``.
+
+        :return: the removed elements
+        :rtype: list
+        '''
+
+        start, stop, step = slice(start, stop).indices(self.length)
+        stop = max(start, stop)
+        chunks = self.chunks
+        removed = []
+        # Drop the whole chunks before start and after stop, then cut the chunks at both ends
+        skipped = 0
+        while chunks and skipped + len(chunks[0]) <= start:
+            skipped += len(chunks[0])
+            removed.extend(chunks.popleft())
+        if chunks and start > skipped:
+            removed.extend(chunks[0][:start - skipped])
+            del chunks[0][:start - skipped]
+        left = self.length - stop
+        while chunks and len(chunks[-1]) <= left:
+            left -= len(chunks[-1])
+            removed.extend(chunks.pop())
+        if chunks and left:
+            removed.extend(chunks[-1][-left:])
+            del chunks[-1][-left:]
+        self.length = stop - start
+        return removed
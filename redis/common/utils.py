@@ -1,3 +1,6 @@
+import fnmatch
+import time
+
 from .exceptions import CommandError, ClientQuitError
 from .objects import RedisObject
 
@@ -22,6 +25,45 @@ def nargs_greater_equal(argnum):
     return nargs_func
 
 
+def make_argv(args):
+    '''
+    Build a command argv from Python values: bytes are kept, str are UTF-8 encoded, and numbers are
+    converted to their decimal representation.
+    '''
+
+    argv = []
+    for arg in args:
+        if isinstance(arg, bytes):
+            argv.append(arg)
+        elif isinstance(arg, str):
+            argv.append(arg.encode())
+        elif isinstance(arg, (int, float)) and not isinstance(arg, bool):
+            argv.append(str(arg).encode())
+        else:
+            raise CommandError('ERR', 'Command arguments must be strings or numbers')
+    return argv
+
+
+def stringmatch(pattern, string):
+    '''
+    Glob-style matching of bytes, as used by the MATCH option of SCAN and by KEYS.
+    '''
+
+    return fnmatch.fnmatchcase(string, pattern)
+
+
+def pattern_prefix(pattern):
+    '''
+    :return: the literal prefix of a glob-style pattern, that all the matching strings start with
+    :rtype: bytes
+    '''
+
+    for pos, byte in enumerate(pattern):
+        if byte in b'*?[\\':
+            return pattern[:pos]
+    return pattern
+
+
 def group_iter(iterator, n=2):
     """ Transforms a sequence of values into a sequence of n-tuples.
     e.g. [1, 2, 3, 4, ...] => [(1, 2), (3, 4), ...] (when n == 2)
@@ -39,21 +81,32 @@ def group_iter(iterator, n=2):
     return zip(*[iterator[i::n] for i in range(n)])
 
 
-def get_object(db, key, type=RedisObject):
+def get_object(db, key, type=RedisObject, touch=True):
     '''
     Ensure the key is exists.
 
+    :param touch: whether to count as an access for the eviction policies
+
     :return: the stored value
     :rtype: RedisObject
     '''
 
     try:
         obj = db.key_space[key]
-        if obj.expired():
-            del db.key_space[key]
-            raise KeyError('%s not exists' % key)
-        if not isinstance(obj, type):
-            raise TypeError('%s is not a %s' % (obj, type))
-        return obj
     except KeyError:
-        raise
+        # The key may have been evicted, its value is then in the backing store
+        obj = db.backing_store.read(db, key) if db.backing_store is not None else None
+        if obj is None:
+            raise
+    else:
+        if db.backing_store is not None:
+            db.backing_store.stat_hits += 1
+    expire_time = db.expires.get(key)
+    if expire_time is not None and time.time() > expire_time:
+        db.expire_key(key)
+        raise KeyError('%s not exists' % key)
+    if not isinstance(obj, type):
+        raise TypeError('%s is not a %s' % (obj, type))
+    if touch:
+        db.touch(key, obj)
+    return obj
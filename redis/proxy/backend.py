@@ -0,0 +1,219 @@
+'''
+Connections of the proxy to the backend servers.
+
+Every backend has a few connections shared by all the clients of the proxy, each client using always
+the same one so its commands run in order. A request is written as soon as it is received, without
+waiting for the replies of the requests sent before, and the replies are matched to the requests in
+order. The replies are kept as raw RESP, forwarded to
+the clients as is.
+'''
+
+import asyncio
+import collections
+import logging
+import time
+
+from redis.common.proto import dump_command
+
+logger = logging.getLogger(__name__)
+
+# Latencies kept to compute the percentiles, per backend
+LATENCY_SAMPLES = 1024
+
+
+@asyncio.coroutine
+def read_reply(reader):
+    '''
+    :return: the raw RESP of the next reply
+    :rtype: bytes
+    :raises ConnectionError: the connection was closed
+    '''
+
+    line = yield from reader.readline()
+    if not line.endswith(b'\r\n'):
+        raise ConnectionError('Connection closed by server')
+    kind = line[:1]
+    if kind == b'$':
+        length = int(line[1:-2])
+        if length < 0:
+            return line
+        return line + (yield from reader.readexactly(length + 2))
+    elif kind == b'*':
+        parts = [line]
+        for i in range(int(line[1:-2])):
+            parts.append((yield from read_reply(reader)))
+        return b''.join(parts)
+    return line
+
+
+def reply_end(data, offset=0):
+    '''
+    :return: the offset of the end of the reply starting at offset of data
+    :rtype: int
+    '''
+
+    end = data.index(b'\r\n', offset) + 2
+    kind = data[offset:offset + 1]
+    if kind == b'$':
+        length = int(data[offset + 1:end - 2])
+        return end + length + 2 if length >= 0 else end
+    elif kind == b'*':
+        for i in range(max(int(data[offset + 1:end - 2]), 0)):
+            end = reply_end(data, end)
+    return end
+
+
+def split_array(data):
+    '''
+    :return: the raw RESP of the elements of an array reply
+    :rtype: list
+    '''
+
+    end = data.index(b'\r\n') + 2
+    items = []
+    for i in range(int(data[1:end - 2])):
+        start, end = end, reply_end(data, end)
+        items.append(data[start:end])
+    return items
+
+
+def error_reply(message):
+    return ('-ERR %s\r\n' % message).encode()
+
+
+class BackendConnection:
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.reader = None
+        self.writer = None
+        self.connect_task = None
+        # Requests sent and waiting for their reply, as (future, send time)
+        self.pending = collections.deque()
+        # Requests received while connecting
+        self.outgoing = []
+
+    def request(self, argv):
+        '''
+        :return: a future of the raw reply
+        :rtype: asyncio.Future
+        '''
+
+        future = asyncio.Future()
+        if self.writer is not None:
+            self.writer.write(dump_command(argv))
+            self.pending.append((future, time.monotonic()))
+        else:
+            self.outgoing.append((future, argv))
+            if self.connect_task is None:
+                self.connect_task = asyncio.ensure_future(self.connect())
+        return future
+
+    @asyncio.coroutine
+    def connect(self):
+        try:
+            self.reader, writer = yield from asyncio.open_connection(self.backend.host, self.backend.port)
+        except OSError as e:
+            self.connect_task = None
+            self.fail(self.outgoing, e)
+            self.outgoing = []
+            return
+        self.writer = writer
+        self.connect_task = None
+        now = time.monotonic()
+        writer.write(b''.join(dump_command(argv) for future, argv in self.outgoing))
+        self.pending.extend((future, now) for future, argv in self.outgoing)
+        self.outgoing = []
+        yield from self.read_replies()
+
+    @asyncio.coroutine
+    def read_replies(self):
+        try:
+            while True:
+                reply = yield from read_reply(self.reader)
+                future, sent = self.pending.popleft()
+                self.backend.record(time.monotonic() - sent, reply.startswith(b'-'))
+                if not future.done():
+                    future.set_result(reply)
+        except (OSError, EOFError, ValueError, IndexError) as e:
+            logger.warning('lost the connection to backend %s: %s' % (self.backend.address, e))
+        finally:
+            self.writer.close()
+            self.reader = self.writer = None
+            pending, self.pending = self.pending, collections.deque()
+            self.fail(pending, ConnectionError('connection lost'))
+
+    def fail(self, requests, error):
+        reply = error_reply('backend %s unavailable: %s' % (self.backend.address, error))
+        for future, unused in requests:
+            self.backend.requests += 1
+            self.backend.errors += 1
+            if not future.done():
+                future.set_result(reply)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class Backend:
+
+    def __init__(self, host, port, connections=2):
+        self.host = host
+        self.port = port
+        self.connections = [BackendConnection(self) for i in range(connections)]
+
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.latencies = collections.deque(maxlen=LATENCY_SAMPLES)
+
+    @property
+    def address(self):
+        return '%s:%d' % (self.host, self.port)
+
+    @property
+    def connected(self):
+        return any(conn.writer is not None for conn in self.connections)
+
+    def request(self, argv, client_id):
+        '''
+        Send a request of a client. The clients are spread over the connections, and all the
+        requests of a client use the same connection, so they are run in order.
+
+        :return: a future of the raw reply
+        :rtype: asyncio.Future
+        '''
+
+        return self.connections[client_id % len(self.connections)].request(argv)
+
+    def record(self, latency, error):
+        self.requests += 1
+        self.errors += error
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        self.latencies.append(latency)
+
+    def latency_percentile(self, percent):
+        '''
+        :return: the latency percentile of the last ``LATENCY_SAMPLES`` requests, in seconds
+        :rtype: float
+        '''
+
+        if not self.latencies:
+            return 0.0
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * percent / 100), len(latencies) - 1)]
+
+    def info(self):
+        return 'addr={},connected={},requests={},errors={},latency_avg_usec={},latency_p50_usec={},' \
+            'latency_p99_usec={},latency_max_usec={}'.format(
+                self.address, int(self.connected), self.requests, self.errors,
+                int(self.total_latency / max(self.requests, 1) * 1e6),
+                int(self.latency_percentile(50) * 1e6), int(self.latency_percentile(99) * 1e6),
+                int(self.max_latency * 1e6))
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
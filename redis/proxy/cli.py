@@ -0,0 +1,49 @@
+'''
+Sharding proxy, see ``redis.proxy.proxy``.
+
+Usage::
+
+    $ redis-proxy [-h host] [-p port] -b host:port [-b host:port ...] [--router slots|ring]
+                  [--connections n] [--report-interval seconds]
+'''
+
+import argparse
+import sys
+
+from .backend import Backend
+from .proxy import RedisProxy
+from .router import ROUTERS
+
+
+def parse_address(value):
+    host, _, port = value.rpartition(':')
+    try:
+        return host or '127.0.0.1', int(port)
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid backend address %s' % value)
+
+
+def parse_args(args):
+    parser = argparse.ArgumentParser(prog='redis-proxy', add_help=False)
+    parser.add_argument('--help', action='help', help='show this help message and exit')
+    parser.add_argument('-h', dest='host', default=None, help='address to listen on, all by default')
+    parser.add_argument('-p', dest='port', type=int, default=7777, help='port to listen on')
+    parser.add_argument('-b', '--backend', dest='backends', type=parse_address, action='append',
+                        required=True, help='address of a backend server, as host:port')
+    parser.add_argument('--router', choices=sorted(ROUTERS), default='slots',
+                        help='route the keys by hash slot ranges or with consistent hashing')
+    parser.add_argument('--connections', type=int, default=2, help='connections per backend')
+    parser.add_argument('--report-interval', type=float, default=0,
+                        help='seconds between two logs of the backend latencies, 0 to disable')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    options = parse_args(sys.argv[1:] if args is None else args)
+    backends = [Backend(host, port, options.connections) for host, port in options.backends]
+    proxy = RedisProxy(backends, options.router, options.report_interval)
+    proxy.run(options.host, options.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+'''
+Sharding proxy, for the clients which do not follow the redirections of cluster mode.
+
+The proxy accepts RESP connections and forwards every command to the backend serving its keys,
+chosen by a ``redis.proxy.router`` router. The key positions are found in the command table of the
+server. MGET, MSET and DEL are split in one command per backend, and their replies merged in the
+order of the keys. The other commands with keys on several backends, transactions, and the commands
+without keys are refused, except FLUSHALL and FLUSHDB sent to every backend, and PING, ECHO, INFO
+and QUIT answered by the proxy.
+
+Clients may pipeline their commands: the commands of a client are forwarded without waiting for the
+replies of the previous ones, and the replies are sent back in order.
+'''
+
+import asyncio
+import logging
+import time
+
+from redis.common.proto import RedisProtocol, ProtocolError, resp_dumps
+from redis.server_impl import server as command_table
+from .backend import error_reply, split_array
+from .router import ROUTERS
+
+logger = logging.getLogger(__name__)
+
+# Commands split by backend when their keys are on several backends
+SPLIT_COMMANDS = (b'mget', b'mset', b'del')
+
+# Commands without keys sent to every backend, replying OK
+BROADCAST_COMMANDS = (b'flushall', b'flushdb')
+
+# Commands answered by the proxy
+PROXY_COMMANDS = (b'ping', b'echo', b'info', b'quit')
+
+# Transactions would have to stay on one backend connection
+UNSUPPORTED_COMMANDS = (b'multi', b'exec', b'discard', b'watch', b'unwatch')
+
+
+def completed(reply):
+    future = asyncio.Future()
+    future.set_result(reply)
+    return future
+
+
+class RedisProxy:
+
+    def __init__(self, backends, router='slots', report_interval=0):
+        self.backends = backends
+        self.router = ROUTERS[router](backends)
+        self.report_interval = report_interval
+        self.clients = 0
+        self.next_client_id = 0
+        self.commands = 0
+        self.start_time = time.time()
+        self.loop = None
+
+    def dispatch(self, argv, client_id):
+        '''
+        :return: a future of the raw reply of the command
+        :rtype: asyncio.Future
+        '''
+
+        self.commands += 1
+        name = argv[0].lower()
+        if name in PROXY_COMMANDS:
+            return completed(self.proxy_command(name, argv))
+        if name not in command_table.handlers:
+            return completed(error_reply("unknown command '%s'" % argv[0].decode(errors='replace')))
+
+        keys = command_table.get_command_keys(argv)
+        if not keys or name in UNSUPPORTED_COMMANDS:
+            if name in BROADCAST_COMMANDS:
+                return asyncio.ensure_future(self.broadcast(argv, client_id))
+            return completed(error_reply("command '%s' is not supported by the proxy" % name.decode()))
+
+        backend = self.router.get_backend(keys[0])
+        if all(self.router.get_backend(key) is backend for key in keys[1:]):
+            return backend.request(argv, client_id)
+        if name in SPLIT_COMMANDS:
+            if name == b'mset' and len(argv) % 2 == 0:
+                return completed(error_reply("wrong number of arguments for 'mset' command"))
+            return asyncio.ensure_future(self.split(name, argv, client_id))
+        return completed(error_reply('keys of the command are served by different backends'))
+
+    def proxy_command(self, name, argv):
+        if name == b'ping' and len(argv) <= 2:
+            return resp_dumps(argv[1]) if len(argv) == 2 else b'+PONG\r\n'
+        elif name == b'echo' and len(argv) == 2:
+            return resp_dumps(argv[1])
+        elif name == b'info' and len(argv) <= 2:
+            return resp_dumps(self.get_info_str())
+        elif name == b'quit' and len(argv) == 1:
+            return resp_dumps(True)
+        return error_reply("wrong number of arguments for '%s' command" % name.decode())
+
+    @asyncio.coroutine
+    def split(self, name, argv, client_id):
+        '''
+        Run MGET, MSET or DEL as one command per backend, with the keys it serves.
+        '''
+
+        step = 2 if name == b'mset' else 1
+        groups = {}
+        for i in range(1, len(argv), step):
+            backend = self.router.get_backend(argv[i])
+            groups.setdefault(backend, []).append(i)
+        requests = []
+        for backend, positions in groups.items():
+            command = [argv[0]] + [arg for i in positions for arg in argv[i:i + step]]
+            requests.append((positions, backend.request(command, client_id)))
+        replies = []
+        for positions, future in requests:
+            reply = yield from future
+            if reply.startswith(b'-'):
+                return reply
+            replies.append((positions, reply))
+
+        if name == b'mget':
+            values = [None] * len(argv)
+            for positions, reply in replies:
+                for i, value in zip(positions, split_array(reply)):
+                    values[i] = value
+            return b''.join([('*%d\r\n' % (len(argv) - 1)).encode()] + values[1:])
+        elif name == b'del':
+            return resp_dumps(sum(int(reply[1:-2]) for positions, reply in replies))
+        return replies[0][1]
+
+    @asyncio.coroutine
+    def broadcast(self, argv, client_id):
+        futures = [backend.request(argv, client_id) for backend in self.backends]
+        replies = []
+        for future in futures:
+            replies.append((yield from future))
+        for reply in replies:
+            if reply.startswith(b'-'):
+                return reply
+        return replies[0]
+
+    def get_info_sections(self):
+        return [
+            ('Proxy', [
+                ('uptime_in_seconds', int(time.time() - self.start_time)),
+                ('connected_clients', self.clients),
+                ('total_commands_processed', self.commands),
+                ('router', type(self.router).__name__),
+            ]),
+            ('Backends', [
+                ('backend%d' % index, backend.info()) for index, backend in enumerate(self.backends)
+            ]),
+        ]
+
+    def get_info_str(self):
+        parts = []
+        for name, fields in self.get_info_sections():
+            parts.append('# %s\r\n' % name)
+            parts.extend('%s:%s\r\n' % (field, value) for field, value in fields)
+            parts.append('\r\n')
+        return ''.join(parts)
+
+    @asyncio.coroutine
+    def client_connected_cb(self, stream_reader, stream_writer):
+        '''
+        Read the commands of a client and forward them, while the replies are sent by send_replies.
+        '''
+
+        self.clients += 1
+        client_id = self.next_client_id
+        self.next_client_id += 1
+        proto = RedisProtocol(stream_reader)
+        replies = asyncio.Queue()
+        sender = asyncio.ensure_future(self.send_replies(replies, stream_writer))
+        try:
+            while not sender.done():
+                argv = yield from proto.get_command()
+                if argv is None:
+                    break
+                if not argv:
+                    continue
+                replies.put_nowait(self.dispatch(argv, client_id))
+                if argv[0].lower() == b'quit':
+                    break
+        except (ProtocolError, ValueError) as e:
+            replies.put_nowait(completed(error_reply('Protocol error: %s' % e)))
+        except (OSError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            replies.put_nowait(None)
+            try:
+                yield from sender
+            except OSError:
+                pass
+            stream_writer.close()
+            self.clients -= 1
+
+    @asyncio.coroutine
+    def send_replies(self, replies, stream_writer):
+        while True:
+            future = yield from replies.get()
+            if future is None:
+                return
+            stream_writer.write((yield from future))
+            if replies.empty():
+                yield from stream_writer.drain()
+
+    def report(self):
+        for backend in self.backends:
+            logger.info('backend %s' % backend.info())
+        self.loop.call_later(self.report_interval, self.report)
+
+    def run(self, host=None, port=7777):
+        loop = self.loop = asyncio.get_event_loop()
+        server = loop.run_until_complete(asyncio.start_server(self.client_connected_cb, host=host, port=port))
+        logger.info('proxy serving on {} for {}'.format(
+            server.sockets[0].getsockname(), ', '.join(backend.address for backend in self.backends)))
+        if self.report_interval:
+            loop.call_later(self.report_interval, self.report)
+        try:
+            loop.run_forever()
+        except KeyboardInterrupt:
+            logger.info('exiting')
+        finally:
+            server.close()
+            for backend in self.backends:
+                backend.close()
+            loop.close()
@@ -0,0 +1,55 @@
+'''
+Key to backend routing of the proxy.
+'''
+
+import bisect
+import hashlib
+
+from redis.common.hashslot import CLUSTER_SLOTS, key_hash_slot, key_hash_tag
+
+
+class SlotRouter:
+
+    '''
+    Split the hash slots of cluster mode in contiguous ranges, one per backend. Keys sharing a
+    ``{hashtag}`` go to the same backend, and the data of a backend can be moved to a cluster node
+    serving the same slots.
+    '''
+
+    def __init__(self, backends):
+        self.backends = backends
+        self.slots = [backends[slot * len(backends) // CLUSTER_SLOTS] for slot in range(CLUSTER_SLOTS)]
+
+    def get_backend(self, key):
+        return self.slots[key_hash_slot(key)]
+
+
+class HashRing:
+
+    '''
+    Consistent hashing: every backend owns ``points`` points of a ring of 32-bit hashes, and a key
+    goes to the backend owning the first point following its hash. Adding or removing a backend
+    only moves the keys of the points it gains or loses. Keys sharing a ``{hashtag}`` are hashed by
+    their tag, like with the slot map.
+    '''
+
+    def __init__(self, backends, points=160):
+        self.backends = backends
+        ring = sorted((self.hash(('%s-%d' % (backend.address, i)).encode()), index)
+                      for index, backend in enumerate(backends) for i in range(points))
+        self.hashes = [point for point, index in ring]
+        self.owners = [backends[index] for point, index in ring]
+
+    @staticmethod
+    def hash(data):
+        return int.from_bytes(hashlib.md5(data).digest()[:4], 'little')
+
+    def get_backend(self, key):
+        index = bisect.bisect(self.hashes, self.hash(key_hash_tag(key)))
+        return self.owners[index % len(self.owners)]
+
+
+ROUTERS = {
+    'slots': SlotRouter,
+    'ring': HashRing,
+}
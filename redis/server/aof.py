@@ -0,0 +1,378 @@
+'''
+Append only file, the log of the write commands, enabled by the ``appendonly`` parameter.
+
+Every write command that modified the dataset is appended to the file in its RESP form, and the
+file is replayed on startup. The commands are buffered and written by a dedicated thread once per
+event loop iteration, so the event loop never waits for the disk. When the file is synced depends on
+``appendfsync``:
+
+* ``always``: after every batch, and the clients get the replies of their write commands once the
+  batch holding them is synced. All the commands of an iteration share one write and one fsync
+  (group commit).
+* ``everysec``: once per second, from server_cron.
+* ``no``: when the operating system flushes its caches.
+
+Timeouts are logged as absolute PEXPIREAT commands, so replaying the file later does not extend
+them. BGREWRITEAOF rewrites the file from the keyspace in a forked child: the writes made in the
+meantime are buffered and appended to the new file before it replaces the old one.
+'''
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import os
+import time
+
+from redis.common.exceptions import CommandError, CommandNotFoundError
+from redis.common.proto import dump_command, parse_commands, ProtocolError, \
+    RedisErrorStringSerializationObject
+
+logger = logging.getLogger(__name__)
+
+# Elements of a list per LPUSH command written by the rewrite
+REWRITE_ITEMS_PER_COMMAND = 64
+
+# Size of the writes of the rewrite
+REWRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class AOFError(Exception):
+    pass
+
+
+def dump_write_command(db, argv):
+    '''
+    :return: the RESP form of a write command executed on db, followed by a PEXPIREAT of its key
+             when it has a timeout, so replaying it later does not extend the timeout
+    :rtype: bytes
+    '''
+
+    command = dump_command(argv)
+    expire_time = db.expires.get(argv[1]) if len(argv) > 1 else None
+    if expire_time is not None and argv[0].lower() != b'pexpireat':
+        # The timeout set relatively to the time of the command, or kept by it
+        command += dump_command([b'PEXPIREAT', argv[1], str(int(expire_time * 1000)).encode()])
+    return command
+
+
+def rewrite_commands(db):
+    '''
+    :return: generator of the commands rebuilding the keys of db
+    '''
+
+    expires = db.expires
+    now = time.time()
+    for key, obj in db.key_space.items():
+        expire_time = expires.get(key)
+        if expire_time is not None and expire_time < now:
+            continue
+        if obj.type_name == b'string':
+            yield [b'SET', key, obj.get_bytes()]
+        else:
+            items = list(obj)
+            # LPUSH prepends, push from the tail
+            for end in range(len(items), 0, -REWRITE_ITEMS_PER_COMMAND):
+                yield [b'LPUSH', key] + items[max(end - REWRITE_ITEMS_PER_COMMAND, 0):end][::-1]
+        if expire_time is not None:
+            yield [b'PEXPIREAT', key, str(int(expire_time * 1000)).encode()]
+
+
+def rewrite(dbs, path):
+    '''
+    Write the commands rebuilding dbs to path, and sync it.
+    '''
+
+    with open(path, 'wb') as stream:
+        buffer = []
+        buffered = 0
+        for db in dbs:
+            if not db.key_space:
+                continue
+            buffer.append(dump_command([b'SELECT', str(db.idnum).encode()]))
+            for argv in rewrite_commands(db):
+                command = dump_command(argv)
+                buffer.append(command)
+                buffered += len(command)
+                if buffered >= REWRITE_BUFFER_SIZE:
+                    stream.write(b''.join(buffer))
+                    buffer = []
+                    buffered = 0
+        stream.write(b''.join(buffer))
+        stream.flush()
+        os.fsync(stream.fileno())
+
+
+def replay(server, path):
+    '''
+    Execute the commands of the file at path. A truncated command at the end of the file, left by a
+    crash while it was written, is removed from the file.
+
+    :return: the number of commands executed
+    :rtype: int
+    :raises AOFError: the file is corrupt or a command failed
+    '''
+
+    # Imported here, the server imports this module
+    from .server import RedisClientBase
+
+    with open(path, 'rb') as stream:
+        data = stream.read()
+
+    client = RedisClientBase(server)
+    commands = 0
+    offset = 0
+    try:
+        for argv, offset in parse_commands(data):
+            if argv[0].upper() == b'SELECT':
+                client.change_db(int(argv[1]))
+                continue
+            server.exec_native_command(argv, client)
+            commands += 1
+    except (ProtocolError, ValueError) as e:
+        raise AOFError('bad file format: %s' % e)
+    except (CommandError, CommandNotFoundError) as e:
+        raise AOFError('command %d failed: %s' % (commands + 1, e))
+
+    if offset < len(data):
+        logger.warning('!!! the AOF file %s is truncated, %d bytes of an incomplete command removed'
+                       % (path, len(data) - offset))
+        with open(path, 'r+b') as stream:
+            stream.truncate(offset)
+    return commands
+
+
+class AppendOnlyFile:
+
+    def __init__(self, server, path):
+        self.server = server
+        self.path = path
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # The file is only written and synced by this thread, in order
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+
+        # Commands not written yet, and the future of the clients waiting for them to be synced
+        self.buffer = bytearray()
+        self.flush_handle = None
+        self.commit = None
+        # Id of the database of the last command, a SELECT is logged when it changes
+        self.selected_db = None
+        # Number of commands logged
+        self.fed_commands = 0
+
+        self.last_fsync = time.monotonic()
+        self.fsyncing = None
+
+        # The rewrite child process and the commands logged since it was forked
+        self.rewrite_pid = None
+        self.rewrite_buffer = None
+        self.rewrite_path = None
+        self.rewrite_start = 0.0
+        self.last_rewrite_ok = True
+
+        self.current_size = os.fstat(self.fd).st_size
+        self.base_size = self.current_size
+        self.stat_writes = 0
+        self.stat_fsyncs = 0
+        self.stat_write_errors = 0
+        self.stat_rewrites = 0
+
+    @property
+    def policy(self):
+        return self.server.config['appendfsync']
+
+    def feed(self, db, argv):
+        '''
+        Log a write command executed on db.
+        '''
+
+        self.fed_commands += 1
+        if db.idnum != self.selected_db:
+            self.selected_db = db.idnum
+            self.append(dump_command([b'SELECT', str(db.idnum).encode()]))
+        self.append(dump_write_command(db, argv))
+
+        loop = self.server.loop
+        if loop is not None and loop.is_running():
+            if self.flush_handle is None:
+                # Written once the commands of the current event loop iteration are all logged
+                self.flush_handle = loop.call_soon(self.flush)
+        else:
+            self.flush(wait=self.policy == 'always')
+
+    def append(self, command):
+        self.buffer += command
+        if self.rewrite_buffer is not None:
+            self.rewrite_buffer += command
+
+    def wait_commit(self, reply):
+        '''
+        :return: a future of reply, done once the commands logged so far are synced
+        :rtype: asyncio.Future
+        '''
+
+        if self.commit is None:
+            self.commit = asyncio.Future()
+        return asyncio.ensure_future(self._wait_commit(self.commit, reply))
+
+    @asyncio.coroutine
+    def _wait_commit(self, commit, reply):
+        try:
+            yield from commit
+        except OSError as e:
+            return RedisErrorStringSerializationObject(
+                errtype='MISCONF', message='Errors writing to the AOF file: %s' % e)
+        return reply
+
+    def flush(self, wait=False):
+        '''
+        Write the buffered commands, from the thread of the file.
+        '''
+
+        self.flush_handle = None
+        if not self.buffer:
+            if self.commit is not None:
+                self.commit.set_result(None)
+                self.commit = None
+            if wait:
+                # The writes submitted before are done once the thread runs this one
+                self.executor.submit(lambda: None).result()
+            return
+        data, self.buffer = bytes(self.buffer), bytearray()
+        done = self.executor.submit(self.write, data, self.policy == 'always')
+        commit, self.commit = self.commit, None
+        if commit is not None:
+            asyncio.wrap_future(done).add_done_callback(functools.partial(self.committed, commit))
+        if wait:
+            concurrent.futures.wait([done])
+
+    @staticmethod
+    def committed(commit, done):
+        if done.exception() is not None:
+            commit.set_exception(done.exception())
+        else:
+            commit.set_result(None)
+
+    def write(self, data, fsync):
+        # Called from the thread of the file
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self.fd, view):]
+            self.current_size += len(data)
+            self.stat_writes += 1
+            if fsync:
+                self.fsync()
+        except OSError as e:
+            self.stat_write_errors += 1
+            logger.error('failed to write to the AOF file: %s' % e)
+            raise
+
+    def fsync(self):
+        # Called from the thread of the file
+        os.fsync(self.fd)
+        self.stat_fsyncs += 1
+
+    def cron(self):
+        self.check_rewrite()
+        if self.policy == 'everysec' and time.monotonic() - self.last_fsync >= 1:
+            # Skipped while the previous fsync is still running
+            if self.fsyncing is None or self.fsyncing.done():
+                self.flush()
+                self.fsyncing = self.executor.submit(self.fsync)
+                self.last_fsync = time.monotonic()
+
+    def start_rewrite(self):
+        '''
+        Rewrite the file from the keyspace in a forked child process, reaped by cron.
+        '''
+
+        self.rewrite_path = os.path.join(os.path.dirname(self.path),
+                                         'temp-rewriteaof-bg-%d.aof' % os.getpid())
+        dbs = [db for idnum, db in sorted(self.server.dbs.items())]
+        pid = self.server.fork()
+        if pid == 0:
+            status = 1
+            try:
+                rewrite(dbs, self.rewrite_path)
+                status = 0
+            except BaseException:
+                logger.exception('failed to rewrite the AOF file')
+            finally:
+                os._exit(status)
+
+        logger.info('background append only file rewriting started by pid %d' % pid)
+        self.rewrite_pid = pid
+        self.rewrite_start = time.time()
+        self.rewrite_buffer = bytearray()
+        # The rewritten file ends with any database selected
+        self.selected_db = None
+
+    def check_rewrite(self, wait=False):
+        '''
+        Reap the rewrite child if it exited, and replace the file with the rewritten one.
+
+        :param wait: wait for the child to exit, and for the file to be replaced
+        '''
+
+        if self.rewrite_pid is None:
+            return
+        pid, status = os.waitpid(self.rewrite_pid, 0 if wait else os.WNOHANG)
+        if not pid:
+            return
+        self.rewrite_pid = None
+        self.server.child_reaped(pid)
+        if not (os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0):
+            logger.error('background AOF rewrite failed')
+            self.rewrite_buffer = None
+            self.last_rewrite_ok = False
+            if os.path.exists(self.rewrite_path):
+                os.unlink(self.rewrite_path)
+            return
+
+        # The commands buffered now are written to the old file, and to the new one with the
+        # rewrite buffer. The ones logged later only go to the new file.
+        self.flush()
+        data, self.rewrite_buffer = bytes(self.rewrite_buffer), None
+        done = self.executor.submit(self.finish_rewrite, data)
+        if wait:
+            concurrent.futures.wait([done])
+
+    def finish_rewrite(self, data):
+        # Called from the thread of the file, so no write is made to the old file after it
+        try:
+            with open(self.rewrite_path, 'ab') as stream:
+                stream.write(data)
+                stream.flush()
+                os.fsync(stream.fileno())
+            os.replace(self.rewrite_path, self.path)
+            old_fd, self.fd = self.fd, os.open(self.path, os.O_WRONLY | os.O_APPEND)
+            os.close(old_fd)
+        except OSError as e:
+            logger.error('failed to replace the AOF file: %s' % e)
+            self.last_rewrite_ok = False
+            return
+        self.current_size = self.base_size = os.fstat(self.fd).st_size
+        self.last_rewrite_ok = True
+        self.stat_rewrites += 1
+        logger.info('background AOF rewrite finished successfully')
+
+    def close(self):
+        self.check_rewrite(wait=True)
+        self.flush()
+        self.executor.submit(self.fsync).result()
+        self.executor.shutdown()
+        os.close(self.fd)
+
+    def info(self):
+        return [
+            ('aof_rewrite_in_progress', int(self.rewrite_pid is not None)),
+            ('aof_last_bgrewrite_status', 'ok' if self.last_rewrite_ok else 'err'),
+            ('aof_last_write_status', 'err' if self.stat_write_errors else 'ok'),
+            ('aof_current_size', self.current_size),
+            ('aof_base_size', self.base_size),
+            ('aof_buffer_length', len(self.buffer)),
+            ('aof_writes', self.stat_writes),
+            ('aof_fsyncs', self.stat_fsyncs),
+            ('aof_rewrites', self.stat_rewrites),
+        ]
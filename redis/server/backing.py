@@ -0,0 +1,288 @@
+'''
+Backing store of the string keys, for a server used as a cache in front of a database.
+
+When ``backing-store`` is set, a command looking up a key missing in memory reads it from the store
+(read-through), and the keys written by commands are queued and written to the store in batches
+(write-behind), at most ``backing-store-max-lag`` milliseconds after they were modified. Deleted
+and expired keys are deleted from the store, evicted keys are kept in it, and FLUSHDB only clears
+the memory. The timeouts are stored with the values, a key read back gets its timeout back and a
+key whose timeout elapsed in the store is missing.
+
+The store is only accessed from a dedicated thread. GET does not block the event loop, which keeps
+serving the other clients while the key is loaded, and concurrent loads of the same key are
+coalesced. The other commands wait for the key to be loaded.
+'''
+
+import asyncio
+import collections
+import concurrent.futures
+import logging
+import os
+import sqlite3
+import time
+
+from redis.common.exceptions import CommandError
+from redis.common.objects import RedisStringObject
+
+logger = logging.getLogger(__name__)
+
+
+class BackingStore:
+
+    '''
+    Interface of the stores. All the methods are called from the thread of the store.
+    '''
+
+    def open(self):
+        pass
+
+    def read(self, idnum, key):
+        '''
+        :return: the value of key in the database idnum and its timeout, an absolute unix time in
+                 seconds or None, or None when the key is missing
+        :rtype: tuple
+        '''
+
+        raise NotImplementedError()
+
+    def write(self, batch):
+        '''
+        :param batch: (database id, key, value, timeout) tuples, a value of None deletes the key
+        '''
+
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+
+class SQLiteBackingStore(BackingStore):
+
+    '''
+    Reference store, a table of a SQLite database. A batch is written in one transaction.
+    '''
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = None
+
+    def open(self):
+        self.connection = sqlite3.connect(self.path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS keys (db INTEGER, key BLOB, value BLOB, '
+                                'expire REAL, PRIMARY KEY (db, key)) WITHOUT ROWID')
+        # Tables created before the timeouts were stored
+        columns = [row[1] for row in self.connection.execute('PRAGMA table_info(keys)')]
+        if 'expire' not in columns:
+            self.connection.execute('ALTER TABLE keys ADD COLUMN expire REAL')
+        self.connection.commit()
+
+    def read(self, idnum, key):
+        return self.connection.execute('SELECT value, expire FROM keys WHERE db = ? AND key = ?',
+                                       (idnum, key)).fetchone()
+
+    def write(self, batch):
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO keys (db, key, value, expire) '
+                                        'VALUES (?, ?, ?, ?)',
+                                        [item for item in batch if item[2] is not None])
+            self.connection.executemany('DELETE FROM keys WHERE db = ? AND key = ?',
+                                        [item[:2] for item in batch if item[2] is None])
+
+    def close(self):
+        self.connection.close()
+
+
+BACKING_STORES = {
+    'sqlite': lambda config: SQLiteBackingStore(
+        os.path.join(config['dir'], config['backing-store-file'])),
+}
+
+
+class BackingStoreCache:
+
+    '''
+    Read-through and write-behind access to a BackingStore, shared by all the databases.
+    '''
+
+    def __init__(self, server, store):
+        self.server = server
+        self.store = store
+        self.executor = concurrent.futures.ThreadPoolExecutor(1)
+        self.executor.submit(store.open).result()
+
+        # {(database id, key): task} of the keys being loaded, and the ones among them written
+        # since their load started, whose loaded value is outdated
+        self.loading = {}
+        self.outdated = set()
+        # {(database id, key): (object, or None when deleted, timeout)} of the keys modified since
+        # the last flush, and time of the oldest modification
+        self.pending = collections.OrderedDict()
+        self.pending_since = None
+        self.flushing = None
+
+        self.stat_hits = 0
+        self.stat_misses = 0
+        self.stat_loads = 0
+        self.stat_coalesced_loads = 0
+        self.stat_load_time = 0.0
+        self.stat_load_time_max = 0.0
+        self.stat_read_errors = 0
+        self.stat_written_keys = 0
+        self.stat_batches = 0
+        self.stat_write_errors = 0
+
+    def read_through(self, client, key):
+        '''
+        Load key, missing in the database of client, from the store. When the client can wait, the
+        key is loaded by the thread of the store and an ``asyncio.Future`` is returned, otherwise it
+        is loaded immediately.
+
+        :return: the loaded object, or None when the key is not in the store
+        :rtype: RedisStringObject or asyncio.Future
+        '''
+
+        self.stat_misses += 1
+        db = client.db
+        if client.suspendable:
+            entry = (db.idnum, key)
+            task = self.loading.get(entry)
+            if task is not None:
+                self.stat_coalesced_loads += 1
+                return task
+            task = self.loading[entry] = asyncio.ensure_future(self.load(db, key))
+            task.add_done_callback(lambda task: self.load_done(entry))
+            return task
+
+        return self.read(db, key, counted=True)
+
+    def read(self, db, key, counted=False):
+        '''
+        Load key, missing in db, from the store and wait for it. Used by the lookups of all the
+        commands, so a key evicted from the memory is read or modified with the value of the store,
+        rather than replaced by a new one.
+
+        :return: the loaded object, or None when the key is not in the store
+        :rtype: RedisObject
+        '''
+
+        if not counted:
+            self.stat_misses += 1
+        begin = time.perf_counter()
+        try:
+            row = self.executor.submit(self.store.read, db.idnum, key).result()
+        except Exception as e:
+            self.read_failed(e)
+        return self.install(db, key, row, begin)
+
+    @asyncio.coroutine
+    def load(self, db, key):
+        begin = time.perf_counter()
+        loop = asyncio.get_event_loop()
+        try:
+            row = yield from loop.run_in_executor(self.executor, self.store.read, db.idnum, key)
+        except Exception as e:
+            self.read_failed(e)
+        return self.install(db, key, row, begin)
+
+    def load_done(self, entry):
+        self.loading.pop(entry, None)
+        self.outdated.discard(entry)
+
+    def read_failed(self, error):
+        self.stat_read_errors += 1
+        logger.error('failed to read from the backing store: %s' % error)
+        raise CommandError('ERR', 'backing store read failed')
+
+    def install(self, db, key, row, begin):
+        elapsed = time.perf_counter() - begin
+        self.stat_load_time += elapsed
+        self.stat_load_time_max = max(self.stat_load_time_max, elapsed)
+
+        # The key may have been written while it was loaded, or not be written to the store yet: an
+        # evicted key whose write is still queued gets the queued object back, None when deleted
+        obj = db.key_space.get(key)
+        if obj is None and (db.idnum, key) in self.pending:
+            obj, expire_time = self.pending[(db.idnum, key)]
+            if obj is None or expire_time is not None and expire_time <= time.time():
+                return None
+            db.put_key(key, obj, expire_time)
+        if obj is not None:
+            if not isinstance(obj, RedisStringObject):
+                raise CommandError('WRONGTYPE', 'Operation against a key holding the wrong kind of value')
+            return obj
+        # A key deleted while it was loaded, possibly already flushed
+        if row is None or (db.idnum, key) in self.outdated:
+            return None
+        value, expire_time = row
+        if expire_time is not None and expire_time <= time.time():
+            return None
+        self.stat_loads += 1
+        obj = RedisStringObject(value)
+        db.put_key(key, obj, expire_time)
+        return obj
+
+    def write(self, idnum, key, obj, expire_time=None):
+        '''
+        Queue the write of a key modified by a command, obj is None when the key was deleted.
+
+        :param expire_time: the timeout of the key, as an absolute unix time in seconds
+        '''
+
+        if not self.pending:
+            self.pending_since = time.monotonic()
+        self.pending[(idnum, key)] = (obj, expire_time)
+        if (idnum, key) in self.loading:
+            self.outdated.add((idnum, key))
+        if len(self.pending) >= self.server.config['backing-store-batch-size']:
+            self.flush()
+
+    def flush(self, wait=False):
+        '''
+        Write the queued keys to the store, in the thread of the store.
+        '''
+
+        if self.pending:
+            batch = []
+            for (idnum, key), (obj, expire_time) in self.pending.items():
+                # Only the strings are stored, a key holding another type is deleted
+                value = obj.get_bytes() if obj is not None and obj.type_name == b'string' else None
+                batch.append((idnum, key, value, expire_time))
+            self.pending = collections.OrderedDict()
+            self.flushing = self.executor.submit(self.store.write, batch)
+            self.flushing.add_done_callback(self.flushed)
+            self.stat_written_keys += len(batch)
+            self.stat_batches += 1
+        if wait and self.flushing is not None:
+            concurrent.futures.wait([self.flushing])
+
+    def flushed(self, future):
+        # Called from the thread of the store
+        if future.exception() is not None:
+            self.stat_write_errors += 1
+            logger.error('failed to write to the backing store: %s' % future.exception())
+
+    def cron(self):
+        max_lag = self.server.config['backing-store-max-lag'] / 1000.0
+        if self.pending and time.monotonic() - self.pending_since >= max_lag:
+            self.flush()
+
+    def close(self):
+        self.flush(wait=True)
+        self.executor.submit(self.store.close).result()
+        self.executor.shutdown()
+
+    def info(self):
+        reads = self.stat_misses - self.stat_coalesced_loads
+        return [
+            ('backing_store_hits', self.stat_hits),
+            ('backing_store_misses', self.stat_misses),
+            ('backing_store_loaded_keys', self.stat_loads),
+            ('backing_store_coalesced_loads', self.stat_coalesced_loads),
+            ('backing_store_load_avg_ms', '%.3f' % (self.stat_load_time * 1000 / reads if reads else 0)),
+            ('backing_store_load_max_ms', '%.3f' % (self.stat_load_time_max * 1000)),
+            ('backing_store_read_errors', self.stat_read_errors),
+            ('backing_store_pending_writes', len(self.pending)),
+            ('backing_store_written_keys', self.stat_written_keys),
+            ('backing_store_write_batches', self.stat_batches),
+            ('backing_store_write_errors', self.stat_write_errors),
+        ]
@@ -0,0 +1,256 @@
+'''
+Delta checkpoints, enabled by the ``checkpoint-deltas`` parameter.
+
+The databases track the keys modified or deleted since the last checkpoint, see
+``RedisDatabase.dirty_keys``. A full snapshot, the base, is tagged with a random id in its
+``checkpoint-base`` auxiliary field, then the save points write deltas holding only the keys
+changed since the previous checkpoint, next to the base as ``<dbfilename>.delta.<n>``, so the
+checkpoints write as much as the clients do rather than the whole dataset. On startup the deltas of
+the base are applied after it, in order, see ``load_deltas``.
+
+The deltas are RDB files with the same ``checkpoint-base`` field and their number in a
+``checkpoint-seq`` field, see ``redis.server.rdb``. Once there are ``checkpoint-max-deltas`` of
+them, the next delta holds every key changed since the base and replaces them. Once the deltas are
+larger than ``checkpoint-rewrite-percentage`` percent of the base, a new base is written instead.
+'''
+
+import binascii
+import logging
+import mmap
+import os
+import time
+
+from . import rdb
+
+logger = logging.getLogger(__name__)
+
+
+def list_deltas(base_path):
+    '''
+    :return: the numbers and paths of the deltas next to the base at base_path, in order
+    :rtype: list
+    '''
+
+    directory = os.path.dirname(base_path) or '.'
+    prefix = os.path.basename(base_path) + '.delta.'
+    deltas = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name[len(prefix):].isdigit():
+            deltas.append((int(name[len(prefix):]), os.path.join(directory, name)))
+    return sorted(deltas)
+
+
+def remove_deltas(base_path, before=None):
+    '''
+    Remove the deltas next to the base at base_path, only the ones numbered below before if given.
+    '''
+
+    for seq, path in list_deltas(base_path):
+        if before is None or seq < before:
+            try:
+                os.unlink(path)
+            except OSError as e:
+                logger.warning('failed to remove the delta checkpoint %s: %s' % (path, e))
+
+
+def apply_delta(server, path):
+    '''
+    Apply the changes of the delta at path to the databases of server.
+
+    :return: the number of keys changed
+    :rtype: int
+    :raises RDBError: the file is corrupt
+    '''
+
+    with open(path, 'rb') as stream:
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            rdb.verify_checksum(data)
+            reader = rdb.RDBReader(data)
+            reader.read_header()
+            now = time.time()
+            keys = 0
+            for idnum, key, obj, expire_time in reader.read_entries():
+                db = server.get_database(idnum)
+                if key is None:
+                    db.flush()
+                    continue
+                keys += 1
+                if obj is None or expire_time is not None and expire_time < now:
+                    if key in db.key_space:
+                        db.remove_key(key)
+                else:
+                    db.put_key(key, obj, expire_time)
+        except IndexError:
+            raise rdb.RDBError('unexpected end of file')
+        finally:
+            data.close()
+    return keys
+
+
+def load_deltas(server, base_path):
+    '''
+    Apply the deltas of the base at base_path, which was just loaded, in order.
+
+    :return: the id of the base, None when it is not tagged, the number of the last delta applied
+             and the total size of the deltas
+    :rtype: tuple
+    :raises RDBError: a delta is corrupt
+    '''
+
+    base_id = rdb.read_aux(base_path).get(b'checkpoint-base')
+    last_seq = 0
+    size = 0
+    if base_id is None:
+        return None, last_seq, size
+    for seq, path in list_deltas(base_path):
+        if rdb.read_aux(path).get(b'checkpoint-base') != base_id:
+            # Left over from a previous base
+            continue
+        begin = time.time()
+        keys = apply_delta(server, path)
+        last_seq = seq
+        size += os.path.getsize(path)
+        logger.info('delta checkpoint %d loaded: %d keys in %.3f seconds'
+                    % (seq, keys, time.time() - begin))
+    return base_id.decode(), last_seq, size
+
+
+class Checkpoint:
+
+    '''
+    A checkpoint being written, a base when its number is 0, else a delta.
+
+    :param taken: the changes taken from the databases, as {database id: (keys, whether the
+                  database was flushed)}
+    '''
+
+    def __init__(self, base_id, seq, taken):
+        self.base_id = base_id
+        self.seq = seq
+        self.taken = taken
+        # The changes written to a delta, more than taken when it replaces the previous deltas
+        self.changes = taken
+        self.compact = False
+
+    @property
+    def full(self):
+        return self.seq == 0
+
+    @property
+    def aux(self):
+        return (('checkpoint-base', self.base_id), ('checkpoint-seq', str(self.seq)))
+
+
+class Checkpoints:
+
+    def __init__(self, server):
+        self.server = server
+        # The base the deltas apply to, None until a base is written or loaded
+        self.base_id = None
+        self.seq = 0
+        self.base_size = 0
+        self.delta_size = 0
+        # The keys changed since the base, as {database id: set}, and the databases flushed since
+        self.covered = {}
+        self.covered_flushed = set()
+        self.stat_deltas = 0
+        self.stat_compactions = 0
+
+    def delta_path(self, seq):
+        return '%s.delta.%d' % (self.server.rdb_path(), seq)
+
+    def delta_due(self):
+        '''
+        :return: whether the next checkpoint can be a delta
+        :rtype: bool
+        '''
+
+        if self.base_id is None:
+            return False
+        return self.delta_size * 100 < \
+            self.base_size * self.server.config['checkpoint-rewrite-percentage']
+
+    def loaded(self, base_id, seq, base_size, delta_size):
+        '''
+        Record the base and the deltas just loaded, the changes they made count as covered.
+        '''
+
+        self.base_id = base_id
+        self.seq = seq
+        self.base_size = base_size
+        self.delta_size = delta_size
+        self.covered = {}
+        self.covered_flushed = set()
+        for db in self.server.all_databases():
+            keys, flushed = db.take_changes()
+            self.cover(db.idnum, keys, flushed)
+
+    def cover(self, idnum, keys, flushed):
+        if keys:
+            self.covered.setdefault(idnum, set()).update(keys)
+        if flushed:
+            self.covered_flushed.add(idnum)
+
+    def begin(self, full):
+        '''
+        Take the changes of the databases for a new checkpoint.
+
+        :param full: whether to write a new base rather than a delta
+        :rtype: Checkpoint
+        '''
+
+        taken = {db.idnum: db.take_changes() for db in self.server.all_databases()}
+        if full:
+            return Checkpoint(binascii.hexlify(os.urandom(20)).decode(), 0, taken)
+
+        checkpoint = Checkpoint(self.base_id, self.seq + 1, taken)
+        if self.seq >= self.server.config['checkpoint-max-deltas']:
+            checkpoint.compact = True
+            checkpoint.changes = {}
+            for idnum in set(taken) | set(self.covered):
+                keys, flushed = taken.get(idnum, (set(), False))
+                checkpoint.changes[idnum] = (keys | self.covered.get(idnum, set()),
+                                             flushed or idnum in self.covered_flushed)
+        return checkpoint
+
+    def finish(self, checkpoint, ok):
+        '''
+        Record a checkpoint once written, or give its changes back to the databases when it failed.
+        '''
+
+        if not ok:
+            for idnum, (keys, flushed) in checkpoint.taken.items():
+                self.server.get_database(idnum).restore_changes(keys, flushed)
+            return
+
+        if checkpoint.full:
+            self.base_id = checkpoint.base_id
+            self.seq = 0
+            self.base_size = os.path.getsize(self.server.rdb_path())
+            self.delta_size = 0
+            self.covered = {}
+            self.covered_flushed = set()
+            return
+
+        self.seq = checkpoint.seq
+        size = os.path.getsize(self.delta_path(checkpoint.seq))
+        for idnum, (keys, flushed) in checkpoint.taken.items():
+            self.cover(idnum, keys, flushed)
+        self.stat_deltas += 1
+        if checkpoint.compact:
+            remove_deltas(self.server.rdb_path(), before=checkpoint.seq)
+            self.delta_size = size
+            self.stat_compactions += 1
+        else:
+            self.delta_size += size
+
+    def info(self):
+        return [
+            ('checkpoint_base_size', self.base_size),
+            ('checkpoint_deltas_size', self.delta_size),
+            ('checkpoint_last_delta', self.seq),
+            ('checkpoint_dirty_keys', sum(len(db.dirty_keys) for db in self.server.all_databases())),
+            ('checkpoint_deltas_written', self.stat_deltas),
+            ('checkpoint_compactions', self.stat_compactions),
+        ]
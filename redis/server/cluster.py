@@ -0,0 +1,460 @@
+'''
+Cluster mode, enabled by the ``cluster-enabled`` parameter.
+
+The keyspace is split in 16384 hash slots, see ``redis.common.hashslot``, and every node of the
+cluster serves some of them, assigned with ``CLUSTER ADDSLOTS``. A command whose keys belong to a
+slot served by another node is answered with ``-MOVED <slot> <host>:<port>``, so the clients learn
+where to send it, and a command whose keys belong to several slots with ``-CROSSSLOT``.
+
+A slot is moved between two nodes by marking it ``IMPORTING`` on the target and ``MIGRATING`` on the
+source with ``CLUSTER SETSLOT``, moving its keys, which the databases index by slot, then assigning
+it to the target with ``CLUSTER SETSLOT <slot> NODE``. Meanwhile the source answers the commands on
+keys it does not have anymore with ``-ASK <slot> <host>:<port>``, and the target only serves the
+clients which sent ``ASKING`` before the command.
+
+The nodes learn about each other with ``CLUSTER MEET``, then every node pulls ``CLUSTER NODES`` from
+the nodes it knows every second, rather than running a gossip bus. A node adopts the slots another
+one claims when it has a greater config epoch than their current owner: the target of a slot bumps
+its epoch when it gets the slot. The configuration of a node is saved to ``cluster-config-file``,
+in the format of ``CLUSTER NODES``.
+'''
+
+import asyncio
+import binascii
+import logging
+import os
+import time
+
+from redis.common.hashslot import CLUSTER_SLOTS, key_hash_slot
+from redis.common.proto import dump_command
+from redis.common.utils import abort
+
+logger = logging.getLogger(__name__)
+
+# Delay between two pulls of the configuration of a node, in seconds
+CLUSTER_PULL_PERIOD = 1
+
+
+def new_node_id():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+def slot_ranges(slots):
+    '''
+    :param slots: sorted slot numbers
+    :return: the (first, last) ranges of consecutive slots
+    :rtype: list
+    '''
+
+    ranges = []
+    for slot in slots:
+        if ranges and ranges[-1][1] == slot - 1:
+            ranges[-1][1] = slot
+        else:
+            ranges.append([slot, slot])
+    return [tuple(r) for r in ranges]
+
+
+def parse_slot_ranges(items):
+    '''
+    Parse the slots of a line of CLUSTER NODES, ``first-last`` ranges or single slots.
+
+    :return: the slots, and the migrating and importing slots as {slot: node id}
+    :rtype: tuple
+    '''
+
+    slots = []
+    migrating = {}
+    importing = {}
+    for item in items:
+        if item.startswith('['):
+            slot, arrow, node_id = item[1:-1].partition('->-')
+            if arrow:
+                migrating[int(slot)] = node_id
+            else:
+                slot, arrow, node_id = item[1:-1].partition('-<-')
+                importing[int(slot)] = node_id
+            continue
+        first, _, last = item.partition('-')
+        slots.extend(range(int(first), int(last or first) + 1))
+    return slots, migrating, importing
+
+
+class ClusterNode:
+
+    def __init__(self, node_id, host, port, config_epoch=0):
+        # None until the first pull of a node met with CLUSTER MEET
+        self.id = node_id
+        self.host = host
+        self.port = port
+        self.config_epoch = config_epoch
+        self.link = None
+        self.connected = False
+        self.last_pull = 0.0
+
+    @property
+    def address(self):
+        return '%s:%d' % (self.host, self.port)
+
+
+class Cluster:
+
+    def __init__(self, server):
+        self.server = server
+        self.myself = None
+        # Known nodes as {node id: ClusterNode}, and the nodes met whose id is not known yet
+        self.nodes = {}
+        self.handshakes = []
+        # The node serving every slot
+        self.slots = [None] * CLUSTER_SLOTS
+        # Slots being moved, as {slot: target node} and {slot: source node}
+        self.migrating = {}
+        self.importing = {}
+        self.current_epoch = 0
+
+    @property
+    def config_path(self):
+        return os.path.join(self.server.config['dir'], self.server.config['cluster-config-file'])
+
+    def load(self):
+        '''
+        Load the configuration file, or start as a new node serving no slot.
+        '''
+
+        path = self.config_path
+        if not os.path.exists(path):
+            self.myself = ClusterNode(new_node_id(), self.server.config['cluster-announce-ip'],
+                                      self.server.config['port'])
+            self.nodes[self.myself.id] = self.myself
+            self.save()
+            return
+
+        pending = []
+        with open(path) as stream:
+            for line in stream:
+                fields = line.split()
+                if not fields:
+                    continue
+                if fields[0] == 'vars':
+                    self.current_epoch = int(fields[2])
+                    continue
+                host, _, port = fields[1].partition('@')[0].rpartition(':')
+                node = ClusterNode(fields[0], host, int(port), int(fields[6]))
+                self.nodes[node.id] = node
+                if 'myself' in fields[2].split(','):
+                    self.myself = node
+                    node.port = self.server.config['port']
+                pending.append((node, fields[8:]))
+        for node, items in pending:
+            slots, migrating, importing = parse_slot_ranges(items)
+            for slot in slots:
+                self.slots[slot] = node
+            for slot, node_id in migrating.items():
+                self.migrating[slot] = self.nodes[node_id]
+            for slot, node_id in importing.items():
+                self.importing[slot] = self.nodes[node_id]
+        logger.info('cluster configuration loaded, node id %s' % self.myself.id)
+
+    def save(self):
+        path = self.config_path
+        with open(path + '.tmp', 'w') as stream:
+            stream.write(self.nodes_description())
+            stream.write('vars currentEpoch %d\n' % self.current_epoch)
+        os.replace(path + '.tmp', path)
+
+    def start(self):
+        for node in list(self.nodes.values()) + self.handshakes:
+            if node is not self.myself and node.link is None:
+                self.connect(node)
+
+    def stop(self):
+        for node in list(self.nodes.values()) + self.handshakes:
+            if node.link is not None:
+                node.link.cancel()
+                node.link = None
+
+    def connect(self, node):
+        if self.server.loop is not None:
+            node.link = asyncio.ensure_future(self.pull(node), loop=self.server.loop)
+
+    def get_node(self, node_id):
+        if isinstance(node_id, bytes):
+            node_id = node_id.decode()
+        if node_id not in self.nodes:
+            abort(message='Unknown node %s' % node_id)
+        return self.nodes[node_id]
+
+    def route(self, argv, client):
+        '''
+        Check that this node serves the keys of a command.
+
+        :raises CommandError: a MOVED, ASK, TRYAGAIN, CROSSSLOT or CLUSTERDOWN error
+        '''
+
+        asking, client.asking = client.asking, False
+        keys = self.server.get_command_keys(argv)
+        if not keys:
+            return
+        slot = key_hash_slot(keys[0])
+        for key in keys[1:]:
+            if key_hash_slot(key) != slot:
+                abort(errtype='CROSSSLOT', message="Keys in request don't hash to the same slot")
+
+        node = self.slots[slot]
+        if node is None:
+            abort(errtype='CLUSTERDOWN', message='Hash slot not served')
+        if node is self.myself:
+            target = self.migrating.get(slot)
+            if target is None:
+                return
+            # The keys already moved are served by the target
+            missing = sum(1 for key in keys if key not in client.db.key_space)
+            if not missing:
+                return
+            if missing < len(keys):
+                abort(errtype='TRYAGAIN', message='Multiple keys request during rehashing of slot')
+            abort(errtype='ASK', message='%d %s' % (slot, target.address))
+        if asking and slot in self.importing:
+            if len(keys) > 1 and any(key not in client.db.key_space for key in keys):
+                abort(errtype='TRYAGAIN', message='Multiple keys request during rehashing of slot')
+            return
+        abort(errtype='MOVED', message='%d %s' % (slot, node.address))
+
+    def add_slots(self, slots):
+        for slot in slots:
+            if self.slots[slot] is not None:
+                abort(message='Slot %d is already busy' % slot)
+        for slot in slots:
+            self.slots[slot] = self.myself
+            self.importing.pop(slot, None)
+        self.save()
+
+    def del_slots(self, slots):
+        for slot in slots:
+            if self.slots[slot] is None:
+                abort(message='Slot %d is already unassigned' % slot)
+        for slot in slots:
+            self.slots[slot] = None
+            self.migrating.pop(slot, None)
+            self.importing.pop(slot, None)
+        self.save()
+
+    def set_slot(self, slot, action, node_id=None):
+        '''
+        CLUSTER SETSLOT: start moving a slot from (IMPORTING) or to (MIGRATING) another node, stop
+        (STABLE), or assign it to a node once moved (NODE).
+        '''
+
+        if action == b'MIGRATING':
+            if self.slots[slot] is not self.myself:
+                abort(message="I'm not the owner of hash slot %d" % slot)
+            self.migrating[slot] = self.get_node(node_id)
+        elif action == b'IMPORTING':
+            if self.slots[slot] is self.myself:
+                abort(message="I'm already the owner of hash slot %d" % slot)
+            self.importing[slot] = self.get_node(node_id)
+        elif action == b'STABLE':
+            self.migrating.pop(slot, None)
+            self.importing.pop(slot, None)
+        elif action == b'NODE':
+            node = self.get_node(node_id)
+            if self.slots[slot] is self.myself and node is not self.myself and \
+                    any(db.count_keys_in_slot(slot) for db in self.server.all_databases()):
+                abort(message="Can't assign hashslot %d to a different node while I still hold keys "
+                              "for this hash slot." % slot)
+            if node is self.myself and self.importing.pop(slot, None) is not None:
+                # The other nodes adopt the slot from the node with the greatest epoch
+                self.current_epoch += 1
+                self.myself.config_epoch = self.current_epoch
+            self.migrating.pop(slot, None)
+            self.slots[slot] = node
+        else:
+            abort(message='Invalid CLUSTER SETSLOT action or number of arguments')
+        self.save()
+
+    def meet(self, host, port):
+        if (host, port) == (self.myself.host, self.myself.port):
+            return
+        for node in list(self.nodes.values()) + self.handshakes:
+            if (node.host, node.port) == (host, port):
+                return
+        node = ClusterNode(None, host, port)
+        self.handshakes.append(node)
+        self.connect(node)
+
+    @asyncio.coroutine
+    def pull(self, node):
+        '''
+        Pull the configuration of node every ``CLUSTER_PULL_PERIOD``, announcing this node to it.
+        '''
+
+        timeout = self.server.config['cluster-node-timeout'] / 1000.0
+        while True:
+            writer = None
+            try:
+                reader, writer = yield from asyncio.wait_for(
+                    asyncio.open_connection(node.host, node.port), timeout)
+                writer.write(dump_command([b'CLUSTER', b'MEET', self.myself.host.encode(),
+                                           str(self.myself.port).encode()]))
+                yield from asyncio.wait_for(reader.readline(), timeout)
+                while True:
+                    writer.write(dump_command([b'CLUSTER', b'NODES']))
+                    line = yield from asyncio.wait_for(reader.readline(), timeout)
+                    if not line.startswith(b'$'):
+                        raise ConnectionError('unexpected reply %r' % line)
+                    data = yield from asyncio.wait_for(reader.readexactly(int(line[1:]) + 2), timeout)
+                    node.connected = True
+                    node.last_pull = time.time()
+                    self.update(node, data[:-2].decode())
+                    yield from asyncio.sleep(CLUSTER_PULL_PERIOD)
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                if node.connected:
+                    logger.warning('lost the link to cluster node %s: %s' % (node.address, e))
+                node.connected = False
+            finally:
+                if writer is not None:
+                    writer.close()
+            yield from asyncio.sleep(CLUSTER_PULL_PERIOD)
+
+    def update(self, node, description):
+        '''
+        Apply the configuration pulled from node, the output of its CLUSTER NODES.
+        '''
+
+        changed = False
+        claims = []
+        for line in description.splitlines():
+            fields = line.split()
+            if len(fields) < 8:
+                continue
+            node_id = fields[0]
+            host, _, port = fields[1].partition('@')[0].rpartition(':')
+            if 'myself' in fields[2].split(','):
+                if node.id is None:
+                    changed |= self.handshake_done(node, node_id)
+                    if node.link is None:
+                        return
+                node.config_epoch = int(fields[6])
+                claims.append((node, fields[8:]))
+            elif node_id not in self.nodes:
+                # Learnt from node
+                self.nodes[node_id] = other = ClusterNode(node_id, host, int(port), int(fields[6]))
+                self.connect(other)
+                changed = True
+            elif self.nodes[node_id] is not self.myself:
+                claims.append((self.nodes[node_id], fields[8:]))
+
+        for claimant, items in claims:
+            if claimant.config_epoch > self.current_epoch:
+                self.current_epoch = claimant.config_epoch
+                changed = True
+            for slot in parse_slot_ranges(items)[0]:
+                owner = self.slots[slot]
+                if owner is claimant:
+                    continue
+                if owner is None or owner.config_epoch < claimant.config_epoch:
+                    if owner is self.myself:
+                        logger.warning('hash slot %d moved to node %s' % (slot, claimant.id))
+                        self.migrating.pop(slot, None)
+                    self.slots[slot] = claimant
+                    changed = True
+        if changed:
+            self.save()
+
+    def handshake_done(self, node, node_id):
+        '''
+        Record the id of a node met, unless it is already known.
+
+        :return: whether the node was added
+        :rtype: bool
+        '''
+
+        self.handshakes.remove(node)
+        if node_id in self.nodes:
+            node.link.cancel()
+            node.link = None
+            return False
+        node.id = node_id
+        self.nodes[node_id] = node
+        logger.info('cluster node %s joined from %s' % (node_id, node.address))
+        return True
+
+    def node_flags(self, node):
+        flags = ['myself'] if node is self.myself else []
+        return ','.join(flags + ['master'])
+
+    def nodes_description(self):
+        '''
+        :return: the configuration of the cluster, in the format of CLUSTER NODES
+        :rtype: str
+        '''
+
+        slots = {}
+        for slot, node in enumerate(self.slots):
+            if node is not None:
+                slots.setdefault(node, []).append(slot)
+        lines = []
+        for node in sorted(self.nodes.values(), key=lambda node: node is not self.myself):
+            items = ['%d-%d' % r if r[0] != r[1] else '%d' % r[0] for r in slot_ranges(slots.get(node, []))]
+            if node is self.myself:
+                items += ['[%d->-%s]' % (slot, target.id) for slot, target in sorted(self.migrating.items())]
+                items += ['[%d-<-%s]' % (slot, source.id) for slot, source in sorted(self.importing.items())]
+            connected = node is self.myself or node.connected
+            lines.append(' '.join([
+                node.id, '%s@%d' % (node.address, node.port), self.node_flags(node), '-', '0',
+                str(int(node.last_pull * 1000)), str(node.config_epoch),
+                'connected' if connected else 'disconnected'] + items))
+        return ''.join(line + '\n' for line in lines)
+
+    def slots_reply(self):
+        '''
+        :return: the reply of CLUSTER SLOTS, the ranges of slots and the node serving them
+        :rtype: list
+        '''
+
+        reply = []
+        first = 0
+        for slot in range(1, CLUSTER_SLOTS + 1):
+            if slot < CLUSTER_SLOTS and self.slots[slot] is self.slots[first]:
+                continue
+            node = self.slots[first]
+            if node is not None:
+                reply.append([first, slot - 1, [node.host.encode(), node.port, node.id.encode()]])
+            first = slot
+        return reply
+
+    def shards_reply(self):
+        '''
+        :return: the reply of CLUSTER SHARDS, the slots and the nodes of every shard
+        :rtype: list
+        '''
+
+        slots = {}
+        for slot, node in enumerate(self.slots):
+            if node is not None:
+                slots.setdefault(node, []).append(slot)
+        reply = []
+        for node_id, node in sorted(self.nodes.items()):
+            ranges = [bound for r in slot_ranges(slots.get(node, [])) for bound in r]
+            online = node is self.myself or node.connected
+            reply.append([b'slots', ranges, b'nodes', [[
+                b'id', node.id.encode(),
+                b'port', node.port,
+                b'ip', node.host.encode(),
+                b'endpoint', node.host.encode(),
+                b'role', b'master',
+                b'replication-offset', 0,
+                b'health', b'online' if online else b'fail',
+            ]]])
+        return reply
+
+    def info(self):
+        assigned = sum(1 for node in self.slots if node is not None)
+        return [
+            ('cluster_state', 'ok' if assigned == CLUSTER_SLOTS else 'fail'),
+            ('cluster_slots_assigned', assigned),
+            ('cluster_known_nodes', len(self.nodes)),
+            ('cluster_size', len(set(node for node in self.slots if node is not None))),
+            ('cluster_current_epoch', self.current_epoch),
+            ('cluster_my_epoch', self.myself.config_epoch),
+        ]
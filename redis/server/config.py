@@ -0,0 +1,175 @@
+import fnmatch
+
+from .backing import BACKING_STORES
+from .evict import MAXMEMORY_POLICIES
+from redis.common.compression import CODECS
+
+
+def parse_integer(value):
+    return int(value)
+
+
+MEMORY_UNITS = [
+    ('kb', 1024), ('mb', 1024 ** 2), ('gb', 1024 ** 3),
+    ('k', 1000), ('m', 1000 ** 2), ('g', 1000 ** 3),
+    ('b', 1),
+]
+
+
+def parse_memory(value):
+    '''
+    Parse a memory size with an optional unit, e.g. ``100mb`` or ``1g``.
+    '''
+
+    value = value.lower()
+    for unit, multiplier in MEMORY_UNITS:
+        if value.endswith(unit):
+            return int(value[:-len(unit)]) * multiplier
+    return int(value)
+
+
+def parse_string(value):
+    return value
+
+
+def parse_yes_no(value):
+    value = value.lower()
+    if value not in ('yes', 'no'):
+        raise ValueError(value)
+    return value == 'yes'
+
+
+def format_yes_no(value):
+    return 'yes' if value else 'no'
+
+
+def parse_save_points(value):
+    '''
+    Parse the snapshot schedule, pairs of seconds and number of changes, e.g. ``3600 1 300 100``.
+    An empty string disables the automatic snapshots.
+    '''
+
+    numbers = [int(number) for number in value.split()]
+    if len(numbers) % 2 or any(number <= 0 for number in numbers):
+        raise ValueError(value)
+    return [(numbers[i], numbers[i + 1]) for i in range(0, len(numbers), 2)]
+
+
+def format_save_points(value):
+    return ' '.join('%d %d' % point for point in value)
+
+
+def parse_replicaof(value):
+    '''
+    Parse the primary of a replica, ``host port``. An empty string or ``no one`` makes the server a
+    primary.
+    '''
+
+    if not value or value.lower() == 'no one':
+        return None
+    host, port = value.split()
+    return host, int(port)
+
+
+def format_replicaof(value):
+    return '%s %d' % value if value is not None else ''
+
+
+def choice_parser(*choices):
+    def parse_choice(value):
+        value = value.lower()
+        if value not in choices:
+            raise ValueError(value)
+        return value
+    return parse_choice
+
+
+class RedisConfig:
+
+    '''
+    Server configuration parameters, as read by ``CONFIG GET`` and written by ``CONFIG SET``.
+
+    Every parameter is declared in ``PARAMETERS`` as ``name: (default, parser, formatter)``. Values
+    are kept in their parsed Python form, the parser converts from the string representation and the
+    formatter converts back.
+    '''
+
+    PARAMETERS = {
+        'port': (8888, parse_integer, str),
+        'dir': ('.', parse_string, str),
+        'hz': (10, parse_integer, str),
+        'busy-reply-threshold': (5000, parse_integer, str),
+        'functions-filename': ('functions.lib', parse_string, str),
+        'dbfilename': ('dump.rdb', parse_string, str),
+        'save': ([(3600, 1), (300, 100), (60, 10000)], parse_save_points, format_save_points),
+        'rdbchecksum': (True, parse_yes_no, format_yes_no),
+        'rdb-key-index': (True, parse_yes_no, format_yes_no),
+        'rdb-lazy-load': (False, parse_yes_no, format_yes_no),
+        'checkpoint-deltas': (False, parse_yes_no, format_yes_no),
+        'checkpoint-max-deltas': (8, parse_integer, str),
+        'checkpoint-rewrite-percentage': (100, parse_integer, str),
+        'appendonly': (False, parse_yes_no, format_yes_no),
+        'appendfilename': ('appendonly.aof', parse_string, str),
+        'appendfsync': ('everysec', choice_parser('always', 'everysec', 'no'), str),
+        'replicaof': (None, parse_replicaof, format_replicaof),
+        'replica-read-only': (True, parse_yes_no, format_yes_no),
+        'repl-backlog-size': (1024 ** 2, parse_memory, str),
+        'repl-timeout': (60, parse_integer, str),
+        'repl-ping-replica-period': (10, parse_integer, str),
+        'cluster-enabled': (False, parse_yes_no, format_yes_no),
+        'cluster-config-file': ('nodes.conf', parse_string, str),
+        'cluster-announce-ip': ('127.0.0.1', parse_string, str),
+        'cluster-node-timeout': (15000, parse_integer, str),
+        'keyspace-backend': ('dict', choice_parser('dict', 'radix', 'spill'), str),
+        'spill-memory': (64 * 1024 ** 2, parse_memory, str),
+        'maxmemory': (0, parse_memory, str),
+        'maxmemory-policy': ('noeviction', choice_parser(*MAXMEMORY_POLICIES), str),
+        'maxmemory-samples': (5, parse_integer, str),
+        'lfu-log-factor': (10, parse_integer, str),
+        'lfu-decay-time': (1, parse_integer, str),
+        'hotkeys-capacity': (100, parse_integer, str),
+        'hotkeys-sample-rate': (100, parse_integer, str),
+        'compress-min-size': (0, parse_memory, str),
+        'compress-codec': ('zlib', choice_parser(*sorted(CODECS)), str),
+        'dedup-min-size': (0, parse_memory, str),
+        'backing-store': ('none', choice_parser('none', *sorted(BACKING_STORES)), str),
+        'backing-store-file': ('backing-store.db', parse_string, str),
+        'backing-store-max-lag': (1000, parse_integer, str),
+        'backing-store-batch-size': (1000, parse_integer, str),
+    }
+
+    def __init__(self):
+        self._values = dict((name, spec[0]) for name, spec in self.PARAMETERS.items())
+
+    def __getitem__(self, name):
+        return self._values[name]
+
+    def __setitem__(self, name, value):
+        if name not in self.PARAMETERS:
+            raise KeyError(name)
+        self._values[name] = value
+
+    def get_matching(self, pattern):
+        '''
+        :return: (name, formatted value) pairs of all the parameters matching the glob-style pattern.
+        :rtype: list
+        '''
+
+        result = []
+        for name in sorted(self._values):
+            if fnmatch.fnmatchcase(name, pattern):
+                formatter = self.PARAMETERS[name][2]
+                result.append((name, formatter(self._values[name])))
+        return result
+
+    def set_from_string(self, name, value):
+        '''
+        Parse and set a parameter from its string representation.
+
+        :raises KeyError: the parameter does not exist
+        :raises ValueError: the value can not be parsed
+        '''
+
+        if name not in self.PARAMETERS:
+            raise KeyError(name)
+        self._values[name] = self.PARAMETERS[name][1](value)
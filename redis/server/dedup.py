@@ -0,0 +1,80 @@
+'''
+Content-addressed storage of large string values, enabled by the ``dedup-min-size`` parameter.
+
+String values at least that large are stored once per database in a BlobTable, indexed by their
+SHA-256 digest, and the objects of all the keys with the same value reference the same bytes. Values
+are immutable bytes, so a command modifying one stores a new value in the object: the database then
+releases the reference to the shared one, which is copy-on-write without copying.
+'''
+
+import hashlib
+import sys
+
+from redis.common.objects import OBJECT_OVERHEAD
+
+
+class BlobTable:
+
+    def __init__(self):
+        # {digest: [shared value, references, length, memory]}
+        self.entries = {}
+        self.references = 0
+        # Estimated memory used by the shared values, and not used thanks to the sharing
+        self.memory = 0
+        self.saved_memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __getitem__(self, digest):
+        return self.entries[digest][0]
+
+    def acquire(self, obj, compress_codec=None):
+        '''
+        Make obj reference the shared copy of its value, which is stored on first use, compressed if
+        compress_codec is set.
+
+        :return: the digest of the value, and the memory added to the table
+        :rtype: tuple
+        '''
+
+        value = obj.value
+        digest = hashlib.sha256(value).digest()
+        entry = self.entries.get(digest)
+        added = 0
+        if entry is None:
+            self.misses += 1
+            if compress_codec is not None:
+                obj.compress(compress_codec)
+            added = sys.getsizeof(obj.value)
+            entry = self.entries[digest] = [obj.value, 0, len(value), added]
+            self.memory += added
+        else:
+            self.hits += 1
+            self.saved_memory += entry[3]
+            obj.value = entry[0]
+        entry[1] += 1
+        self.references += 1
+        # The value is accounted once, by the table
+        obj.memory = OBJECT_OVERHEAD
+        return digest, added
+
+    def release(self, digest):
+        '''
+        Drop a reference to a shared value, and the value with its last reference.
+
+        :return: the memory freed
+        :rtype: int
+        '''
+
+        entry = self.entries[digest]
+        entry[1] -= 1
+        self.references -= 1
+        if entry[1]:
+            self.saved_memory -= entry[3]
+            return 0
+        del self.entries[digest]
+        self.memory -= entry[3]
+        return entry[3]
@@ -0,0 +1,104 @@
+import bisect
+
+from redis.common.objects import LFU_INIT_VAL
+
+# Number of the best candidates kept between two evictions
+EVPOOL_SIZE = 16
+
+MAXMEMORY_POLICIES = ('noeviction', 'allkeys-lru', 'volatile-lru', 'allkeys-lfu', 'volatile-lfu',
+                      'allkeys-random', 'volatile-random', 'volatile-ttl')
+
+
+def lfu_incr_probabilities(lfu_log_factor):
+    '''
+    The logarithmic access counter is incremented with a probability that decreases as the counter
+    grows. With the default factor of 10, the counter saturates at 255 after about a million accesses.
+
+    :return: the probability of incrementing the counter, for each value of the counter
+    :rtype: list
+    '''
+
+    return [1.0 / (max(counter - LFU_INIT_VAL, 0) * lfu_log_factor + 1) for counter in range(255)] + [0.0]
+
+
+def lfu_decay_period(lfu_decay_time):
+    '''
+    :return: the seconds without access after which the access counter is decremented by one
+    :rtype: float
+    '''
+
+    return 60.0 * lfu_decay_time if lfu_decay_time else float('inf')
+
+
+def lfu_decayed_counter(obj, decay_period, now):
+    '''
+    :return: the access counter of obj, decremented by one per decay period elapsed since its last
+             access
+    :rtype: int
+    '''
+
+    elapsed = now - obj.atime
+    if elapsed < decay_period:
+        return obj.freq
+    return max(obj.freq - int(elapsed // decay_period), 0)
+
+
+class EvictionPool:
+
+    '''
+    The best eviction candidates found by sampling, as Redis does instead of keeping every key in an
+    LRU list.
+
+    Every eviction samples a few keys of each database, inserts the ones with the highest idle score
+    in the pool, and evicts the best candidate of the pool that still exists. Candidates are kept
+    between evictions, so the choice improves over successive samplings.
+    '''
+
+    def __init__(self, size=EVPOOL_SIZE):
+        self.size = size
+        # (idle score, database id, key), in ascending order of score
+        self.entries = []
+        # (database id, key) of the entries
+        self.keys = set()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def populate(self, db, samples, idle_score):
+        '''
+        Sample keys of db and insert them in the pool.
+
+        :param samples: the (key, object) pairs sampled from db
+        :param idle_score: function of the database, the key and its object, the higher the better
+                           candidate
+        '''
+
+        entries = self.entries
+        for key, obj in samples:
+            idle = idle_score(db, key, obj)
+            if len(entries) == self.size:
+                if idle <= entries[0][0]:
+                    continue
+            if (db.idnum, key) in self.keys:
+                continue
+            bisect.insort(entries, (idle, db.idnum, key))
+            self.keys.add((db.idnum, key))
+            if len(entries) > self.size:
+                idle, idnum, key = entries.pop(0)
+                self.keys.discard((idnum, key))
+
+    def pop_best(self):
+        '''
+        :return: the (database id, key) of the best candidate, or None if the pool is empty
+        :rtype: tuple
+        '''
+
+        if not self.entries:
+            return None
+        idle, idnum, key = self.entries.pop()
+        self.keys.discard((idnum, key))
+        return idnum, key
+
+    def clear(self):
+        self.entries = []
+        self.keys = set()
@@ -0,0 +1,405 @@
+import ast
+import builtins
+import os
+import sys
+import time
+
+from redis.common.exceptions import CommandError
+from redis.common.utils import make_argv
+from redis.common.proto import resp_loads, RedisSerializationObject, RedisSimpleStringSerializationObject, \
+    RedisErrorStringSerializationObject, RedisIntegerSerializationObject, RedisBulkStringSerializationObject, \
+    RedisListSerializationObject
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+LIBRARY_FILENAME = '<function library>'
+
+FUNCTION_FLAGS = frozenset(['no-writes'])
+
+SAFE_BUILTINS = dict((name, getattr(builtins, name)) for name in (
+    'abs', 'all', 'any', 'bool', 'bytearray', 'bytes', 'chr', 'dict', 'divmod', 'enumerate', 'filter',
+    'float', 'frozenset', 'hash', 'int', 'isinstance', 'iter', 'len', 'list', 'map', 'max', 'min', 'next',
+    'ord', 'range', 'repr', 'reversed', 'round', 'set', 'slice', 'sorted', 'str', 'sum', 'tuple', 'zip',
+    'True', 'False', 'None', 'Exception', 'ArithmeticError', 'IndexError', 'KeyError', 'LookupError',
+    'StopIteration', 'TypeError', 'ValueError', 'ZeroDivisionError',
+))
+
+# Attributes that lead from a plain object back to frames, code objects or globals
+FORBIDDEN_ATTRIBUTE_PREFIXES = ('_', 'gi_', 'cr_', 'ag_', 'f_', 'tb_', 'co_', 'func_')
+
+# Methods looking up the attributes named in a string, e.g. '{0.__class__}'.format(x), which the
+# validator can not see
+FORBIDDEN_ATTRIBUTES = frozenset(['format', 'format_map'])
+
+
+class ScriptTimeoutError(BaseException):
+
+    '''
+    Raised inside a running function when it exceeded ``busy-reply-threshold``.
+
+    It derives from ``BaseException`` so that ``except Exception`` in library code does not swallow it.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super(ScriptTimeoutError, self).__init__(*args, **kwargs)
+
+
+class SandboxValidator(ast.NodeVisitor):
+
+    '''
+    Reject the constructs that can escape the restricted builtins of a library: imports, dunder
+    names, attributes giving access to frames, code objects or globals, and string formatting
+    methods that can reach them.
+    '''
+
+    def visit_Import(self, node):
+        raise CommandError('ERR', 'Error compiling function: imports are not allowed (line %d)' % node.lineno)
+
+    visit_ImportFrom = visit_Import
+
+    def visit_Global(self, node):
+        raise CommandError('ERR', 'Error compiling function: global is not allowed (line %d)' % node.lineno)
+
+    visit_Nonlocal = visit_Global
+
+    def visit_Name(self, node):
+        if node.id.startswith('__'):
+            raise CommandError('ERR', 'Error compiling function: name %s is not allowed (line %d)'
+                               % (node.id, node.lineno))
+
+    def visit_Attribute(self, node):
+        if node.attr.startswith(FORBIDDEN_ATTRIBUTE_PREFIXES) or node.attr in FORBIDDEN_ATTRIBUTES:
+            raise CommandError('ERR', 'Error compiling function: attribute %s is not allowed (line %d)'
+                               % (node.attr, node.lineno))
+        self.generic_visit(node)
+
+
+class RedisFunction:
+
+    def __init__(self, name, callback, flags, library):
+        self.name = name
+        self.callback = callback
+        self.flags = flags
+        self.library = library
+
+    @property
+    def read_only(self):
+        return 'no-writes' in self.flags
+
+
+class FunctionLibrary:
+
+    def __init__(self, name, code):
+        self.name = name
+        self.code = code
+        self.functions = dict()
+
+
+class FunctionRun:
+
+    '''
+    State of a function being executed by FCALL / FCALL_RO.
+    '''
+
+    def __init__(self, client, read_only, deadline):
+        self.client = client
+        self.read_only = read_only
+        self.deadline = deadline
+        self.did_write = False
+        self.warned = False
+
+
+class ScriptAPI:
+
+    '''
+    The ``redis`` object visible to library code.
+    '''
+
+    def __init__(self, registry, library):
+        self._registry = registry
+        self._library = library
+
+    def register_function(self, name, callback, flags=()):
+        if self._library is None:
+            raise CommandError('ERR', 'register_function can only be called on FUNCTION LOAD')
+        if isinstance(name, bytes):
+            name = name.decode()
+        if not callable(callback):
+            raise CommandError('ERR', 'Function %s callback is not callable' % name)
+        if name in self._library.functions:
+            raise CommandError('ERR', 'Function %s already exists in the library' % name)
+        flags = frozenset(flags)
+        if not flags <= FUNCTION_FLAGS:
+            raise CommandError('ERR', 'Unknown flag given: %s' % ', '.join(sorted(flags - FUNCTION_FLAGS)))
+        self._library.functions[name] = RedisFunction(name, callback, flags, self._library)
+
+    def call(self, *args):
+        return self._registry.call_command(args)
+
+    def pcall(self, *args):
+        try:
+            return self._registry.call_command(args)
+        except CommandError as e:
+            return e
+
+    def log(self, message):
+        logger.info('function: %s' % message)
+
+
+def script_reply(value):
+    '''
+    Convert the return value of a function to its REdis Serialization Protocol object.
+
+    :rtype: RedisSerializationObject
+    '''
+
+    if isinstance(value, RedisSerializationObject):
+        return value
+    elif value is True:
+        return RedisSimpleStringSerializationObject('OK')
+    elif value is None or value is False:
+        return RedisBulkStringSerializationObject(None)
+    elif isinstance(value, int):
+        return RedisIntegerSerializationObject(value)
+    elif isinstance(value, (bytes, str, float)):
+        return RedisBulkStringSerializationObject(value)
+    elif isinstance(value, CommandError):
+        errtype, message = value.args
+        return RedisErrorStringSerializationObject(errtype=errtype, message=message)
+    elif isinstance(value, (list, tuple)):
+        return RedisListSerializationObject([script_reply(item) for item in value])
+    else:
+        raise CommandError('ERR', 'Function returned an unsupported value of type %s' % type(value).__name__)
+
+
+class FunctionRegistry:
+
+    '''
+    Libraries loaded with FUNCTION LOAD.
+
+    Library code is Python source starting with a ``#!python name=<library>`` line. It is executed
+    with a restricted set of builtins and a ``redis`` object exposing ``register_function``, ``call``,
+    ``pcall`` and ``log``. Functions run on the event loop thread, so they are atomic, and call the
+    command handlers directly without going through RESP.
+    '''
+
+    def __init__(self, server):
+        self.server = server
+        self.libraries = dict()
+        self.functions = dict()
+        self.current_run = None
+
+    def parse_metadata(self, code):
+        first_line, _, _ = code.partition('\n')
+        if not first_line.startswith('#!'):
+            raise CommandError('ERR', 'Missing library metadata')
+
+        engine, *params = first_line[2:].split() or ['']
+        if engine.lower() != 'python':
+            raise CommandError('ERR', 'Engine \'%s\' not found' % engine)
+
+        name = None
+        for param in params:
+            key, sep, value = param.partition('=')
+            if not sep or key != 'name':
+                raise CommandError('ERR', 'Invalid metadata value given: %s' % param)
+            name = value
+        if not name:
+            raise CommandError('ERR', 'Library name was not given')
+        return name
+
+    def load(self, code, replace=False, persist=True):
+        '''
+        Compile and register a library.
+
+        :return: the library name
+        :raises CommandError: the code is invalid or the library already exists
+        '''
+
+        if isinstance(code, bytes):
+            code = code.decode()
+
+        name = self.parse_metadata(code)
+        old_library = self.libraries.get(name)
+        if old_library is not None and not replace:
+            raise CommandError('ERR', 'Library \'%s\' already exists' % name)
+
+        try:
+            tree = ast.parse(code, LIBRARY_FILENAME)
+        except SyntaxError as e:
+            raise CommandError('ERR', 'Error compiling function: %s' % e)
+        SandboxValidator().visit(tree)
+
+        library = FunctionLibrary(name, code)
+        api = ScriptAPI(self, library)
+        env = {'__builtins__': SAFE_BUILTINS, 'redis': api}
+        try:
+            self.run_sandboxed(exec, compile(tree, LIBRARY_FILENAME, 'exec'), env,
+                               run=FunctionRun(None, True, self.get_deadline()))
+        except ScriptTimeoutError:
+            raise CommandError('ERR', 'FUNCTION LOAD timeout')
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError('ERR', 'Error registering functions: %s' % e)
+        api._library = None
+
+        if not library.functions:
+            raise CommandError('ERR', 'No functions registered')
+        for fname in library.functions:
+            if fname in self.functions and self.functions[fname].library is not old_library:
+                raise CommandError('ERR', 'Function %s already exists' % fname)
+
+        if old_library is not None:
+            self.remove_library(old_library)
+        self.libraries[name] = library
+        self.functions.update(library.functions)
+
+        if persist:
+            self.save_to_disk()
+        return name
+
+    def remove_library(self, library):
+        del self.libraries[library.name]
+        for fname in library.functions:
+            del self.functions[fname]
+
+    def delete(self, name):
+        '''
+        :raises KeyError: the library does not exist
+        '''
+
+        self.remove_library(self.libraries[name])
+        self.save_to_disk()
+
+    def flush(self):
+        self.libraries.clear()
+        self.functions.clear()
+        self.save_to_disk()
+
+    def fcall(self, client, name, keys, args, read_only=False):
+        '''
+        Run a function and return its RESP reply.
+
+        :raises KeyError: the function does not exist
+        '''
+
+        function = self.functions[name]
+        if read_only and not function.read_only:
+            raise CommandError('ERR', 'Can not execute a script with write flag using *_ro command.')
+
+        run = FunctionRun(client, read_only or function.read_only, self.get_deadline())
+
+        try:
+            ret = self.run_sandboxed(function.callback, keys, args, run=run)
+        except ScriptTimeoutError:
+            raise CommandError('BUSY', 'Function %s exceeded busy-reply-threshold and was killed' % name)
+        except CommandError:
+            raise
+        except Exception as e:
+            raise CommandError('ERR', 'Error running function %s: %s' % (name, e))
+        return script_reply(ret)
+
+    def get_deadline(self):
+        threshold = self.server.config['busy-reply-threshold']
+        if threshold <= 0:
+            return None
+        return time.monotonic() + threshold / 1000.0
+
+    def run_sandboxed(self, func, *args, run):
+        if self.current_run is not None:
+            raise CommandError('ERR', 'Functions can not be nested')
+
+        old_trace = sys.gettrace()
+        self.current_run = run
+        if run.deadline is not None:
+            sys.settrace(self.trace_call)
+        try:
+            return func(*args)
+        finally:
+            if run.deadline is not None:
+                sys.settrace(old_trace)
+            self.current_run = None
+
+    def trace_call(self, frame, event, arg):
+        if frame.f_code.co_filename != LIBRARY_FILENAME:
+            return None
+        return self.trace_line
+
+    def trace_line(self, frame, event, arg):
+        if event == 'line':
+            self.check_deadline()
+        return self.trace_line
+
+    def check_deadline(self):
+        run = self.current_run
+        if run.deadline is None or time.monotonic() < run.deadline:
+            return
+
+        # A function that already modified the dataset can not be killed without breaking atomicity
+        if run.did_write:
+            if not run.warned:
+                logger.warning('function exceeded busy-reply-threshold after performing writes, '
+                               'it can not be killed')
+                run.warned = True
+            return
+        raise ScriptTimeoutError()
+
+    def call_command(self, args):
+        from .server import native_reply
+
+        run = self.current_run
+        if run is None or run.client is None:
+            raise CommandError('ERR', 'Commands can only be called while running a function')
+
+        self.check_deadline()
+        argv = make_argv(args)
+        if not argv:
+            raise CommandError('ERR', 'Please specify at least one argument for this redis lib call')
+
+        flags = self.server.get_command_flags(argv[0])
+        if 'noscript' in flags:
+            raise CommandError('ERR', 'This Redis command is not allowed from script')
+        if 'write' in flags:
+            if run.read_only:
+                raise CommandError('ERR', 'Write commands are not allowed from read-only scripts.')
+            run.did_write = True
+
+        # The function runs atomically, the command can not be suspended
+        run.client.suspendable = False
+        return native_reply(self.server.exec_native_command(argv, run.client))
+
+    def get_persistence_path(self):
+        return os.path.join(self.server.config['dir'], self.server.config['functions-filename'])
+
+    def save_to_disk(self):
+        '''
+        Persist the code of all the libraries, as a RESP array of bulk strings.
+        '''
+
+        codes = [RedisBulkStringSerializationObject(library.code) for library in self.libraries.values()]
+        path = self.get_persistence_path()
+        tmp_path = '%s.tmp-%d' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            f.write(RedisListSerializationObject(codes).to_resp())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def load_from_disk(self):
+        path = self.get_persistence_path()
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        loaded = resp_loads(data)
+        for item in loaded:
+            try:
+                self.load(item._value, replace=True, persist=False)
+            except CommandError as e:
+                logger.error('failed to load function library from %s: %s' % (path, e.args[1]))
+        logger.info('{} function libraries loaded from {}'.format(len(self.libraries), path))
@@ -0,0 +1,85 @@
+'''
+On-line tracking of the most accessed keys of a database, for ``HOTKEYS`` and ``redis-cli --hotkeys``.
+
+The accesses are counted with the Space-Saving algorithm: a fixed number of counters is kept, and a
+key without counter takes over the counter of the least accessed key, inheriting its count as the
+possible overestimation of its own. Every key accessed more often than the total number of accesses
+divided by the number of counters is guaranteed to have a counter.
+
+The counters are grouped by value, as in the Stream-Summary structure of the algorithm, so an access
+is a constant number of dict and set operations however many counters there are. Even so, counting
+every access would cost about a sixth of an embedded GET, so only a random sample of the accesses is
+counted, one in ``hotkeys-sample-rate``, and the counts are scaled back when reported.
+'''
+
+
+class HotKeys:
+
+    '''
+    :param capacity: number of counters, keys are reported out of the capacity most accessed ones
+    '''
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.clear()
+
+    def __len__(self):
+        return len(self.counts)
+
+    def clear(self):
+        # {key: count}, {key: overestimation of the count}, and {count: set of keys}
+        self.counts = {}
+        self.errors = {}
+        self.buckets = {}
+        # Lowest count, whose key is replaced by the next key without counter
+        self.min_count = 0
+
+    def add(self, key):
+        counts = self.counts
+        buckets = self.buckets
+        count = counts.get(key)
+        if count is not None:
+            bucket = buckets[count]
+            bucket.remove(key)
+            if not bucket:
+                del buckets[count]
+                if count == self.min_count:
+                    self.min_count = count + 1
+        elif len(counts) < self.capacity:
+            count = self.errors[key] = 0
+            self.min_count = 1
+        elif self.capacity > 0:
+            count = self.min_count
+            bucket = buckets[count]
+            replaced = bucket.pop()
+            del counts[replaced]
+            del self.errors[replaced]
+            self.errors[key] = count
+            if not bucket:
+                del buckets[count]
+                self.min_count = count + 1
+        else:
+            return
+
+        count += 1
+        counts[key] = count
+        bucket = buckets.get(count)
+        if bucket is None:
+            buckets[count] = {key}
+        else:
+            bucket.add(key)
+
+    def top(self, count):
+        '''
+        :return: the count keys with the highest counts, as (key, count, overestimation) tuples, the
+                 highest count first
+        :rtype: list
+        '''
+
+        result = []
+        for value in sorted(self.buckets, reverse=True):
+            for key in sorted(self.buckets[value]):
+                if len(result) == count:
+                    return result
+                result.append((key, value, self.errors[key]))
+        return result
@@ -0,0 +1,994 @@
+'''
+Storage engines of the keyspace of a database.
+
+An engine is a Keyspace: a mutable mapping of keys to objects, with ``get``, ``pop``, ``clear`` and
+``items``, which also implements the methods the database and the server need to scan, sample and
+maintain it, see Keyspace. An engine missing one of them is refused when its class is defined.
+
+Timeouts are not stored by the engines but by the database, see ``RedisDatabase.expires``.
+'''
+
+import abc
+import bisect
+import collections
+import collections.abc
+import itertools
+import os
+import pickle
+import random
+import sqlite3
+import sys
+import tempfile
+
+CURSOR_BITS = 64
+CURSOR_MASK = (1 << CURSOR_BITS) - 1
+
+
+def reverse_bits(value):
+    return int('{:064b}'.format(value)[::-1], 2)
+
+
+def next_cursor(cursor, mask):
+    '''
+    Increment the bits of cursor not covered by mask, starting from the most significant one.
+    '''
+
+    cursor |= ~mask & CURSOR_MASK
+    return reverse_bits((reverse_bits(cursor) + 1) & CURSOR_MASK)
+
+
+class ScanCursors:
+
+    '''
+    The SCAN cursors issued to a client by the engines resuming after the last returned key, which
+    does not fit in a cursor, see RadixKeyspace.
+
+    A cursor is a random 64 bits id, mapped to the prefix of its iteration and to that key. It stays
+    valid until the cursor returned with it is used, so a call can be retried, or until its
+    iteration completes. The cursors of the other clients never drop it.
+    '''
+
+    def __init__(self):
+        # {cursor: (prefix, last returned key, previous cursor of the iteration)}
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def resume(self, cursor, prefix):
+        '''
+        :return: the key to resume after
+        :rtype: bytes
+        :raises ValueError: the cursor was not issued for prefix, or was dropped
+        '''
+
+        entry = self.entries.get(cursor)
+        if entry is None or entry[0] != prefix:
+            raise ValueError('invalid cursor')
+        self.entries.pop(entry[2], None)
+        return entry[1]
+
+    def issue(self, prefix, key, previous):
+        cursor = 0
+        while not cursor or cursor in self.entries:
+            cursor = random.getrandbits(CURSOR_BITS)
+        self.entries[cursor] = (prefix, key, previous)
+        return cursor
+
+    def finish(self, cursor):
+        self.entries.pop(cursor, None)
+
+
+class KeyspaceMeta(abc.ABCMeta):
+
+    '''
+    Check that the engines implement all the abstract methods of Keyspace when they are defined,
+    instead of when they are first instantiated, e.g. once a configuration selects them.
+    '''
+
+    def __init__(cls, name, bases, namespace):
+        super(KeyspaceMeta, cls).__init__(name, bases, namespace)
+        if any(isinstance(base, KeyspaceMeta) for base in bases) and cls.__abstractmethods__:
+            raise TypeError('keyspace engine %s does not implement %s' % (
+                name, ', '.join(sorted(cls.__abstractmethods__))))
+
+
+class Keyspace(collections.abc.MutableMapping, metaclass=KeyspaceMeta):
+
+    '''
+    Base class of the keyspace engines.
+    '''
+
+    @abc.abstractmethod
+    def scan(self, cursor, count, prefix=b'', cursors=None):
+        '''
+        Collect about count keys starting with prefix, for SCAN. The cursor is 0 for the first call,
+        then the cursor returned by the previous call, an unsigned 64 bits integer.
+
+        :param cursors: the ScanCursors of the client, for the engines whose cursors are kept by the
+                        server
+        :return: the next cursor, 0 when the iteration is complete, and the collected keys
+        :rtype: tuple
+        :raises ValueError: the engine can not resume from cursor
+        '''
+
+    @abc.abstractmethod
+    def iter_prefix(self, prefix):
+        '''
+        Iterate over the keys starting with prefix, for KEYS.
+        '''
+
+    @abc.abstractmethod
+    def sample(self, count):
+        '''
+        :return: about count keys picked at random, for the eviction policies
+        :rtype: list
+        '''
+
+    @abc.abstractmethod
+    def memory_overhead(self):
+        '''
+        :return: the memory used besides the keys and the values, in bytes
+        :rtype: int
+        '''
+
+    @abc.abstractmethod
+    def configure(self, config):
+        '''
+        Apply the parameters of the server, called when they change.
+        '''
+
+    @abc.abstractmethod
+    def rehash(self, steps):
+        '''
+        Incremental maintenance, run by the server cron.
+
+        :return: whether there is more to do
+        :rtype: bool
+        '''
+
+    @abc.abstractmethod
+    def expand(self, size):
+        '''
+        A hint that the engine is about to hold size keys, e.g. when loading a snapshot.
+        '''
+
+    @abc.abstractmethod
+    def reclaim(self):
+        '''
+        Called between two commands, when the objects returned by the engine are not used anymore.
+        '''
+
+    @abc.abstractmethod
+    def close(self):
+        '''
+        Release the resources of the engine, once its content was moved to another one.
+        '''
+
+    def peek(self, key, default=None):
+        '''
+        Like ``get``, but leaving the engine unchanged, e.g. for the eviction policies to score a key
+        without loading its object back in memory. The object returned may be a copy.
+        '''
+
+        return self.get(key, default)
+
+    def freeze(self):
+        '''
+        Called before forking a child process that reads the keyspace, e.g. to write a snapshot:
+        until ``thaw`` is called as many times, what the child reads of the engine outside of the
+        memory it copied must not change.
+        '''
+
+    def thaw(self):
+        '''
+        Called once a child process forked after ``freeze`` exited.
+        '''
+
+    def reopen(self):
+        '''
+        Called in a forked child process, to reopen the resources it can not share with the parent.
+        '''
+
+
+class DictKeyspace(dict, Keyspace):
+
+    '''
+    The dict of a database keyspace, with an index of its keys that can be scanned with a cursor.
+
+    Keys are also stored in a table of buckets, by hash. It grows and shrinks by powers of two and
+    is rehashed incrementally, like the dict of Redis, and is scanned with the same reverse binary
+    cursor: every key present during the whole scan is returned at least once, even if the table was
+    resized between two calls.
+
+    Lookups are plain dict lookups. Only ``__setitem__``, ``__delitem__``, ``pop`` and ``clear`` keep
+    the index up to date, the other mutating methods of dict are not supported.
+
+    A bucket is ``None``, a single key, or a list of keys when several keys collide.
+    '''
+
+    MIN_SIZE = 16
+    # Buckets moved at most by a rehash step, and empty buckets visited at most while looking for one
+    REHASH_EMPTY_VISITS = 10
+
+    def __init__(self):
+        super(DictKeyspace, self).__init__()
+        self.tables = [[None] * self.MIN_SIZE, None]
+        self.rehash_index = -1
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self.index_add(key)
+        dict.__setitem__(self, key, value)
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, key)
+        self.index_remove(key)
+
+    def pop(self, key, *default):
+        if key not in self:
+            return dict.pop(self, key, *default)
+        value = dict.pop(self, key)
+        self.index_remove(key)
+        return value
+
+    def clear(self):
+        dict.clear(self)
+        self.tables = [[None] * self.MIN_SIZE, None]
+        self.rehash_index = -1
+
+    def unsupported(self, *args, **kwargs):
+        raise TypeError('DictKeyspace only supports item assignment, del, pop and clear')
+
+    def configure(self, config):
+        pass
+
+    def reclaim(self):
+        pass
+
+    def close(self):
+        pass
+
+    def expand(self, size):
+        '''
+        Size the index for size keys at once, instead of growing it by steps while they are added.
+        '''
+
+        if self.rehashing or len(self.tables[0]) >= size:
+            return
+        new_size = len(self.tables[0])
+        while new_size < size:
+            new_size *= 2
+        if not self:
+            self.tables = [[None] * new_size, None]
+        else:
+            self.start_rehash(new_size)
+
+    setdefault = update = popitem = unsupported
+
+    @property
+    def rehashing(self):
+        return self.rehash_index != -1
+
+    def index_add(self, key):
+        if self.rehashing:
+            self.rehash(1)
+        elif len(self) >= len(self.tables[0]):
+            self.start_rehash(len(self.tables[0]) * 2)
+
+        table = self.tables[1] if self.rehashing else self.tables[0]
+        self.bucket_add(table, key)
+
+    def index_remove(self, key):
+        if self.rehashing:
+            self.rehash(1)
+
+        if not self.bucket_remove(self.tables[0], key):
+            self.bucket_remove(self.tables[1], key)
+
+        size = len(self.tables[0])
+        if not self.rehashing and size > self.MIN_SIZE and len(self) * 8 < size:
+            self.start_rehash(size // 2)
+
+    @staticmethod
+    def bucket_add(table, key):
+        index = hash(key) & (len(table) - 1)
+        bucket = table[index]
+        if bucket is None:
+            table[index] = key
+        elif type(bucket) is list:
+            bucket.append(key)
+        else:
+            table[index] = [bucket, key]
+
+    @staticmethod
+    def bucket_remove(table, key):
+        index = hash(key) & (len(table) - 1)
+        bucket = table[index]
+        if type(bucket) is list:
+            try:
+                bucket.remove(key)
+            except ValueError:
+                return False
+            if len(bucket) == 1:
+                table[index] = bucket[0]
+            return True
+        elif bucket is not None and bucket == key:
+            table[index] = None
+            return True
+        return False
+
+    def start_rehash(self, size):
+        self.tables[1] = [None] * size
+        self.rehash_index = 0
+
+    def rehash(self, steps):
+        '''
+        Move at most steps buckets of the old table to the new one.
+
+        :return: whether the rehashing is still in progress
+        :rtype: bool
+        '''
+
+        if not self.rehashing:
+            return False
+
+        old_table, new_table = self.tables
+        empty_visits = steps * self.REHASH_EMPTY_VISITS
+        while steps and self.rehash_index < len(old_table):
+            bucket = old_table[self.rehash_index]
+            if bucket is None:
+                self.rehash_index += 1
+                empty_visits -= 1
+                if not empty_visits:
+                    return True
+                continue
+
+            if type(bucket) is list:
+                for key in bucket:
+                    self.bucket_add(new_table, key)
+            else:
+                self.bucket_add(new_table, bucket)
+            old_table[self.rehash_index] = None
+            self.rehash_index += 1
+            steps -= 1
+
+        if self.rehash_index >= len(old_table):
+            self.tables = [new_table, None]
+            self.rehash_index = -1
+            return False
+        return True
+
+    @staticmethod
+    def bucket_keys(bucket):
+        if bucket is None:
+            return ()
+        elif type(bucket) is list:
+            return list(bucket)
+        return (bucket, )
+
+    def sample(self, count):
+        '''
+        Pick about count keys from random buckets, like ``dictGetSomeKeys`` of Redis. The keys are not
+        uniformly distributed, which is good enough for eviction.
+        '''
+
+        keys = []
+        if not len(self):
+            return keys
+        tables = [table for table in self.tables if table is not None]
+        steps = 0
+        # Stop after 10 * count buckets, once at least one key was found
+        while len(keys) < count and (not keys or steps < count * 10):
+            table = tables[steps % len(tables)]
+            keys.extend(self.bucket_keys(table[random.getrandbits(64) & (len(table) - 1)]))
+            steps += 1
+        return keys
+
+    def memory_overhead(self):
+        '''
+        :return: the memory used by the hash tables, besides the keys and the values, in bytes
+        :rtype: int
+        '''
+
+        return sys.getsizeof(self) + sum(sys.getsizeof(table) for table in self.tables if table is not None)
+
+    def iter_prefix(self, prefix):
+        '''
+        Iterate over the keys starting with prefix. All the keys are visited.
+        '''
+
+        for key in list(self):
+            if key.startswith(prefix):
+                yield key
+
+    def scan(self, cursor, count, prefix=b'', cursors=None):
+        '''
+        Visit buckets from cursor until at least count keys were collected or ``10 * count`` buckets
+        were visited. The buckets are not grouped by prefix, keys not starting with prefix are only
+        filtered out.
+
+        :return: the next cursor, 0 when the iteration is complete, and the collected keys
+        :rtype: tuple
+        '''
+
+        keys = []
+        visits = count * 10
+        while True:
+            if not self.rehashing:
+                table = self.tables[0]
+                mask = len(table) - 1
+                keys.extend(self.bucket_keys(table[cursor & mask]))
+                cursor = next_cursor(cursor, mask)
+            else:
+                small, large = sorted(self.tables, key=len)
+                small_mask, large_mask = len(small) - 1, len(large) - 1
+                keys.extend(self.bucket_keys(small[cursor & small_mask]))
+                # Visit all the buckets of the larger table that are expansions of the bucket of the
+                # smaller one
+                while True:
+                    keys.extend(self.bucket_keys(large[cursor & large_mask]))
+                    cursor = next_cursor(cursor, large_mask)
+                    if not cursor & (small_mask ^ large_mask):
+                        break
+
+            visits -= 1
+            if cursor == 0 or len(keys) >= count or not visits:
+                if prefix:
+                    keys = [key for key in keys if key.startswith(prefix)]
+                return cursor, keys
+
+
+# Value of the nodes of a RadixKeyspace that are not a key
+_MISSING = object()
+
+
+class RadixLeaf:
+
+    '''
+    A node of a RadixKeyspace without children, the key of a node is the concatenation of the labels
+    from the root.
+    '''
+
+    __slots__ = ('label', 'value')
+
+    index = b''
+    children = None
+
+    def __init__(self, label, value):
+        self.label = label
+        self.value = value
+
+
+class RadixNode:
+
+    '''
+    A node of a RadixKeyspace with children, or without a value.
+
+    ``index`` holds the first byte of the label of every child, in the order of ``children``, which
+    is a sorted tuple, or None when there are none. Both are rebuilt when a child is added or removed,
+    the fan-out is small and they are smaller than a dict.
+    '''
+
+    __slots__ = ('label', 'index', 'children', 'value')
+
+    def __init__(self, label, value=_MISSING):
+        self.label = label
+        self.index = b''
+        self.children = None
+        self.value = value
+
+    def add_child(self, child):
+        byte = child.label[0]
+        if self.children is None:
+            self.index = bytes((byte, ))
+            self.children = (child, )
+            return
+        pos = bisect.bisect(self.index, byte)
+        self.index = self.index[:pos] + bytes((byte, )) + self.index[pos:]
+        self.children = self.children[:pos] + (child, ) + self.children[pos:]
+
+    def replace_child(self, pos, child):
+        self.children = self.children[:pos] + (child, ) + self.children[pos + 1:]
+
+    def remove_child(self, pos):
+        if len(self.children) == 1:
+            self.index = b''
+            self.children = None
+            return
+        self.index = self.index[:pos] + self.index[pos + 1:]
+        self.children = self.children[:pos] + self.children[pos + 1:]
+
+
+class RadixKeyspace(Keyspace):
+
+    '''
+    The keyspace of a database as a radix tree, like the rax of Redis.
+
+    Keys sharing a prefix share the nodes, and the bytes, of that prefix, and the keys are kept in
+    lexicographic order. So the keys under a prefix are listed in time proportional to their number,
+    and SCAN resumes after the last returned key: every key present during the whole scan is returned
+    exactly once. The key does not fit in a 64 bits cursor, the cursors are ids kept in the
+    ScanCursors of the client.
+
+    Lookups walk one node per distinct prefix, they are slower than the lookups of DictKeyspace.
+    '''
+
+    # Estimated average size of a node, with its label and its entries in the index of its parent
+    NODE_SIZE = 96
+
+    def __init__(self):
+        self.root = RadixNode(b'')
+        self.size = 0
+        self.nodes = 1
+
+    def __len__(self):
+        return self.size
+
+    def memory_overhead(self):
+        '''
+        :return: the estimated memory used by the nodes, which also hold the bytes of the keys
+        :rtype: int
+        '''
+
+        return self.nodes * self.NODE_SIZE
+
+    def find_node(self, key):
+        node = self.root
+        pos = 0
+        end = len(key)
+        while pos < end:
+            i = node.index.find(key[pos])
+            if i == -1:
+                return None
+            node = node.children[i]
+            if not key.startswith(node.label, pos):
+                return None
+            pos += len(node.label)
+        return node
+
+    def get(self, key, default=None):
+        node = self.find_node(key)
+        if node is None or node.value is _MISSING:
+            return default
+        return node.value
+
+    def __getitem__(self, key):
+        node = self.find_node(key)
+        if node is None or node.value is _MISSING:
+            raise KeyError(key)
+        return node.value
+
+    def __contains__(self, key):
+        node = self.find_node(key)
+        return node is not None and node.value is not _MISSING
+
+    def __setitem__(self, key, value):
+        node = self.root
+        pos = 0
+        end = len(key)
+        while pos < end:
+            i = node.index.find(key[pos])
+            if i == -1:
+                node.add_child(RadixLeaf(key[pos:], value))
+                self.size += 1
+                self.nodes += 1
+                return
+
+            child = node.children[i]
+            label = child.label
+            if key.startswith(label, pos):
+                pos += len(label)
+                if type(child) is RadixLeaf and pos < end:
+                    child = RadixNode(label, child.value)
+                    node.replace_child(i, child)
+                node = child
+                continue
+
+            # Split the label of child where it differs from the key
+            common = 1
+            while pos + common < end and label[common] == key[pos + common]:
+                common += 1
+            middle = RadixNode(label[:common])
+            child.label = label[common:]
+            middle.add_child(child)
+            node.replace_child(i, middle)
+            self.nodes += 1
+            node = middle
+            pos += common
+
+        if node.value is _MISSING:
+            self.size += 1
+        node.value = value
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        # (parent, position in its children) of every node down to the key
+        path = []
+        node = self.root
+        pos = 0
+        end = len(key)
+        while pos < end:
+            i = node.index.find(key[pos])
+            if i == -1 or not key.startswith(node.children[i].label, pos):
+                node = None
+                break
+            path.append((node, i))
+            node = node.children[i]
+            pos += len(node.label)
+
+        if node is None or node.value is _MISSING:
+            if default:
+                return default[0]
+            raise KeyError(key)
+
+        value = node.value
+        node.value = _MISSING
+        self.size -= 1
+
+        # Remove the node, or merge it with its only child, and then merge its parent if it is left
+        # with a single child
+        if node.children is None and path:
+            parent, i = path.pop()
+            parent.remove_child(i)
+            self.nodes -= 1
+            node = parent
+        if node is not self.root and node.value is _MISSING and node.children is not None \
+                and len(node.children) == 1:
+            parent, i = path[-1]
+            child = node.children[0]
+            child.label = node.label + child.label
+            parent.replace_child(i, child)
+            self.nodes -= 1
+        return value
+
+    def clear(self):
+        self.root = RadixNode(b'')
+        self.size = 0
+        self.nodes = 1
+
+    def rehash(self, steps):
+        return False
+
+    def expand(self, size):
+        pass
+
+    def configure(self, config):
+        pass
+
+    def reclaim(self):
+        pass
+
+    def close(self):
+        pass
+
+    def walk(self, node, key):
+        '''
+        Items of the subtree of node, whose key is key, in lexicographic order. The tree is walked
+        with a stack rather than by recursion, a long chain of nested keys would exceed the
+        recursion limit.
+        '''
+
+        stack = [(node, key)]
+        while stack:
+            node, key = stack.pop()
+            if node.value is not _MISSING:
+                yield key, node.value
+            if node.children is not None:
+                stack.extend((child, key + child.label) for child in reversed(node.children))
+
+    def walk_after(self, node, key, after):
+        '''
+        Items of the subtree of node, whose key is key, that are greater than after.
+        '''
+
+        stack = [(node, key)]
+        while stack:
+            node, key = stack.pop()
+            head = after[:len(key)]
+            if key > head:
+                yield from self.walk(node, key)
+            elif key == head and node.children is not None:
+                # node is a prefix of after, or after itself
+                stack.extend((child, key + child.label) for child in reversed(node.children))
+
+    def find_prefix(self, prefix):
+        '''
+        :return: the top node of the keys starting with prefix and its key, or ``(None, None)``
+        :rtype: tuple
+        '''
+
+        node = self.root
+        pos = 0
+        end = len(prefix)
+        while pos < end:
+            i = node.index.find(prefix[pos])
+            if i == -1:
+                return None, None
+            node = node.children[i]
+            label = node.label
+            if not prefix.startswith(label, pos):
+                if label.startswith(prefix[pos:]):
+                    return node, prefix[:pos] + label
+                return None, None
+            pos += len(label)
+        return node, prefix
+
+    def __iter__(self):
+        for key, value in self.walk(self.root, b''):
+            yield key
+
+    def items(self):
+        return list(self.walk(self.root, b''))
+
+    def iter_prefix(self, prefix):
+        '''
+        Iterate over the keys starting with prefix, in lexicographic order.
+        '''
+
+        node, key = self.find_prefix(prefix)
+        if node is not None:
+            for key, value in self.walk(node, key):
+                yield key
+
+    def sample(self, count):
+        '''
+        Pick count keys, each by a random walk from the root. Keys in small subtrees are more likely to
+        be picked, which is good enough for eviction.
+        '''
+
+        keys = []
+        if not self.size:
+            return keys
+        while len(keys) < count:
+            node, key = self.root, b''
+            while True:
+                children = node.children or ()
+                choice = random.randrange(len(children) + (node.value is not _MISSING))
+                if choice == len(children):
+                    keys.append(key)
+                    break
+                node = children[choice]
+                key += node.label
+        return keys
+
+    def scan(self, cursor, count, prefix=b'', cursors=None):
+        '''
+        Return the next count keys starting with prefix, after the last key returned with cursor.
+
+        :param cursors: the ScanCursors the cursor was issued from, required
+        :return: the next cursor, 0 when the iteration is complete, and the collected keys
+        :rtype: tuple
+        :raises ValueError: the cursor is unknown, or was dropped
+        '''
+
+        if cursor != 0:
+            after = cursors.resume(cursor, prefix)
+
+        node, key = self.find_prefix(prefix)
+        if node is None:
+            keys = []
+        elif cursor == 0:
+            keys = [key for key, value in itertools.islice(self.walk(node, key), count)]
+        else:
+            keys = [key for key, value in itertools.islice(self.walk_after(node, key, after), count)]
+
+        if len(keys) < count:
+            cursors.finish(cursor)
+            return 0, keys
+        return cursors.issue(prefix, keys[-1], cursor), keys
+
+
+# Value of the keys of a SpillKeyspace stored on disk
+_SPILLED = object()
+
+
+class SpillKeyspace(Keyspace):
+
+    '''
+    A keyspace keeping the recently used objects in memory and the others on disk, in a SQLite
+    database, so a dataset larger than the memory can be stored.
+
+    All the keys are kept in memory, in a DictKeyspace also used for SCAN and sampling, so the
+    existence of a key is known without reading the disk. The objects in memory are kept in LRU
+    order, and when their size exceeds ``spill-memory`` the least recently used ones are pickled
+    to disk by ``reclaim``, between two commands. Reading a key on disk loads its object back in
+    memory and removes it from the disk, but ``peek`` and ``items``, used to sample and save the
+    keys, only read copies of the objects on disk.
+
+    The size of an object is measured when it is stored or loaded, values growing in place are
+    only measured again when the key is stored again.
+
+    The disk database is a temporary file in ``dir``, removed when the engine is closed: it does not
+    persist anything, it only extends the memory. A child process forked to save the keys reads it
+    through its own connection, and while the engine is frozen for a child it does not write to it:
+    the rows of the objects loaded back in memory are only deleted when the child exits, and no
+    object is spilled in the meantime.
+    '''
+
+    def __init__(self):
+        self.index = DictKeyspace()
+        # {key: size} of the objects in memory, least recently used first
+        self.lru = collections.OrderedDict()
+        self.memory = 0
+        self.max_memory = 64 * 1024 * 1024
+        self.directory = None
+        self.path = None
+        self.connection = None
+        self.spilled = 0
+        # Number of child processes reading the disk, and keys whose rows are kept for them
+        self.frozen = 0
+        self.stale = set()
+        # Cumulative numbers of objects written to and read from the disk
+        self.stat_spills = 0
+        self.stat_loads = 0
+
+    def configure(self, config):
+        self.max_memory = config['spill-memory']
+        self.directory = config['dir']
+
+    def expand(self, size):
+        self.index.expand(size)
+
+    def open(self):
+        fd, self.path = tempfile.mkstemp(prefix='spill-', suffix='.sqlite', dir=self.directory)
+        os.close(fd)
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        # The content does not need to survive a crash
+        self.connection.execute('PRAGMA journal_mode = OFF')
+        self.connection.execute('PRAGMA synchronous = OFF')
+        self.connection.execute('CREATE TABLE objects (key BLOB PRIMARY KEY, object BLOB) WITHOUT ROWID')
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+    def freeze(self):
+        self.frozen += 1
+
+    def thaw(self):
+        self.frozen -= 1
+        if not self.frozen and self.stale:
+            self.connection.executemany('DELETE FROM objects WHERE key = ?',
+                                        [(key, ) for key in self.stale])
+            self.stale.clear()
+
+    def reopen(self):
+        # SQLite connections can not be used across a fork, the parent's one is left unused
+        if self.connection is not None:
+            self.connection = sqlite3.connect(self.path, isolation_level=None)
+            self.connection.execute('PRAGMA query_only = ON')
+
+    def delete_row(self, key):
+        if self.frozen:
+            self.stale.add(key)
+        else:
+            self.connection.execute('DELETE FROM objects WHERE key = ?', (key, ))
+
+    def __len__(self):
+        return len(self.index)
+
+    def __iter__(self):
+        return iter(list(self.index))
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def read(self, key):
+        row = self.connection.execute('SELECT object FROM objects WHERE key = ?', (key, )).fetchone()
+        return pickle.loads(row[0])
+
+    def load(self, key):
+        obj = self.read(key)
+        self.delete_row(key)
+        self.spilled -= 1
+        self.stat_loads += 1
+        self.index[key] = obj
+        self.lru[key] = obj.memory
+        self.memory += obj.memory
+        return obj
+
+    def get(self, key, default=None):
+        obj = self.index.get(key, _SPILLED)
+        if obj is _SPILLED:
+            if key not in self.index:
+                return default
+            return self.load(key)
+        self.lru.move_to_end(key)
+        return obj
+
+    def peek(self, key, default=None):
+        obj = self.index.get(key, default)
+        if obj is _SPILLED:
+            return self.read(key)
+        return obj
+
+    def __getitem__(self, key):
+        obj = self.get(key, _SPILLED)
+        if obj is _SPILLED:
+            raise KeyError(key)
+        return obj
+
+    def __setitem__(self, key, obj):
+        if self.index.get(key) is _SPILLED:
+            self.delete_row(key)
+            self.spilled -= 1
+        self.index[key] = obj
+        self.memory += obj.memory - self.lru.pop(key, 0)
+        self.lru[key] = obj.memory
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        if key not in self.index:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        obj = self.get(key)
+        self.index.pop(key)
+        self.memory -= self.lru.pop(key)
+        return obj
+
+    def clear(self):
+        if self.spilled and self.frozen:
+            self.stale.update(key for key, obj in self.index.items() if obj is _SPILLED)
+        elif self.spilled:
+            self.connection.execute('DELETE FROM objects')
+        self.index.clear()
+        self.lru.clear()
+        self.memory = 0
+        self.spilled = 0
+
+    def items(self):
+        for key in list(self.index):
+            yield key, self.peek(key)
+
+    def reclaim(self):
+        '''
+        Write the least recently used objects to disk until the objects in memory fit in
+        ``spill-memory``.
+        '''
+
+        if self.memory <= self.max_memory or self.frozen:
+            return
+        if self.connection is None:
+            self.open()
+        rows = []
+        while self.memory > self.max_memory and len(self.lru) > 1:
+            key, size = self.lru.popitem(last=False)
+            rows.append((key, pickle.dumps(self.index[key], pickle.HIGHEST_PROTOCOL)))
+            self.index[key] = _SPILLED
+            self.memory -= size
+        self.connection.executemany('INSERT INTO objects VALUES (?, ?)', rows)
+        self.spilled += len(rows)
+        self.stat_spills += len(rows)
+
+    def memory_overhead(self):
+        return self.index.memory_overhead() + sys.getsizeof(self.lru)
+
+    def rehash(self, steps):
+        return self.index.rehash(steps)
+
+    def iter_prefix(self, prefix):
+        return self.index.iter_prefix(prefix)
+
+    def sample(self, count):
+        return self.index.sample(count)
+
+    def scan(self, cursor, count, prefix=b'', cursors=None):
+        return self.index.scan(cursor, count, prefix, cursors)
+
+
+KEYSPACE_BACKENDS = {
+    'dict': DictKeyspace,
+    'radix': RadixKeyspace,
+    'spill': SpillKeyspace,
+}
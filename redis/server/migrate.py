@@ -0,0 +1,98 @@
+'''
+Connections of MIGRATE to the target instances.
+
+MIGRATE runs synchronously, like the real command: the keys are serialized with DUMP's format, sent
+to the target as a single pipeline of RESTORE commands, and the source waits for all the replies
+before deleting the keys the target acknowledged. The connection is then kept for the next MIGRATE
+to the same target, which saves the connection setup when keys are moved by batches. At most
+``MIGRATE_CACHED_CONNECTIONS`` targets are kept, and connections idle for
+``MIGRATE_CONNECTION_IDLE_TIME`` seconds are closed by the server cron.
+'''
+
+import collections
+import logging
+from time import monotonic
+
+from redis.client.connection import RedisConnection
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_CACHED_CONNECTIONS = 16
+MIGRATE_CONNECTION_IDLE_TIME = 10
+
+
+class MigrateConnection:
+
+    def __init__(self, host, port, timeout):
+        self.connection = RedisConnection(host, port, timeout)
+        # The database selected on the target
+        self.db = 0
+        self.last_use = monotonic()
+
+
+class MigrateConnectionPool:
+
+    def __init__(self):
+        # {(host, port): MigrateConnection}, the least recently used first
+        self.connections = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.connections)
+
+    def execute(self, host, port, db, timeout, commands):
+        '''
+        Run a pipeline of commands against database db of the target.
+
+        :param timeout: the timeout of every I/O operation, in seconds
+        :return: the native replies of the commands, errors in place of the failed ones
+        :rtype: list
+        :raises OSError: the target could not be reached or timed out, the connection is dropped
+        '''
+
+        target = (host, port)
+        conn = self.connections.pop(target, None)
+        if conn is not None:
+            try:
+                return self.run(target, conn, db, timeout, commands)
+            except ConnectionError:
+                # Closed by the target since last used, retried once on a new connection
+                logger.debug('MIGRATE connection to %s:%d closed, reconnecting' % target)
+        conn = MigrateConnection(host, port, timeout)
+        return self.run(target, conn, db, timeout, commands)
+
+    def run(self, target, conn, db, timeout, commands):
+        conn.connection.sock.settimeout(timeout)
+        select = conn.db != db
+        if select:
+            commands = [(b'SELECT', db)] + commands
+        try:
+            replies = conn.connection.execute_many(commands)
+        except (OSError, ValueError):
+            conn.connection.close()
+            raise
+        if select:
+            error = replies.pop(0)
+            if isinstance(error, Exception):
+                conn.connection.close()
+                return [error] * len(replies)
+            conn.db = db
+        conn.last_use = monotonic()
+        self.connections[target] = conn
+        while len(self.connections) > MIGRATE_CACHED_CONNECTIONS:
+            self.connections.popitem(last=False)[1].connection.close()
+        return replies
+
+    def cron(self):
+        '''
+        Close the connections idle for more than ``MIGRATE_CONNECTION_IDLE_TIME``.
+        '''
+
+        now = monotonic()
+        for target, conn in list(self.connections.items()):
+            if now - conn.last_use > MIGRATE_CONNECTION_IDLE_TIME:
+                del self.connections[target]
+                conn.connection.close()
+
+    def close(self):
+        while self.connections:
+            self.connections.popitem()[1].connection.close()
@@ -0,0 +1,826 @@
+'''
+Snapshots of the databases in the RDB file format, written by SAVE and BGSAVE and loaded on startup.
+
+A file starts with ``REDIS`` and the 4 digits version, followed by auxiliary fields, then the keys
+of every database after a SELECTDB opcode, and ends with the EOF opcode and the CRC-64 of everything
+before it, little endian, or 0 when ``rdbchecksum`` is disabled. Every key is an optional
+EXPIRETIME_MS opcode with its timeout in milliseconds, the type of its value, the key and the value:
+
+* strings are a length followed by the bytes, or an integer encoding for small integers
+* lists are the number of elements followed by the elements, as strings
+
+Lengths are encoded on 1, 2, 5 or 9 bytes depending on their value, see ``encode_length``.
+
+With ``rdb-key-index`` enabled, the keys are also written to a key index, the value of a
+``key-index`` auxiliary field after the databases. For every database it holds the database id and
+its number of keys on 8 bytes, then for every key the key, the offset of its type in the file and
+its timeout in milliseconds, 0 for none, on 8 bytes each. A ``key-index-offset`` auxiliary field
+with the offset of the index on 8 bytes comes right before the EOF opcode, so it is found at a fixed
+distance from the end of the file. Other loaders skip both fields like any auxiliary field.
+
+Delta checkpoints, see ``redis.server.checkpoint``, are written in the same format, with two more
+opcodes: DELETED followed by a deleted key, and FLUSHDB after SELECTDB when the database was
+flushed.
+
+``load_lazily`` only reads the index, and the values are decoded from the memory mapped file when
+their keys are first accessed, or in the background, see ``LazySnapshotKeyspace``.
+'''
+
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from redis.common.crc64 import crc64
+from redis.common.objects import RedisStringObject, RedisListObject
+from .keyspace import Keyspace
+
+RDB_VERSION = 9
+
+# Only in the delta checkpoints
+OPCODE_DELETED = 0xf0
+OPCODE_FLUSHDB = 0xf1
+
+OPCODE_AUX = 0xfa
+OPCODE_RESIZEDB = 0xfb
+OPCODE_EXPIRETIME_MS = 0xfc
+OPCODE_SELECTDB = 0xfe
+OPCODE_EOF = 0xff
+
+TYPE_STRING = 0
+TYPE_LIST = 1
+
+# Special encodings of strings, with the 2 most significant bits of the length set
+ENCODING_INT8 = 0
+ENCODING_INT16 = 1
+ENCODING_INT32 = 2
+
+# Size of the writes to the file
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+KEY_INDEX_AUX = b'key-index'
+KEY_INDEX_OFFSET_AUX = b'key-index-offset'
+# The key-index-offset field up to its value, followed by the value, the EOF opcode and the checksum
+KEY_INDEX_TRAILER = bytes((OPCODE_AUX, len(KEY_INDEX_OFFSET_AUX))) + KEY_INDEX_OFFSET_AUX + b'\x08'
+
+
+class RDBError(Exception):
+    pass
+
+
+class RDBChecksumError(RDBError):
+    pass
+
+
+def encode_length(length):
+    if length < 0x40:
+        return bytes((length,))
+    if length < 0x4000:
+        return bytes((0x40 | length >> 8, length & 0xff))
+    if length <= 0xffffffff:
+        return b'\x80' + struct.pack('>I', length)
+    return b'\x81' + struct.pack('>Q', length)
+
+
+def encode_string(value):
+    '''
+    :param value: bytes, or int for the strings with the int encoding
+    '''
+
+    if value.__class__ is int:
+        if -0x80 <= value < 0x80:
+            return struct.pack('<Bb', 0xc0 | ENCODING_INT8, value)
+        if -0x8000 <= value < 0x8000:
+            return struct.pack('<Bh', 0xc0 | ENCODING_INT16, value)
+        if -0x80000000 <= value < 0x80000000:
+            return struct.pack('<Bi', 0xc0 | ENCODING_INT32, value)
+        value = str(value).encode()
+    return encode_length(len(value)) + value
+
+
+def encode_object(obj):
+    '''
+    :return: the type of obj and the encoding of its value
+    :rtype: tuple
+    '''
+
+    if obj.__class__ is RedisStringObject:
+        value = obj.value
+        if value.__class__ is not int:
+            value = obj.get_bytes()
+        return TYPE_STRING, encode_string(value)
+    return TYPE_LIST, encode_length(len(obj)) + b''.join(encode_string(item) for item in obj)
+
+
+class RDBWriter:
+
+    '''
+    Write a snapshot to a file object, checksummed while it is written.
+
+    :param key_index: whether to write the key index, which is built in a temporary file while the
+                      keys are written
+    '''
+
+    def __init__(self, stream, checksum=True, key_index=False):
+        self.stream = stream
+        self.checksum = checksum
+        self.crc = 0
+        self.buffer = bytearray()
+        self.written = 0
+        self.key_index = tempfile.TemporaryFile() if key_index else None
+
+    def write(self, data):
+        self.buffer += data
+        if len(self.buffer) >= WRITE_BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self.checksum:
+            self.crc = crc64(self.buffer, self.crc)
+        self.stream.write(self.buffer)
+        self.written += len(self.buffer)
+        self.buffer = bytearray()
+
+    def write_header(self, aux=()):
+        '''
+        :param aux: more auxiliary fields, as (name, value) pairs of str
+        '''
+
+        self.write(('REDIS%04d' % RDB_VERSION).encode())
+        for name, value in (('redis-ver', '2.8.0'), ('redis-bits', '64'),
+                            ('ctime', str(int(time.time())))) + tuple(aux):
+            self.write(bytes((OPCODE_AUX,)) + encode_string(name.encode()) +
+                       encode_string(value.encode()))
+
+    def write_database(self, db):
+        '''
+        :return: the number of keys written
+        :rtype: int
+        '''
+
+        expires = db.expires
+        self.write(bytes((OPCODE_SELECTDB,)) + encode_length(db.idnum) + bytes((OPCODE_RESIZEDB,)) +
+                   encode_length(len(db.key_space)) + encode_length(len(expires)))
+        index = self.key_index
+        if index is not None:
+            index.write(encode_length(db.idnum))
+            count_offset = index.tell()
+            index.write(struct.pack('<Q', 0))
+        now = time.time()
+        keys = 0
+        for key, obj in db.key_space.items():
+            expire_time = expires.get(key)
+            expire_ms = 0
+            if expire_time is not None:
+                if expire_time < now:
+                    continue
+                expire_ms = int(expire_time * 1000)
+                self.write(struct.pack('<BQ', OPCODE_EXPIRETIME_MS, expire_ms))
+            if index is not None:
+                index.write(encode_string(key) + struct.pack('<QQ', self.written + len(self.buffer),
+                                                             expire_ms))
+            value_type, value = encode_object(obj)
+            self.write(bytes((value_type,)) + encode_string(key) + value)
+            keys += 1
+        if index is not None:
+            index.seek(count_offset)
+            index.write(struct.pack('<Q', keys))
+            index.seek(0, os.SEEK_END)
+        return keys
+
+    def write_changes(self, db, keys, flushed):
+        '''
+        Write the current state of keys of db for a delta checkpoint, the keys missing from db as
+        deleted.
+
+        :param flushed: whether db was flushed before the keys changed
+        :return: the number of keys written
+        :rtype: int
+        '''
+
+        key_space = db.key_space
+        expires = db.expires
+        self.write(bytes((OPCODE_SELECTDB,)) + encode_length(db.idnum))
+        if flushed:
+            self.write(bytes((OPCODE_FLUSHDB,)))
+        now = time.time()
+        for key in keys:
+            obj = key_space.get(key)
+            expire_time = expires.get(key)
+            if obj is None or expire_time is not None and expire_time < now:
+                self.write(bytes((OPCODE_DELETED,)) + encode_string(key))
+                continue
+            if expire_time is not None:
+                self.write(struct.pack('<BQ', OPCODE_EXPIRETIME_MS, int(expire_time * 1000)))
+            value_type, value = encode_object(obj)
+            self.write(bytes((value_type,)) + encode_string(key) + value)
+        return len(keys)
+
+    def write_key_index(self):
+        index, self.key_index = self.key_index, None
+        offset = self.written + len(self.buffer)
+        self.write(bytes((OPCODE_AUX,)) + encode_string(KEY_INDEX_AUX) + encode_length(index.tell()))
+        index.seek(0)
+        while True:
+            chunk = index.read(WRITE_BUFFER_SIZE)
+            if not chunk:
+                break
+            self.write(chunk)
+        index.close()
+        self.write(KEY_INDEX_TRAILER + struct.pack('<Q', offset))
+
+    def write_footer(self):
+        if self.key_index is not None:
+            self.write_key_index()
+        self.write(bytes((OPCODE_EOF,)))
+        self.flush()
+        self.stream.write(struct.pack('<Q', self.crc if self.checksum else 0))
+        self.written += 8
+
+
+def save(dbs, path, checksum=True, key_index=True, aux=(), changes=None):
+    '''
+    Write a snapshot of dbs to path. The snapshot is written to a temporary file first, renamed to
+    path once complete, so path always holds a complete snapshot.
+
+    :param key_index: whether to write the key index used by load_lazily
+    :param aux: more auxiliary fields, as (name, value) pairs of str
+    :param changes: write a delta checkpoint of these keys only, as {database id: (keys, whether
+                    the database was flushed)}
+
+    :return: the number of keys and bytes written
+    :rtype: tuple
+    '''
+
+    temp_path = os.path.join(os.path.dirname(path), 'temp-%d.rdb' % os.getpid())
+    keys = 0
+    try:
+        with open(temp_path, 'wb') as stream:
+            writer = RDBWriter(stream, checksum, key_index and changes is None)
+            writer.write_header(aux)
+            for db in dbs:
+                if changes is not None:
+                    db_keys, flushed = changes.get(db.idnum, ((), False))
+                    if db_keys or flushed:
+                        keys += writer.write_changes(db, db_keys, flushed)
+                elif db.key_space:
+                    keys += writer.write_database(db)
+            writer.write_footer()
+            stream.flush()
+            os.fsync(stream.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    return keys, writer.written
+
+
+class RDBReader:
+
+    '''
+    Parse a snapshot from a buffer, e.g. a memory mapped file.
+
+    :param on_resize: called with the database id and its number of keys before its keys
+    '''
+
+    def __init__(self, data, on_resize=None):
+        self.data = data
+        self.offset = 0
+        self.on_resize = on_resize
+
+    def read(self, size):
+        offset = self.offset
+        self.offset = offset + size
+        if self.offset > len(self.data):
+            raise RDBError('unexpected end of file')
+        return self.data[offset:offset + size]
+
+    def read_byte(self):
+        offset = self.offset
+        self.offset += 1
+        return self.data[offset]
+
+    def read_length(self):
+        '''
+        :return: the length, and whether it is a special string encoding
+        :rtype: tuple
+        '''
+
+        first = self.read_byte()
+        kind = first >> 6
+        if kind == 0:
+            return first, False
+        if kind == 1:
+            return (first & 0x3f) << 8 | self.read_byte(), False
+        if kind == 3:
+            return first & 0x3f, True
+        if first == 0x80:
+            return struct.unpack('>I', self.read(4))[0], False
+        if first == 0x81:
+            return struct.unpack('>Q', self.read(8))[0], False
+        raise RDBError('invalid length encoding 0x%02x' % first)
+
+    def read_string(self):
+        '''
+        :return: bytes, or int for the integer encodings
+        '''
+
+        # Fast path for the strings shorter than 64 bytes
+        data, offset = self.data, self.offset
+        first = data[offset]
+        if first < 0x40:
+            end = self.offset = offset + 1 + first
+            if end > len(data):
+                raise RDBError('unexpected end of file')
+            return data[offset + 1:end]
+
+        length, encoded = self.read_length()
+        if not encoded:
+            return self.read(length)
+        if length == ENCODING_INT8:
+            return struct.unpack('<b', self.read(1))[0]
+        if length == ENCODING_INT16:
+            return struct.unpack('<h', self.read(2))[0]
+        if length == ENCODING_INT32:
+            return struct.unpack('<i', self.read(4))[0]
+        raise RDBError('unsupported string encoding %d' % length)
+
+    def read_bytes(self):
+        value = self.read_string()
+        return str(value).encode() if value.__class__ is int else value
+
+    def read_header(self):
+        magic = self.read(9)
+        if magic[:5] != b'REDIS':
+            raise RDBError('not a RDB file')
+        version = int(magic[5:])
+        if version > RDB_VERSION:
+            raise RDBError("can't handle RDB format version %d" % version)
+
+    def read_entries(self):
+        '''
+        Generate the keys of the snapshot, the timeouts of the expired keys are not checked.
+
+        :return: generator of (database id, key, object, expire time) tuples, the expire time is an
+                 absolute unix time in seconds or None. In delta checkpoints the object of the
+                 deleted keys is None, and a flush of the database is a tuple with a None key.
+        '''
+
+        idnum = 0
+        expire_time = None
+        while True:
+            opcode = self.read_byte()
+            if opcode == OPCODE_EOF:
+                return
+            elif opcode == OPCODE_SELECTDB:
+                idnum = self.read_length()[0]
+            elif opcode == OPCODE_RESIZEDB:
+                size = self.read_length()[0]
+                self.read_length()
+                if self.on_resize is not None:
+                    self.on_resize(idnum, size)
+            elif opcode == OPCODE_AUX:
+                if self.read_string() == KEY_INDEX_AUX:
+                    # Skipped without copying it
+                    length = self.read_length()[0]
+                    self.offset += length
+                else:
+                    self.read_string()
+            elif opcode == OPCODE_EXPIRETIME_MS:
+                expire_time = struct.unpack('<Q', self.read(8))[0] / 1000.0
+            elif opcode == OPCODE_DELETED:
+                yield idnum, self.read_bytes(), None, None
+            elif opcode == OPCODE_FLUSHDB:
+                yield idnum, None, None, None
+            elif opcode in (TYPE_STRING, TYPE_LIST):
+                key = self.read_bytes()
+                yield idnum, key, self.read_object(opcode), expire_time
+                expire_time = None
+            else:
+                raise RDBError('unknown opcode %d at offset %d' % (opcode, self.offset - 1))
+
+    def read_object(self, value_type):
+        if value_type == TYPE_STRING:
+            return RedisStringObject(self.read_string())
+        elif value_type == TYPE_LIST:
+            length = self.read_length()[0]
+            return RedisListObject([self.read_bytes() for i in range(length)])
+        raise RDBError('unsupported value type %d at offset %d' % (value_type, self.offset - 1))
+
+
+def dump(obj):
+    '''
+    Serialize obj for DUMP: its type and value as in the RDB files, followed by the RDB version on
+    2 bytes and the CRC-64 of all the preceding bytes on 8 bytes, little endian.
+
+    :rtype: bytes
+    '''
+
+    value_type, value = encode_object(obj)
+    payload = bytes((value_type,)) + value + struct.pack('<H', RDB_VERSION)
+    return payload + struct.pack('<Q', crc64(payload))
+
+
+def restore(payload):
+    '''
+    Deserialize an object serialized by dump.
+
+    :rtype: RedisObject
+    :raises RDBChecksumError: the version or the checksum is wrong
+    :raises RDBError: the payload is corrupt
+    '''
+
+    if len(payload) < 11:
+        raise RDBError('payload too short')
+    version, expected = struct.unpack('<HQ', payload[-10:])
+    if version > RDB_VERSION or crc64(payload[:-8]) != expected:
+        raise RDBChecksumError('DUMP payload version or checksum are wrong')
+    reader = RDBReader(payload[:-10])
+    try:
+        obj = reader.read_object(reader.read_byte())
+    except IndexError:
+        raise RDBError('unexpected end of payload')
+    if reader.offset != len(reader.data):
+        raise RDBError('trailing data after the value')
+    return obj
+
+
+def read_aux(path):
+    '''
+    :return: the auxiliary fields at the beginning of the snapshot at path, as {name: value} of
+             bytes
+    :rtype: dict
+    :raises RDBError: the file is corrupt
+    '''
+
+    with open(path, 'rb') as stream:
+        reader = RDBReader(stream.read(64 * 1024))
+    aux = {}
+    try:
+        reader.read_header()
+        while reader.read_byte() == OPCODE_AUX:
+            name = reader.read_bytes()
+            aux[name] = reader.read_bytes()
+    except IndexError:
+        pass
+    return aux
+
+
+def verify_checksum(data):
+    '''
+    :raises RDBChecksumError: the checksum at the end of data does not match
+    '''
+
+    expected = struct.unpack('<Q', data[-8:])[0]
+    if not expected:
+        # Written with rdbchecksum disabled
+        return
+    crc = 0
+    for offset in range(0, len(data) - 8, WRITE_BUFFER_SIZE):
+        crc = crc64(data[offset:min(offset + WRITE_BUFFER_SIZE, len(data) - 8)], crc)
+    if crc != expected:
+        raise RDBChecksumError('wrong RDB checksum, expected %016x got %016x' % (expected, crc))
+
+
+def load(server, path):
+    '''
+    Load the snapshot at path into the databases of server. Keys expired in the meantime are
+    skipped, keys already in the databases are replaced.
+
+    :return: the number of keys loaded
+    :rtype: int
+    :raises RDBError: the file is corrupt
+    '''
+
+    with open(path, 'rb') as stream:
+        size = os.fstat(stream.fileno()).st_size
+        if size < 18:
+            raise RDBError('truncated RDB file')
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            verify_checksum(data)
+
+            def resize(idnum, size):
+                key_space = server.get_database(idnum).key_space
+                key_space.expand(len(key_space) + size)
+
+            reader = RDBReader(data, resize)
+            reader.read_header()
+            now = time.time()
+            keys = 0
+            db = None
+            for idnum, key, obj, expire_time in reader.read_entries():
+                if expire_time is not None and expire_time < now:
+                    continue
+                if db is None or db.idnum != idnum:
+                    db = server.get_database(idnum)
+                db.put_key(key, obj, expire_time)
+                keys += 1
+        except IndexError:
+            raise RDBError('unexpected end of file')
+        finally:
+            data.close()
+    return keys
+
+
+class LazySnapshot:
+
+    '''
+    A snapshot loaded by load_lazily, memory mapped until the values of all its keys are loaded.
+
+    :param on_loaded: called once all the values are loaded
+    '''
+
+    def __init__(self, stream, data, on_loaded=None):
+        self.stream = stream
+        self.data = data
+        self.reader = RDBReader(data)
+        self.on_loaded = on_loaded
+        self.keyspaces = []
+        self.keys = 0
+        # Values loaded on access and by hydrate
+        self.stat_loaded_on_access = 0
+        self.stat_hydrated = 0
+
+    @property
+    def pending(self):
+        '''
+        :return: the number of keys whose value is not loaded yet
+        :rtype: int
+        '''
+
+        return sum(key_space.unloaded for key_space in self.keyspaces)
+
+    def read_object(self, key, offset):
+        '''
+        :return: the value of key, at offset in the file
+        :raises RDBError: the file does not match the key index
+        '''
+
+        reader = self.reader
+        reader.offset = offset
+        try:
+            value_type = reader.read_byte()
+            if reader.read_bytes() != key:
+                raise RDBError('key index does not match the snapshot at offset %d' % offset)
+            return reader.read_object(value_type)
+        except IndexError:
+            raise RDBError('unexpected end of file')
+
+    def hydrate(self, count):
+        '''
+        Load the values of up to count keys, in the order of the key index.
+
+        :return: whether values are left to load
+        :rtype: bool
+        '''
+
+        for key_space in list(self.keyspaces):
+            if key_space.unloaded:
+                count -= key_space.hydrate(count)
+                if not count:
+                    break
+        return bool(self.keyspaces)
+
+    def finished(self, key_space):
+        self.keyspaces.remove(key_space)
+        if not self.keyspaces:
+            self.close()
+            if self.on_loaded is not None:
+                self.on_loaded(self)
+
+    def close(self):
+        self.reader = None
+        self.data.close()
+        self.stream.close()
+
+
+class LazySnapshotKeyspace(Keyspace):
+
+    '''
+    Wraps the keyspace engine of a database while the values of a lazily loaded snapshot are not all
+    loaded. The engine maps the keys not loaded yet to the offset of their value in the snapshot,
+    an int, and the value is decoded and stored in the engine when the key is first read, so the
+    commands see the objects as if the snapshot was fully loaded. Once all the values are loaded the
+    database uses the engine directly again.
+    '''
+
+    def __init__(self, db, snapshot, base, keys):
+        self.db = db
+        self.snapshot = snapshot
+        self.base = base
+        # Keys in the order of the key index, and the position of the next one to hydrate
+        self.keys = keys
+        self.position = 0
+        self.unloaded = len(keys)
+
+    def materialize(self, key, offset):
+        obj = self.snapshot.read_object(key, offset)
+        self.base[key] = obj
+        self.unloaded -= 1
+        self.db.account_loaded_object(key, obj)
+        if not self.unloaded:
+            self.finish()
+        return obj
+
+    def finish(self):
+        if self.db.key_space is self:
+            self.db.key_space = self.base
+        self.keys = []
+        self.snapshot.finished(self)
+
+    def hydrate(self, count):
+        '''
+        Load the values of up to count keys, in the order of the key index.
+
+        :return: the number of values loaded
+        :rtype: int
+        '''
+
+        keys = self.keys
+        position = self.position
+        loaded = 0
+        while loaded < count and position < len(keys):
+            key = keys[position]
+            position += 1
+            offset = self.base.get(key)
+            if offset.__class__ is int:
+                loaded += 1
+                self.materialize(key, offset)
+        self.position = position
+        self.snapshot.stat_hydrated += loaded
+        return loaded
+
+    def get(self, key, default=None):
+        obj = self.base.get(key, default)
+        if obj.__class__ is int:
+            self.snapshot.stat_loaded_on_access += 1
+            return self.materialize(key, obj)
+        return obj
+
+    def __getitem__(self, key):
+        obj = self.base[key]
+        if obj.__class__ is int:
+            self.snapshot.stat_loaded_on_access += 1
+            return self.materialize(key, obj)
+        return obj
+
+    def __setitem__(self, key, obj):
+        replaced = self.base.get(key).__class__ is int
+        self.base[key] = obj
+        if replaced:
+            self.unloaded -= 1
+            if not self.unloaded:
+                self.finish()
+
+    def __delitem__(self, key):
+        self.pop(key)
+
+    def pop(self, key, *default):
+        if key not in self.base:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        # Loaded so the database can unaccount it
+        self.get(key)
+        return self.base.pop(key)
+
+    def clear(self):
+        self.base.clear()
+        self.unloaded = 0
+        self.finish()
+
+    def items(self):
+        for key, obj in self.base.items():
+            if obj.__class__ is int:
+                obj = self.materialize(key, obj)
+            yield key, obj
+
+    def __len__(self):
+        return len(self.base)
+
+    def __iter__(self):
+        return iter(self.base)
+
+    def __contains__(self, key):
+        return key in self.base
+
+    def configure(self, config):
+        self.base.configure(config)
+
+    def expand(self, size):
+        self.base.expand(size)
+
+    def reclaim(self):
+        self.base.reclaim()
+
+    def close(self):
+        self.base.close()
+
+    def freeze(self):
+        self.base.freeze()
+
+    def thaw(self):
+        self.base.thaw()
+
+    def reopen(self):
+        self.base.reopen()
+
+    def memory_overhead(self):
+        return self.base.memory_overhead()
+
+    def rehash(self, steps):
+        return self.base.rehash(steps)
+
+    def iter_prefix(self, prefix):
+        return self.base.iter_prefix(prefix)
+
+    def sample(self, count):
+        return self.base.sample(count)
+
+    def scan(self, cursor, count, prefix=b'', cursors=None):
+        return self.base.scan(cursor, count, prefix, cursors)
+
+
+def find_key_index(data):
+    '''
+    :return: the offset of the key-index field in data, or None when the snapshot has no key index
+    '''
+
+    end = len(data) - 9
+    if data[end - 8 - len(KEY_INDEX_TRAILER):end - 8] != KEY_INDEX_TRAILER:
+        return None
+    return struct.unpack('<Q', data[end - 8:end])[0]
+
+
+def load_lazily(server, path, on_loaded=None):
+    '''
+    Load the key index of the snapshot at path into the databases of server, which are expected to
+    be empty, the values are loaded later, see LazySnapshotKeyspace. The checksum of the file is not
+    verified, every value is checked to belong to its key when it is loaded. Keys expired in the
+    meantime are skipped.
+
+    :param on_loaded: called with the snapshot once all the values are loaded
+    :return: the snapshot, or None when the file has no key index
+    :rtype: LazySnapshot
+    :raises RDBError: the file is corrupt
+    '''
+
+    stream = open(path, 'rb')
+    try:
+        if os.fstat(stream.fileno()).st_size < 18:
+            raise RDBError('truncated RDB file')
+        data = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+    except BaseException:
+        stream.close()
+        raise
+    snapshot = LazySnapshot(stream, data, on_loaded)
+    try:
+        reader = RDBReader(data)
+        reader.read_header()
+        reader.offset = find_key_index(data) or 0
+        if not reader.offset or reader.read_byte() != OPCODE_AUX or reader.read_string() != KEY_INDEX_AUX:
+            snapshot.close()
+            return None
+        end = reader.read_length()[0] + reader.offset
+        if end > len(data):
+            raise RDBError('unexpected end of file')
+
+        now = time.time()
+        unpack_from = struct.unpack_from
+        read_bytes = reader.read_bytes
+        while reader.offset < end:
+            db = server.get_database(reader.read_length()[0])
+            count = unpack_from('<Q', data, reader.offset)[0]
+            reader.offset += 8
+            base = db.key_space
+            base.expand(len(base) + count)
+            keys = []
+            for i in range(count):
+                key = read_bytes()
+                offset, expire_ms = unpack_from('<QQ', data, reader.offset)
+                reader.offset += 16
+                if expire_ms:
+                    expire_time = expire_ms / 1000.0
+                    if expire_time < now:
+                        continue
+                    db.add_volatile(key, expire_time)
+                base[key] = offset
+                keys.append(key)
+            if keys:
+                db.key_space = LazySnapshotKeyspace(db, snapshot, base, keys)
+                snapshot.keyspaces.append(db.key_space)
+                snapshot.keys += len(keys)
+    except (IndexError, struct.error):
+        snapshot.close()
+        raise RDBError('unexpected end of file')
+    except BaseException:
+        snapshot.close()
+        raise
+    if not snapshot.keyspaces:
+        snapshot.close()
+        if on_loaded is not None:
+            on_loaded(snapshot)
+    return snapshot
@@ -0,0 +1,739 @@
+'''
+Primary/replica replication, a server becomes a replica with ``REPLICAOF host port`` or the
+``replicaof`` parameter.
+
+The write commands executed by a primary are propagated the way they are logged to the AOF, see
+``aof.dump_write_command``, to a byte stream: the replication stream. The id of the history of a
+server, the replication id, and the number of bytes of its stream, the replication offset, identify
+its data. A replica executes the stream of its primary, and proxies it to its own replicas.
+
+The last ``repl-backlog-size`` bytes of the stream are kept in a circular buffer, the backlog. A
+replica reconnecting after a short disconnection sends ``PSYNC <replication id> <offset + 1>`` and
+gets the part of the stream it missed from the backlog (partial resync). Otherwise the primary writes
+a snapshot from a child process, and sends it followed by the commands executed meanwhile (full
+sync). A replica promoted with ``REPLICAOF NO ONE`` starts a new history, and keeps the id of the
+previous one so the other replicas of its old primary can still partially resync with it.
+
+The replicas acknowledge the offset they processed every second, and when asked by the ``REPLCONF
+GETACK`` commands WAIT adds to the stream. The replicas expire the keys with a timeout on their own,
+the stream sets the timeouts as absolute times, and ignore ``maxmemory``: the keys evicted by the
+primary are propagated as DEL commands.
+'''
+
+import asyncio
+import binascii
+import logging
+import os
+import time
+
+from redis.common.exceptions import CommandError, CommandNotFoundError
+from redis.common.proto import dump_command, parse_commands, ProtocolError
+from redis.common.utils import abort
+from . import rdb
+from .aof import dump_write_command
+
+logger = logging.getLogger(__name__)
+
+# States of the replicas of a primary: waiting for a snapshot to start, for the snapshot they get
+# to be written, receiving it, and receiving the stream
+REPLICA_WAIT_BGSAVE_START = 'wait_bgsave_start'
+REPLICA_WAIT_BGSAVE_END = 'wait_bgsave_end'
+REPLICA_SEND_BULK = 'send_bulk'
+REPLICA_ONLINE = 'online'
+
+# States of the link of a replica to its primary
+LINK_CONNECT = 'connect'
+LINK_CONNECTING = 'connecting'
+LINK_SYNC = 'sync'
+LINK_CONNECTED = 'connected'
+
+# Size of the reads and writes of the snapshots and of the stream
+TRANSFER_CHUNK_SIZE = 64 * 1024
+
+# Delay before a replica reconnects to its primary, in seconds
+RECONNECT_DELAY = 1
+
+
+class ReplicationError(Exception):
+    pass
+
+
+def new_replid():
+    return binascii.hexlify(os.urandom(20)).decode()
+
+
+class ReplicationBacklog:
+
+    '''
+    The last ``size`` bytes of the replication stream, in a circular buffer.
+
+    :param offset: the replication offset where the backlog starts
+    '''
+
+    def __init__(self, size, offset):
+        self.size = size
+        self.buffer = bytearray(size)
+        # Offset of the end of the stream, and number of bytes of the stream held
+        self.end = offset
+        self.histlen = 0
+
+    @property
+    def start(self):
+        return self.end - self.histlen
+
+    def append(self, data):
+        self.end += len(data)
+        self.histlen = min(self.histlen + len(data), self.size)
+        if len(data) > self.size:
+            data = data[-self.size:]
+        pos = (self.end - len(data)) % self.size
+        first = min(len(data), self.size - pos)
+        self.buffer[pos:pos + first] = data[:first]
+        self.buffer[:len(data) - first] = data[first:]
+
+    def read(self, offset):
+        '''
+        :return: the stream from offset to its end, None when the backlog does not hold it anymore
+        :rtype: bytes
+        '''
+
+        if not self.start <= offset <= self.end:
+            return None
+        length = self.end - offset
+        pos = offset % self.size
+        first = min(length, self.size - pos)
+        return bytes(self.buffer[pos:pos + first]) + bytes(self.buffer[:length - first])
+
+
+class Replica:
+
+    '''
+    A replica of this server, on the connection of its client.
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.state = REPLICA_WAIT_BGSAVE_START
+        # The offset acknowledged by the replica, and when
+        self.ack_offset = 0
+        self.ack_time = time.monotonic()
+        # The stream fed while the replica waits for its snapshot
+        self.buffer = None
+        self.send_task = None
+
+    @property
+    def ip(self):
+        return self.client.peername[0]
+
+    def write(self, data):
+        self.client.stream_writer.write(data)
+
+    def close(self):
+        self.client.transport.close()
+
+
+class Replication:
+
+    def __init__(self, server):
+        self.server = server
+        self.replid = new_replid()
+        # The id of the previous history, and the offset up to which it is shared with the current one
+        self.replid2 = '0' * 40
+        self.second_replid_offset = -1
+        self.master_repl_offset = 0
+        self.backlog = None
+        # Database selected by the last command of the stream
+        self.selected_db = None
+
+        self.replicas = []
+        # The link to the primary when this server is a replica
+        self.master = None
+        # WAIT commands, as [future, offset, number of replicas, timeout handle]
+        self.waiters = []
+        self.getack_handle = None
+        self.last_cron = 0.0
+        self.last_ping = time.monotonic()
+
+        self.stat_sync_full = 0
+        self.stat_sync_partial_ok = 0
+        self.stat_sync_partial_err = 0
+
+    @property
+    def propagating(self):
+        '''
+        Whether the write commands are fed to the stream: the server is a primary and had replicas.
+        The stream of a replica is the one of its primary.
+        '''
+
+        return self.backlog is not None and self.master is None
+
+    def create_backlog(self):
+        self.backlog = ReplicationBacklog(self.server.config['repl-backlog-size'],
+                                          self.master_repl_offset)
+
+    def resize_backlog(self):
+        if self.backlog is None or self.backlog.size == self.server.config['repl-backlog-size']:
+            return
+        data = self.backlog.read(self.backlog.start)
+        self.backlog = ReplicationBacklog(self.server.config['repl-backlog-size'], self.backlog.start)
+        self.backlog.append(data)
+
+    def feed(self, db, argv):
+        '''
+        Propagate a write command executed on db.
+        '''
+
+        data = dump_write_command(db, argv)
+        if db.idnum != self.selected_db:
+            self.selected_db = db.idnum
+            data = dump_command([b'SELECT', str(db.idnum).encode()]) + data
+        self.feed_stream(data)
+
+    def feed_stream(self, data):
+        self.backlog.append(data)
+        self.master_repl_offset += len(data)
+        for replica in self.replicas:
+            if replica.state == REPLICA_ONLINE:
+                replica.write(data)
+            elif replica.buffer is not None:
+                replica.buffer += data
+
+    def check_write(self, cmd, client):
+        '''
+        :raises CommandError: cmd is a write command and the server is a read only replica
+        '''
+
+        if self.master is None or client is self.master.client or \
+                not self.server.config['replica-read-only']:
+            return
+        if 'write' in self.server.get_command_flags(cmd):
+            abort(errtype='READONLY', message="You can't write against a read only replica.")
+
+    def psync(self, client, replid, offset):
+        '''
+        Attach a client as a replica, continuing from offset of the history replid when the backlog
+        still holds it, else with a full sync.
+        '''
+
+        if self.master is not None and self.master.state != LINK_CONNECTED:
+            abort(message="Can't SYNC while not connected with my master")
+        replica = Replica(client)
+        client.replica = replica
+        self.replicas.append(replica)
+        if self.backlog is None:
+            self.create_backlog()
+        if self.partial_resync(replica, replid, offset):
+            self.stat_sync_partial_ok += 1
+            logger.info('partial resynchronization accepted for replica %s' % client.ipaddr)
+            return
+
+        self.stat_sync_full += 1
+        if replid != '?':
+            self.stat_sync_partial_err += 1
+        logger.info('full resync requested by replica %s' % client.ipaddr)
+        self.start_bgsave()
+
+    def partial_resync(self, replica, replid, offset):
+        if replid != self.replid and (replid != self.replid2 or offset > self.second_replid_offset):
+            return False
+        # The offset the replica has is the one before the first byte it asks for
+        data = self.backlog.read(offset - 1)
+        if data is None:
+            return False
+        replica.state = REPLICA_ONLINE
+        replica.ack_offset = offset - 1
+        replica.write(('+CONTINUE %s\r\n' % self.replid).encode())
+        replica.write(data)
+        return True
+
+    def start_bgsave(self):
+        '''
+        Write a snapshot for the replicas waiting for one, unless a child process is running, the
+        replicas then wait for it to exit, see cron.
+        '''
+
+        server = self.server
+        if server.rdb_child_pid is not None:
+            return
+        if server.aof is not None and server.aof.rewrite_pid is not None:
+            return
+        server.rdb_bgsave()
+
+    def snapshot_aux(self):
+        '''
+        :return: the auxiliary fields of the snapshots, the database selected by the stream, which is
+                 kept selected by a replica loading the snapshot
+        :rtype: tuple
+        '''
+
+        if self.master is not None:
+            stream_db = self.master.client.db.idnum
+        else:
+            stream_db = self.selected_db or 0
+        return (('repl-stream-db', str(stream_db)),)
+
+    def snapshot_started(self, full):
+        '''
+        Called once the child process writing a snapshot is forked, the replicas waiting for one get
+        this one, and the stream from now on.
+        '''
+
+        waiting = [replica for replica in self.replicas if replica.state == REPLICA_WAIT_BGSAVE_START]
+        if not full or not waiting:
+            return
+        if self.master is None:
+            # The stream selects its database again after the snapshot
+            self.selected_db = None
+        for replica in waiting:
+            replica.state = REPLICA_WAIT_BGSAVE_END
+            replica.buffer = bytearray()
+            replica.write(('+FULLRESYNC %s %d\r\n' % (self.replid, self.master_repl_offset)).encode())
+
+    def snapshot_done(self, ok):
+        '''
+        Called once the child process writing a snapshot exited, the snapshot is sent to the replicas
+        waiting for it.
+        '''
+
+        for replica in list(self.replicas):
+            if replica.state != REPLICA_WAIT_BGSAVE_END:
+                continue
+            if not ok:
+                logger.warning('snapshot for replica %s failed' % replica.client.ipaddr)
+                self.drop_replica(replica)
+                continue
+            try:
+                stream = open(self.server.rdb_path(), 'rb')
+            except OSError as e:
+                logger.warning('failed to open the snapshot for replica %s: %s' % (replica.client.ipaddr, e))
+                self.drop_replica(replica)
+                continue
+            replica.state = REPLICA_SEND_BULK
+            replica.send_task = asyncio.ensure_future(self.send_snapshot(replica, stream),
+                                                      loop=self.server.loop)
+        if any(replica.state == REPLICA_WAIT_BGSAVE_START for replica in self.replicas):
+            self.start_bgsave()
+
+    @asyncio.coroutine
+    def send_snapshot(self, replica, stream):
+        writer = replica.client.stream_writer
+        try:
+            writer.write(('$%d\r\n' % os.fstat(stream.fileno()).st_size).encode())
+            while True:
+                chunk = stream.read(TRANSFER_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                yield from writer.drain()
+        except OSError as e:
+            logger.warning('failed to send the snapshot to replica %s: %s' % (replica.client.ipaddr, e))
+            self.drop_replica(replica)
+            return
+        finally:
+            stream.close()
+        replica.send_task = None
+        replica.write(bytes(replica.buffer))
+        replica.buffer = None
+        replica.state = REPLICA_ONLINE
+        replica.ack_time = time.monotonic()
+        logger.info('synchronization with replica %s succeeded' % replica.client.ipaddr)
+
+    def remove_replica(self, client):
+        replica = client.replica
+        if replica is None or replica not in self.replicas:
+            return
+        self.replicas.remove(replica)
+        if replica.send_task is not None:
+            replica.send_task.cancel()
+        logger.info('connection with replica %s lost' % client.ipaddr)
+
+    def drop_replica(self, replica):
+        self.remove_replica(replica.client)
+        replica.close()
+
+    def disconnect_replicas(self):
+        for replica in list(self.replicas):
+            self.drop_replica(replica)
+
+    def ack(self, client, offset):
+        replica = client.replica
+        if replica is None:
+            return
+        replica.ack_offset = max(replica.ack_offset, offset)
+        replica.ack_time = time.monotonic()
+        if self.waiters:
+            self.check_waiters()
+
+    def acked_replicas(self, offset):
+        return sum(1 for replica in self.replicas
+                   if replica.state == REPLICA_ONLINE and replica.ack_offset >= offset)
+
+    def wait(self, client, numreplicas, timeout):
+        '''
+        :return: the number of replicas which acknowledged the stream up to now, or a future of it,
+                 done once numreplicas did or after timeout milliseconds, 0 waiting forever
+        '''
+
+        offset = self.master_repl_offset
+        acked = self.acked_replicas(offset)
+        if acked >= numreplicas or not client.suspendable:
+            return acked
+
+        waiter = [asyncio.Future(), offset, numreplicas, None]
+        if timeout:
+            waiter[3] = self.server.loop.call_later(timeout / 1000.0, self.finish_wait, waiter)
+        self.waiters.append(waiter)
+        if self.getack_handle is None and self.propagating:
+            # Asked once the commands of the current event loop iteration are all fed
+            self.getack_handle = self.server.loop.call_soon(self.send_getack)
+        return waiter[0]
+
+    def send_getack(self):
+        self.getack_handle = None
+        if self.propagating:
+            self.feed_stream(dump_command([b'REPLCONF', b'GETACK', b'*']))
+
+    def check_waiters(self):
+        for waiter in list(self.waiters):
+            if self.acked_replicas(waiter[1]) >= waiter[2]:
+                self.finish_wait(waiter)
+
+    def finish_wait(self, waiter):
+        future, offset, numreplicas, handle = waiter
+        self.waiters.remove(waiter)
+        if handle is not None:
+            handle.cancel()
+        if not future.done():
+            future.set_result(self.acked_replicas(offset))
+
+    def configure(self):
+        '''
+        Follow the primary set by ``replicaof``, or become a primary.
+        '''
+
+        primary = self.server.config['replicaof']
+        if primary is None:
+            if self.master is not None:
+                self.promote()
+        elif self.master is None or (self.master.host, self.master.port) != primary:
+            self.replicate(*primary)
+
+    def replicate(self, host, port):
+        '''
+        Become a replica of host:port. The replication id and offset are kept, to partially resync
+        when the primary shares the history of this server.
+        '''
+
+        if self.master is not None:
+            self.master.close()
+        # They resync once this server is synced
+        self.disconnect_replicas()
+        self.master = MasterLink(self, host, port)
+        logger.info('replica of %s:%d' % (host, port))
+        if self.server.loop is not None:
+            self.master.start()
+
+    def promote(self):
+        self.master.close()
+        self.master = None
+        self.shift_replid()
+        self.selected_db = None
+        logger.info('replication id switched to %s, the server is a primary' % self.replid)
+
+    def shift_replid(self):
+        self.replid2 = self.replid
+        self.second_replid_offset = self.master_repl_offset + 1
+        self.replid = new_replid()
+
+    def full_synced(self, replid, offset, path):
+        '''
+        Load the snapshot received from the primary at path, which starts the stream at offset.
+        '''
+
+        server = self.server
+        self.disconnect_replicas()
+        for db in server.all_databases():
+            db.flush()
+        os.replace(path, server.rdb_path())
+        server.rdb_load()
+        stream_db = rdb.read_aux(server.rdb_path()).get(b'repl-stream-db', b'0')
+        self.master.client.change_db(int(stream_db))
+        if server.aof is not None:
+            # Rewritten from the loaded keys
+            server.stop_aof()
+            os.unlink(server.aof_path())
+            server.start_aof()
+
+        self.replid = replid
+        self.replid2 = '0' * 40
+        self.second_replid_offset = -1
+        self.master_repl_offset = offset
+        self.create_backlog()
+
+    def continued(self, replid):
+        '''
+        Called once the primary accepted a partial resync, and switched to the history replid.
+        '''
+
+        if self.backlog is None:
+            self.create_backlog()
+        if replid is not None and replid != self.replid:
+            self.shift_replid()
+            self.replid = replid
+            # They get the new replication id
+            self.disconnect_replicas()
+
+    def cron(self):
+        now = time.monotonic()
+        if now - self.last_cron < 1:
+            return
+        self.last_cron = now
+        if self.master is not None:
+            self.master.send_ack()
+
+        timeout = self.server.config['repl-timeout']
+        for replica in list(self.replicas):
+            if replica.state == REPLICA_ONLINE:
+                if now - replica.ack_time > timeout:
+                    logger.warning('disconnecting timed out replica %s' % replica.client.ipaddr)
+                    self.drop_replica(replica)
+            elif replica.state in (REPLICA_WAIT_BGSAVE_START, REPLICA_WAIT_BGSAVE_END):
+                # Keeps the connection alive, the replicas skip the newlines before the snapshot
+                replica.write(b'\n')
+
+        if self.replicas and self.propagating and \
+                now - self.last_ping >= self.server.config['repl-ping-replica-period']:
+            self.last_ping = now
+            self.feed_stream(dump_command([b'PING']))
+        if any(replica.state == REPLICA_WAIT_BGSAVE_START for replica in self.replicas):
+            self.start_bgsave()
+
+    def info(self):
+        now = time.monotonic()
+        fields = [('role', 'master' if self.master is None else 'slave')]
+        if self.master is not None:
+            fields += self.master.info()
+        fields.append(('connected_slaves', len(self.replicas)))
+        for i, replica in enumerate(self.replicas):
+            online = replica.state == REPLICA_ONLINE
+            fields.append(('slave%d' % i, 'ip=%s,port=%d,state=%s,offset=%d,lag=%d,lag_bytes=%d' % (
+                replica.ip, replica.client.replica_listening_port,
+                'wait_bgsave' if replica.state.startswith('wait_') else replica.state,
+                replica.ack_offset, int(now - replica.ack_time) if online else 0,
+                self.master_repl_offset - replica.ack_offset if online else 0)))
+        backlog = self.backlog
+        fields += [
+            ('master_replid', self.replid),
+            ('master_replid2', self.replid2),
+            ('master_repl_offset', self.master_repl_offset),
+            ('second_repl_offset', self.second_replid_offset),
+            ('repl_backlog_active', int(backlog is not None)),
+            ('repl_backlog_size', self.server.config['repl-backlog-size']),
+            ('repl_backlog_first_byte_offset', backlog.start + 1 if backlog is not None else 0),
+            ('repl_backlog_histlen', backlog.histlen if backlog is not None else 0),
+        ]
+        return fields
+
+    def stats_info(self):
+        return [
+            ('sync_full', self.stat_sync_full),
+            ('sync_partial_ok', self.stat_sync_partial_ok),
+            ('sync_partial_err', self.stat_sync_partial_err),
+        ]
+
+
+class MasterLink:
+
+    '''
+    The connection of a replica to its primary, reconnected until it is closed.
+    '''
+
+    def __init__(self, replication, host, port):
+        # Imported here, the server imports this module
+        from .server import RedisClientBase
+
+        self.replication = replication
+        self.server = replication.server
+        self.host = host
+        self.port = port
+        self.state = LINK_CONNECT
+        # Executes the stream, the only client allowed to write to a read only replica
+        self.client = RedisClientBase(self.server)
+        self.task = None
+        self.reader = None
+        self.writer = None
+        self.last_io = None
+        self.down_since = time.time()
+        self.sync_total_bytes = -1
+        self.sync_read_bytes = 0
+
+    def start(self):
+        self.task = asyncio.ensure_future(self.run(), loop=self.server.loop)
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        self.disconnect()
+
+    def disconnect(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        if self.state == LINK_CONNECTED:
+            self.down_since = time.time()
+        self.state = LINK_CONNECT
+
+    @asyncio.coroutine
+    def run(self):
+        while True:
+            try:
+                yield from self.connect()
+                yield from self.sync()
+                yield from self.stream()
+            except (OSError, EOFError, asyncio.TimeoutError, ProtocolError, ReplicationError,
+                    rdb.RDBError, ValueError) as e:
+                logger.warning('replication with the primary %s:%d failed: %s'
+                               % (self.host, self.port, e or type(e).__name__))
+            self.disconnect()
+            yield from asyncio.sleep(RECONNECT_DELAY)
+
+    @asyncio.coroutine
+    def read(self, coro):
+        data = yield from asyncio.wait_for(coro, self.server.config['repl-timeout'])
+        if not data:
+            raise ConnectionError('connection closed by the primary')
+        self.last_io = time.monotonic()
+        return data
+
+    @asyncio.coroutine
+    def read_line(self):
+        while True:
+            line = (yield from self.read(self.reader.readline())).rstrip(b'\r\n')
+            # Newlines keep the connection alive while the primary writes the snapshot
+            if line:
+                return line
+
+    @asyncio.coroutine
+    def command(self, *argv):
+        self.writer.write(dump_command(argv))
+        return (yield from self.read_line())
+
+    @asyncio.coroutine
+    def connect(self):
+        self.state = LINK_CONNECTING
+        self.reader, self.writer = yield from asyncio.open_connection(self.host, self.port)
+        self.last_io = time.monotonic()
+        reply = yield from self.command(b'REPLCONF', b'listening-port',
+                                        str(self.server.config['port']).encode())
+        if reply.startswith(b'-'):
+            logger.warning('the primary refused REPLCONF listening-port: %s' % reply.decode())
+        yield from self.command(b'REPLCONF', b'capa', b'psync2')
+
+    @asyncio.coroutine
+    def sync(self):
+        replication = self.replication
+        self.state = LINK_SYNC
+        if replication.backlog is not None:
+            psync = [b'PSYNC', replication.replid.encode(),
+                     str(replication.master_repl_offset + 1).encode()]
+        else:
+            psync = [b'PSYNC', b'?', b'-1']
+        reply = yield from self.command(*psync)
+        if reply.startswith(b'+FULLRESYNC'):
+            command, replid, offset = reply.split()
+            logger.info('full resync from the primary %s:%d' % (self.host, self.port))
+            path = yield from self.receive_snapshot()
+            replication.full_synced(replid.decode(), int(offset), path)
+        elif reply.startswith(b'+CONTINUE'):
+            parts = reply.split()
+            logger.info('partial resync from the primary %s:%d' % (self.host, self.port))
+            replication.continued(parts[1].decode() if len(parts) > 1 else None)
+        else:
+            raise ReplicationError('unexpected reply to PSYNC: %s' % reply.decode())
+        self.state = LINK_CONNECTED
+
+    @asyncio.coroutine
+    def receive_snapshot(self):
+        '''
+        :return: the path of the temporary file the snapshot sent by the primary is written to
+        '''
+
+        line = yield from self.read_line()
+        if not line.startswith(b'$'):
+            raise ReplicationError('unexpected snapshot header: %s' % line.decode())
+        self.sync_total_bytes = int(line[1:])
+        self.sync_read_bytes = 0
+        path = os.path.join(self.server.config['dir'], 'temp-%d-%d.rdb' % (int(time.time()), os.getpid()))
+        try:
+            with open(path, 'wb') as stream:
+                while self.sync_read_bytes < self.sync_total_bytes:
+                    size = min(TRANSFER_CHUNK_SIZE, self.sync_total_bytes - self.sync_read_bytes)
+                    stream.write((yield from self.read(self.reader.readexactly(size))))
+                    self.sync_read_bytes += size
+        except BaseException:
+            os.unlink(path)
+            raise
+        finally:
+            self.sync_total_bytes = -1
+        return path
+
+    @asyncio.coroutine
+    def stream(self):
+        '''
+        Execute the stream of the primary, and proxy it to the replicas of this server.
+        '''
+
+        self.send_ack()
+        pending = b''
+        while True:
+            data = yield from self.read(self.reader.read(TRANSFER_CHUNK_SIZE))
+            if pending:
+                data = pending + data
+            consumed = 0
+            for argv, end in parse_commands(data):
+                self.replication.feed_stream(data[consumed:end])
+                consumed = end
+                self.execute(argv)
+            pending = data[consumed:]
+
+    def execute(self, argv):
+        name = argv[0].upper()
+        if name == b'SELECT':
+            self.client.change_db(int(argv[1]))
+        elif name == b'PING':
+            pass
+        elif name == b'REPLCONF':
+            if len(argv) > 1 and argv[1].upper() == b'GETACK':
+                self.send_ack()
+        else:
+            try:
+                self.server.exec_native_command(argv, self.client)
+            except (CommandError, CommandNotFoundError) as e:
+                logger.warning('command %s of the primary failed: %s' % (argv[0].decode(), e))
+
+    def send_ack(self):
+        if self.state == LINK_CONNECTED:
+            self.writer.write(dump_command(
+                [b'REPLCONF', b'ACK', str(self.replication.master_repl_offset).encode()]))
+
+    def info(self):
+        up = self.state == LINK_CONNECTED
+        fields = [
+            ('master_host', self.host),
+            ('master_port', self.port),
+            ('master_link_status', 'up' if up else 'down'),
+            ('master_last_io_seconds_ago',
+             int(time.monotonic() - self.last_io) if self.last_io is not None else -1),
+            ('master_sync_in_progress', int(self.state == LINK_SYNC)),
+            ('slave_repl_offset', self.replication.master_repl_offset),
+            ('slave_read_only', int(self.server.config['replica-read-only'])),
+        ]
+        if self.sync_total_bytes >= 0:
+            fields += [
+                ('master_sync_total_bytes', self.sync_total_bytes),
+                ('master_sync_read_bytes', self.sync_read_bytes),
+            ]
+        if not up:
+            fields.append(('master_link_down_since_seconds', int(time.time() - self.down_since)))
+        return fields
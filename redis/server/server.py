@@ -1,18 +1,33 @@
 import asyncio
+import concurrent.futures
 import functools
+import os
+import sys
+import threading
 import types
 import time
 
 from redis.common.proto import RedisProtocol, ProtocolError
 from redis.common.exceptions import CommandNotFoundError, CommandError, ClientQuitError
-from redis.common.utils import close_connection, abort
+from redis.common.utils import close_connection, abort, make_argv
 from .storage import RedisDatabase
+from .keyspace import ScanCursors
+from .config import RedisConfig
+from .functions import FunctionRegistry
+from .backing import BACKING_STORES, BackingStoreCache
+from . import aof, checkpoint, rdb
+from .replication import Replication
+from .cluster import Cluster
+from .migrate import MigrateConnectionPool
+from .evict import EvictionPool, lfu_decay_period, lfu_decayed_counter
 
 from redis.common.proto import RedisSerializationObject, \
     RedisSimpleStringSerializationObject, RedisErrorStringSerializationObject, \
-    RedisIntegerSerializationObject, RedisListSerializationObject, RedisBulkStringSerializationObject
+    RedisIntegerSerializationObject, RedisListSerializationObject, RedisBulkStringSerializationObject, \
+    RedisNoReplySerializationObject
 
-from redis.common.objects import RedisObject
+from redis.common.objects import RedisObject, RedisStringObject, RedisListObject
+from redis.common.compression import stats as compression_stats
 
 from redis.common.proto import resp_loads, InlineProtocolParser
 
@@ -20,18 +35,106 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def serialize_reply(ret):
+    '''
+    Convert the return value of a command handler to its REdis Serialization Protocol object.
+
+    :rtype: RedisSerializationObject
+    '''
+
+    if isinstance(ret, RedisObject):
+        return ret.serialize()
+    elif isinstance(ret, RedisSerializationObject):
+        return ret
+    elif ret is True:
+        return RedisSimpleStringSerializationObject('OK')
+    elif isinstance(ret, int):
+        # This line shouldn't put before the ``ret is True``
+        # **Cuz True is an integer**
+        return RedisIntegerSerializationObject(ret)
+    elif isinstance(ret, (list, types.GeneratorType)):
+        return RedisListSerializationObject(ret)
+    elif ret is None or isinstance(ret, (bytes, str)):
+        return RedisBulkStringSerializationObject(ret)
+    else:
+        raise ValueError('Invalid reply %s' % ret)
+
+
+@asyncio.coroutine
+def serialize_deferred_reply(future):
+    '''
+    Wait for the deferred reply of a command handler and serialize it like ``serialize_reply``.
+    '''
+
+    try:
+        return serialize_reply((yield from future))
+    except CommandError as e:
+        errtype, message = e.args
+        return RedisErrorStringSerializationObject(errtype=errtype, message=message)
+
+
+def native_reply(ret):
+    '''
+    Convert the return value of a command handler to plain Python values: strings become bytes,
+    lists become lists, integers stay integers, nil becomes None and ``+OK`` becomes True. Error
+    replies are turned into ``CommandError`` instances.
+    '''
+
+    if isinstance(ret, RedisStringObject):
+        return ret.get_bytes()
+    elif isinstance(ret, RedisListObject):
+        return list(ret)
+    elif ret is True or ret is None or isinstance(ret, (int, bytes)):
+        return ret
+    elif isinstance(ret, RedisNoReplySerializationObject):
+        return None
+    elif isinstance(ret, (list, types.GeneratorType)):
+        return [native_reply(item) for item in ret]
+    elif isinstance(ret, RedisErrorStringSerializationObject):
+        return CommandError(ret._errtype, ret._message)
+    elif isinstance(ret, RedisSimpleStringSerializationObject):
+        return True if ret._value == b'OK' else ret._value
+    elif isinstance(ret, (RedisIntegerSerializationObject, RedisBulkStringSerializationObject)):
+        return ret._value
+    elif isinstance(ret, RedisListSerializationObject):
+        if ret.is_null():
+            return None
+        return [native_reply(item) for item in ret]
+    elif isinstance(ret, str):
+        return ret.encode()
+    else:
+        raise ValueError('Invalid reply %s' % ret)
+
+
 class RedisServerMixin(object):
 
-    def command(self, cmd, nargs=None):
+    def command(self, cmd, nargs=None, flags=(), keys=None):
+        '''
+        Register a command handler.
+
+        A handler called by a client whose ``suspendable`` attribute is set may return an
+        ``asyncio.Future`` instead of its reply, e.g. to wait for I/O, the reply is then the result of
+        the future and the client does not execute its next command before.
+
+        :param nargs: the exact number of arguments, or a function validating it
+        :param flags: command flags, ``write`` for commands that may modify the keyspace, ``denyoom``
+                      for commands that may use more memory and are refused when the memory limit
+                      is reached, and ``noscript`` for commands that can not be called from functions
+        :param keys: the positions of the key arguments, as (first, last, step) with a negative last
+                     counted from the end, or a function returning the keys of an argument list
+        '''
+
         if not hasattr(self, 'handlers'):
             self.handlers = dict()
+            self.native_handlers = dict()
+            self.command_flags = dict()
+            self.command_keys = dict()
         if not isinstance(cmd, bytes):
             cmd = cmd.encode()
 
         def wrapper(func):
             @functools.wraps(func)
-            def __wrapper(client, argv):
-
+            def __native_wrapper(client, argv):
                 if nargs is not None:
                     if isinstance(nargs, int):
                         if len(argv) - 1 != nargs:
@@ -40,25 +143,15 @@ class RedisServerMixin(object):
                         if not nargs(len(argv) - 1):
                             abort(message="wrong number of arguments for '%s' command" % cmd.decode())
 
+                return func(client, argv)
+
+            @functools.wraps(func)
+            def __wrapper(client, argv):
                 try:
-                    ret = func(client, argv)
-
-                    if isinstance(ret, RedisObject):
-                        return ret.serialize()
-                    elif isinstance(ret, RedisSerializationObject):
-                        return ret
-                    elif ret is True:
-                        return RedisSimpleStringSerializationObject('OK')
-                    elif isinstance(ret, int):
-                        # This line shouldn't put before the ``ret is True``
-                        # **Cuz True is an integer**
-                        return RedisIntegerSerializationObject(ret)
-                    elif isinstance(ret, (list, types.GeneratorType)):
-                        return RedisListSerializationObject(ret)
-                    elif ret is None:
-                        return RedisBulkStringSerializationObject(None)
-                    else:
-                        raise ValueError('Invalid reply %s' % ret)
+                    ret = __native_wrapper(client, argv)
+                    if isinstance(ret, asyncio.Future):
+                        return asyncio.ensure_future(serialize_deferred_reply(ret))
+                    return serialize_reply(ret)
                 except CommandNotFoundError as e:
                     return RedisErrorStringSerializationObject(errtype='ERR', message=str(e))
                 except CommandError as e:
@@ -66,6 +159,10 @@ class RedisServerMixin(object):
                     return RedisErrorStringSerializationObject(errtype=errtype, message=message)
 
             self.handlers[cmd.lower()] = __wrapper
+            self.native_handlers[cmd.lower()] = __native_wrapper
+            self.command_flags[cmd.lower()] = frozenset(flags)
+            if keys is not None:
+                self.command_keys[cmd.lower()] = keys
             return __wrapper
         return wrapper
 
@@ -74,8 +171,54 @@ class RedisServerMixin(object):
         if not hasattr(self, 'handlers') or cmd not in self.handlers:
             raise CommandNotFoundError("unknown command '%s'" % cmd.decode())
 
+        try:
+            self.check_command(cmd)
+        except CommandError as e:
+            errtype, message = e.args
+            return RedisErrorStringSerializationObject(errtype=errtype, message=message)
         return self.handlers[cmd](client_instance, argv)
 
+    def exec_native_command(self, argv, client_instance):
+        '''
+        Execute the command without serializing its reply.
+
+        :return: the raw return value of the handler, see ``native_reply``
+        :raises CommandError: the command replied with an error
+        '''
+
+        cmd = argv[0].lower()
+        if not hasattr(self, 'handlers') or cmd not in self.native_handlers:
+            raise CommandNotFoundError("unknown command '%s'" % cmd.decode())
+
+        self.check_command(cmd)
+        return self.native_handlers[cmd](client_instance, argv)
+
+    def get_command_flags(self, cmd):
+        return self.command_flags.get(cmd.lower(), frozenset())
+
+    def get_command_keys(self, argv):
+        '''
+        :return: the key arguments of a command
+        :rtype: list
+        '''
+
+        spec = self.command_keys.get(argv[0].lower())
+        if spec is None:
+            return []
+        if not isinstance(spec, tuple):
+            return spec(argv)
+        first, last, step = spec
+        if last < 0:
+            last += len(argv)
+        return argv[first:last + 1:step]
+
+    def check_command(self, cmd):
+        '''
+        Called before executing a command.
+
+        :raises CommandError: the command can not be executed now
+        '''
+
 
 class RedisServerTestClientMixin:
 
@@ -83,7 +226,37 @@ class RedisServerTestClientMixin:
         return RedisTestClient(self)
 
 
-class RedisServer(RedisServerMixin, RedisServerTestClientMixin):
+class RedisServerEmbeddedClientMixin:
+
+    def get_embedded_client(self):
+        return RedisEmbeddedClient(self)
+
+    def call_in_server_thread(self, func, *args):
+        '''
+        Call func on the event loop thread and wait for its result. When the event loop is not running,
+        or when called from the event loop thread, func is called directly.
+        '''
+
+        loop = self.loop
+        if loop is None or not loop.is_running() or threading.get_ident() == self.loop_thread_id:
+            with self.lock:
+                return func(*args)
+
+        future = concurrent.futures.Future()
+
+        def callback():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+        loop.call_soon_threadsafe(callback)
+        return future.result()
+
+
+class RedisServer(RedisServerMixin, RedisServerTestClientMixin, RedisServerEmbeddedClientMixin):
 
     def __init__(self, *args, **kwargs):
         super(RedisServer, self).__init__(*args, **kwargs)
@@ -91,10 +264,108 @@ class RedisServer(RedisServerMixin, RedisServerTestClientMixin):
         redis.server.current_server = self
 
         self.clients = dict()
+        self.config = RedisConfig()
         self.dbs = {
-            0: RedisDatabase(0),
+            0: RedisDatabase(0, self.config),
         }
         self.pause_seconds = None
+        self.functions = FunctionRegistry(self)
+        self.backing_store = None
+
+        self.loop = None
+        self.loop_thread_id = None
+        # Serializes embedded clients of other threads while the event loop is not running
+        self.lock = threading.RLock()
+
+        self.start_time = time.time()
+        self.cronloops = 0
+        self.active_expire_fast_handle = None
+        self.stat_evicted_keys = 0
+        self.stat_expire_cycle_time = 0.0
+        self.eviction_pool = EvictionPool()
+        # Database the random eviction policies evict from next
+        self.eviction_next_db = 0
+
+        # Keyspace engines frozen for each child process reading them, by pid
+        self.frozen_key_spaces = {}
+
+        # Snapshots: the child process writing one in the background, with the value of changes()
+        # when it was forked and the time it started, and the last snapshot written
+        self.rdb_child_pid = None
+        self.rdb_child_changes = 0
+        self.rdb_child_start = 0.0
+        self.rdb_child_checkpoint = None
+        self.rdb_changes_at_last_save = 0
+        self.lastsave = int(time.time())
+        self.rdb_last_save_ok = True
+        self.rdb_last_save_attempt = 0.0
+        self.rdb_last_save_duration = -1.0
+        self.stat_rdb_saves = 0
+        self.aof = None
+        self.checkpoints = None
+
+        # The last load of the data on startup: when it started, when the server could serve the
+        # clients and when all the values were loaded, and the snapshot still loading lazily
+        self.loading_start = None
+        self.loading_ready_time = None
+        self.loading_done_time = None
+        self.loading_snapshot = None
+        self.lazy_load_handle = None
+
+        self.replication = Replication(self)
+        self.cluster = None
+        self.migrate_pool = MigrateConnectionPool()
+
+    def exec_command(self, argv, client_instance):
+        client_instance.propagate_argv = None
+        try:
+            if self.cluster is not None:
+                self.cluster.route(argv, client_instance)
+            self.replication.check_write(argv[0], client_instance)
+        except CommandError as e:
+            errtype, message = e.args
+            return RedisErrorStringSerializationObject(errtype=errtype, message=message)
+        if self.aof is None and not self.replication.propagating:
+            return super(RedisServer, self).exec_command(argv, client_instance)
+
+        suspendable = client_instance.suspendable
+        fed_commands = self.aof.fed_commands if self.aof is not None else 0
+        changes = self.changes()
+        ret = super(RedisServer, self).exec_command(argv, client_instance)
+        self.propagate(argv, client_instance, changes)
+        if suspendable and self.aof is not None and self.aof.fed_commands != fed_commands and \
+                self.config['appendfsync'] == 'always':
+            # The reply is sent once the write is synced
+            return self.aof.wait_commit(ret)
+        return ret
+
+    def exec_native_command(self, argv, client_instance):
+        client_instance.propagate_argv = None
+        self.replication.check_write(argv[0], client_instance)
+        if self.aof is None and not self.replication.propagating:
+            return super(RedisServer, self).exec_native_command(argv, client_instance)
+
+        changes = self.changes()
+        ret = super(RedisServer, self).exec_native_command(argv, client_instance)
+        self.propagate(argv, client_instance, changes)
+        return ret
+
+    def propagate(self, argv, client, changes):
+        '''
+        Log the command to the AOF and feed it to the replicas if it is a write command and it
+        modified the dataset. Commands running other commands, like EXEC and FCALL, are not
+        propagated, the commands they ran are. A command may set the ``propagate_argv`` attribute of
+        the client to propagate another command in its place.
+        '''
+
+        if self.changes() != changes and 'write' in self.get_command_flags(argv[0]):
+            self.feed_write_command(client.db, client.propagate_argv or argv)
+
+    def feed_write_command(self, db, argv):
+        if self.aof is not None:
+            self.aof.feed(db, argv)
+        if self.replication.propagating:
+            self.replication.feed(db, argv)
 
     def all_databases(self):
         return self.dbs.values()
@@ -104,9 +375,544 @@ class RedisServer(RedisServerMixin, RedisServerTestClientMixin):
 
     def get_database(self, dbnum):
         if dbnum not in self.dbs:
-            self.dbs[dbnum] = RedisDatabase(dbnum)
+            self.dbs[dbnum] = RedisDatabase(dbnum, self.config)
+            self.dbs[dbnum].backing_store = self.backing_store
+            self.dbs[dbnum].track_changes(self.checkpoints is not None)
+            self.dbs[dbnum].track_slots(self.cluster is not None)
         return self.dbs[dbnum]
 
+    def config_changed(self, name):
+        '''
+        Apply a parameter set with ``CONFIG SET`` that is not just read when needed.
+        '''
+
+        if name in ('keyspace-backend', 'spill-memory', 'maxmemory-policy', 'lfu-log-factor',
+                    'lfu-decay-time', 'hotkeys-capacity', 'hotkeys-sample-rate', 'compress-min-size',
+                    'compress-codec', 'dedup-min-size'):
+            for db in self.all_databases():
+                db.configure()
+        if name == 'maxmemory-policy':
+            self.eviction_pool.clear()
+        if name in ('backing-store', 'backing-store-file'):
+            self.configure_backing_store()
+        if name == 'appendonly':
+            if self.config['appendonly'] and self.aof is None:
+                self.start_aof()
+            elif not self.config['appendonly'] and self.aof is not None:
+                self.stop_aof()
+        if name == 'checkpoint-deltas':
+            self.configure_checkpoints()
+        if name == 'replicaof':
+            self.replication.configure()
+        if name == 'repl-backlog-size':
+            self.replication.resize_backlog()
+        if name == 'cluster-enabled':
+            self.configure_cluster()
+
+    def configure_cluster(self):
+        '''
+        Enter or leave cluster mode, as set by ``cluster-enabled``.
+        '''
+
+        if self.config['cluster-enabled']:
+            if self.cluster is None:
+                self.cluster = Cluster(self)
+                self.cluster.load()
+            # The links to the other nodes start with the event loop
+            self.cluster.start()
+        elif not self.config['cluster-enabled'] and self.cluster is not None:
+            self.cluster.stop()
+            self.cluster = None
+        for db in self.all_databases():
+            db.track_slots(self.cluster is not None)
+
+    def configure_backing_store(self):
+        '''
+        Open the store selected by ``backing-store``, after writing the pending keys to the previous one.
+        '''
+
+        if self.backing_store is not None:
+            self.backing_store.close()
+            self.backing_store = None
+        backend = self.config['backing-store']
+        if backend != 'none':
+            self.backing_store = BackingStoreCache(self, BACKING_STORES[backend](self.config))
+        for db in self.all_databases():
+            db.backing_store = self.backing_store
+
+    def used_memory(self):
+        '''
+        :return: the estimated memory used by the keys and values of all the databases, in bytes
+        :rtype: int
+        '''
+
+        return sum(db.used_memory for db in self.all_databases())
+
+    def memory_stats(self):
+        '''
+        :return: the memory breakdown reported by MEMORY STATS, as a flat list of names and values
+        :rtype: list
+        '''
+
+        clients = sum(client.memory_usage() for client in self.clients.values())
+        functions = sum(len(library.code) for library in self.functions.libraries.values())
+        dataset = 0
+        keys = 0
+        overhead = clients + functions
+        types = {}
+        db_stats = []
+        for idnum, db in sorted(self.dbs.items()):
+            main, expires = db.key_space.memory_overhead(), db.expires_memory_overhead()
+            overhead += main + expires
+            dataset += db.used_memory
+            keys += len(db.key_space)
+            db_types = []
+            for type_name, (type_keys, type_bytes) in sorted(db.type_stats.items()):
+                if type_keys:
+                    db_types += [type_name, [b'keys', type_keys, b'bytes', type_bytes]]
+                    total = types.setdefault(type_name, [0, 0])
+                    total[0] += type_keys
+                    total[1] += type_bytes
+            if db.key_space:
+                db_stats += [('db.%d' % idnum).encode(), [
+                    b'keys', len(db.key_space),
+                    b'overhead.hashtable.main', main,
+                    b'overhead.hashtable.expires', expires,
+                    b'dataset.bytes', db.used_memory,
+                    b'types', db_types,
+                ]]
+
+        total = dataset + overhead
+        return [
+            b'total.allocated', total,
+            b'clients.normal', clients,
+            b'functions.caches', functions,
+        ] + db_stats + [
+            b'overhead.total', overhead,
+            b'keys.count', keys,
+            b'keys.bytes-per-key', dataset // keys if keys else 0,
+            b'dataset.bytes', dataset,
+            b'dataset.percentage', ('%.2f' % (100.0 * dataset / total if total else 0)).encode(),
+            b'types', [item for type_name, (type_keys, type_bytes) in sorted(types.items())
+                       for item in (type_name, [b'keys', type_keys, b'bytes', type_bytes])],
+        ]
+
+    def check_command(self, cmd):
+        if self.config['keyspace-backend'] == 'spill':
+            # No command is running, the objects of the keys it used can be moved to disk
+            for db in self.all_databases():
+                db.key_space.reclaim()
+        # A replica keeps the keys of its primary, which propagates its evictions
+        if self.config['maxmemory'] and self.replication.master is None and \
+                'denyoom' in self.get_command_flags(cmd):
+            if not self.perform_evictions():
+                abort(errtype='OOM', message="command not allowed when used memory > 'maxmemory'.")
+
+    def perform_evictions(self):
+        '''
+        Evict keys according to ``maxmemory-policy`` until the used memory is below ``maxmemory``.
+
+        :return: whether the used memory is below the limit
+        :rtype: bool
+        '''
+
+        maxmemory = self.config['maxmemory']
+        policy = self.config['maxmemory-policy']
+        while maxmemory and self.used_memory() > maxmemory:
+            if policy == 'noeviction':
+                return False
+            if policy.endswith('-random'):
+                evicted = self.evict_random_key(policy.startswith('volatile-'))
+            else:
+                evicted = self.evict_best_key(policy)
+            if not evicted:
+                return False
+            self.stat_evicted_keys += 1
+        return True
+
+    def evict_random_key(self, volatile):
+        dbs = [db for idnum, db in sorted(self.dbs.items())]
+        for i in range(len(dbs)):
+            db = dbs[(self.eviction_next_db + i) % len(dbs)]
+            samples = db.sample(1, volatile)
+            if samples:
+                self.eviction_next_db = (self.eviction_next_db + i + 1) % len(dbs)
+                self.evict_key(db, samples[0][0])
+                return True
+        return False
+
+    def evict_best_key(self, policy):
+        '''
+        Evict the best candidate of the eviction pool, refilled by sampling ``maxmemory-samples`` keys
+        of every database.
+
+        :return: whether a key was evicted
+        :rtype: bool
+        '''
+
+        volatile = policy.startswith('volatile-')
+        now = time.monotonic()
+        if policy.endswith('-lru'):
+            idle_score = lambda db, key, obj: now - obj.atime
+        elif policy.endswith('-lfu'):
+            decay_period = lfu_decay_period(self.config['lfu-decay-time'])
+            idle_score = lambda db, key, obj: 255 - lfu_decayed_counter(obj, decay_period, now)
+        else:
+            # volatile-ttl, the sooner a key expires the better candidate it is
+            idle_score = lambda db, key, obj: -db.expires[key]
+
+        samples = self.config['maxmemory-samples']
+        while True:
+            keys = 0
+            for db in self.all_databases():
+                candidates = db.volatile_keys if volatile else len(db.key_space)
+                if candidates:
+                    keys += candidates
+                    self.eviction_pool.populate(db, db.sample(samples, volatile), idle_score)
+            if not keys:
+                return False
+
+            while True:
+                candidate = self.eviction_pool.pop_best()
+                if candidate is None:
+                    break
+                idnum, key = candidate
+                db = self.dbs.get(idnum)
+                if db is not None and key in db.key_space and (not volatile or key in db.expires):
+                    self.evict_key(db, key)
+                    return True
+
+    def evict_key(self, db, key):
+        db.remove_key(key)
+        self.feed_write_command(db, [b'DEL', key])
+
+    # Delay before retrying a scheduled snapshot after a failure, in seconds
+    RDB_SAVE_RETRY_DELAY = 5
+
+    def changes(self):
+        '''
+        :return: the number of modifications of the keys since the server started
+        :rtype: int
+        '''
+
+        return sum(db.version for db in self.all_databases())
+
+    def rdb_path(self):
+        return os.path.join(self.config['dir'], self.config['dbfilename'])
+
+    def configure_checkpoints(self):
+        '''
+        Start or stop tracking the changes for delta checkpoints, as set by ``checkpoint-deltas``.
+        The first checkpoint after they are enabled is a full snapshot.
+        '''
+
+        enabled = self.config['checkpoint-deltas']
+        if enabled == (self.checkpoints is not None):
+            return
+        self.checkpoints = checkpoint.Checkpoints(self) if enabled else None
+        for db in self.all_databases():
+            db.track_changes(enabled)
+
+    def write_snapshot(self, current):
+        '''
+        Write a snapshot of the databases, or a delta checkpoint.
+
+        :param current: the Checkpoint written, None when delta checkpoints are disabled
+        :return: the number of keys and bytes written
+        :rtype: tuple
+        '''
+
+        dbs = [db for idnum, db in sorted(self.dbs.items())]
+        aux = self.replication.snapshot_aux()
+        if current is None:
+            return rdb.save(dbs, self.rdb_path(), self.config['rdbchecksum'],
+                            self.config['rdb-key-index'], aux)
+        if current.full:
+            return rdb.save(dbs, self.rdb_path(), self.config['rdbchecksum'],
+                            self.config['rdb-key-index'], current.aux + aux)
+        return rdb.save(dbs, self.checkpoints.delta_path(current.seq), self.config['rdbchecksum'],
+                        aux=current.aux, changes=current.changes)
+
+    def rdb_save(self):
+        '''
+        Write a snapshot of the databases, blocking the server until it is written.
+
+        :return: whether the snapshot was written
+        :rtype: bool
+        '''
+
+        begin = time.time()
+        changes = self.changes()
+        current = self.checkpoints.begin(full=True) if self.checkpoints is not None else None
+        try:
+            keys, size = self.write_snapshot(current)
+        except (OSError, rdb.RDBError) as e:
+            logger.error('failed to save the snapshot: %s' % e)
+            self.rdb_save_done(begin, changes, False, current)
+            return False
+        logger.info('DB saved on disk, %d keys, %d bytes' % (keys, size))
+        self.rdb_save_done(begin, changes, True, current)
+        return True
+
+    def fork(self):
+        '''
+        Fork a child process reading the databases, with their keyspace engines frozen until
+        ``child_reaped`` is called with its pid. In the child, the engines reopen what they can not
+        share.
+
+        :return: the pid of the child, 0 in the child
+        :rtype: int
+        :raises OSError: the fork failed
+        '''
+
+        key_spaces = [db.key_space for db in self.all_databases()]
+        for key_space in key_spaces:
+            key_space.freeze()
+        try:
+            pid = os.fork()
+        except OSError:
+            for key_space in key_spaces:
+                key_space.thaw()
+            raise
+        if pid == 0:
+            for key_space in key_spaces:
+                key_space.reopen()
+        else:
+            self.frozen_key_spaces[pid] = key_spaces
+        return pid
+
+    def child_reaped(self, pid):
+        for key_space in self.frozen_key_spaces.pop(pid):
+            key_space.thaw()
+
+    def rdb_bgsave(self, delta=False):
+        '''
+        Write a snapshot of the databases from a forked child process, which has a copy-on-write copy
+        of the memory, so the server keeps serving the clients. The child is reaped by server_cron.
+
+        :param delta: write a delta checkpoint rather than a full snapshot
+        :return: whether the child process was started, a failed fork counts as a failed save
+        :rtype: bool
+        '''
+
+        changes = self.changes()
+        current = self.checkpoints.begin(full=not delta) if self.checkpoints is not None else None
+        try:
+            pid = self.fork()
+        except OSError as e:
+            logger.error('can not save in background: fork failed: %s' % e)
+            self.rdb_save_done(time.time(), changes, False, current)
+            return False
+        if pid == 0:
+            status = 1
+            try:
+                self.write_snapshot(current)
+                status = 0
+            except BaseException:
+                logger.exception('failed to save the snapshot')
+            finally:
+                # Skip the cleanup of the parent's resources the child has a copy of
+                os._exit(status)
+
+        logger.info('background saving started by pid %d%s'
+                    % (pid, ', delta %d' % current.seq if delta else ''))
+        self.rdb_child_pid = pid
+        self.rdb_child_changes = changes
+        self.rdb_child_start = time.time()
+        self.rdb_child_checkpoint = current
+        self.replication.snapshot_started(current is None or current.full)
+        return True
+
+    def check_rdb_child(self, wait=False):
+        '''
+        Reap the background saving child if it exited.
+
+        :param wait: wait for the child to exit
+        '''
+
+        if self.rdb_child_pid is None:
+            return
+        pid, status = os.waitpid(self.rdb_child_pid, 0 if wait else os.WNOHANG)
+        if not pid:
+            return
+        self.rdb_child_pid = None
+        self.child_reaped(pid)
+        ok = os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0
+        if ok:
+            logger.info('background saving terminated with success')
+        else:
+            logger.error('background saving failed')
+        current, self.rdb_child_checkpoint = self.rdb_child_checkpoint, None
+        self.rdb_save_done(self.rdb_child_start, self.rdb_child_changes, ok, current)
+        self.replication.snapshot_done(ok)
+
+    def rdb_save_done(self, begin, changes, ok, current=None):
+        now = time.time()
+        self.rdb_last_save_ok = ok
+        self.rdb_last_save_attempt = now
+        self.rdb_last_save_duration = now - begin
+        if ok:
+            self.lastsave = int(now)
+            self.rdb_changes_at_last_save = changes
+            self.stat_rdb_saves += 1
+            if current is None or current.full:
+                # The deltas of the previous base
+                checkpoint.remove_deltas(self.rdb_path())
+        if current is not None and self.checkpoints is not None:
+            self.checkpoints.finish(current, ok)
+
+    def rdb_cron(self):
+        '''
+        Start a background snapshot when one of the ``save`` points is reached: at least the given
+        number of changes since the last snapshot, written at least the given number of seconds ago.
+        '''
+
+        self.check_rdb_child()
+        if self.rdb_child_pid is not None or not self.config['save']:
+            return
+        if self.aof is not None and self.aof.rewrite_pid is not None:
+            return
+        now = time.time()
+        if not self.rdb_last_save_ok and now - self.rdb_last_save_attempt < self.RDB_SAVE_RETRY_DELAY:
+            return
+        changed = self.changes() - self.rdb_changes_at_last_save
+        for seconds, changes in self.config['save']:
+            if changed >= changes and now - self.lastsave >= seconds:
+                logger.info('%d changes in %d seconds, saving' % (changes, seconds))
+                self.rdb_bgsave(delta=self.checkpoints is not None and self.checkpoints.delta_due())
+                return
+
+    # Time spent loading the values of a lazily loaded snapshot per event loop iteration, in seconds
+    LAZY_LOAD_STEP_DURATION = 0.002
+
+    def rdb_load(self):
+        '''
+        Load the snapshot, if there is one.
+
+        With ``rdb-lazy-load`` enabled and a snapshot written with its key index, only the index is
+        loaded, and the values are loaded when their keys are first accessed, or by lazy_load_step
+        in the background once the server runs.
+        '''
+
+        path = self.rdb_path()
+        if not os.path.exists(path):
+            return
+        begin = self.loading_start = time.time()
+        self.loading_ready_time = self.loading_done_time = None
+        try:
+            # The spill engine stores objects only, and already keeps the values on disk
+            if self.config['rdb-lazy-load'] and self.config['keyspace-backend'] != 'spill' and \
+                    not any(db.key_space for db in self.all_databases()):
+                snapshot = rdb.load_lazily(self, path, self.lazy_load_done)
+                if snapshot is not None:
+                    logger.info('DB key index loaded from disk: %d keys in %.3f seconds'
+                                % (snapshot.keys, time.time() - begin))
+                    self.load_deltas()
+                    self.loading_ready_time = time.time()
+                    self.rdb_changes_at_last_save = self.changes()
+                    if self.loading_done_time is None:
+                        self.loading_snapshot = snapshot
+                        self.schedule_lazy_load()
+                    return
+            keys = rdb.load(self, path)
+            logger.info('DB loaded from disk: %d keys in %.3f seconds' % (keys, time.time() - begin))
+            self.load_deltas()
+        except rdb.RDBError as e:
+            logger.error('failed to load the snapshot %s: %s' % (path, e))
+            raise
+        self.rdb_changes_at_last_save = self.changes()
+        self.loading_ready_time = self.loading_done_time = time.time()
+
+    def load_deltas(self):
+        '''
+        Apply the delta checkpoints of the snapshot just loaded.
+        '''
+
+        if self.checkpoints is not None:
+            # Loading the base is not a change to checkpoint
+            for db in self.all_databases():
+                db.take_changes()
+        path = self.rdb_path()
+        base_id, seq, delta_size = checkpoint.load_deltas(self, path)
+        if self.checkpoints is not None:
+            self.checkpoints.loaded(base_id, seq, os.path.getsize(path), delta_size)
+
+    def schedule_lazy_load(self):
+        if self.loop is not None and self.lazy_load_handle is None:
+            self.lazy_load_handle = self.loop.call_soon(self.lazy_load_step)
+
+    def lazy_load_step(self):
+        '''
+        Load values of the lazily loaded snapshot for ``LAZY_LOAD_STEP_DURATION``, and schedule the
+        next step if values are left, so the clients are served in between.
+        '''
+
+        self.lazy_load_handle = None
+        snapshot = self.loading_snapshot
+        if snapshot is None:
+            return
+        time_limit = time.monotonic() + self.LAZY_LOAD_STEP_DURATION
+        while snapshot.hydrate(100):
+            if time.monotonic() >= time_limit:
+                self.schedule_lazy_load()
+                return
+
+    def lazy_load_done(self, snapshot):
+        self.loading_snapshot = None
+        self.loading_done_time = time.time()
+        logger.info('DB values loaded from disk: %d keys in %.3f seconds, %d on access'
+                    % (snapshot.keys, self.loading_done_time - self.loading_start,
+                       snapshot.stat_loaded_on_access))
+
+    def loading_info(self):
+        snapshot = self.loading_snapshot
+
+        def elapsed_ms(end):
+            return -1 if end is None else int((end - self.loading_start) * 1000)
+
+        return [
+            ('loading_lazy', int(snapshot is not None)),
+            ('loading_keys_pending', snapshot.pending if snapshot is not None else 0),
+            ('loading_time_to_first_request_ms', elapsed_ms(self.loading_ready_time)),
+            ('loading_time_to_fully_loaded_ms', elapsed_ms(self.loading_done_time)),
+        ]
+
+    def aof_path(self):
+        return os.path.join(self.config['dir'], self.config['appendfilename'])
+
+    def start_aof(self):
+        '''
+        Start logging the write commands. The file is written from the keyspace first, unless it
+        already exists, in which case it was just replayed.
+        '''
+
+        path = self.aof_path()
+        if not os.path.exists(path):
+            aof.rewrite([db for idnum, db in sorted(self.dbs.items())], path)
+        self.aof = aof.AppendOnlyFile(self, path)
+
+    def stop_aof(self):
+        self.aof.close()
+        self.aof = None
+
+    def aof_load(self):
+        '''
+        Replay the AOF.
+        '''
+
+        path = self.aof_path()
+        begin = time.time()
+        try:
+            commands = aof.replay(self, path)
+        except aof.AOFError as e:
+            logger.error('failed to load the append only file %s: %s' % (path, e))
+            raise
+        self.rdb_changes_at_last_save = self.changes()
+        self.loading_start = begin
+        self.loading_ready_time = self.loading_done_time = time.time()
+        logger.info('DB loaded from append only file: %d commands in %.3f seconds'
+                    % (commands, time.time() - begin))
+
     def kill_client(self, ipaddr):
         client = self.clients[ipaddr]
         client.transport.close()
@@ -115,6 +921,151 @@ class RedisServer(RedisServerMixin, RedisServerTestClientMixin):
         self.pause_seconds = seconds
         raise NotImplementedError()
 
+    # Part of each cron period the active expire cycle may use
+    ACTIVE_EXPIRE_CYCLE_SLOW_TIME_PERC = 25
+    # Duration of the fast cycles run between two cron periods while expired keys are left, in seconds
+    ACTIVE_EXPIRE_CYCLE_FAST_DURATION = 0.001
+
+    def server_cron(self):
+        '''
+        Periodic tasks, run ``hz`` times per second on the event loop.
+        '''
+
+        self.cronloops += 1
+        period = 1.0 / max(self.config['hz'], 1)
+
+        self.active_expire_cycle(period * self.ACTIVE_EXPIRE_CYCLE_SLOW_TIME_PERC / 100)
+        for db in self.all_databases():
+            db.key_space.rehash(100)
+        if self.backing_store is not None:
+            self.backing_store.cron()
+        self.rdb_cron()
+        if self.aof is not None:
+            self.aof.cron()
+        self.replication.cron()
+        self.migrate_pool.cron()
+
+        self.loop.call_later(period, self.server_cron)
+
+    def active_expire_cycle(self, duration):
+        '''
+        Reclaim expired keys of all the databases for at most duration seconds.
+
+        When expired keys are left, fast cycles of ``ACTIVE_EXPIRE_CYCLE_FAST_DURATION`` are scheduled
+        with the same amount of idle time in between, until the backlog is cleared. So the expire rate
+        follows the number of expired keys, while clients still get served between the cycles.
+
+        :return: the number of expired keys
+        :rtype: int
+        '''
+
+        begin = time.monotonic()
+        time_limit = begin + duration
+        expired = 0
+        timed_out = False
+        for db in list(self.all_databases()):
+            db_expired, timed_out = db.active_expire_cycle(time_limit)
+            expired += db_expired
+            if timed_out:
+                break
+        self.stat_expire_cycle_time += time.monotonic() - begin
+
+        if timed_out and self.loop is not None and self.active_expire_fast_handle is None:
+            self.active_expire_fast_handle = self.loop.call_later(
+                self.ACTIVE_EXPIRE_CYCLE_FAST_DURATION, self.active_expire_fast_cycle)
+        return expired
+
+    def active_expire_fast_cycle(self):
+        self.active_expire_fast_handle = None
+        self.active_expire_cycle(self.ACTIVE_EXPIRE_CYCLE_FAST_DURATION)
+
+    def get_info_sections(self):
+        '''
+        :return: the INFO sections, as (section name, [(field, value), ...]) pairs
+        :rtype: list
+        '''
+
+        dbs = sorted(self.dbs.items())
+        dedup_hits = sum(db.blobs.hits for idnum, db in dbs)
+        dedup_lookups = dedup_hits + sum(db.blobs.misses for idnum, db in dbs)
+        return [
+            ('Server', [
+                ('redis_version', '2.8.0'),
+                ('process_id', os.getpid()),
+                ('uptime_in_seconds', int(time.time() - self.start_time)),
+                ('hz', self.config['hz']),
+            ]),
+            ('Clients', [
+                ('connected_clients', len(self.clients)),
+            ]),
+            ('Memory', [
+                ('used_memory', self.used_memory()),
+                ('maxmemory', self.config['maxmemory']),
+                ('maxmemory_policy', self.config['maxmemory-policy']),
+            ]),
+            ('Compression', [
+                ('compress_min_size', self.config['compress-min-size']),
+                ('compress_codec', self.config['compress-codec']),
+                ('compressed_values', compression_stats.compressed_values),
+                ('compress_rejected_values', compression_stats.rejected_values),
+                ('compress_input_bytes', compression_stats.input_bytes),
+                ('compress_output_bytes', compression_stats.output_bytes),
+                ('compression_ratio', '%.2f' % compression_stats.ratio()),
+                ('compression_cpu_milliseconds', int(compression_stats.compression_time * 1000)),
+                ('decompressed_bytes', compression_stats.decompressed_bytes),
+                ('decompression_cpu_milliseconds', int(compression_stats.decompression_time * 1000)),
+            ]),
+            ('Deduplication', [
+                ('dedup_min_size', self.config['dedup-min-size']),
+                ('dedup_blobs', sum(len(db.blobs) for idnum, db in dbs)),
+                ('dedup_references', sum(db.blobs.references for idnum, db in dbs)),
+                ('dedup_hits', dedup_hits),
+                ('dedup_misses', dedup_lookups - dedup_hits),
+                ('dedup_hit_rate', '%.2f' % (dedup_hits / dedup_lookups if dedup_lookups else 0.0)),
+                ('dedup_blobs_bytes', sum(db.blobs.memory for idnum, db in dbs)),
+                ('dedup_saved_bytes', sum(db.blobs.saved_memory for idnum, db in dbs)),
+            ]),
+            ('Backing store', [
+                ('backing_store', self.config['backing-store']),
+            ] + (self.backing_store.info() if self.backing_store is not None else [])),
+            ('Persistence', [
+                ('rdb_changes_since_last_save', self.changes() - self.rdb_changes_at_last_save),
+                ('rdb_bgsave_in_progress', int(self.rdb_child_pid is not None)),
+                ('rdb_last_save_time', self.lastsave),
+                ('rdb_last_bgsave_status', 'ok' if self.rdb_last_save_ok else 'err'),
+                ('rdb_last_bgsave_time_sec', int(self.rdb_last_save_duration)),
+                ('rdb_saves', self.stat_rdb_saves),
+            ] + self.loading_info() + [
+                ('checkpoint_deltas_enabled', int(self.checkpoints is not None)),
+            ] + (self.checkpoints.info() if self.checkpoints is not None else []) + [
+                ('aof_enabled', int(self.aof is not None)),
+            ] + (self.aof.info() if self.aof is not None else [])),
+            ('Stats', [
+                ('expired_keys', sum(db.expired_keys for idnum, db in dbs)),
+                ('evicted_keys', self.stat_evicted_keys),
+                ('expire_cycle_cpu_milliseconds', int(self.stat_expire_cycle_time * 1000)),
+            ] + self.replication.stats_info()),
+            ('Replication', self.replication.info()),
+            ('Cluster', [
+                ('cluster_enabled', int(self.cluster is not None)),
+            ]),
+            ('Keyspace', [
+                ('db%d' % idnum, 'keys=%d,expires=%d,avg_ttl=%d' % (
+                    len(db.key_space), db.volatile_keys, int(db.avg_ttl() * 1000)))
+                for idnum, db in dbs if db.key_space
+            ]),
+        ]
+
+    def get_info_str(self, section=None):
+        parts = []
+        for name, fields in self.get_info_sections():
+            if section is not None and section not in (name.lower(), 'all', 'default', 'everything'):
+                continue
+            parts.append('# %s\r\n' % name)
+            parts.extend('%s:%s\r\n' % (field, value) for field, value in fields)
+            parts.append('\r\n')
+        return ''.join(parts)
+
     def get_clients_info_str(self):
         repr_strs = [client.get_info_str() for ipaddr, client in self.clients.items()]
         return '\r'.join(repr_strs)
@@ -124,13 +1075,35 @@ class RedisServer(RedisServerMixin, RedisServerTestClientMixin):
         client = RedisClient(self, stream_reader, stream_writer)
         self.clients[client.ipaddr] = client
         yield from client.run()
+        self.replication.remove_replica(client)
         del self.clients[client.ipaddr]
 
-    def run(self, host=None, port=8888):
+    def run(self, host=None, port=None):
+        self.functions.load_from_disk()
+        self.configure_checkpoints()
+        if self.config['appendonly'] and os.path.exists(self.aof_path()):
+            # The AOF is more recent than the snapshot
+            self.aof_load()
+        else:
+            self.rdb_load()
+        if self.config['appendonly']:
+            self.start_aof()
+        if self.backing_store is None:
+            self.configure_backing_store()
+
+        if port is not None:
+            self.config['port'] = port
+
         loop = asyncio.get_event_loop()
-        coro = asyncio.start_server(self.client_connected_cb, host=host, port=port, loop=loop)
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        coro = asyncio.start_server(self.client_connected_cb, host=host, port=self.config['port'])
         server = loop.run_until_complete(coro)
         logger.info('serving on {}'.format(server.sockets[0].getsockname()))
+        loop.call_soon(self.server_cron)
+        self.schedule_lazy_load()
+        self.replication.configure()
+        self.configure_cluster()
 
         try:
             loop.run_forever()
@@ -138,6 +1111,16 @@ class RedisServer(RedisServerMixin, RedisServerTestClientMixin):
             logger.info('exiting')
         finally:
             server.close()
+            self.check_rdb_child(wait=True)
+            if self.config['save']:
+                self.rdb_save()
+            if self.aof is not None:
+                self.stop_aof()
+            if self.backing_store is not None:
+                self.backing_store.close()
+            self.migrate_pool.close()
+            for db in self.all_databases():
+                db.key_space.close()
             loop.close()
 
 
@@ -147,6 +1130,9 @@ class RedisClientBase:
     STAT_MULTI = 1
     STAT_EXEC = 2
 
+    # Commands executed immediately inside a MULTI block instead of being queued
+    TRANSACTION_COMMANDS = (b'EXEC', b'DISCARD', b'MULTI', b'WATCH')
+
     def __init__(self, server):
         self.server = server
 
@@ -161,7 +1147,21 @@ class RedisClientBase:
         self.last_active_time = self.conn_time
 
         self.stat = RedisClient.STAT_NORMAL
+        # Whether the command being executed may return a deferred reply
+        self.suspendable = False
         self.multi_command_list = []
+        # (database, key, version) recorded by WATCH
+        self.watched_keys = []
+
+        # Set when the client is a replica, see PSYNC, with the port it listens on
+        self.replica = None
+        self.replica_listening_port = 0
+        # Set by ASKING for the next command, see Cluster.route
+        self.asking = False
+        # Cursors of the SCAN iterations of the radix keyspace
+        self.scan_cursors = ScanCursors()
+        # Command propagated instead of the one executed, see RedisServer.propagate
+        self.propagate_argv = None
 
     def get_info_str(self):
         return 'addr={addr} fd= name={name} age={age} idle={idle} flags= db={db} sub= psub= multi= qbuf= ' \
@@ -178,19 +1178,69 @@ class RedisClientBase:
     def db(self):
         return self._db
 
+    # Estimated memory used by a client, besides its queued commands
+    CLIENT_OVERHEAD = 2048
+
+    def memory_usage(self):
+        '''
+        :return: the estimated memory used by the client, in bytes
+        :rtype: int
+        '''
+
+        queued = sum(sys.getsizeof(arg) for argv in self.multi_command_list for arg in argv)
+        return self.CLIENT_OVERHEAD + queued
+
     def change_db(self, dbnum):
         self._db = self.server.get_database(dbnum)
 
-    def exec_command(self, argv):
+    def watch(self, key):
+        for db, watched_key, version in self.watched_keys:
+            if db is self.db and watched_key == key:
+                return
+        self.db.watch(key)
+        self.watched_keys.append((self.db, key, self.db.key_version(key)))
+
+    def unwatch_all(self):
+        for db, key, version in self.watched_keys:
+            db.unwatch(key)
+        self.watched_keys = []
+
+    def watched_keys_modified(self):
+        for db, key, version in self.watched_keys:
+            if db.key_version(key) != version:
+                return True
+        return False
+
+    def queue_command(self, argv):
+        '''
+        Queue the command if the client is inside a MULTI block.
+
+        :return: whether the command was queued
+        :rtype: bool
+        '''
+
+        if self.stat != RedisClientBase.STAT_MULTI or argv[0].upper() in self.TRANSACTION_COMMANDS:
+            return False
+        self.multi_command_list.append(argv)
+        return True
+
+    def exec_command(self, argv, suspendable=False):
         '''
         Execute the command and serialize the return value as the REdis Serializaion Protocol representation.
 
+        :param suspendable: whether the command may be suspended, it then returns an ``asyncio.Future``
+                            of its reply. Commands run inside another one, by EXEC or a function, are
+                            never suspended so they keep running atomically.
         :return: RESP value
         :rtype: RedisSerializationObject
 
         '''
 
-        return self.server.exec_command(argv, self)
+        self.suspendable = suspendable
+        try:
+            return self.server.exec_command(argv, self)
+        finally:
+            self.suspendable = False
 
     def run(self):
         raise NotImplementedError()
@@ -221,14 +1271,69 @@ class RedisTestClient(RedisClientBase):
         else:
             argv = InlineProtocolParser.parse_line(command_str)
 
-        if self.stat == RedisClientBase.STAT_MULTI \
-                and argv[0].upper() != b'EXEC':
-            self.multi_command_list.append(argv)
-            return RedisSimpleStringSerializationObject('QUEUED')
+        if self.queue_command(argv):
+            return RedisSimpleStringSerializationObject('QUEUED').to_resp()
 
         return self.server.exec_command(argv, self).to_resp()
 
 
+class RedisEmbeddedClient(RedisClientBase):
+
+    '''
+    In-process client for applications embedding the server.
+
+    Commands are given as Python values and call the handlers directly, replies are returned as
+    native Python values (see ``native_reply``) and nothing is encoded to or parsed from RESP. It can
+    be used from any thread, commands are run on the event loop thread when the server is running.
+    '''
+
+    def __init__(self, server):
+        super(RedisEmbeddedClient, self).__init__(server)
+
+    def execute(self, *args):
+        '''
+        Execute a single command, e.g. ``client.execute('SET', 'key', 10)``.
+
+        :return: the native reply
+        :raises CommandError: the command replied with an error
+        '''
+
+        reply = self.server.call_in_server_thread(self._execute, make_argv(args))
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    def execute_many(self, commands):
+        '''
+        Execute a batch of commands in one go, without any other client running in between.
+
+        :param commands: iterable of argument sequences
+        :return: the native replies, in order. Failed commands have their exception in place of a reply.
+        :rtype: list
+        '''
+
+        argvs = [make_argv(args) for args in commands]
+        return self.server.call_in_server_thread(self._execute_many, argvs)
+
+    def _execute_many(self, argvs):
+        return [self._execute(argv) for argv in argvs]
+
+    def _execute(self, argv):
+        if not argv:
+            return CommandError('ERR', 'empty command')
+        if self.queue_command(argv):
+            return b'QUEUED'
+
+        try:
+            # Routed like the commands of the other clients, unlike the commands replayed from the
+            # AOF or the primary
+            if self.server.cluster is not None:
+                self.server.cluster.route(argv, self)
+            return native_reply(self.server.exec_native_command(argv, self))
+        except (CommandError, CommandNotFoundError) as e:
+            return e
+
+
 class RedisClient(RedisClientBase):
 
     def __init__(self, server, stream_reader, stream_writer):
@@ -239,9 +1344,10 @@ class RedisClient(RedisClientBase):
         self.proto = RedisProtocol(self.stream_reader)
 
     def get_info_str(self):
-        return 'addr={addr} fd= name={name} age={age} idle={idle} flags= db={db} sub= psub= multi= qbuf= ' \
-            'qbuf-free= obl= oll= omem= events= cmd={last_cmd}'.format(
+        return 'addr={addr} fd= name={name} age={age} idle={idle} flags={flags} db={db} sub= psub= multi= ' \
+            'qbuf= qbuf-free= obl= oll= omem= events= cmd={last_cmd}'.format(
                 addr=self.ipaddr,
+                flags='S' if self.replica is not None else '',
                 age=int(time.time() - self.conn_time),
                 idle=int(self.idle_time),
                 db=self.db.idnum,
@@ -262,6 +1368,7 @@ class RedisClient(RedisClientBase):
         ipaddr, ipport, *others = self.peername
         return '%s:%s' % (ipaddr, ipport)
 
+    @asyncio.coroutine
     def run(self):
         logger.info('client {} connected'.format(self.ipaddr))
         while True:
@@ -284,16 +1391,17 @@ class RedisClient(RedisClientBase):
                 self.write_object(RedisSimpleStringSerializationObject('OK'))
                 break
 
-            if self.stat == RedisClientBase.STAT_MULTI \
-                    and argv[0].upper() != b'EXEC':
-                self.multi_command_list.append(argv)
+            if self.queue_command(argv):
                 self.write_object(RedisSimpleStringSerializationObject('QUEUED'))
                 continue
 
-            ret = self.exec_command(argv)
+            ret = self.exec_command(argv, suspendable=True)
+            if isinstance(ret, asyncio.Future):
+                ret = yield from ret
             self.write_object(ret)
             self.last_cmd = argv[0].decode()
 
+        self.unwatch_all()
         self.close()
         logger.info('client {} exiting'.format(self.ipaddr))
 
@@ -1,18 +1,552 @@
-
+import heapq
+import itertools
+import sys
 import time
+from random import random, randrange
+from time import monotonic
+
+from redis.common.hashslot import key_hash_slot
+from .config import RedisConfig
+from .dedup import BlobTable
+from .evict import lfu_incr_probabilities, lfu_decay_period, lfu_decayed_counter
+from .hotkeys import HotKeys
+from .keyspace import KEYSPACE_BACKENDS
+from .rdb import LazySnapshotKeyspace
 
 key_space = {}
 
+# Estimated memory used by the keyspace for every key, besides the key and the object
+KEYSPACE_ENTRY_OVERHEAD = 64
+# Estimated memory used by a volatile key in the expires map and the expires index
+EXPIRES_ENTRY_SIZE = 128
+
 
 class RedisDatabase:
 
-    def __init__(self, idnum=0):
+    def __init__(self, idnum=0, config=None):
         self._idnum = idnum
-        self.key_space = {}
+        self.config = config if config is not None else RedisConfig()
+        self.key_space = KEYSPACE_BACKENDS[self.config['keyspace-backend']]()
+        # Most accessed keys, created by configure
+        self.hotkeys = None
+        self.configure()
+
+        # Estimated memory used by the keys and their values, and its breakdown as
+        # {type name: [keys, bytes]}
+        self.used_memory = 0
+        self.type_stats = {}
+
+        # Shared large string values, and {key: digest} for the keys referencing one of them
+        self.blobs = BlobTable()
+        self.blob_refs = {}
+
+        # BackingStoreCache the modified keys are written to, set by the server
+        self.backing_store = None
+
+        # With delta checkpoints, the keys modified or deleted since the last checkpoint, and
+        # whether the database was flushed since, see track_changes
+        self.dirty_keys = None
+        self.dirty_flushed = False
+
+        # In cluster mode, the keys of every hash slot as {slot: set}, see track_slots
+        self.slot_keys = None
+
+        # Modification counter of the database, every change of a key stamps it with the next value
+        self.version = 0
+        # Number of clients watching each key
+        self.watched_keys = {}
+        # Version of the deletion of watched keys, which have no object left to carry it
+        self.deleted_versions = {}
+
+        # Timeouts of the volatile keys, as {key: absolute unix time}
+        self.expires = {}
+        # Min-heap of (expire time, key) for the volatile keys. Entries are not removed when a key
+        # is deleted or its timeout changes, they are dropped when they reach the top of the heap
+        # and do not match the expires map anymore.
+        self.expires_index = []
+        self.volatile_deadlines_sum = 0.0
+        self.expired_keys = 0
 
     @property
     def idnum(self):
         return self._idnum
 
+    @property
+    def volatile_keys(self):
+        return len(self.expires)
+
+    def configure(self):
+        '''
+        Apply the configuration parameters the database depends on, after they were changed.
+        '''
+
+        self.lfu_incr_probabilities = lfu_incr_probabilities(self.config['lfu-log-factor'])
+        self.lfu_decay_period = lfu_decay_period(self.config['lfu-decay-time'])
+        sample_rate = self.config['hotkeys-sample-rate']
+        self.hotkeys_sample_probability = 1.0 / sample_rate if sample_rate > 0 else 0.0
+        if self.hotkeys is None or self.hotkeys.capacity != self.config['hotkeys-capacity']:
+            self.hotkeys = HotKeys(self.config['hotkeys-capacity'])
+        self.compress_min_size = self.config['compress-min-size']
+        self.compress_codec = self.config['compress-codec']
+        self.dedup_min_size = self.config['dedup-min-size']
+
+        backend = KEYSPACE_BACKENDS[self.config['keyspace-backend']]
+        if isinstance(self.key_space, LazySnapshotKeyspace) and type(self.key_space.base) is backend:
+            # Kept until the values of the snapshot are loaded
+            self.key_space.configure(self.config)
+        elif type(self.key_space) is not backend:
+            # Move the keys to a keyspace of the other implementation
+            key_space = backend()
+            key_space.configure(self.config)
+            for key, obj in self.key_space.items():
+                key_space[key] = obj
+            self.key_space.close()
+            self.key_space = key_space
+        else:
+            self.key_space.configure(self.config)
+
+    def touch(self, key, obj):
+        '''
+        Record an access to the object obj of key: its access time, for OBJECT IDLETIME and the LRU
+        policies, its logarithmic access counter, for OBJECT FREQ and the LFU policies, and a sample
+        of the accesses to the key, for HOTKEYS.
+        '''
+
+        # This is run by every command reading or writing a key, keep it short
+        now = monotonic()
+        if now - obj.atime >= self.lfu_decay_period:
+            obj.freq = lfu_decayed_counter(obj, self.lfu_decay_period, now)
+        obj.atime = now
+        # The same draw decides the increment and the sampling, each access is still sampled with
+        # the same probability whatever its key
+        draw = random()
+        if draw < self.lfu_incr_probabilities[obj.freq]:
+            obj.freq += 1
+        if draw < self.hotkeys_sample_probability:
+            self.hotkeys.add(key)
+
+    def idle_time(self, obj):
+        '''
+        :return: the seconds elapsed since the last access to obj
+        :rtype: float
+        '''
+
+        return monotonic() - obj.atime
+
+    def access_frequency(self, obj):
+        '''
+        :return: the logarithmic access counter of obj, decayed since its last access
+        :rtype: int
+        '''
+
+        return lfu_decayed_counter(obj, self.lfu_decay_period, monotonic())
+
+    def store_value(self, key, obj):
+        '''
+        Deduplicate or compress the value of obj, which was just stored at key or modified.
+        '''
+
+        old_digest = self.blob_refs.pop(key, None)
+        if old_digest is not None and obj.value is self.blobs[old_digest]:
+            self.blob_refs[key] = old_digest
+            return
+
+        value = obj.value
+        if self.dedup_min_size and value.__class__ is bytes and len(value) >= self.dedup_min_size:
+            codec = self.compress_codec if self.compress_min_size and \
+                len(value) >= self.compress_min_size else None
+            digest, added = self.blobs.acquire(obj, codec)
+            self.blob_refs[key] = digest
+            self.used_memory += added
+            self.type_stats[obj.type_name][1] += added
+        elif self.compress_min_size:
+            self.compress_value(obj)
+
+        # Released last, so storing the same value again does not drop it from the table
+        if old_digest is not None:
+            self.release_blob(old_digest)
+
+    def release_blob(self, digest):
+        freed = self.blobs.release(digest)
+        self.used_memory -= freed
+        self.type_stats[b'string'][1] -= freed
+
+    def compress_value(self, obj):
+        '''
+        Compress the value of obj if compression is enabled and it is a large enough string. Values
+        written afterwards are compressed again, values already compressed are kept as they are
+        when the parameters change.
+        '''
+
+        value = obj.value
+        if value.__class__ is bytes and len(value) >= self.compress_min_size:
+            obj.compress(self.compress_codec)
+
+    def account_memory(self, key, obj):
+        memory = sys.getsizeof(key) + KEYSPACE_ENTRY_OVERHEAD + obj.memory
+        delta = memory - obj.accounted_memory
+        self.used_memory += delta
+        self.type_stats[obj.type_name][1] += delta
+        obj.accounted_memory = memory
+
+    def account_loaded_object(self, key, obj):
+        '''
+        Account obj, stored at key by a lazily loaded snapshot without going through put_key.
+        '''
+
+        self.account_new_object(obj)
+        if self.compress_min_size or self.dedup_min_size:
+            self.store_value(key, obj)
+        self.account_memory(key, obj)
+
+    def account_new_object(self, obj):
+        stats = self.type_stats.get(obj.type_name)
+        if stats is None:
+            stats = self.type_stats[obj.type_name] = [0, 0]
+        stats[0] += 1
+
+    def unaccount_object(self, obj):
+        stats = self.type_stats[obj.type_name]
+        stats[0] -= 1
+        stats[1] -= obj.accounted_memory
+        self.used_memory -= obj.accounted_memory
+        obj.accounted_memory = 0
+
+    def expires_memory_overhead(self):
+        '''
+        :return: the estimated memory used by the expires index, in bytes
+        :rtype: int
+        '''
+
+        return (sys.getsizeof(self.expires) + sys.getsizeof(self.expires_index) +
+                len(self.expires_index) * EXPIRES_ENTRY_SIZE)
+
+    def sample(self, count, volatile=False):
+        '''
+        Pick about count random keys, among the keys with a timeout if volatile is set.
+
+        :return: (key, object) pairs
+        :rtype: list
+        '''
+
+        if not volatile:
+            return [(key, self.key_space.peek(key)) for key in self.key_space.sample(count)]
+
+        result = []
+        if not self.expires:
+            return result
+        for attempt in range(2):
+            expires_index = self.expires_index
+            for i in range(count * 3):
+                expire_time, key = expires_index[randrange(len(expires_index))]
+                if self.expires.get(key) == expire_time:
+                    result.append((key, self.key_space.peek(key)))
+                    if len(result) == count:
+                        return result
+            if result:
+                break
+            # Only stale entries were picked, drop them
+            self.rebuild_expires_index()
+        return result
+
+    def next_version(self):
+        self.version += 1
+        return self.version
+
+    def key_version(self, key):
+        '''
+        The version of a key changes every time the key is set, modified, expired or deleted, so
+        comparing two versions tells whether the key changed in between without comparing values.
+
+        Deletions are only versioned for watched keys, for other keys a missing key has version 0.
+
+        :rtype: int
+        '''
+
+        obj = self.key_space.get(key)
+        if obj is None:
+            return self.deleted_versions.get(key, 0)
+        if self.expired(key):
+            self.expire_key(key)
+            return self.deleted_versions.get(key, 0)
+        return obj.version
+
+    def expired(self, key):
+        '''
+        :return: whether the timeout of key elapsed
+        :rtype: bool
+        '''
+
+        expire_time = self.expires.get(key)
+        return expire_time is not None and time.time() > expire_time
+
+    def set_key(self, key, obj, expire_time=None):
+        '''
+        Store obj at key, replacing the previous value and its timeout. When obj is the object
+        already stored at key, after it was modified in place, the timeout is kept.
+
+        :param expire_time: the timeout of the key, as an absolute unix time in seconds
+        '''
+
+        self.put_key(key, obj, expire_time)
+        if self.backing_store is not None:
+            self.backing_store.write(self.idnum, key, obj, self.expires.get(key))
+
+    def put_key(self, key, obj, expire_time=None):
+        '''
+        Same as set_key, without writing the key to the backing store.
+        '''
+
+        old_obj = self.key_space.get(key)
+        if old_obj is not obj:
+            if old_obj is not None:
+                # The access statistics belong to the key
+                obj.atime, obj.freq = old_obj.atime, old_obj.freq
+                self.unaccount_object(old_obj)
+                self.remove_volatile(key)
+            elif self.slot_keys is not None:
+                self.slot_keys.setdefault(key_hash_slot(key), set()).add(key)
+            if expire_time is not None:
+                self.add_volatile(key, expire_time)
+            self.account_new_object(obj)
+
+        obj.version = self.next_version()
+        self.touch(key, obj)
+        self.key_space[key] = obj
+        if self.dirty_keys is not None:
+            self.dirty_keys.add(key)
+        if self.compress_min_size or self.dedup_min_size or self.blob_refs:
+            self.store_value(key, obj)
+        self.account_memory(key, obj)
+
+    def delete_key(self, key):
+        '''
+        :raises KeyError: the key does not exist
+        '''
+
+        self.remove_key(key)
+        if self.backing_store is not None:
+            self.backing_store.write(self.idnum, key, None)
+
+    def remove_key(self, key):
+        '''
+        Same as delete_key, keeping the key in the backing store. Used to evict keys.
+
+        :raises KeyError: the key does not exist
+        '''
+
+        obj = self.key_space.pop(key)
+        self.unaccount_object(obj)
+        self.remove_volatile(key)
+        if self.slot_keys is not None:
+            keys = self.slot_keys[key_hash_slot(key)]
+            keys.discard(key)
+            if not keys:
+                del self.slot_keys[key_hash_slot(key)]
+        if key in self.blob_refs:
+            self.release_blob(self.blob_refs.pop(key))
+        # Counted as a change even when the key is not watched
+        version = self.next_version()
+        if key in self.watched_keys:
+            self.deleted_versions[key] = version
+        if self.dirty_keys is not None:
+            self.dirty_keys.add(key)
+
+    def expire_key(self, key):
+        '''
+        Delete a key whose timeout elapsed.
+        '''
+
+        self.delete_key(key)
+        self.expired_keys += 1
+
+    def set_expire(self, key, expire_time):
+        '''
+        Set the timeout of an existing key, as an absolute unix time in seconds.
+        '''
+
+        if key not in self.key_space:
+            raise KeyError(key)
+        self.remove_volatile(key)
+        self.add_volatile(key, expire_time)
+        self.signal_modified_key(key)
+
+    def persist(self, key):
+        '''
+        Remove the timeout of an existing key.
+
+        :return: whether the key had a timeout
+        :rtype: bool
+        '''
+
+        if key not in self.key_space:
+            raise KeyError(key)
+        if not self.remove_volatile(key):
+            return False
+        self.signal_modified_key(key)
+        return True
+
+    def add_volatile(self, key, expire_time):
+        self.expires[key] = expire_time
+        self.volatile_deadlines_sum += expire_time
+        heapq.heappush(self.expires_index, (expire_time, key))
+
+        # Rebuild the index when stale entries are the majority, so it stays proportional to the
+        # number of volatile keys
+        if len(self.expires_index) > 2 * len(self.expires) + 1024:
+            self.rebuild_expires_index()
+
+    def remove_volatile(self, key):
+        '''
+        :return: whether key had a timeout
+        :rtype: bool
+        '''
+
+        expire_time = self.expires.pop(key, None)
+        if expire_time is None:
+            return False
+        self.volatile_deadlines_sum -= expire_time
+        return True
+
+    def rebuild_expires_index(self):
+        self.expires_index = [(expire_time, key) for key, expire_time in self.expires.items()]
+        heapq.heapify(self.expires_index)
+        self.volatile_deadlines_sum = sum(self.expires.values())
+
+    def avg_ttl(self):
+        '''
+        :return: the average time to live of the volatile keys, in seconds
+        :rtype: float
+        '''
+
+        if not self.expires:
+            return 0.0
+        return max(self.volatile_deadlines_sum / len(self.expires) - time.time(), 0.0)
+
+    def active_expire_cycle(self, time_limit):
+        '''
+        Delete the keys whose timeout elapsed, in expire time order, until there are none left or
+        ``time.monotonic()`` reaches time_limit.
+
+        :return: the number of expired keys and whether expired keys are left
+        :rtype: tuple
+        '''
+
+        expires_index = self.expires_index
+        now = time.time()
+        expired = 0
+        checked = 0
+
+        while expires_index and expires_index[0][0] <= now:
+            expire_time, key = heapq.heappop(expires_index)
+            if self.expires.get(key) == expire_time:
+                self.expire_key(key)
+                expired += 1
+
+            checked += 1
+            if checked % 16 == 0 and time.monotonic() >= time_limit:
+                return expired, bool(expires_index) and expires_index[0][0] <= now
+        return expired, False
+
+    def signal_modified_key(self, key):
+        '''
+        Must be called after the object stored at key was modified in place.
+        '''
+
+        obj = self.key_space.get(key)
+        if obj is not None:
+            obj.version = self.next_version()
+            if self.compress_min_size or self.dedup_min_size or self.blob_refs:
+                self.store_value(key, obj)
+            self.account_memory(key, obj)
+        elif key in self.watched_keys:
+            self.deleted_versions[key] = self.next_version()
+        if self.dirty_keys is not None:
+            self.dirty_keys.add(key)
+        if self.backing_store is not None:
+            self.backing_store.write(self.idnum, key, obj, self.expires.get(key))
+
+    def track_changes(self, enabled):
+        '''
+        Start or stop tracking the keys changed since the last checkpoint.
+        '''
+
+        self.dirty_keys = set() if enabled else None
+        self.dirty_flushed = False
+
+    def track_slots(self, enabled):
+        '''
+        Start or stop indexing the keys by hash slot, for cluster mode. The index is built from the
+        keys already stored.
+        '''
+
+        if not enabled:
+            self.slot_keys = None
+            return
+        self.slot_keys = {}
+        for key in self.key_space:
+            self.slot_keys.setdefault(key_hash_slot(key), set()).add(key)
+
+    def count_keys_in_slot(self, slot):
+        return len(self.slot_keys.get(slot, ()))
+
+    def get_keys_in_slot(self, slot, count):
+        '''
+        :return: at most count keys of the hash slot
+        :rtype: list
+        '''
+
+        keys = self.slot_keys.get(slot, ())
+        return list(keys) if count >= len(keys) else list(itertools.islice(keys, count))
+
+    def take_changes(self):
+        '''
+        :return: the keys changed since the last call, and whether the database was flushed since,
+                 the tracking starts over
+        :rtype: tuple
+        '''
+
+        changes = self.dirty_keys, self.dirty_flushed
+        self.dirty_keys = set()
+        self.dirty_flushed = False
+        return changes
+
+    def restore_changes(self, keys, flushed):
+        '''
+        Give back the changes taken by a checkpoint that failed.
+        '''
+
+        if self.dirty_keys is not None:
+            self.dirty_keys |= keys
+            self.dirty_flushed = self.dirty_flushed or flushed
+
+    def watch(self, key):
+        self.watched_keys[key] = self.watched_keys.get(key, 0) + 1
+
+    def unwatch(self, key):
+        count = self.watched_keys[key] - 1
+        if count:
+            self.watched_keys[key] = count
+        else:
+            del self.watched_keys[key]
+            self.deleted_versions.pop(key, None)
+
     def flush(self):
+        # The deleted keys count as changes for the snapshot schedule
+        self.version += len(self.key_space)
+        for key in self.watched_keys:
+            self.deleted_versions[key] = self.next_version()
         self.key_space.clear()
+        if self.dirty_keys is not None:
+            self.dirty_keys = set()
+            self.dirty_flushed = True
+        if self.slot_keys is not None:
+            self.slot_keys = {}
+        self.used_memory = 0
+        self.type_stats = {}
+        self.blobs = BlobTable()
+        self.blob_refs = {}
+        self.hotkeys.clear()
+        self.expires = {}
+        self.expires_index = []
+        self.volatile_deadlines_sum = 0.0
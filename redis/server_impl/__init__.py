@@ -1,4 +1,6 @@
 
+import sys
+
 from redis.server import RedisServer
 
 server = RedisServer()
@@ -7,9 +9,34 @@ from .string_command import *
 from .list_command import *
 from .client_command import *
 from .misc_command import *
+from .server_command import *
+from .function_command import *
+from .replication_command import *
+from .cluster_command import *
+
+
+def parse_args(args):
+    '''
+    Set the configuration parameters given on the command line as ``--name value`` pairs, e.g.
+    ``redis-server --port 6380 --replicaof "127.0.0.1 6379"``.
+    '''
+
+    if len(args) % 2:
+        raise SystemExit('usage: redis-server [--name value ...]')
+    for i in range(0, len(args), 2):
+        name, value = args[i], args[i + 1]
+        try:
+            if not name.startswith('--'):
+                raise KeyError(name)
+            server.config.set_from_string(name[2:], value)
+        except (KeyError, ValueError):
+            raise SystemExit('Bad directive or wrong number of arguments: %s %s' % (name, value))
+    for db in server.all_databases():
+        db.configure()
 
 
-def server_main():
+def server_main(args=None):
+    parse_args(sys.argv[1:] if args is None else args)
     server.run()
 
 if __name__ == '__main__':
@@ -0,0 +1,140 @@
+from redis.server import current_server as server
+from redis.common.hashslot import CLUSTER_SLOTS, key_hash_slot
+from redis.common.utils import abort
+from redis.common.utils import nargs_greater_equal
+
+CLUSTER_USAGE = 'Unknown subcommand or wrong number of arguments, try CLUSTER (SLOTS | SHARDS | NODES | ' \
+    'INFO | MYID | KEYSLOT key | COUNTKEYSINSLOT slot | GETKEYSINSLOT slot count | MEET ip port | ' \
+    'ADDSLOTS slot ... | ADDSLOTSRANGE first last ... | DELSLOTS slot ... | ' \
+    'SETSLOT slot (IMPORTING node | MIGRATING node | STABLE | NODE node))'
+
+
+def get_cluster(client):
+    if client.server.cluster is None:
+        abort(message='This instance has cluster support disabled')
+    return client.server.cluster
+
+
+def parse_slot(value):
+    try:
+        slot = int(value)
+    except ValueError:
+        slot = -1
+    if not 0 <= slot < CLUSTER_SLOTS:
+        abort(message='Invalid or out of range slot')
+    return slot
+
+
+@server.command('cluster', nargs=nargs_greater_equal(1))
+def cluster_handler(client, argv):
+    '''
+    Cluster command dispatcher, see ``redis.server.cluster``.
+
+    .. code::
+        CLUSTER op args
+
+    '''
+
+    cluster = get_cluster(client)
+    op = argv[1].upper()
+    args = argv[2:]
+
+    if op == b'SLOTS' and not args:
+        return cluster.slots_reply()
+    elif op == b'SHARDS' and not args:
+        return cluster.shards_reply()
+    elif op == b'NODES' and not args:
+        return cluster.nodes_description()
+    elif op == b'INFO' and not args:
+        return ''.join('%s:%s\r\n' % field for field in cluster.info())
+    elif op == b'MYID' and not args:
+        return cluster.myself.id
+    elif op == b'KEYSLOT' and len(args) == 1:
+        return key_hash_slot(args[0])
+    elif op == b'COUNTKEYSINSLOT' and len(args) == 1:
+        return client.db.count_keys_in_slot(parse_slot(args[0]))
+    elif op == b'GETKEYSINSLOT' and len(args) == 2:
+        return cluster_getkeysinslot_handler(client, args)
+    elif op == b'MEET' and len(args) in (2, 3):
+        return cluster_meet_handler(client, args)
+    elif op == b'ADDSLOTS' and args:
+        cluster.add_slots(set(parse_slot(slot) for slot in args))
+        return True
+    elif op == b'ADDSLOTSRANGE' and args and len(args) % 2 == 0:
+        cluster.add_slots(parse_slot_ranges(args))
+        return True
+    elif op == b'DELSLOTS' and args:
+        cluster.del_slots(set(parse_slot(slot) for slot in args))
+        return True
+    elif op == b'DELSLOTSRANGE' and args and len(args) % 2 == 0:
+        cluster.del_slots(parse_slot_ranges(args))
+        return True
+    elif op == b'SETSLOT' and len(args) in (2, 3):
+        cluster.set_slot(parse_slot(args[0]), args[1].upper(), *args[2:])
+        return True
+    else:
+        abort(message=CLUSTER_USAGE)
+
+
+def parse_slot_ranges(args):
+    slots = set()
+    for i in range(0, len(args), 2):
+        first, last = parse_slot(args[i]), parse_slot(args[i + 1])
+        if first > last:
+            abort(message='start slot number %d is greater than end slot number %d' % (first, last))
+        slots.update(range(first, last + 1))
+    return slots
+
+
+def cluster_getkeysinslot_handler(client, args):
+    '''
+    Keys of a hash slot stored by this node, at most count.
+
+    .. code::
+        CLUSTER GETKEYSINSLOT slot count
+
+    :return: the keys
+    :rtype: list
+
+    '''
+
+    slot = parse_slot(args[0])
+    try:
+        count = int(args[1])
+    except ValueError:
+        count = -1
+    if count < 0:
+        abort(message='Invalid number of keys')
+    return client.db.get_keys_in_slot(slot, count)
+
+
+def cluster_meet_handler(client, args):
+    '''
+    Connect the node to another one, which becomes part of the cluster, learning the nodes it knows.
+
+    .. code::
+        CLUSTER MEET ip port [cluster-bus-port]
+
+    '''
+
+    try:
+        port = int(args[1])
+    except ValueError:
+        abort(message='Invalid node address specified: %s:%s' % (args[0].decode(), args[1].decode()))
+    client.server.cluster.meet(args[0].decode(), port)
+    return True
+
+
+@server.command('asking', nargs=0)
+def asking_handler(client, argv):
+    '''
+    Let the next command access a hash slot being imported by the node, after an ASK redirection.
+
+    .. code::
+        ASKING
+
+    '''
+
+    get_cluster(client)
+    client.asking = True
+    return True
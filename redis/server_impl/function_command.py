@@ -0,0 +1,198 @@
+import fnmatch
+
+from redis.server import current_server as server
+from redis.common.utils import abort
+from redis.common.utils import nargs_greater_equal
+
+
+@server.command('function', nargs=nargs_greater_equal(1), flags=('noscript',))
+def function_handler(client, argv):
+    '''
+
+    Function command dispatcher
+
+    .. code::
+        FUNCTION op args
+
+    '''
+
+    op = argv[1].upper()
+
+    if op == b'LOAD':
+        return function_load_handler(client, argv)
+    elif op == b'DELETE':
+        return function_delete_handler(client, argv)
+    elif op == b'FLUSH':
+        return function_flush_handler(client, argv)
+    elif op == b'LIST':
+        return function_list_handler(client, argv)
+    else:
+        abort(message='Syntax error, try FUNCTION (LOAD [REPLACE] code | DELETE library | FLUSH | '
+                      'LIST [LIBRARYNAME pattern] [WITHCODE])')
+
+
+def function_load_handler(client, argv):
+    '''
+    Load a library to Redis.
+
+    The library code must start with a shebang statement that provides the engine and the library name:
+    ``#!python name=<library name>``. Executing the library code registers its functions through
+    ``redis.register_function(name, callback, flags=())``, where callback is called with the list of key
+    names and the list of arguments given to FCALL.
+
+    The only supported function flag is ``no-writes``, which allows the function to be called with
+    FCALL_RO.
+
+    Loaded libraries are persisted to ``functions-filename`` in ``dir`` and reloaded on startup.
+
+    .. code::
+        FUNCTION LOAD [REPLACE] function-code
+
+    :return: the library name that was loaded
+    :rtype: bytes
+
+    '''
+
+    if len(argv) == 3:
+        replace = False
+    elif len(argv) == 4 and argv[2].upper() == b'REPLACE':
+        replace = True
+    else:
+        abort(message='Syntax error, try FUNCTION LOAD [REPLACE] function-code')
+
+    name = client.server.functions.load(argv[-1], replace=replace)
+    return name.encode()
+
+
+def function_delete_handler(client, argv):
+    '''
+    Delete a library and all its functions.
+
+    .. code::
+        FUNCTION DELETE library-name
+
+    '''
+
+    if len(argv) != 3:
+        abort(message='Syntax error, try FUNCTION DELETE library-name')
+
+    try:
+        client.server.functions.delete(argv[2].decode())
+    except KeyError:
+        abort(message='Library not found')
+    return True
+
+
+def function_flush_handler(client, argv):
+    '''
+    Deletes all the libraries.
+
+    .. code::
+        FUNCTION FLUSH
+
+    '''
+
+    if len(argv) != 2:
+        abort(message='Syntax error, try FUNCTION FLUSH')
+
+    client.server.functions.flush()
+    return True
+
+
+def function_list_handler(client, argv):
+    '''
+    Return information about the functions and libraries.
+
+    .. code::
+        FUNCTION LIST [LIBRARYNAME library-name-pattern] [WITHCODE]
+
+    :return: one entry per library, with its name, engine, functions and optionally its code.
+    :rtype: list
+
+    '''
+
+    pattern = '*'
+    with_code = False
+
+    cur_index = 2
+    while cur_index < len(argv):
+        argname = argv[cur_index].upper()
+        if argname == b'WITHCODE':
+            with_code = True
+        elif argname == b'LIBRARYNAME' and cur_index + 1 < len(argv):
+            cur_index += 1
+            pattern = argv[cur_index].decode()
+        else:
+            abort(message='syntax error')
+        cur_index += 1
+
+    result = []
+    for name, library in sorted(client.server.functions.libraries.items()):
+        if not fnmatch.fnmatchcase(name, pattern):
+            continue
+
+        functions = [[b'name', fname.encode(), b'flags', [flag.encode() for flag in sorted(function.flags)]]
+                     for fname, function in sorted(library.functions.items())]
+        entry = [b'library_name', name.encode(), b'engine', b'PYTHON', b'functions', functions]
+        if with_code:
+            entry += [b'library_code', library.code.encode()]
+        result.append(entry)
+
+    return result
+
+
+def fcall(client, argv, read_only):
+    name, numkeys = argv[1].decode(), argv[2]
+
+    try:
+        numkeys = int(numkeys)
+    except ValueError:
+        abort(message='value is not an integer or out of range')
+    if numkeys < 0:
+        abort(message='Number of keys can\'t be negative')
+    if numkeys > len(argv) - 3:
+        abort(message='Number of keys can\'t be greater than number of args')
+
+    keys, args = argv[3:3 + numkeys], argv[3 + numkeys:]
+    try:
+        return client.server.functions.fcall(client, name, keys, args, read_only=read_only)
+    except KeyError:
+        abort(message='Function not found')
+
+
+def fcall_keys(argv):
+    try:
+        return argv[3:3 + max(int(argv[2]), 0)]
+    except (IndexError, ValueError):
+        return []
+
+
+@server.command('fcall', nargs=nargs_greater_equal(2), keys=fcall_keys, flags=('noscript',))
+def fcall_handler(client, argv):
+    '''
+    Invoke a function.
+
+    The function is executed atomically, calls the command handlers without RESP encoding, and is killed
+    with a BUSY error if it runs longer than ``busy-reply-threshold`` milliseconds without having performed
+    any write.
+
+    .. code::
+        FCALL function numkeys [key [key ...]] [arg [arg ...]]
+
+    '''
+
+    return fcall(client, argv, read_only=False)
+
+
+@server.command('fcall_ro', nargs=nargs_greater_equal(2), keys=fcall_keys, flags=('noscript',))
+def fcall_ro_handler(client, argv):
+    '''
+    This is a read-only variant of the FCALL command that cannot execute commands that modify data. The
+    function must have been registered with the ``no-writes`` flag.
+
+    .. code::
+        FCALL_RO function numkeys [key [key ...]] [arg [arg ...]]
+
+    '''
+
+    return fcall(client, argv, read_only=True)
@@ -5,7 +5,7 @@ from redis.common.utils import nargs_greater_equal
 from redis.common.utils import get_object
 
 
-@server.command('lindex', nargs=2)
+@server.command('lindex', nargs=2, keys=(1, 1, 1))
 def lindex_handler(client, argv):
     '''
     Returns the element at index index in the list stored at key. The index is zero-based, so 0
@@ -42,7 +42,7 @@ def lindex_handler(client, argv):
         return None
 
 
-@server.command('lpush', nargs=nargs_greater_equal(2))
+@server.command('lpush', nargs=nargs_greater_equal(2), keys=(1, 1, 1), flags=('write', 'denyoom'))
 def lpush_handler(client, argv):
     '''
     Insert all the specified values at the head of the list stored at key. If key does not exist,
@@ -69,17 +69,18 @@ def lpush_handler(client, argv):
         obj = get_object(client.db, key, RedisListObject)
     except KeyError:
         obj = RedisListObject()
-        client.db.key_space[key] = obj
+        client.db.set_key(key, obj)
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
     # for value in values:
     obj.push(*values)
+    client.db.signal_modified_key(key)
 
     return len(obj)
 
 
-@server.command('lpushx', nargs=2)
+@server.command('lpushx', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def lpushx_handler(client, argv):
     '''
     Inserts value at the head of the list stored at key, only if key already exists and holds a list.
@@ -103,10 +104,11 @@ def lpushx_handler(client, argv):
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
     obj.push(value)
+    client.db.signal_modified_key(key)
     return len(obj)
 
 
-@server.command('lrange', nargs=3)
+@server.command('lrange', nargs=3, keys=(1, 1, 1))
 def lrange_handler(client, argv):
     '''
     Returns the specified elements of the list stored at key. The offsets start and stop are zero-based
@@ -146,7 +148,7 @@ def lrange_handler(client, argv):
     return obj[start:stop + 1]
 
 
-@server.command('lrem', nargs=3)
+@server.command('lrem', nargs=3, keys=(1, 1, 1), flags=('write',))
 def lrem_handler(client, argv):
     '''
     Removes the first count occurrences of elements equal to value from the list stored at key. The
@@ -183,33 +185,13 @@ def lrem_handler(client, argv):
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
-    if count < 0:
-        count *= -1
-        objlst = obj[::-1]
-        revd = True
-    else:
-        objlst = obj[:]
-        revd = False
-
-    if count == 0:
-        count = len(obj)
-
-    counter = 0
-    while count:
-        try:
-            objlst.remove(value)
-        except ValueError:
-            break
-        count -= 1
-        counter += 1
-
-    if revd:
-        objlst.reverse()
-    obj.value = objlst
+    counter = obj.remove(value, count)
+    if counter:
+        client.db.signal_modified_key(key)
     return counter
 
 
-@server.command('llen', nargs=1)
+@server.command('llen', nargs=1, keys=(1, 1, 1))
 def llen_handler(client, argv):
     '''
     Returns the length of the list stored at key. If key does not exist, it is interpreted as an empty
@@ -233,7 +215,7 @@ def llen_handler(client, argv):
     return len(obj)
 
 
-@server.command('lpop', nargs=1)
+@server.command('lpop', nargs=1, keys=(1, 1, 1), flags=('write',))
 def lpop_handler(client, argv):
     '''
     Removes and returns the first element of the list stored at key.
@@ -255,12 +237,14 @@ def lpop_handler(client, argv):
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
     try:
-        return obj.pop()
+        value = obj.pop()
     except IndexError:
         return None
+    client.db.signal_modified_key(key)
+    return value
 
 
-@server.command('lset', nargs=3)
+@server.command('lset', nargs=3, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def lset_handler(client, argv):
     '''
 
@@ -294,10 +278,11 @@ def lset_handler(client, argv):
         obj[index] = value
     except IndexError:
         abort(message='index out of range')
+    client.db.signal_modified_key(key)
     return True
 
 
-@server.command('ltrim', nargs=3)
+@server.command('ltrim', nargs=3, keys=(1, 1, 1), flags=('write',))
 def ltrim_handler(client, argv):
     '''
     Trim an existing list so that it will contain only the specified range of elements specified.
@@ -339,11 +324,12 @@ def ltrim_handler(client, argv):
     if stop < 0:
         stop = len(obj) + stop
 
-    obj.value = obj[start:stop]
+    obj.trim(start, stop)
+    client.db.signal_modified_key(key)
     return True
 
 
-@server.command('linsert', nargs=4)
+@server.command('linsert', nargs=4, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def linsert(client, argv):
     '''
     Inserts value in the list stored at key either before or after the reference value pivot.
@@ -382,5 +368,6 @@ def linsert(client, argv):
         obj.insert(op_func(index), value)
     except ValueError:
         return None
+    client.db.signal_modified_key(key)
 
     return len(obj)
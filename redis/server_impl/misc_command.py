@@ -1,15 +1,16 @@
-import pickle
 import time
 
 from redis.server import current_server as server
 from redis.server.server import RedisClientBase
+from redis.server import rdb
+from redis.common.proto import RedisSimpleStringSerializationObject, RedisListSerializationObject
 from redis.common.objects import RedisStringObject
 from redis.common.utils import abort, close_connection
 from redis.common.utils import nargs_greater_equal
-from redis.common.utils import get_object
+from redis.common.utils import get_object, stringmatch, pattern_prefix
 
 
-@server.command('del', nargs=nargs_greater_equal(1))
+@server.command('del', nargs=nargs_greater_equal(1), keys=(1, -1, 1), flags=('write',))
 def del_handler(client, argv):
     '''
     Removes the specified keys. A key is ignored if it does not exist.
@@ -20,9 +21,10 @@ def del_handler(client, argv):
     '''
 
     deleted = 0
-    for key in argv:
+    for key in argv[1:]:
         try:
-            del client.db.key_space[key]
+            get_object(client.db, key, touch=False)
+            client.db.delete_key(key)
             deleted += 1
         except KeyError:
             pass
@@ -30,7 +32,7 @@ def del_handler(client, argv):
     return deleted
 
 
-@server.command('dump', nargs=1)
+@server.command('dump', nargs=1, keys=(1, 1, 1))
 def dump_handler(client, argv):
     '''
     Serialize the value stored at key in a Redis-specific format and return it to the user. The returned
@@ -39,15 +41,15 @@ def dump_handler(client, argv):
     The serialization format is opaque and non-standard, however it has a few semantical characteristics:
 
     * It contains a 64-bit checksum that is used to make sure errors will be detected. The RESTORE command
-    makes sure to check the checksum before synthesizing a key using the serialized value. *(NOT IMPLEMENTED)*
+    makes sure to check the checksum before synthesizing a key using the serialized value.
 
     * Values are encoded in the same format used by RDB.
 
     * An RDB version is encoded inside the serialized value, so that different Redis versions with
-    incompatible RDB formats will refuse to process the serialized value. *(NOT IMPLEMENTED)*
+    incompatible RDB formats will refuse to process the serialized value.
 
-    <del>The serialized value does NOT contain expire information. In order to capture the time to live of the
-    current value the PTTL command should be used.</del>
+    The serialized value does NOT contain expire information. In order to capture the time to live of the
+    current value the PTTL command should be used.
 
     If key does not exist a nil bulk reply is returned.
 
@@ -55,12 +57,190 @@ def dump_handler(client, argv):
         DUMP key
     '''
 
-    key = argv[1]
-
-    if key not in client.db.key_space:
+    try:
+        obj = get_object(client.db, argv[1])
+    except KeyError:
         return None
 
-    return pickle.dumps(client.db.key_space[key], pickle.HIGHEST_PROTOCOL)
+    return rdb.dump(obj)
+
+
+@server.command('restore', nargs=nargs_greater_equal(3), keys=(1, 1, 1), flags=('write', 'denyoom'))
+def restore_handler(client, argv):
+    '''
+    Create a key associated with a value that is obtained by deserializing the provided serialized value
+    (obtained via DUMP).
+
+    If ttl is 0 the key is created without any expire, otherwise the specified expire time (in milliseconds)
+    is set. If the ABSTTL modifier was used, ttl should represent an absolute Unix timestamp (in
+    milliseconds) in which the key will expire.
+
+    For eviction purposes, you may use the IDLETIME modifier to set the idle time of the key, in seconds.
+
+    RESTORE will return a "Target key name is busy" error when key already exists unless you use the
+    REPLACE modifier.
+
+    RESTORE checks the RDB version and data checksum. If they don't match an error is returned.
+
+    .. code::
+        RESTORE key ttl serialized-value [REPLACE] [ABSTTL] [IDLETIME seconds]
+
+    '''
+
+    key, payload = argv[1], argv[3]
+    try:
+        ttl = int(argv[2])
+    except ValueError:
+        abort(message='value is not an integer or out of range')
+    if ttl < 0:
+        abort(message='Invalid TTL value, must be >= 0')
+
+    replace = absttl = False
+    idletime = None
+    i = 4
+    while i < len(argv):
+        option = argv[i].upper()
+        if option == b'REPLACE':
+            replace = True
+        elif option == b'ABSTTL':
+            absttl = True
+        elif option == b'IDLETIME' and i + 1 < len(argv):
+            i += 1
+            try:
+                idletime = int(argv[i])
+            except ValueError:
+                abort(message='value is not an integer or out of range')
+            if idletime < 0:
+                abort(message='Invalid IDLETIME value, must be >= 0')
+        else:
+            abort(message='syntax error')
+        i += 1
+
+    try:
+        get_object(client.db, key, touch=False)
+    except KeyError:
+        exists = False
+    else:
+        exists = True
+        if not replace:
+            abort(errtype='BUSYKEY', message='Target key name already exists.')
+
+    try:
+        obj = rdb.restore(payload)
+    except rdb.RDBChecksumError:
+        abort(message='DUMP payload version or checksum are wrong')
+    except rdb.RDBError:
+        abort(message='Bad data format')
+
+    expire_time = None
+    if ttl:
+        expire_time = ttl / 1000.0 if absttl else time.time() + ttl / 1000.0
+        if expire_time <= time.time():
+            # Already expired, only the replaced key is deleted
+            if exists:
+                client.db.delete_key(key)
+            return True
+
+    client.db.set_key(key, obj, expire_time)
+    if idletime is not None:
+        obj.atime = time.monotonic() - idletime
+    return True
+
+
+def migrate_keys(argv):
+    for i in range(6, len(argv)):
+        if argv[i].upper() == b'KEYS':
+            return argv[i + 1:]
+    return argv[3:4] if len(argv) > 3 and argv[3] else []
+
+
+@server.command('migrate', nargs=nargs_greater_equal(5), keys=migrate_keys, flags=('write',))
+def migrate_handler(client, argv):
+    '''
+    Atomically transfer keys from the source instance to a destination instance. The keys are
+    serialized like DUMP does and sent to the destination as a pipeline of RESTORE commands, on a
+    connection kept open for the next MIGRATE to the same instance. Once the destination replied, the
+    keys it restored are deleted from the source, unless COPY is given, and the keys it refused are
+    kept.
+
+    The command blocks the source instance until the destination replied, or until timeout
+    milliseconds elapsed without I/O progress.
+
+    With the KEYS option, the key argument must be the empty string and all the keys that follow are
+    migrated, the keys that do not exist being ignored.
+
+    .. code::
+        MIGRATE host port key|"" destination-db timeout [COPY] [REPLACE] [KEYS key [key ...]]
+
+    :return: OK, or NOKEY when none of the keys exists
+    :rtype: str
+
+    '''
+
+    host = argv[1].decode()
+    try:
+        port, db, timeout = int(argv[2]), int(argv[4]), int(argv[5])
+    except (IndexError, ValueError):
+        abort(message='value is not an integer or out of range')
+    if timeout <= 0:
+        timeout = 1000
+
+    copy = replace = False
+    keys = [argv[3]]
+    i = 6
+    while i < len(argv):
+        option = argv[i].upper()
+        if option == b'COPY':
+            copy = True
+        elif option == b'REPLACE':
+            replace = True
+        elif option == b'KEYS':
+            if argv[3]:
+                abort(message='When using MIGRATE KEYS option, the key argument must be set to the empty string')
+            keys = argv[i + 1:]
+            break
+        else:
+            abort(message='syntax error')
+        i += 1
+
+    now = time.time()
+    migrated = []
+    commands = []
+    for key in keys:
+        try:
+            obj = get_object(client.db, key, touch=False)
+        except KeyError:
+            continue
+        expire_time = client.db.expires.get(key)
+        ttl = max(int((expire_time - now) * 1000), 1) if expire_time is not None else 0
+        if client.server.cluster is not None:
+            # The slot may still be importing on the destination
+            commands.append((b'ASKING', ))
+        commands.append((b'RESTORE', key, ttl, rdb.dump(obj)) + ((b'REPLACE', ) if replace else ()))
+        migrated.append(key)
+    if not migrated:
+        return RedisSimpleStringSerializationObject('NOKEY')
+
+    try:
+        replies = client.server.migrate_pool.execute(host, port, db, timeout / 1000.0, commands)
+    except (OSError, ValueError) as e:
+        abort(errtype='IOERR', message='error or timeout migrating to target instance: %s' % e)
+    if client.server.cluster is not None:
+        replies = replies[1::2]
+
+    error = None
+    deleted = []
+    for key, reply in zip(migrated, replies):
+        if isinstance(reply, Exception):
+            error = error or reply
+        elif not copy:
+            client.db.delete_key(key)
+            deleted.append(key)
+    if deleted:
+        client.propagate_argv = [b'DEL'] + deleted
+    if error is not None:
+        abort(message='Target instance replied with error: %s %s' % error.args)
+    return True
 
 
 @server.command('echo', nargs=1)
@@ -75,7 +255,7 @@ def echo_handler(client, argv):
     return argv[1]
 
 
-@server.command('expire', nargs=2)
+@server.command('expire', nargs=2, keys=(1, 1, 1), flags=('write',))
 def expire_handler(client, argv):
     '''
     Set a timeout on key. After the timeout has expired, the key will automatically be deleted. A key
@@ -106,15 +286,15 @@ def expire_handler(client, argv):
         abort(message='value is not an integer or out of range')
 
     try:
-        obj = get_object(client.db, key)
+        get_object(client.db, key)
     except KeyError:
         return 0
 
-    obj.expire_time = time.time() + exptime
+    client.db.set_expire(key, time.time() + exptime)
     return 1
 
 
-@server.command('expireat', nargs=2)
+@server.command('expireat', nargs=2, keys=(1, 1, 1), flags=('write',))
 def expireat_handler(client, argv):
     '''
     EXPIREAT has the same effect and semantic as EXPIRE, but instead of specifying the number of seconds
@@ -137,15 +317,15 @@ def expireat_handler(client, argv):
         abort(message='value is not an integer or out of range')
 
     try:
-        obj = get_object(client.db, key)
+        get_object(client.db, key)
     except KeyError:
         return 0
 
-    obj.expire_time = exptime
+    client.db.set_expire(key, exptime)
     return 1
 
 
-@server.command('flushall', nargs=0)
+@server.command('flushall', nargs=0, flags=('write',))
 def flushall_handler(client, argv):
     '''
     Delete all the keys of all the existing databases, not just the currently selected one. This command never fails.
@@ -160,7 +340,7 @@ def flushall_handler(client, argv):
     return True
 
 
-@server.command('flushdb', nargs=0)
+@server.command('flushdb', nargs=0, flags=('write',))
 def flushdb_handler(client, argv):
     '''
     Delete all the keys of the currently selected DB. This command never fails.
@@ -172,7 +352,7 @@ def flushdb_handler(client, argv):
     return True
 
 
-@server.command('persist', nargs=1)
+@server.command('persist', nargs=1, keys=(1, 1, 1), flags=('write',))
 def persist_handler(client, argv):
     '''
     Remove the existing timeout on key, turning the key from volatile (a key with an expire set) to
@@ -185,15 +365,14 @@ def persist_handler(client, argv):
 
     key = argv[1]
     try:
-        obj = get_object(client.db, key)
+        get_object(client.db, key)
     except KeyError:
         return 0
 
-    obj.expire_time = None
-    return 1
+    return int(client.db.persist(key))
 
 
-@server.command('pexpire', nargs=2)
+@server.command('pexpire', nargs=2, keys=(1, 1, 1), flags=('write',))
 def pexpire_handler(client, argv):
     '''
     This command works exactly like EXPIRE but the time to live of the key is specified in milliseconds
@@ -212,15 +391,15 @@ def pexpire_handler(client, argv):
         abort(message='value is not an integer or out of range')
 
     try:
-        obj = get_object(client.db, key)
+        get_object(client.db, key)
     except KeyError:
         return 0
 
-    obj.expire_time = time.time() + milliseconds / 1000.0
+    client.db.set_expire(key, time.time() + milliseconds / 1000.0)
     return 1
 
 
-@server.command('pexpireat', nargs=2)
+@server.command('pexpireat', nargs=2, keys=(1, 1, 1), flags=('write',))
 def pexpireat_handler(client, argv):
     '''
     PEXPIREAT has the same effect and semantic as EXPIREAT, but the Unix time at which the key will
@@ -239,17 +418,22 @@ def pexpireat_handler(client, argv):
         abort(message='value is not an integer or out of range')
 
     try:
-        obj = get_object(client.db, key)
+        get_object(client.db, key)
     except KeyError:
         return 0
 
-    obj.expire_time = milliseconds / 1000.0
+    client.db.set_expire(key, milliseconds / 1000.0)
     return 1
 
 
-@server.command('multi', nargs=0)
+@server.command('multi', nargs=0, flags=('noscript',))
 def multi_handler(client, argv):
     '''
+    Marks the start of a transaction block. Subsequent commands will be queued for atomic execution
+    using EXEC.
+
+    .. code::
+        MULTI
 
     '''
 
@@ -260,20 +444,298 @@ def multi_handler(client, argv):
     return True
 
 
-@server.command('exec', nargs=0)
+@server.command('exec', nargs=0, flags=('noscript',))
 def exec_handler(client, argv):
     '''
+    Executes all previously queued commands in a transaction and restores the connection state to normal.
+
+    When using WATCH, EXEC will execute commands only if the watched keys were not modified, allowing for
+    a check-and-set mechanism.
+
+    .. code::
+        EXEC
+
+    :return: each element being the reply to each of the commands in the atomic transaction, or nil
+             when the execution was aborted because a watched key was modified.
+    :rtype: list
 
     '''
 
     if client.stat != RedisClientBase.STAT_MULTI:
         abort(message='EXEC without MULTI')
 
+    commands = client.multi_command_list
+    client.multi_command_list = []
+    client.stat = RedisClientBase.STAT_NORMAL
+
+    if client.watched_keys_modified():
+        client.unwatch_all()
+        return RedisListSerializationObject(None)
+    client.unwatch_all()
+
     ret = []
-    for cmd in client.multi_command_list:
+    for cmd in commands:
         ret.append(client.exec_command(cmd))
 
+    return ret
+
+
+@server.command('discard', nargs=0, flags=('noscript',))
+def discard_handler(client, argv):
+    '''
+    Flushes all previously queued commands in a transaction and restores the connection state to normal.
+
+    If WATCH was used, DISCARD unwatches all keys watched by the connection.
+
+    .. code::
+        DISCARD
+
+    '''
+
+    if client.stat != RedisClientBase.STAT_MULTI:
+        abort(message='DISCARD without MULTI')
+
     client.multi_command_list = []
     client.stat = RedisClientBase.STAT_NORMAL
+    client.unwatch_all()
+    return True
 
-    return ret
+
+@server.command('watch', nargs=nargs_greater_equal(1), keys=(1, -1, 1), flags=('noscript',))
+def watch_handler(client, argv):
+    '''
+    Marks the given keys to be watched for conditional execution of a transaction.
+
+    The version of each key is recorded, EXEC aborts the transaction if any of them changed in the
+    meantime, because the key was written, expired, deleted or flushed.
+
+    .. code::
+        WATCH key [key ...]
+
+    '''
+
+    if client.stat == RedisClientBase.STAT_MULTI:
+        abort(message='WATCH inside MULTI is not allowed')
+
+    for key in argv[1:]:
+        client.watch(key)
+    return True
+
+
+@server.command('unwatch', nargs=0, flags=('noscript',))
+def unwatch_handler(client, argv):
+    '''
+    Flushes all the previously watched keys for a transaction.
+
+    If EXEC or DISCARD, there's no need to manually call UNWATCH.
+
+    .. code::
+        UNWATCH
+
+    '''
+
+    client.unwatch_all()
+    return True
+
+
+@server.command('scan', nargs=nargs_greater_equal(1))
+def scan_handler(client, argv):
+    '''
+    The SCAN command is used in order to incrementally iterate over the keys of the currently selected
+    database. A full iteration starts when the cursor is set to 0, and terminates when the cursor
+    returned by the server is 0.
+
+    An element that was present in the database from the start to the end of a full iteration is
+    returned at least once, even if keys were added or removed between the calls. Each call visits a
+    bounded number of buckets of the keyspace index, proportional to COUNT.
+
+    MATCH and TYPE filter the keys after they were retrieved, so a call may return few or no keys while
+    the iteration is not over yet. With the ``radix`` keyspace backend, the iteration only visits the
+    keys starting with the literal prefix of the MATCH pattern, e.g. ``user:*``, and its cursors are
+    ids kept by the server for the connection: a cursor of another connection, another prefix or
+    another backend is refused.
+
+    .. code::
+        SCAN cursor [MATCH pattern] [COUNT count] [TYPE type]
+
+    :return: the next cursor and the list of keys
+    :rtype: list
+
+    '''
+
+    try:
+        cursor = int(argv[1])
+        if cursor < 0:
+            raise ValueError()
+    except ValueError:
+        abort(message='invalid cursor')
+
+    pattern = None
+    count = 10
+    type_name = None
+
+    cur_index = 2
+    while cur_index < len(argv):
+        argname = argv[cur_index].lower()
+        if cur_index == len(argv) - 1:
+            abort(message='syntax error')
+        cur_index += 1
+        if argname == b'match':
+            pattern = argv[cur_index]
+        elif argname == b'count':
+            try:
+                count = int(argv[cur_index])
+            except ValueError:
+                abort(message='value is not an integer or out of range')
+            if count < 1:
+                abort(message='syntax error')
+        elif argname == b'type':
+            type_name = argv[cur_index].lower()
+        else:
+            abort(message='syntax error')
+        cur_index += 1
+
+    prefix = pattern_prefix(pattern) if pattern is not None else b''
+    try:
+        cursor, keys = client.db.key_space.scan(cursor, count, prefix, client.scan_cursors)
+    except ValueError:
+        abort(message='invalid cursor')
+
+    result = []
+    for key in keys:
+        try:
+            obj = get_object(client.db, key, touch=False)
+        except KeyError:
+            continue
+        if pattern is not None and not stringmatch(pattern, key):
+            continue
+        if type_name is not None and obj.type_name != type_name:
+            continue
+        result.append(key)
+
+    return [str(cursor).encode(), result]
+
+
+@server.command('keys', nargs=1)
+def keys_handler(client, argv):
+    '''
+    Returns all keys matching pattern.
+
+    While the time complexity for this operation is O(N), the constant times are fairly low. With the
+    ``radix`` keyspace backend, only the keys starting with the literal prefix of the pattern are
+    visited, so ``KEYS prefix*`` is proportional to the number of matching keys.
+
+    .. code::
+        KEYS pattern
+
+    :return: list of keys matching pattern.
+    :rtype: list
+
+    '''
+
+    pattern = argv[1]
+    result = []
+    for key in list(client.db.key_space.iter_prefix(pattern_prefix(pattern))):
+        if not stringmatch(pattern, key):
+            continue
+        try:
+            get_object(client.db, key, touch=False)
+        except KeyError:
+            continue
+        result.append(key)
+    return result
+
+
+@server.command('type', nargs=1, keys=(1, 1, 1))
+def type_handler(client, argv):
+    '''
+    Returns the string representation of the type of the value stored at key. The different types that
+    can be returned are: string and list.
+
+    .. code::
+        TYPE key
+
+    :return: type of key, or none when key does not exist.
+    :rtype: str
+
+    '''
+
+    try:
+        obj = get_object(client.db, argv[1], touch=False)
+    except KeyError:
+        return RedisSimpleStringSerializationObject('none')
+
+    return RedisSimpleStringSerializationObject(obj.type_name)
+
+
+@server.command('object', nargs=2, keys=(2, 2, 1))
+def object_handler(client, argv):
+    '''
+    The OBJECT command allows to inspect the internals of Redis Objects associated with keys. Looking
+    at an object with OBJECT does not count as an access.
+
+    The following subcommands are supported:
+
+    * ``OBJECT ENCODING key`` returns the internal representation used to store the value at the
+      specified key: ``int``, ``embstr`` or ``raw`` for strings, ``linkedlist`` for lists.
+    * ``OBJECT IDLETIME key`` returns the number of seconds since the object stored at the specified key
+      was last read or written.
+    * ``OBJECT FREQ key`` returns the logarithmic access frequency counter of the object stored at the
+      specified key, as used by the LFU eviction policies. It is incremented with a decreasing
+      probability on every access, and decremented by one every ``lfu-decay-time`` minutes without
+      access.
+
+    .. code::
+        OBJECT subcommand key
+
+    :return: the requested value, or nil when the key does not exist.
+    :rtype: int or bytes
+
+    '''
+
+    op, key = argv[1].upper(), argv[2]
+    if op not in (b'ENCODING', b'IDLETIME', b'FREQ'):
+        abort(message='Unknown subcommand or wrong number of arguments for \'%s\'' % argv[1].decode())
+
+    try:
+        obj = get_object(client.db, key, touch=False)
+    except KeyError:
+        return None
+
+    if op == b'ENCODING':
+        return obj.encoding.encode()
+    if op == b'IDLETIME':
+        return int(client.db.idle_time(obj))
+    return client.db.access_frequency(obj)
+
+
+@server.command('hotkeys')
+def hotkeys_handler(client, argv):
+    '''
+    Returns the most accessed keys of the database, as tracked on-line by every command reading or
+    writing a key. Only one access in ``hotkeys-sample-rate`` is counted, out of
+    ``hotkeys-capacity`` counters, so the counts are estimates, which may include the accesses to
+    keys that were replaced by the key since. Deleted keys are reported until FLUSHDB.
+
+    .. code::
+        HOTKEYS [COUNT count]
+
+    :return: up to count pairs of a key and its estimated number of accesses, 10 by default, the most
+             accessed key first.
+    :rtype: list
+
+    '''
+
+    count = 10
+    if len(argv) == 3 and argv[1].upper() == b'COUNT':
+        try:
+            count = int(argv[2])
+        except ValueError:
+            abort(message='value is not an integer or out of range')
+        if count < 0:
+            abort(message='syntax error')
+    elif len(argv) != 1:
+        abort(message='syntax error')
+
+    sample_rate = max(client.server.config['hotkeys-sample-rate'], 1)
+    return [[key, accesses * sample_rate] for key, accesses, error in client.db.hotkeys.top(count)]
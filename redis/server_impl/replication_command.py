@@ -0,0 +1,144 @@
+from redis.server import current_server as server
+from redis.common.proto import RedisNoReplySerializationObject
+from redis.common.utils import abort
+from redis.common.utils import nargs_greater_equal
+
+
+def set_primary(client, argv):
+    if argv[1].upper() == b'NO' and argv[2].upper() == b'ONE':
+        primary = None
+    else:
+        try:
+            primary = (argv[1].decode(), int(argv[2]))
+        except ValueError:
+            abort(message='Invalid master port')
+    client.server.config['replicaof'] = primary
+    client.server.config_changed('replicaof')
+    return True
+
+
+@server.command('replicaof', nargs=2, flags=('noscript',))
+def replicaof_handler(client, argv):
+    '''
+    Make the server a replica of another instance, or turn it back into a primary.
+
+    The replica drops its data, loads a snapshot sent by the primary and then executes the write
+    commands the primary propagates. When the primary still has them in its replication backlog,
+    a replica which was in sync only gets the commands it missed. ``REPLICAOF NO ONE`` promotes a
+    replica, which keeps its data.
+
+    .. code::
+        REPLICAOF host port
+        REPLICAOF NO ONE
+
+    '''
+
+    return set_primary(client, argv)
+
+
+@server.command('slaveof', nargs=2, flags=('noscript',))
+def slaveof_handler(client, argv):
+    '''
+    Alias of REPLICAOF.
+
+    .. code::
+        SLAVEOF host port
+        SLAVEOF NO ONE
+
+    '''
+
+    return set_primary(client, argv)
+
+
+@server.command('psync', nargs=2, flags=('noscript',))
+def psync_handler(client, argv):
+    '''
+    Sent by a replica to synchronize with its primary, from the offset of the replication stream
+    following the one it has, or ``? -1`` for a full sync.
+
+    The primary replies ``+CONTINUE <replication id>`` followed by the commands the replica missed,
+    or ``+FULLRESYNC <replication id> <offset>`` followed by a snapshot, then keeps sending the write
+    commands it executes on the connection.
+
+    .. code::
+        PSYNC replicationid offset
+
+    '''
+
+    if getattr(client, 'stream_writer', None) is None:
+        abort(message='PSYNC is only allowed on network connections')
+    if client.replica is not None:
+        abort(message='The client is already a replica')
+    try:
+        offset = int(argv[2])
+    except ValueError:
+        abort(message='value is not an integer or out of range')
+    client.server.replication.psync(client, argv[1].decode(), offset)
+    return RedisNoReplySerializationObject()
+
+
+@server.command('replconf', nargs=nargs_greater_equal(2), flags=('noscript',))
+def replconf_handler(client, argv):
+    '''
+    Options of the replication connection, sent by a replica.
+
+    ``listening-port`` is the port the replica serves on, reported by INFO replication, ``capa``
+    its capabilities, and ``ACK`` acknowledges the offset of the replication stream it processed,
+    without reply.
+
+    .. code::
+        REPLCONF option value [option value ...]
+
+    '''
+
+    if len(argv) % 2 == 0:
+        abort(message='syntax error')
+    for i in range(1, len(argv), 2):
+        option, value = argv[i].lower(), argv[i + 1]
+        if option == b'listening-port':
+            try:
+                client.replica_listening_port = int(value)
+            except ValueError:
+                abort(message='value is not an integer or out of range')
+        elif option == b'capa':
+            pass
+        elif option == b'ack':
+            try:
+                client.server.replication.ack(client, int(value))
+            except ValueError:
+                pass
+            return RedisNoReplySerializationObject()
+        elif option == b'getack':
+            return RedisNoReplySerializationObject()
+        else:
+            abort(message='Unrecognized REPLCONF option: %s' % option.decode())
+    return True
+
+
+@server.command('wait', nargs=2, flags=('noscript',))
+def wait_handler(client, argv):
+    '''
+    Block the client until all the write commands executed before are acknowledged by at least
+    numreplicas replicas, or until timeout milliseconds elapsed, 0 blocking forever.
+
+    Inside a transaction or a function, it returns immediately.
+
+    .. code::
+        WAIT numreplicas timeout
+
+    :return: the number of replicas which acknowledged the write commands
+    :rtype: int
+
+    '''
+
+    replication = client.server.replication
+    if replication.master is not None:
+        abort(message='WAIT cannot be used with replica instances')
+    try:
+        numreplicas = int(argv[1])
+        timeout = int(argv[2])
+    except ValueError:
+        abort(message='value is not an integer or out of range')
+    if timeout < 0:
+        abort(message='timeout is negative')
+    return replication.wait(client, numreplicas, timeout)
@@ -0,0 +1,270 @@
+import os
+import sys
+
+from redis.server import current_server as server
+from redis.common.proto import RedisSimpleStringSerializationObject
+from redis.common.utils import abort
+from redis.common.utils import nargs_greater_equal
+from redis.common.utils import get_object
+from redis.server.storage import KEYSPACE_ENTRY_OVERHEAD
+
+
+@server.command('config', nargs=nargs_greater_equal(1), flags=('noscript',))
+def config_handler(client, argv):
+    '''
+
+    Config command dispatcher
+
+    .. code::
+        CONFIG op args
+
+    '''
+
+    op = argv[1].upper()
+
+    if op == b'GET':
+        return config_get_handler(client, argv)
+    elif op == b'SET':
+        return config_set_handler(client, argv)
+    else:
+        abort(message='Syntax error, try CONFIG (GET parameter | SET parameter value)')
+
+
+def config_get_handler(client, argv):
+    '''
+    The CONFIG GET command is used to read the configuration parameters of a running Redis server.
+
+    It takes a single argument, which is a glob-style pattern. All the configuration parameters
+    matching this parameter are reported as a list of key-value pairs.
+
+    .. code::
+        CONFIG GET parameter
+
+    :return: a flat list of parameter names and values
+    :rtype: list
+
+    '''
+
+    if len(argv) != 3:
+        abort(message='Syntax error, try CONFIG GET parameter')
+
+    result = []
+    for name, value in client.server.config.get_matching(argv[2].decode().lower()):
+        result += [name.encode(), value.encode()]
+    return result
+
+
+def config_set_handler(client, argv):
+    '''
+    The CONFIG SET command is used in order to reconfigure the server at run time without the need to
+    restart Redis.
+
+    .. code::
+        CONFIG SET parameter value
+
+    '''
+
+    if len(argv) != 4:
+        abort(message='Syntax error, try CONFIG SET parameter value')
+
+    name, value = argv[2].decode().lower(), argv[3].decode()
+    try:
+        client.server.config.set_from_string(name, value)
+    except KeyError:
+        abort(message='Unsupported CONFIG parameter: %s' % name)
+    except ValueError:
+        abort(message='Invalid argument \'%s\' for CONFIG SET \'%s\'' % (value, name))
+    client.server.config_changed(name)
+    return True
+
+
+@server.command('info')
+def info_handler(client, argv):
+    '''
+    The INFO command returns information and statistics about the server in a format that is simple to
+    parse by computers and easy to read by humans.
+
+    The optional parameter can be used to select a specific section of information, ``all`` returns
+    every section.
+
+    .. code::
+        INFO [section]
+
+    :return: a collection of text lines, with section headers starting with ``#`` and ``field:value``
+             lines.
+    :rtype: bytes
+
+    '''
+
+    if len(argv) > 2:
+        abort(message='syntax error')
+
+    section = argv[1].decode().lower() if len(argv) == 2 else None
+    return client.server.get_info_str(section)
+
+
+@server.command('memory', nargs=nargs_greater_equal(1))
+def memory_handler(client, argv):
+    '''
+
+    Memory command dispatcher
+
+    .. code::
+        MEMORY op args
+
+    '''
+
+    op = argv[1].upper()
+
+    if op == b'USAGE':
+        return memory_usage_handler(client, argv)
+    elif op == b'STATS':
+        return memory_stats_handler(client, argv)
+    else:
+        abort(message='Syntax error, try MEMORY (USAGE key [SAMPLES count] | STATS)')
+
+
+def memory_usage_handler(client, argv):
+    '''
+    The MEMORY USAGE command reports the number of bytes that a key and its value require to be stored
+    in RAM.
+
+    The reported usage is the total of memory allocations for data and administrative overheads that
+    a key and its value require. For lists, the size is estimated by sampling SAMPLES elements, 5 by
+    default. To measure all the elements, use SAMPLES 0.
+
+    .. code::
+        MEMORY USAGE key [SAMPLES count]
+
+    :return: the memory usage in bytes, or nil when the key does not exist.
+    :rtype: int
+
+    '''
+
+    if len(argv) == 3:
+        samples = 5
+    elif len(argv) == 5 and argv[3].upper() == b'SAMPLES':
+        try:
+            samples = int(argv[4])
+        except ValueError:
+            abort(message='value is not an integer or out of range')
+        if samples < 0:
+            abort(message='syntax error')
+    else:
+        abort(message='syntax error')
+
+    key = argv[2]
+    try:
+        obj = get_object(client.db, key, touch=False)
+    except KeyError:
+        return None
+    return sys.getsizeof(key) + KEYSPACE_ENTRY_OVERHEAD + obj.estimate_memory(samples)
+
+
+def memory_stats_handler(client, argv):
+    '''
+    The MEMORY STATS command returns an array reply about the memory usage of the server.
+
+    The sizes are estimates, in bytes: ``dataset.bytes`` is the memory used by the keys and their
+    values, as accounted for ``maxmemory``, and the overheads are the memory used by the keyspace
+    indexes, the clients and the function libraries. Every database with keys has its breakdown by
+    type, as well as the whole dataset.
+
+    .. code::
+        MEMORY STATS
+
+    :return: nested list of memory usage metrics and their values
+    :rtype: list
+
+    '''
+
+    if len(argv) != 2:
+        abort(message='syntax error')
+
+    return client.server.memory_stats()
+
+
+@server.command('save', nargs=0, flags=('noscript',))
+def save_handler(client, argv):
+    '''
+    The SAVE commands performs a synchronous save of the dataset producing a point in time snapshot of
+    all the data inside the Redis instance, in the form of an RDB file.
+
+    It blocks all the other clients, BGSAVE should be used instead in production.
+
+    .. code::
+        SAVE
+
+    '''
+
+    if client.server.rdb_child_pid is not None:
+        abort(message='Background save already in progress')
+    if not client.server.rdb_save():
+        abort(message='Failed to save the snapshot, see the server log')
+    return True
+
+
+@server.command('bgsave', nargs=0, flags=('noscript',))
+def bgsave_handler(client, argv):
+    '''
+    Save the DB in background. The server forks, the parent continues to serve the clients while the
+    child saves the DB on disk and exits.
+
+    LASTSAVE tells whether the snapshot was written, and INFO persistence whether it failed.
+
+    .. code::
+        BGSAVE
+
+    '''
+
+    if client.server.rdb_child_pid is not None:
+        abort(message='Background save already in progress')
+    if client.server.aof is not None and client.server.aof.rewrite_pid is not None:
+        abort(message='Background append only file rewriting already in progress')
+    if not hasattr(os, 'fork'):
+        abort(message='BGSAVE is not supported on this platform')
+    if not client.server.rdb_bgsave():
+        abort(message='Background saving failed to start, see the server log')
+    return RedisSimpleStringSerializationObject('Background saving started')
+
+
+@server.command('lastsave', nargs=0)
+def lastsave_handler(client, argv):
+    '''
+    Return the UNIX time of the last DB save executed with success.
+
+    .. code::
+        LASTSAVE
+
+    :rtype: int
+
+    '''
+
+    return client.server.lastsave
+
+
+@server.command('bgrewriteaof', nargs=0, flags=('noscript',))
+def bgrewriteaof_handler(client, argv):
+    '''
+    Instruct Redis to start an Append Only File rewrite process. The rewrite will create a small
+    optimized version of the current Append Only File, from the keys in memory.
+
+    The server forks, the child writes the new file while the parent keeps logging the write
+    commands, which are appended to the new file before it replaces the old one.
+
+    .. code::
+        BGREWRITEAOF
+
+    '''
+
+    aof = client.server.aof
+    if aof is None:
+        abort(message='Append only file is not enabled, use CONFIG SET appendonly yes')
+    if aof.rewrite_pid is not None:
+        abort(message='Background append only file rewriting already in progress')
+    if client.server.rdb_child_pid is not None:
+        abort(message='Background save already in progress')
+    if not hasattr(os, 'fork'):
+        abort(message='BGREWRITEAOF is not supported on this platform')
+    aof.start_rewrite()
+    return RedisSimpleStringSerializationObject('Background append only file rewriting started')
@@ -9,7 +9,7 @@ import bitarray
 from decimal import InvalidOperation, Decimal
 
 
-@server.command('bitcount', nargs=nargs_greater_equal(1))
+@server.command('bitcount', nargs=nargs_greater_equal(1), keys=(1, 1, 1))
 def bitcount_handler(client, argv):
     '''
     Count the number of set bits (population counting) in a string.
@@ -56,7 +56,7 @@ def bitcount_handler(client, argv):
     return ba.count()
 
 
-@server.command('bitop', nargs=nargs_greater_equal(3))
+@server.command('bitop', nargs=nargs_greater_equal(3), keys=(2, -1, 1), flags=('write', 'denyoom'))
 def bitop_handler(client, argv):
     '''
     Perform a bitwise operation between multiple keys (containing string values) and store the result in
@@ -103,8 +103,8 @@ def bitop_handler(client, argv):
         ba = bitarray.bitarray()
         ba.frombytes(obj.get_bytes())
         ba.invert()
-        client.db.key_space[destkey] = RedisStringObject(ba.tobytes())
-        return len(client.db.key_space[destkey].value)
+        client.db.set_key(destkey, RedisStringObject(ba.tobytes()))
+        return len(client.db.key_space[destkey])
 
     if operation == b'AND':
         oper_func = lambda a, b: a & b
@@ -139,11 +139,11 @@ def bitop_handler(client, argv):
 
         dest_ba = oper_func(dest_ba, src_ba)
 
-    client.db.key_space[destkey] = RedisStringObject(dest_ba.tobytes())
+    client.db.set_key(destkey, RedisStringObject(dest_ba.tobytes()))
     return len(client.db.key_space[destkey].get_bytes())
 
 
-@server.command('bitpos', nargs=nargs_greater_equal(2))
+@server.command('bitpos', nargs=nargs_greater_equal(2), keys=(1, 1, 1))
 def bitpos_handler(client, argv):
     '''
     Return the position of the first bit set to 1 or 0 in a string.
@@ -241,7 +241,7 @@ def bitpos_handler(client, argv):
         return pos[0] + begin_pos
 
 
-@server.command('set', nargs=nargs_greater_equal(2))
+@server.command('set', nargs=nargs_greater_equal(2), keys=(1, 1, 1), flags=('write', 'denyoom'))
 def set_handler(client, argv):
     '''
     Set the string value of a key
@@ -295,23 +295,20 @@ def set_handler(client, argv):
     if nx and xx:
         abort(message='syntax error')
 
-    try:
-        get_object(client.db, key)
-        if nx:
-            return None
-    except KeyError:
-        if xx:
-            return None
+    if nx or xx:
+        try:
+            get_object(client.db, key)
+            if nx:
+                return None
+        except KeyError:
+            if xx:
+                return None
 
-    try:
-        value = int(value)
-    except ValueError:
-        pass
-    client.db.key_space[key] = RedisStringObject(value, expire_time=expire_time)
+    client.db.set_key(key, RedisStringObject(value), expire_time)
     return True
 
 
-@server.command('setbit', nargs=3)
+@server.command('setbit', nargs=3, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def setbit_handler(client, argv):
     '''
     Sets or clears the bit at offset in the string value stored at key.
@@ -345,17 +342,18 @@ def setbit_handler(client, argv):
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
     except KeyError:
-        pass
+        obj = RedisStringObject()
 
-    if len(ba) < offset:
+    if len(ba) <= offset:
         ba.extend([0] * (offset - len(ba) + 1))
 
     ba[offset] = value
-    client.db.key_space[key].value = ba.tobytes()
+    obj.set_value(ba.tobytes())
+    client.db.set_key(key, obj)
     return True
 
 
-@server.command('setex', nargs=3)
+@server.command('setex', nargs=3, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def setex_handler(client, argv):
     '''
     Set key to hold the string value and set key to timeout after a given number of seconds.
@@ -374,11 +372,11 @@ def setex_handler(client, argv):
     except ValueError:
         abort(message='value is not an integer or out of range')
 
-    client.db.key_space[key] = RedisStringObject(value, expire_time=time.time() + seconds)
+    client.db.set_key(key, RedisStringObject(value), time.time() + seconds)
     return True
 
 
-@server.command('setnx', nargs=2)
+@server.command('setnx', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def setnx_handler(client, argv):
     '''
     Set key to hold string value if key does not exist. In that case, it is equal to SET.
@@ -397,11 +395,11 @@ def setnx_handler(client, argv):
         get_object(client.db, key)
         return 0
     except KeyError:
-        client.db.key_space[key] = RedisStringObject(value)
+        client.db.set_key(key, RedisStringObject(value))
     return 1
 
 
-@server.command('setrange', nargs=3)
+@server.command('setrange', nargs=3, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def setrange_handler(client, argv):
     '''
     Overwrites part of the string stored at key, starting at the specified offset, for the entire
@@ -439,33 +437,38 @@ def setrange_handler(client, argv):
     else:
         stor_value = stor_value[0:offset + 1] + value
 
-    obj.value = stor_value
-    client.db.key_space[key] = obj
+    obj.set_value(stor_value)
+    client.db.set_key(key, obj)
     return len(stor_value)
 
 
-@server.command('get', nargs=1)
+@server.command('get', nargs=1, keys=(1, 1, 1))
 def get_handler(client, argv):
     '''
     Get the value of key. If the key does not exist the special value nil is returned.
     An error is returned if the value stored at key is not a string, because GET only handles string values.
 
+    When a backing store is configured, a key missing in memory is loaded from the store.
+
     .. code::
         GET key
 
     '''
 
     key = argv[1]
+    backing_store = client.db.backing_store
+    if backing_store is not None and client.suspendable and key not in client.db.key_space:
+        # Loaded without blocking the other clients
+        return backing_store.read_through(client, key)
     try:
-        obj = get_object(client.db, key, RedisStringObject)
-        return obj
+        return get_object(client.db, key, RedisStringObject)
     except KeyError:
         return None
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
 
-@server.command('getbit', nargs=2)
+@server.command('getbit', nargs=2, keys=(1, 1, 1))
 def getbit_handler(client, argv):
     '''
     Returns the bit value at offset in the string value stored at key.
@@ -499,7 +502,7 @@ def getbit_handler(client, argv):
         return 0
 
 
-@server.command('getrange', nargs=3)
+@server.command('getrange', nargs=3, keys=(1, 1, 1))
 def getrange_handler(client, argv):
     '''
     Returns the substring of the string value stored at key, determined by the offsets start and end
@@ -538,7 +541,7 @@ def getrange_handler(client, argv):
     return obj.get_range(start, end)
 
 
-@server.command('getset', nargs=2)
+@server.command('getset', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def getset_handler(client, argv):
     '''
     Atomically sets key to value and returns the old value stored at key. Returns an error when key
@@ -551,26 +554,22 @@ def getset_handler(client, argv):
 
     key, value = argv[1], argv[2]
 
-    try:
-        value = int(value)
-    except ValueError:
-        pass
-
     try:
         obj = get_object(client.db, key, type=RedisStringObject)
 
         orig_value = obj.get_bytes()
-        obj.value = value
+        obj.set_value(value)
+        client.db.signal_modified_key(key)
     except KeyError:
         orig_value = None
-        client.db.key_space[key] = RedisStringObject(value)
+        client.db.set_key(key, RedisStringObject(value))
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
     return RedisStringObject(orig_value)
 
 
-@server.command('decr', nargs=1)
+@server.command('decr', nargs=1, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def decr_handler(client, argv):
     '''
     Decrements the number stored at key by one. If the key does not exist, it is set to 0 before
@@ -605,12 +604,12 @@ def decr_handler(client, argv):
 
     value -= 1
 
-    obj.value = value
-    # client.db.key_space[key] = obj
+    obj.set_value(value)
+    client.db.set_key(key, obj)
     return obj
 
 
-@server.command('decrby', nargs=2)
+@server.command('decrby', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def decrby_handler(client, argv):
     '''
     Decrements the number stored at key by decrement. If the key does not exist, it is set to 0
@@ -651,12 +650,12 @@ def decrby_handler(client, argv):
 
     value -= decrement
 
-    obj.value = value
-    # client.db.key_space[key] = obj
+    obj.set_value(value)
+    client.db.set_key(key, obj)
     return obj
 
 
-@server.command('incr', nargs=1)
+@server.command('incr', nargs=1, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def incr_handler(client, argv):
     '''
     Increments the number stored at key by one. If the key does not exist, it is set to 0 before
@@ -695,12 +694,12 @@ def incr_handler(client, argv):
 
     value += 1
 
-    obj.value = value
-    client.db.key_space[key] = obj
+    obj.set_value(value)
+    client.db.set_key(key, obj)
     return obj
 
 
-@server.command('incrby', nargs=2)
+@server.command('incrby', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def incrby_handler(client, argv):
     '''
     Increments the number stored at key by increment. If the key does not exist, it is set to 0 before
@@ -740,12 +739,12 @@ def incrby_handler(client, argv):
 
     value += increment
 
-    obj.value = value
-    client.db.key_space[key] = obj
+    obj.set_value(value)
+    client.db.set_key(key, obj)
     return obj
 
 
-@server.command('incrbyfloat', nargs=2)
+@server.command('incrbyfloat', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def incrbyfloat_handler(client, argv):
     '''
     Increment the string representing a floating point number stored at key by the specified increment.
@@ -798,12 +797,12 @@ def incrbyfloat_handler(client, argv):
 
     value += increment
 
-    obj.value = value
-    client.db.key_space[key] = obj
+    obj.set_value(value)
+    client.db.set_key(key, obj)
     return obj
 
 
-@server.command('strlen', nargs=1)
+@server.command('strlen', nargs=1, keys=(1, 1, 1))
 def strlen_handler(client, argv):
     '''
     Returns the length of the string value stored at key. An error is returned when key holds a non-string value.
@@ -825,10 +824,10 @@ def strlen_handler(client, argv):
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
-    return len(obj.get_bytes())
+    return len(obj)
 
 
-@server.command('append', nargs=2)
+@server.command('append', nargs=2, keys=(1, 1, 1), flags=('write', 'denyoom'))
 def append_handler(client, argv):
     '''
     If key already exists and is a string, this command appends the value at the end of the string.
@@ -848,22 +847,18 @@ def append_handler(client, argv):
     try:
         obj = get_object(client.db, key, type=RedisStringObject)
     except KeyError:
-        length = len(value)
-        try:
-            value = int(value)
-        except ValueError:
-            pass
-        client.db.key_space[key] = RedisStringObject(value)
-        return length
+        client.db.set_key(key, RedisStringObject(value))
+        return len(value)
     except TypeError:
         abort(errtype='WRONGTYPE', message='Operation against a key holding the wrong kind of value')
 
-    obj.value = obj.get_bytes() + value
+    obj.set_value(obj.get_bytes() + value)
+    client.db.signal_modified_key(key)
 
-    return len(obj.value)
+    return len(obj)
 
 
-@server.command('mset', nargs=nargs_greater_equal(2))
+@server.command('mset', nargs=nargs_greater_equal(2), keys=(1, -1, 2), flags=('write', 'denyoom'))
 def mset_handler(client, argv):
     '''
     Sets the given keys to their respective values. MSET replaces existing values with new values,
@@ -881,12 +876,12 @@ def mset_handler(client, argv):
         abort(message='wrong number of arguments for MSET')
 
     for key, value in group_iter(argv[1:], n=2):
-        client.db.key_space[key] = RedisStringObject(value=value)
+        client.db.set_key(key, RedisStringObject(value=value))
 
     return True
 
 
-@server.command('msetnx', nargs=nargs_greater_equal(2))
+@server.command('msetnx', nargs=nargs_greater_equal(2), keys=(1, -1, 2), flags=('write', 'denyoom'))
 def msetnx_handler(client, argv):
     '''
     Sets the given keys to their respective values. MSETNX will not perform any operation at all even
@@ -921,12 +916,12 @@ def msetnx_handler(client, argv):
 
     if all_set:
         for key, value in group_iter(argv[1:], n=2):
-            client.db.key_space[key] = RedisStringObject(value=value)
+            client.db.set_key(key, RedisStringObject(value=value))
 
     return int(all_set)
 
 
-@server.command('mget', nargs=nargs_greater_equal(1))
+@server.command('mget', nargs=nargs_greater_equal(1), keys=(1, -1, 1))
 def mget_handler(client, argv):
     '''
     Returns the values of all specified keys. For every key that does not hold a string value or does
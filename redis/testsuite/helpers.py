@@ -0,0 +1,141 @@
+'''
+Helpers shared by the test modules.
+'''
+
+import contextlib
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from redis.client.connection import RedisConnection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@contextlib.contextmanager
+def configured(client, *parameters):
+    '''
+    Set configuration parameters for the duration of a with block, and restore their previous
+    values when it exits, in reverse order.
+
+    :param parameters: (name, value) tuples, set in order
+    '''
+
+    previous = []
+    try:
+        for name, value in parameters:
+            previous.append((name, client.execute('CONFIG', 'GET', name)[1]))
+            client.execute('CONFIG', 'SET', name, value)
+        yield
+    finally:
+        for name, value in reversed(previous):
+            client.execute('CONFIG', 'SET', name, value)
+
+
+def raises(exception_type, func, *args):
+    '''
+    Call func with args, which must raise exception_type.
+
+    :return: the exception raised
+    :raises AssertionError: func did not raise exception_type
+    '''
+
+    try:
+        func(*args)
+    except exception_type as e:
+        return e
+    raise AssertionError('%s not raised' % exception_type.__name__)
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.05)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def spawn(code, args):
+    '''
+    Run the Python code in a new process, from the root of the repository.
+
+    :rtype: subprocess.Popen
+    '''
+
+    return subprocess.Popen([sys.executable, '-c', code] + args, cwd=ROOT,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def connect(port, timeout=10):
+    '''
+    Connect to a process that was just started, retrying until it listens on port.
+
+    :rtype: RedisConnection
+    '''
+
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return RedisConnection(port=port, timeout=10)
+        except OSError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.05)
+
+
+class ServerProcess:
+
+    def __init__(self, directory, *options):
+        self.port = free_port()
+        self.dir = os.path.join(directory, str(self.port))
+        os.mkdir(self.dir)
+        args = ['--port', str(self.port), '--dir', self.dir, '--save', ''] + list(options)
+        self.process = spawn('from redis.server_impl import server_main; server_main()', args)
+        self.connection = connect(self.port)
+
+    def execute(self, *args):
+        return self.connection.execute(*args)
+
+    def info(self):
+        info = self.execute('INFO', 'replication').decode()
+        return dict(line.split(':', 1) for line in info.split('\r\n') if ':' in line)
+
+    def stop(self):
+        self.connection.close()
+        self.process.kill()
+        self.process.wait()
+
+
+class ServerProcesses:
+
+    '''
+    Servers run in their own processes, each with a directory in a temporary directory. They must
+    be stopped with ``stop``, which removes the directory.
+    '''
+
+    def __init__(self):
+        self.directory = tempfile.mkdtemp()
+        self.started = []
+
+    def start(self, *options):
+        '''
+        :param options: command line options of the server
+        :rtype: ServerProcess
+        '''
+
+        self.started.append(ServerProcess(self.directory, *options))
+        return self.started[-1]
+
+    def stop(self):
+        for server in self.started:
+            server.stop()
+        shutil.rmtree(self.directory)
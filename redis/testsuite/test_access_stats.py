@@ -0,0 +1,111 @@
+from redis.server_impl import server
+from redis.client.analyzer import KeyspaceAnalyzer
+from redis.common.exceptions import CommandError
+from redis.common.objects import LFU_INIT_VAL
+from redis.server.hotkeys import HotKeys
+from redis.testsuite.helpers import configured, raises
+
+c = server.get_embedded_client()
+
+
+def test_object_idletime():
+    c.execute('FLUSHALL')
+    c.execute('SET', 'key', 'value')
+    assert c.execute('OBJECT', 'IDLETIME', 'key') == 0
+
+    obj = server.default_database().key_space[b'key']
+    obj.atime -= 10
+    assert c.execute('OBJECT', 'IDLETIME', 'key') == 10
+    # Inspecting a key does not count as an access
+    c.execute('TYPE', 'key')
+    c.execute('SCAN', 0)
+    assert c.execute('OBJECT', 'IDLETIME', 'key') == 10
+    c.execute('GET', 'key')
+    assert c.execute('OBJECT', 'IDLETIME', 'key') == 0
+
+    assert c.execute('OBJECT', 'IDLETIME', 'notexists') is None
+    raises(CommandError, c.execute, 'OBJECT', 'REFCOUNT', 'key')
+
+
+def test_object_freq():
+    c.execute('FLUSHALL')
+    c.execute('SET', 'hot', 'value')
+    c.execute('SET', 'cold', 'value')
+    assert c.execute('OBJECT', 'FREQ', 'cold') in (LFU_INIT_VAL, LFU_INIT_VAL + 1)
+
+    for i in range(1000):
+        c.execute('GET', 'hot')
+    # With the default lfu-log-factor, 1000 accesses are counted as about 18
+    freq = c.execute('OBJECT', 'FREQ', 'hot')
+    assert 10 < freq < 30
+    for i in range(10000):
+        c.execute('GET', 'hot')
+    assert freq < c.execute('OBJECT', 'FREQ', 'hot') < 100
+
+    # The counter decays by one every lfu-decay-time minutes without access
+    obj = server.default_database().key_space[b'hot']
+    freq = c.execute('OBJECT', 'FREQ', 'hot')
+    obj.atime -= 180
+    assert c.execute('OBJECT', 'FREQ', 'hot') == freq - 3
+
+
+def test_space_saving():
+    hotkeys = HotKeys(10)
+    keys = [b'hot:%d' % (i % 3) if i % 2 == 0 else b'cold:%d' % i for i in range(10000)]
+    for key in keys:
+        hotkeys.add(key)
+    assert len(hotkeys) == 10
+    # The hot keys are accessed more than 10000 / 10 times: they are kept, with counts never under
+    # the actual ones
+    top = hotkeys.top(3)
+    assert sorted(key for key, count, error in top) == [b'hot:0', b'hot:1', b'hot:2']
+    for key, count, error in top:
+        assert count - error <= keys.count(key) <= count
+    assert sum(count for key, count, error in hotkeys.top(10)) == 10000
+
+    hotkeys.clear()
+    hotkeys.add(b'key')
+    hotkeys.add(b'key')
+    assert hotkeys.top(10) == [(b'key', 2, 0)]
+    disabled = HotKeys(0)
+    disabled.add(b'key')
+    assert disabled.top(10) == []
+
+
+def test_hotkeys():
+    c.execute('FLUSHALL')
+    with configured(c, ('hotkeys-sample-rate', 1), ('hotkeys-capacity', 200)):
+        for i in range(100):
+            c.execute('SET', 'key:%d' % i, 'value')
+        for i in range(50):
+            c.execute('GET', 'key:42')
+            c.execute('LPUSH', 'list', i)
+        # Inspecting a key does not count as an access
+        c.execute('TYPE', 'key:42')
+        assert c.execute('HOTKEYS', 'COUNT', 2) == [[b'key:42', 51], [b'list', 50]]
+        assert len(c.execute('HOTKEYS')) == 10
+        assert 'syntax' in raises(CommandError, c.execute, 'HOTKEYS', 'COUNT').args[1]
+
+        c.execute('CONFIG', 'SET', 'hotkeys-sample-rate', 4)
+        for i in range(400):
+            c.execute('GET', 'key:7')
+        # The sampled accesses are scaled back
+        assert c.execute('HOTKEYS', 'COUNT', 1)[0][0] == b'key:7'
+        assert 250 < c.execute('HOTKEYS', 'COUNT', 1)[0][1] < 600
+        c.execute('FLUSHDB')
+        assert c.execute('HOTKEYS') == []
+
+
+def test_hotkeys_analyzer():
+    c.execute('FLUSHALL')
+    for i in range(100):
+        c.execute('SET', 'key:%d' % i, 'value')
+    c.execute('LPUSH', 'list', 'a')
+    for i in range(2000):
+        c.execute('GET', 'key:42')
+        c.execute('LLEN', 'list')
+
+    analyzer = KeyspaceAnalyzer(c, hotkeys=True, top=2, count=10)
+    analyzer.run()
+    assert sorted(key for freq, key in analyzer.types[None]['top']) == [b'key:42', b'list']
+    assert 'hottest keys' in '\n'.join(analyzer.format_report())
@@ -0,0 +1,148 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from redis.common.proto import parse_commands
+from redis.server import aof
+from redis.server_impl import server
+from redis.testsuite.helpers import configured, raises
+
+c = server.get_embedded_client()
+
+
+def aof_enabled(directory, fsync='everysec'):
+    c.execute('FLUSHALL')
+    return configured(c, ('dir', directory), ('appendfsync', fsync), ('appendonly', 'yes'))
+
+
+def reload():
+    # Drop the keys without logging it, and replay the file
+    c.execute('CONFIG', 'SET', 'appendonly', 'no')
+    for db in server.all_databases():
+        db.flush()
+    server.aof_load()
+
+
+def logged_commands(path):
+    with open(path, 'rb') as stream:
+        return [argv for argv, offset in parse_commands(stream.read())]
+
+
+def test_log_and_replay():
+    with tempfile.TemporaryDirectory() as directory:
+        with aof_enabled(directory, 'always'):
+            log = server.aof
+            c.execute('SET', 'counter', 10)
+            c.execute('INCR', 'counter')
+            c.execute('SET', 'volatile', 'value', 'EX', 100)
+            c.execute('LPUSH', 'list', 'a', 'b')
+            c.execute('SET', 'deleted', 'x')
+            c.execute('DEL', 'deleted')
+            c.execute('DEL', 'missing')
+            c.execute('GET', 'counter')
+            c.execute('MULTI')
+            c.execute('INCRBY', 'counter', 5)
+            c.execute('APPEND', 'volatile', '!')
+            c.execute('EXEC')
+            assert log.stat_fsyncs == log.stat_writes
+
+            path = os.path.join(directory, 'appendonly.aof')
+            commands = logged_commands(path)
+            assert commands[0] == [b'SELECT', b'0']
+            assert [b'DEL', b'missing'] not in commands
+            assert [b'GET', b'counter'] not in commands
+            assert [b'INCRBY', b'counter', b'5'] in commands
+            assert commands.count([b'PEXPIREAT', b'volatile',
+                                   str(int(server.default_database().expires[b'volatile'] * 1000)).encode()]) == 2
+
+            reload()
+            assert c.execute('GET', 'counter') == b'16'
+            assert c.execute('GET', 'volatile') == b'value!'
+            assert 99 < server.default_database().expires[b'volatile'] - time.time() <= 100
+            assert c.execute('LRANGE', 'list', 0, -1) == [b'b', b'a']
+            assert c.execute('GET', 'deleted') is None
+
+            # An incomplete command at the end of the file is dropped
+            size = os.path.getsize(path)
+            with open(path, 'ab') as stream:
+                stream.write(b'*3\r\n$3\r\nSET\r\n$7\r\ncou')
+            reload()
+            assert os.path.getsize(path) == size
+            assert c.execute('GET', 'counter') == b'16'
+    c.execute('FLUSHALL')
+
+
+def test_group_commit():
+    with tempfile.TemporaryDirectory() as directory, aof_enabled(directory, 'always'):
+        loop = asyncio.new_event_loop()
+        try:
+            log = server.aof
+            writes, fsyncs = log.stat_writes, log.stat_fsyncs
+            clients = [server.get_test_client() for i in range(10)]
+
+            @asyncio.coroutine
+            def run_clients():
+                server.loop = loop
+                replies = []
+                for i, client in enumerate(clients):
+                    client.suspendable = True
+                    replies.append(server.exec_command([b'SET', ('key:%d' % i).encode(), b'value'], client))
+                    client.suspendable = False
+                # The replies wait for the sync of the batch
+                assert all(isinstance(reply, asyncio.Future) for reply in replies)
+                assert not any(reply.done() for reply in replies)
+                for reply in replies:
+                    assert (yield from reply).to_resp() == b'+OK\r\n'
+
+            loop.run_until_complete(run_clients())
+            assert log.stat_writes == writes + 1
+            assert log.stat_fsyncs == fsyncs + 1
+        finally:
+            server.loop = None
+            loop.close()
+    c.execute('FLUSHALL')
+
+
+def test_bgrewriteaof():
+    with tempfile.TemporaryDirectory() as directory:
+        with aof_enabled(directory):
+            log = server.aof
+            for i in range(100):
+                c.execute('INCR', 'counter')
+            c.execute('LPUSH', 'list', *range(100))
+            c.execute('PEXPIRE', 'list', 100000)
+            log.flush(wait=True)
+            path = os.path.join(directory, 'appendonly.aof')
+            before = os.path.getsize(path)
+
+            assert c.execute('BGREWRITEAOF') == b'Background append only file rewriting started'
+            # Logged to both files while the child runs
+            c.execute('SET', 'during', 'rewrite')
+            log.check_rewrite(wait=True)
+            c.execute('SET', 'after', 'rewrite')
+            log.flush(wait=True)
+            assert log.last_rewrite_ok
+            assert os.path.getsize(path) < before
+
+            commands = logged_commands(path)
+            assert commands.count([b'SET', b'during', b'rewrite']) == 1
+            assert [b'SET', b'counter', b'100'] in commands
+
+            reload()
+            assert c.execute('GET', 'counter') == b'100'
+            assert c.execute('LRANGE', 'list', 0, -1) == [str(i).encode() for i in range(99, -1, -1)]
+            assert b'list' in server.default_database().expires
+            assert c.execute('GET', 'during') == b'rewrite'
+            assert c.execute('GET', 'after') == b'rewrite'
+    c.execute('FLUSHALL')
+
+
+def test_corrupt_file():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'appendonly.aof')
+        with open(path, 'wb') as stream:
+            stream.write(b'*1\r\n$4\r\nINCR\r\n')
+        with configured(c, ('dir', directory)):
+            assert 'command 1 failed' in str(raises(aof.AOFError, server.aof_load))
+    c.execute('FLUSHALL')
@@ -0,0 +1,183 @@
+import asyncio
+import tempfile
+import time
+
+from redis.server_impl import server
+from redis.testsuite.helpers import configured
+
+c = server.get_embedded_client()
+
+
+def sqlite_store(directory, *parameters):
+    return configured(c, *((('dir', directory),) + parameters + (('backing-store', 'sqlite'),)))
+
+
+def test_read_through_and_write_behind():
+    c.execute('FLUSHALL')
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlite_store(directory, ('backing-store-batch-size', '3')):
+            store = server.backing_store
+            c.execute('LPUSH', 'list', 'x')
+            c.execute('SET', 'a', '1')
+            c.execute('SET', 'b', 'value')
+            c.execute('DEL', 'a')
+            c.execute('SET', 'c', 'other')
+            # The batch was full with the third key, the later writes are still pending
+            assert store.stat_batches == 1
+            assert dict(store.info())['backing_store_pending_writes'] == 2
+            store.flush(wait=True)
+
+            # Keys missing in memory are loaded from the store, deleted keys are not
+            c.execute('FLUSHALL')
+            assert c.execute('GET', 'b') == b'value'
+            assert c.execute('GET', 'c') == b'other'
+            assert c.execute('GET', 'a') is None
+            assert c.execute('GET', 'list') is None
+            assert c.execute('GET', 'b') == b'value'
+            # The lookups of LPUSH and DEL are counted too
+            info = dict(store.info())
+            assert info['backing_store_hits'] == 2
+            assert info['backing_store_misses'] == 5
+            assert info['backing_store_loaded_keys'] == 2
+
+            # Evicted keys stay in the store
+            server.default_database().remove_key(b'b')
+            assert c.execute('GET', 'b') == b'value'
+            assert b'backing_store_loaded_keys:3' in c.execute('INFO', 'backing store')
+    c.execute('FLUSHALL')
+
+
+def test_coalesced_loads():
+    c.execute('FLUSHALL')
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlite_store(directory):
+            store = server.backing_store
+            c.execute('SET', 'key', 'value')
+            store.flush(wait=True)
+            c.execute('FLUSHALL')
+
+            client = server.get_test_client()
+            replies = []
+
+            @asyncio.coroutine
+            def get_concurrently():
+                client.suspendable = True
+                futures = [server.exec_command([b'GET', b'key'], client) for i in range(10)]
+                client.suspendable = False
+                for future in futures:
+                    replies.append((yield from future).to_resp())
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(get_concurrently())
+            finally:
+                loop.close()
+
+            assert replies == [b'$5\r\nvalue\r\n'] * 10
+            assert store.stat_loads == 1
+            assert store.stat_coalesced_loads == 9
+            assert not store.loading
+    c.execute('FLUSHALL')
+
+
+def test_evicted_keys_are_loaded_by_all_commands():
+    c.execute('FLUSHALL')
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlite_store(directory):
+            store = server.backing_store
+            c.execute('SET', 'counter', '10')
+            c.execute('SET', 'string', 'hello')
+            c.execute('SET', 'deleted', 'value')
+            store.flush(wait=True)
+            db = server.default_database()
+            for key in (b'counter', b'string', b'deleted'):
+                db.remove_key(key)
+
+            assert c.execute('INCR', 'counter') == b'11'
+            assert c.execute('APPEND', 'string', 'X') == 6
+            assert c.execute('SETNX', 'string', 'other') == 0
+            assert c.execute('DEL', 'deleted') == 1
+            store.flush(wait=True)
+            assert store.executor.submit(store.store.read, 0, b'counter').result() == (b'11', None)
+            assert store.executor.submit(store.store.read, 0, b'string').result() == (b'helloX', None)
+            assert store.executor.submit(store.store.read, 0, b'deleted').result() is None
+    c.execute('FLUSHALL')
+
+
+def test_evicted_keys_with_pending_writes():
+    c.execute('FLUSHALL')
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlite_store(directory):
+            store = server.backing_store
+            c.execute('SET', 'k', 'v1')
+            c.execute('SET', 'gone', 'value')
+            store.flush(wait=True)
+            c.execute('SET', 'k', 'v2')
+            c.execute('DEL', 'gone')
+            db = server.default_database()
+            db.remove_key(b'k')
+
+            # The queued writes are newer than the store
+            assert c.execute('GET', 'k') == b'v2'
+            assert c.execute('GET', 'gone') is None
+            db.remove_key(b'k')
+            assert c.execute('APPEND', 'k', 'X') == 3
+            store.flush(wait=True)
+            assert store.executor.submit(store.store.read, 0, b'k').result() == (b'v2X', None)
+            assert store.executor.submit(store.store.read, 0, b'gone').result() is None
+    c.execute('FLUSHALL')
+
+
+def test_evicted_keys_keep_their_timeout():
+    c.execute('FLUSHALL')
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlite_store(directory):
+            store = server.backing_store
+            c.execute('SET', 'k', 'v', 'EX', 100)
+            store.flush(wait=True)
+            db = server.default_database()
+            db.remove_key(b'k')
+            assert c.execute('GET', 'k') == b'v'
+            assert 99 < db.expires[b'k'] - time.time() <= 100
+
+            # Keys whose timeout elapsed in the store are missing
+            store.executor.submit(store.store.write, [(0, b'old', b'v', time.time() - 1)]).result()
+            assert c.execute('GET', 'old') is None
+            assert b'old' not in db.key_space
+    c.execute('FLUSHALL')
+
+
+def test_load_outdated_by_a_delete():
+    c.execute('FLUSHALL')
+    with tempfile.TemporaryDirectory() as directory:
+        with sqlite_store(directory):
+            store = server.backing_store
+            c.execute('SET', 'key', 'value')
+            store.flush(wait=True)
+            c.execute('FLUSHALL')
+
+            client = server.get_test_client()
+            replies = []
+
+            @asyncio.coroutine
+            def get_then_delete():
+                client.suspendable = True
+                future = server.exec_command([b'GET', b'key'], client)
+                client.suspendable = False
+                # Let GET submit its read, the delete is flushed before the value it read is installed
+                yield from asyncio.sleep(0)
+                server.exec_command([b'DEL', b'key'], client)
+                store.flush(wait=True)
+                replies.append((yield from future).to_resp())
+
+            loop = asyncio.new_event_loop()
+            try:
+                loop.run_until_complete(get_then_delete())
+            finally:
+                loop.close()
+
+            assert replies == [b'$-1\r\n']
+            assert b'key' not in server.default_database().key_space
+            assert not store.outdated
+            assert store.executor.submit(store.store.read, 0, b'key').result() is None
+    c.execute('FLUSHALL')
@@ -0,0 +1,128 @@
+import os
+import tempfile
+
+from redis.server import checkpoint
+from redis.server_impl import server
+from redis.testsuite.helpers import configured
+
+c = server.get_embedded_client()
+
+
+def checkpoints_enabled(directory, *parameters):
+    c.execute('FLUSHALL')
+    return configured(c, *((('dir', directory), ('checkpoint-deltas', 'yes')) + parameters))
+
+
+def reload():
+    c.execute('FLUSHALL')
+    server.rdb_load()
+
+
+def bgsave_delta():
+    server.rdb_bgsave(delta=True)
+    server.check_rdb_child(wait=True)
+    assert server.rdb_last_save_ok
+
+
+def test_deltas():
+    with tempfile.TemporaryDirectory() as directory:
+        with checkpoints_enabled(directory):
+            checkpoints = server.checkpoints
+            for i in range(100):
+                c.execute('SET', 'key:%d' % i, i)
+            c.execute('LPUSH', 'list', 'a')
+            assert not checkpoints.delta_due()
+            assert c.execute('SAVE') is True
+            assert checkpoints.delta_due()
+            assert not server.default_database().dirty_keys
+            base_size = os.path.getsize(os.path.join(directory, 'dump.rdb'))
+
+            c.execute('SET', 'key:1', 'changed')
+            c.execute('APPEND', 'key:2', '!')
+            c.execute('LPUSH', 'list', 'b')
+            c.execute('DEL', 'key:3')
+            c.execute('EXPIRE', 'key:4', 100)
+            c.execute('SET', 'new', 'value')
+            assert server.default_database().dirty_keys == {
+                b'key:1', b'key:2', b'list', b'key:3', b'key:4', b'new'}
+            bgsave_delta()
+            assert checkpoints.seq == 1
+            # Only the changed keys are written
+            assert checkpoints.delta_size < base_size / 4
+
+            c.execute('PERSIST', 'key:4')
+            c.execute('SET', 'key:3', 'back')
+            server.get_database(2).set_key(b'other', server.default_database().key_space[b'new'])
+            bgsave_delta()
+            assert [seq for seq, path in checkpoint.list_deltas(server.rdb_path())] == [1, 2]
+
+            reload()
+            assert checkpoints.seq == 2
+            assert c.execute('GET', 'key:1') == b'changed'
+            assert c.execute('GET', 'key:2') == b'2!'
+            assert c.execute('GET', 'key:3') == b'back'
+            assert b'key:4' not in server.default_database().expires
+            assert c.execute('GET', 'key:5') == b'5'
+            assert c.execute('LRANGE', 'list', 0, -1) == [b'b', b'a']
+            assert c.execute('GET', 'new') == b'value'
+            assert server.get_database(2).key_space[b'other'].get_bytes() == b'value'
+
+            # A flush is replayed before the keys set after it
+            c.execute('FLUSHDB')
+            c.execute('SET', 'after', 'flush')
+            bgsave_delta()
+            reload()
+            assert len(server.default_database().key_space) == 1
+            assert c.execute('GET', 'after') == b'flush'
+
+            # A new base removes the deltas
+            assert c.execute('SAVE') is True
+            assert checkpoint.list_deltas(server.rdb_path()) == []
+            assert checkpoints.seq == 0
+    c.execute('FLUSHALL')
+
+
+def test_compaction():
+    with tempfile.TemporaryDirectory() as directory:
+        with checkpoints_enabled(directory, ('checkpoint-max-deltas', 2)):
+            checkpoints = server.checkpoints
+            for i in range(100):
+                c.execute('SET', 'key:%d' % i, 'x' * 100)
+            assert c.execute('SAVE') is True
+            for i in range(3):
+                c.execute('SET', 'key:%d' % i, 'delta %d' % i)
+                bgsave_delta()
+            # The third delta replaced the first two
+            assert [seq for seq, path in checkpoint.list_deltas(server.rdb_path())] == [3]
+            assert checkpoints.stat_compactions == 1
+
+            reload()
+            for i in range(3):
+                assert c.execute('GET', 'key:%d' % i) == ('delta %d' % i).encode()
+
+            # Deltas larger than the base: the save points write a new base
+            for i in range(100):
+                c.execute('SET', 'key:%d' % i, 'y' * 200)
+            bgsave_delta()
+            assert not checkpoints.delta_due()
+            c.execute('SET', 'key:0', 'z')
+            server.lastsave -= 3600
+            server.rdb_cron()
+            server.check_rdb_child(wait=True)
+            assert checkpoints.seq == 0
+            assert checkpoint.list_deltas(server.rdb_path()) == []
+    c.execute('FLUSHALL')
+
+
+def test_failed_checkpoint_keeps_changes():
+    with tempfile.TemporaryDirectory() as directory:
+        with checkpoints_enabled(directory):
+            checkpoints = server.checkpoints
+            c.execute('SET', 'key', 'value')
+            assert c.execute('SAVE') is True
+            c.execute('SET', 'key', 'changed')
+            c.execute('CONFIG', 'SET', 'dir', os.path.join(directory, 'missing'))
+            assert server.rdb_save() is False
+            assert server.default_database().dirty_keys == {b'key'}
+            assert checkpoints.delta_due()
+    c.execute('FLUSHALL')
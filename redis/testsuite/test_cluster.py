@@ -0,0 +1,98 @@
+import tempfile
+
+from redis.common.exceptions import CommandError
+from redis.common.hashslot import key_hash_slot
+from redis.server_impl import server
+from redis.testsuite.helpers import ServerProcesses, configured, raises, wait_for
+
+c = server.get_embedded_client()
+
+
+def test_key_hash_slot():
+    assert key_hash_slot(b'123456789') == 0x31c3
+    assert key_hash_slot(b'foo') == 12182
+    assert key_hash_slot(b'{user1000}.following') == key_hash_slot(b'user1000')
+    # An empty tag is not a tag
+    assert key_hash_slot(b'foo{}{bar}') != key_hash_slot(b'bar')
+    assert key_hash_slot(b'foo{{bar}}zap') == key_hash_slot(b'{bar')
+
+
+def test_slot_index():
+    with tempfile.TemporaryDirectory() as directory:
+        c.execute('FLUSHALL')
+        c.execute('SET', '{a}1', 'value')
+        with configured(c, ('dir', directory), ('cluster-enabled', 'yes')):
+            # The embedded client is redirected like the other clients
+            assert error(c, 'MSET', '{a}2', 'value', '{a}3', 'value') == 'CLUSTERDOWN Hash slot not served'
+            c.execute('CLUSTER', 'ADDSLOTSRANGE', 0, 16383)
+            c.execute('MSET', '{a}2', 'value', '{a}3', 'value')
+            assert error(c, 'MSET', '{a}4', 'value', '{b}4', 'value').startswith('CROSSSLOT')
+
+            slot = c.execute('CLUSTER', 'KEYSLOT', '{a}1')
+            assert slot == key_hash_slot(b'a')
+            assert c.execute('CLUSTER', 'COUNTKEYSINSLOT', slot) == 3
+            assert len(c.execute('CLUSTER', 'GETKEYSINSLOT', slot, 2)) == 2
+            c.execute('DEL', '{a}1')
+            assert sorted(c.execute('CLUSTER', 'GETKEYSINSLOT', slot, 10)) == [b'{a}2', b'{a}3']
+            assert c.execute('CLUSTER', 'SLOTS') == [[0, 16383, [b'127.0.0.1', 8888, server.cluster.myself.id.encode()]]]
+    c.execute('FLUSHALL')
+    assert 'cluster support disabled' in raises(CommandError, c.execute, 'CLUSTER', 'NODES').args[1]
+
+
+def error(node, *args):
+    return ' '.join(raises(CommandError, node.execute, *args).args)
+
+
+def slots(node):
+    return [(first, last, address[1]) for first, last, address in node.execute('CLUSTER', 'SLOTS')]
+
+
+def test_redirection():
+    servers = ServerProcesses()
+    try:
+        nodes = [servers.start('--cluster-enabled', 'yes') for i in range(3)]
+        assert error(nodes[0], 'GET', 'foo') == 'CLUSTERDOWN Hash slot not served'
+        for i, node in enumerate(nodes):
+            node.execute('CLUSTER', 'ADDSLOTSRANGE', i * 5462, min(i * 5462 + 5461, 16383))
+            if i:
+                node.execute('CLUSTER', 'MEET', '127.0.0.1', nodes[0].port)
+        expected = [(0, 5461, nodes[0].port), (5462, 10923, nodes[1].port), (10924, 16383, nodes[2].port)]
+        for node in nodes:
+            wait_for(lambda: slots(node) == expected)
+
+        # foo is in slot 12182
+        assert error(nodes[0], 'SET', 'foo', 'bar') == 'MOVED 12182 127.0.0.1:%d' % nodes[2].port
+        nodes[2].execute('SET', 'foo', 'bar')
+        assert error(nodes[2], 'MSET', 'foo', 'bar', 'other', 'value').startswith('CROSSSLOT')
+
+        # Move the slot of foo to the first node
+        source, target = nodes[2], nodes[0]
+        source_id, target_id = source.execute('CLUSTER', 'MYID'), target.execute('CLUSTER', 'MYID')
+        source.execute('SET', '{foo}2', 'value')
+        target.execute('CLUSTER', 'SETSLOT', 12182, 'IMPORTING', source_id)
+        source.execute('CLUSTER', 'SETSLOT', 12182, 'MIGRATING', target_id)
+        target.execute('ASKING')
+        target.execute('RESTORE', 'foo', 0, source.execute('DUMP', 'foo'))
+        source.execute('DEL', 'foo')
+
+        assert error(source, 'GET', 'foo') == 'ASK 12182 127.0.0.1:%d' % target.port
+        assert source.execute('GET', '{foo}2') == b'value'
+        assert error(source, 'MGET', 'foo', '{foo}2').startswith('TRYAGAIN')
+        assert error(target, 'GET', 'foo').startswith('MOVED 12182')
+        target.execute('ASKING')
+        assert target.execute('GET', 'foo') == b'bar'
+
+        target.execute('ASKING')
+        target.execute('RESTORE', '{foo}2', 0, source.execute('DUMP', '{foo}2'))
+        source.execute('DEL', '{foo}2')
+        assert source.execute('CLUSTER', 'COUNTKEYSINSLOT', 12182) == 0
+        target.execute('CLUSTER', 'SETSLOT', 12182, 'NODE', target_id)
+        source.execute('CLUSTER', 'SETSLOT', 12182, 'NODE', target_id)
+        expected = [(0, 5461, nodes[0].port), (5462, 10923, nodes[1].port), (10924, 12181, nodes[2].port),
+                    (12182, 12182, nodes[0].port), (12183, 16383, nodes[2].port)]
+        for node in nodes:
+            wait_for(lambda: slots(node) == expected)
+        assert target.execute('GET', 'foo') == b'bar'
+        assert error(source, 'GET', 'foo') == 'MOVED 12182 127.0.0.1:%d' % target.port
+    finally:
+        servers.stop()
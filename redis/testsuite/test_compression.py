@@ -0,0 +1,53 @@
+import os
+
+from redis.server_impl import server
+from redis.common import compression
+
+c = server.get_embedded_client()
+
+DOCUMENT = ''.join('{"id": %d, "name": "user %d", "tags": ["a", "b"]},' % (i, i)
+                   for i in range(10000)).encode()
+
+
+def info_field(field):
+    for line in c.execute('INFO', 'compression').decode().split('\r\n'):
+        if line.startswith(field + ':'):
+            return line.split(':', 1)[1]
+    return None
+
+
+def test_compressed_strings():
+    c.execute('FLUSHALL')
+    c.execute('SET', 'uncompressed', DOCUMENT)
+    c.execute('CONFIG', 'SET', 'compress-min-size', '1kb')
+    try:
+        c.execute('SET', 'document', DOCUMENT)
+        c.execute('SET', 'small', DOCUMENT[:100])
+        c.execute('SET', 'random', os.urandom(10000))
+        assert c.execute('OBJECT', 'ENCODING', 'document') == b'compressed'
+        assert c.execute('OBJECT', 'ENCODING', 'small') == b'raw'
+        # Incompressible values are stored as they are
+        assert c.execute('OBJECT', 'ENCODING', 'random') == b'raw'
+        assert c.execute('MEMORY', 'USAGE', 'document') * 5 < c.execute('MEMORY', 'USAGE', 'uncompressed')
+        assert float(info_field('compression_ratio')) > 5
+
+        decompressed = compression.stats.decompressed_bytes
+        assert c.execute('STRLEN', 'document') == len(DOCUMENT)
+        assert compression.stats.decompressed_bytes == decompressed
+        # Only the block holding the range is decompressed
+        assert c.execute('GETRANGE', 'document', 200000, 200099) == DOCUMENT[200000:200100]
+        assert c.execute('GETRANGE', 'document', -10, -1) == DOCUMENT[-10:]
+        assert compression.stats.decompressed_bytes - decompressed <= 2 * compression.BLOCK_SIZE
+        assert c.execute('GET', 'document') == DOCUMENT
+
+        assert c.execute('APPEND', 'document', 'end') == len(DOCUMENT) + 3
+        assert c.execute('OBJECT', 'ENCODING', 'document') == b'compressed'
+        assert c.execute('GET', 'document') == DOCUMENT + b'end'
+
+        for codec in sorted(compression.CODECS):
+            c.execute('CONFIG', 'SET', 'compress-codec', codec)
+            c.execute('SET', codec, DOCUMENT)
+            assert c.execute('GET', codec) == DOCUMENT
+    finally:
+        c.execute('CONFIG', 'SET', 'compress-min-size', '0')
+        c.execute('CONFIG', 'SET', 'compress-codec', 'zlib')
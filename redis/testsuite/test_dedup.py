@@ -0,0 +1,45 @@
+from redis.server_impl import server
+
+c = server.get_embedded_client()
+
+FRAGMENT = ''.join('<li>item %d</li>' % i for i in range(1000)).encode()
+
+
+def info_fields(section):
+    lines = c.execute('INFO', section).decode().split('\r\n')
+    return dict(line.split(':', 1) for line in lines if ':' in line)
+
+
+def test_dedup():
+    c.execute('FLUSHALL')
+    c.execute('CONFIG', 'SET', 'dedup-min-size', '1kb')
+    try:
+        for i in range(10):
+            c.execute('SET', 'fragment:%d' % i, FRAGMENT)
+        c.execute('SET', 'small', FRAGMENT[:100])
+
+        db = server.default_database()
+        assert len(db.blobs) == 1 and db.blobs.references == 10
+        assert db.key_space[b'fragment:0'].value is db.key_space[b'fragment:9'].value
+        fields = info_fields('deduplication')
+        assert fields['dedup_hits'] == '9' and fields['dedup_misses'] == '1'
+        assert fields['dedup_hit_rate'] == '0.90'
+        assert int(fields['dedup_saved_bytes']) == 9 * int(fields['dedup_blobs_bytes'])
+        # The shared value is accounted once
+        assert server.used_memory() < 2 * len(FRAGMENT)
+
+        # Modifying a key copies its value and leaves the others alone
+        assert c.execute('APPEND', 'fragment:0', '<li>end</li>') == len(FRAGMENT) + 12
+        c.execute('SETBIT', 'fragment:1', 0, 1)
+        c.execute('SET', 'fragment:2', FRAGMENT)
+        assert c.execute('GET', 'fragment:0') == FRAGMENT + b'<li>end</li>'
+        assert c.execute('GET', 'fragment:1') == b'\xbc' + FRAGMENT[1:]
+        assert c.execute('GET', 'fragment:3') == FRAGMENT
+        assert len(db.blobs) == 3 and db.blobs.references == 10
+
+        for i in range(10):
+            c.execute('DEL', 'fragment:%d' % i)
+        assert len(db.blobs) == 0 and db.blobs.memory == 0
+        assert server.used_memory() == c.execute('MEMORY', 'USAGE', 'small')
+    finally:
+        c.execute('CONFIG', 'SET', 'dedup-min-size', '0')
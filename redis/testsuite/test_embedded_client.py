@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+from redis.server_impl import server
+from redis.common.exceptions import CommandError
+
+c = server.get_embedded_client()
+
+
+def test_execute():
+    assert c.execute('SET', 'embedded', 'hello') is True
+    assert c.execute('GET', 'embedded') == b'hello'
+    assert c.execute('GET', 'notexists') is None
+    assert c.execute('DEL', 'embedded', 'notexists') == 1
+    assert c.execute('LPUSH', 'embedded', 'a', 'b') == 2
+    assert c.execute('LRANGE', 'embedded', 0, -1) == [b'b', b'a']
+
+    try:
+        c.execute('GET', 'embedded')
+        assert False
+    except CommandError as e:
+        assert e.args[0] == 'WRONGTYPE'
+
+
+def test_execute_many():
+    replies = c.execute_many([('SET', 'embedded', 1), ('GETX', 'embedded'), ('GET', 'embedded')])
+    assert replies[0] is True
+    assert isinstance(replies[1], Exception)
+    assert replies[2] == b'1'
+
+
+def test_multi_exec():
+    assert c.execute('MULTI') is True
+    assert c.execute('SET', 'embedded', 'hello') == b'QUEUED'
+    assert c.execute('GET', 'embedded') == b'QUEUED'
+    assert c.execute('EXEC') == [True, b'hello']
+
+
+def test_threads_with_running_loop():
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+
+    def run_loop():
+        server.loop = loop
+        server.loop_thread_id = threading.get_ident()
+        loop.call_soon(started.set)
+        loop.run_forever()
+
+    loop_thread = threading.Thread(target=run_loop)
+    loop_thread.start()
+    started.wait()
+
+    try:
+        c.execute('SET', 'embedded', 0)
+
+        def incr():
+            client = server.get_embedded_client()
+            for i in range(200):
+                client.execute('INCR', 'embedded')
+
+        threads = [threading.Thread(target=incr) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert c.execute('GET', 'embedded') == b'800'
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        loop_thread.join()
+        loop.close()
+        server.loop = None
+        server.loop_thread_id = None
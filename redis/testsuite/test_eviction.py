@@ -0,0 +1,101 @@
+from redis.server_impl import server
+from redis.common.exceptions import CommandError
+from redis.common.objects import OBJECT_OVERHEAD
+from redis.testsuite.helpers import configured, raises
+
+c = server.get_embedded_client()
+
+
+def db_volatile_keys():
+    return server.default_database().volatile_keys
+
+
+def exists(key):
+    # Unlike GET, does not count as an access
+    return key.encode() in server.default_database().key_space
+
+
+def limited_memory():
+    # The tests change the limit and the policy, restored when they end
+    c.execute('FLUSHALL')
+    return configured(c, ('maxmemory', 0), ('maxmemory-policy', 'noeviction'), ('maxmemory-samples', 5))
+
+
+def test_memory_accounting():
+    with limited_memory():
+        db = server.default_database()
+        c.execute('SET', 'string', 'x' * 1000)
+        c.execute('LPUSH', 'list', *range(100))
+        c.execute('LSET', 'list', 0, 'y' * 1000)
+        c.execute('LREM', 'list', 0, 50)
+        c.execute('LPOP', 'list')
+        c.execute('APPEND', 'string', 'z' * 1000)
+        assert db.used_memory > 3000
+
+        obj = db.key_space[b'list']
+        assert obj.memory == OBJECT_OVERHEAD + obj.value_memory(obj.value)
+        c.execute('DEL', 'string', 'list')
+        assert db.used_memory == 0
+    c.execute('FLUSHALL')
+
+
+def test_noeviction():
+    with limited_memory():
+        c.execute('SET', 'key', 'x' * 1000)
+        c.execute('CONFIG', 'SET', 'maxmemory', 1000)
+        assert raises(CommandError, c.execute, 'SET', 'other', 'value').args[0] == 'OOM'
+        assert c.execute('GET', 'key') == b'x' * 1000
+        assert c.execute('DEL', 'key') == 1
+    c.execute('FLUSHALL')
+
+
+def check_evict_cold_keys(policy):
+    with limited_memory():
+        c.execute('CONFIG', 'SET', 'maxmemory-policy', policy)
+        c.execute('CONFIG', 'SET', 'maxmemory-samples', 10)
+        for i in range(100):
+            c.execute('SET', 'hot:%d' % i, 'value')
+        c.execute('CONFIG', 'SET', 'maxmemory', server.used_memory() * 2)
+
+        for i in range(1000):
+            c.execute_many([('GET', 'hot:%d' % j) for j in range(100)])
+            c.execute('SET', 'cold:%d' % i, 'value')
+        # Evictions happen before the commands, the last one may exceed the limit
+        assert server.used_memory() <= server.config['maxmemory'] + 1000
+        assert int(c.execute('INFO', 'stats').split(b'evicted_keys:')[1].split(b'\r\n')[0]) > 0
+        hot_keys = sum(exists('hot:%d' % j) for j in range(100))
+        assert hot_keys >= 90
+    c.execute('FLUSHALL')
+
+
+def test_evict_cold_keys_lru():
+    check_evict_cold_keys('allkeys-lru')
+
+
+def test_evict_cold_keys_lfu():
+    check_evict_cold_keys('allkeys-lfu')
+
+
+def test_volatile_policies():
+    with limited_memory():
+        for i in range(50):
+            c.execute('SET', 'persistent:%d' % i, 'value')
+            c.execute('SET', 'volatile:%d' % i, 'value', 'EX', 1000 + i)
+        c.execute('CONFIG', 'SET', 'maxmemory', server.used_memory())
+
+        c.execute('CONFIG', 'SET', 'maxmemory-policy', 'volatile-ttl')
+        for i in range(10):
+            c.execute('SET', 'new:%d' % i, 'value')
+        # The keys expiring last are kept
+        assert sum(exists('volatile:%d' % i) for i in range(25, 50)) == 25
+        assert sum(exists('volatile:%d' % i) for i in range(25)) < 25
+
+        c.execute('CONFIG', 'SET', 'maxmemory-policy', 'volatile-random')
+        for i in range(10, 30):
+            c.execute('SET', 'new:%d' % i, 'value')
+        assert sum(exists('persistent:%d' % i) for i in range(50)) == 50
+        # Evicting all the volatile keys is not enough after this one
+        c.execute('SET', 'large', 'x' * 100000)
+        raises(CommandError, c.execute, 'SET', 'more', 'value')
+        assert db_volatile_keys() == 0
+    c.execute('FLUSHALL')
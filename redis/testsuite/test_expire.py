@@ -0,0 +1,73 @@
+import time
+from redis.server_impl import server
+
+c = server.get_test_client()
+
+
+def info_field(section, field):
+    info = c.execute('INFO %s\r\n' % section).decode()
+    for line in info.split('\r\n'):
+        if line.startswith(field + ':'):
+            return line.split(':', 1)[1]
+    return None
+
+
+def test_active_expire():
+    assert c.execute(b'FLUSHDB\r\n') == b'+OK\r\n'
+    for i in range(100):
+        assert c.execute(('SET volatile:%d value PX 50\r\n' % i).encode()) == b'+OK\r\n'
+    assert c.execute(b'SET persistent value\r\n') == b'+OK\r\n'
+
+    db = server.default_database()
+    assert db.volatile_keys == 100
+    expired_keys = int(info_field('stats', 'expired_keys'))
+
+    time.sleep(0.1)
+    assert server.active_expire_cycle(1) == 100
+    assert len(db.key_space) == 1
+    assert db.volatile_keys == 0
+    assert int(info_field('stats', 'expired_keys')) == expired_keys + 100
+
+
+def test_active_expire_time_limit():
+    assert c.execute(b'FLUSHDB\r\n') == b'+OK\r\n'
+    for i in range(100):
+        assert c.execute(('SET volatile:%d value PX 10\r\n' % i).encode()) == b'+OK\r\n'
+
+    time.sleep(0.05)
+    db = server.default_database()
+    assert db.active_expire_cycle(time.monotonic()) == (16, True)
+    assert db.active_expire_cycle(time.monotonic() + 1) == (84, False)
+
+
+def test_expires_index():
+    assert c.execute(b'FLUSHDB\r\n') == b'+OK\r\n'
+    assert c.execute(b'SET key value EX 100\r\n') == b'+OK\r\n'
+    assert c.execute(b'EXPIRE key 200\r\n') == b':1\r\n'
+    assert c.execute(b'SET other value EX 100\r\n') == b'+OK\r\n'
+    assert c.execute(b'PERSIST other\r\n') == b':1\r\n'
+    assert c.execute(b'PERSIST other\r\n') == b':0\r\n'
+
+    db = server.default_database()
+    assert db.volatile_keys == 1
+    assert 199 < db.avg_ttl() <= 200
+    assert info_field('keyspace', 'db0').startswith('keys=2,expires=1,avg_ttl=')
+
+    assert c.execute(b'SET key value\r\n') == b'+OK\r\n'
+    assert db.volatile_keys == 0
+    assert info_field('keyspace', 'db0') == 'keys=2,expires=0,avg_ttl=0'
+
+
+def test_expires_map():
+    assert c.execute(b'FLUSHDB\r\n') == b'+OK\r\n'
+    assert c.execute(b'SET persistent value\r\n') == b'+OK\r\n'
+    assert c.execute(b'SET volatile value EX 100\r\n') == b'+OK\r\n'
+    assert c.execute(b'APPEND volatile value\r\n') == b':10\r\n'
+
+    db = server.default_database()
+    # Only the volatile keys have an entry, and modifying a value in place keeps its timeout
+    assert list(db.expires) == [b'volatile']
+    assert not hasattr(db.key_space[b'persistent'], '__dict__')
+
+    assert c.execute(b'SET volatile value\r\n') == b'+OK\r\n'
+    assert db.expires == {}
@@ -0,0 +1,88 @@
+import tempfile
+
+from redis.server_impl import server
+from redis.common.proto import RedisListSerializationObject, RedisBulkStringSerializationObject
+
+c = server.get_test_client()
+c.execute(b'CONFIG SET dir ' + tempfile.mkdtemp().encode() + b'\r\n')
+
+LIBRARY = '''#!python name=testlib
+def incr_twice(keys, args):
+    redis.call('INCR', keys[0])
+    return redis.call('INCRBY', keys[0], args[0])
+
+def get_and_push(keys, args):
+    return [redis.call('GET', keys[0]), redis.pcall('LPUSH', keys[0], 'x')]
+
+def spin(keys, args):
+    while True:
+        pass
+
+redis.register_function('incr_twice', incr_twice)
+redis.register_function('get_and_push', get_and_push, flags=['no-writes'])
+redis.register_function('spin', spin, flags=['no-writes'])
+'''
+
+
+def execute(*argv):
+    return c.execute(RedisListSerializationObject([RedisBulkStringSerializationObject(arg) for arg in argv]).to_resp())
+
+
+def test_function_load():
+    execute('FUNCTION', 'FLUSH')
+    assert execute('FUNCTION', 'LOAD', LIBRARY) == b'$7\r\ntestlib\r\n'
+    assert execute('FUNCTION', 'LOAD', LIBRARY) == b"-ERR Library 'testlib' already exists\r\n"
+    assert execute('FUNCTION', 'LOAD', 'REPLACE', LIBRARY) == b'$7\r\ntestlib\r\n'
+    assert execute('FUNCTION', 'LOAD', 'def f(keys, args): pass') == b'-ERR Missing library metadata\r\n'
+
+
+def test_function_sandbox():
+    assert execute('FUNCTION', 'LOAD', '#!python name=bad\nimport os') == \
+        b'-ERR Error compiling function: imports are not allowed (line 2)\r\n'
+    assert execute('FUNCTION', 'LOAD', '#!python name=bad\n().__class__') == \
+        b'-ERR Error compiling function: attribute __class__ is not allowed (line 2)\r\n'
+    escape = '''#!python name=bad
+def env(keys, args):
+    return '{0.call.__globals__[os].environ}'.format(redis)
+redis.register_function('env', env)
+'''
+    assert execute('FUNCTION', 'LOAD', escape) == \
+        b'-ERR Error compiling function: attribute format is not allowed (line 3)\r\n'
+    assert execute('FUNCTION', 'LOAD', '#!python name=bad\nf = str.format_map') == \
+        b'-ERR Error compiling function: attribute format_map is not allowed (line 2)\r\n'
+    assert execute('FUNCTION', 'LOAD', '#!python name=bad\nopen("x")') == \
+        b"-ERR Error registering functions: name 'open' is not defined\r\n"
+
+
+def test_fcall():
+    execute('FUNCTION', 'LOAD', 'REPLACE', LIBRARY)
+    assert execute('SET', 'counter', '1') == b'+OK\r\n'
+    assert execute('FCALL', 'incr_twice', '1', 'counter', '5') == b'$1\r\n7\r\n'
+    assert execute('FCALL', 'missing', '0') == b'-ERR Function not found\r\n'
+    assert execute('FCALL', 'incr_twice', '2', 'counter') == \
+        b"-ERR Number of keys can't be greater than number of args\r\n"
+
+
+def test_fcall_ro():
+    execute('FUNCTION', 'LOAD', 'REPLACE', LIBRARY)
+    assert execute('SET', 'counter', '1') == b'+OK\r\n'
+    assert execute('FCALL_RO', 'get_and_push', '1', 'counter') == \
+        b'*2\r\n$1\r\n1\r\n-ERR Write commands are not allowed from read-only scripts.\r\n'
+    assert execute('FCALL_RO', 'incr_twice', '1', 'counter', '1') == \
+        b'-ERR Can not execute a script with write flag using *_ro command.\r\n'
+
+
+def test_fcall_timeout():
+    execute('FUNCTION', 'LOAD', 'REPLACE', LIBRARY)
+    assert execute('CONFIG', 'SET', 'busy-reply-threshold', '100') == b'+OK\r\n'
+    assert execute('FCALL', 'spin', '0') == b'-BUSY Function spin exceeded busy-reply-threshold and was killed\r\n'
+    assert execute('CONFIG', 'SET', 'busy-reply-threshold', '5000') == b'+OK\r\n'
+
+
+def test_function_persistence():
+    execute('FUNCTION', 'LOAD', 'REPLACE', LIBRARY)
+    server.functions.libraries.clear()
+    server.functions.functions.clear()
+    server.functions.load_from_disk()
+    assert execute('SET', 'counter', '1') == b'+OK\r\n'
+    assert execute('FCALL', 'incr_twice', '1', 'counter', '1') == b'$1\r\n3\r\n'
@@ -0,0 +1,80 @@
+import io
+
+from redis.server_impl import server
+from redis.client.analyzer import KeyspaceAnalyzer
+from redis.client.connection import pack_command, read_reply
+from redis.common.exceptions import CommandError
+from redis.testsuite.helpers import raises
+
+c = server.get_embedded_client()
+
+
+def stats_dict(pairs):
+    return dict(zip(pairs[::2], pairs[1::2]))
+
+
+def test_memory_usage():
+    c.execute('FLUSHALL')
+    c.execute('SET', 'small', 'x')
+    c.execute('SET', 'large', 'x' * 10000)
+    assert c.execute('MEMORY', 'USAGE', 'large') - c.execute('MEMORY', 'USAGE', 'small') == 9999
+    assert c.execute('MEMORY', 'USAGE', 'notexists') is None
+
+    c.execute('LPUSH', 'list', *(['x' * 10] * 1000 + ['x' * 100] * 10))
+    exact = c.execute('MEMORY', 'USAGE', 'list', 'SAMPLES', 0)
+    # The sampled elements are the last pushed ones, larger than the others
+    assert c.execute('MEMORY', 'USAGE', 'list', 'SAMPLES', 5) > exact
+    assert abs(c.execute('MEMORY', 'USAGE', 'list', 'SAMPLES', 1000) - exact) < exact * 0.05
+    assert c.execute('MEMORY', 'USAGE', 'list', 'SAMPLES', 2000) == exact
+    raises(CommandError, c.execute, 'MEMORY', 'USAGE', 'list', 'SAMPLES', -1)
+
+
+def test_memory_stats():
+    c.execute('FLUSHALL')
+    for i in range(10):
+        c.execute('SET', 'string:%d' % i, 'value')
+    c.execute('LPUSH', 'list', 'a', 'b')
+    c.execute('SET', 'volatile', 'value', 'EX', 100)
+
+    stats = stats_dict(c.execute('MEMORY', 'STATS'))
+    assert stats[b'keys.count'] == 12
+    assert stats[b'dataset.bytes'] == server.used_memory()
+    assert stats[b'total.allocated'] == stats[b'dataset.bytes'] + stats[b'overhead.total']
+
+    db = stats_dict(stats[b'db.0'])
+    assert db[b'keys'] == 12
+    assert db[b'overhead.hashtable.expires'] > 0
+    types = stats_dict(db[b'types'])
+    assert stats_dict(types[b'string'])[b'keys'] == 11
+    assert stats_dict(types[b'list'])[b'keys'] == 1
+    assert sum(stats_dict(value)[b'bytes'] for value in types.values()) == db[b'dataset.bytes']
+
+
+def test_keyspace_analyzer():
+    c.execute('FLUSHALL')
+    for i in range(100):
+        c.execute('SET', 'string:%d' % i, 'x' * i)
+        c.execute('LPUSH', 'list:%d' % i, *range(i + 1))
+
+    analyzer = KeyspaceAnalyzer(c, top=3, count=10)
+    types = analyzer.run()
+    assert analyzer.scanned == 200
+    assert sorted(types[b'string']['top'], reverse=True) == [
+        (99, b'string:99'), (98, b'string:98'), (97, b'string:97')]
+    assert types[b'list']['total'] == sum(range(1, 101))
+    assert '100 lists with 5050 items (50.50 items per key)' in analyzer.format_report()
+
+    analyzer = KeyspaceAnalyzer(c, memkeys=True)
+    types = analyzer.run()
+    assert types[b'list']['top'] == [(c.execute('MEMORY', 'USAGE', 'list:99'), b'list:99')]
+
+
+def test_read_reply():
+    fp = io.BytesIO(b'+OK\r\n-ERR bad thing\r\n:42\r\n$-1\r\n*2\r\n$3\r\nfoo\r\n*1\r\n+PONG\r\n')
+    assert read_reply(fp) is True
+    error = read_reply(fp)
+    assert isinstance(error, CommandError) and error.args == ('ERR', 'bad thing')
+    assert read_reply(fp) == 42
+    assert read_reply(fp) is None
+    assert read_reply(fp) == [b'foo', [b'PONG']]
+    assert pack_command([b'GET', b'key']) == b'*2\r\n$3\r\nGET\r\n$3\r\nkey\r\n'
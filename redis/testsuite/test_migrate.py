@@ -0,0 +1,49 @@
+from redis.common.exceptions import CommandError
+from redis.testsuite.helpers import ServerProcesses, raises, wait_for
+
+
+def test_migrate():
+    servers = ServerProcesses()
+    try:
+        source, target = servers.start(), servers.start()
+        replica = servers.start('--replicaof', '127.0.0.1 %d' % source.port)
+        wait_for(lambda: replica.info()['master_link_status'] == 'up')
+
+        source.execute('SET', 'key', 'value', 'EX', 100)
+        assert source.execute('MIGRATE', '127.0.0.1', target.port, 'key', 0, 1000) is True
+        assert source.execute('GET', 'key') is None
+        assert target.execute('GET', 'key') == b'value'
+        assert b'db0:keys=1,expires=1,' in target.execute('INFO', 'keyspace')
+        assert source.execute('MIGRATE', '127.0.0.1', target.port, 'key', 0, 1000) == b'NOKEY'
+
+        for i in range(100):
+            source.execute('SET', 'key:%d' % i, i)
+        target.execute('SET', 'key:0', 'busy')
+        keys = ['key:%d' % i for i in range(100)] + ['missing']
+        error = raises(CommandError, source.execute,
+                       'MIGRATE', '127.0.0.1', target.port, '', 0, 1000, 'KEYS', *keys)
+        assert 'BUSYKEY' in error.args[1]
+        # Only the keys the target restored are deleted
+        assert source.execute('MGET', 'key:0', 'key:1') == [b'0', None]
+        assert target.execute('MGET', 'key:0', 'key:99') == [b'busy', b'99']
+
+        source.execute('LPUSH', 'list', 'a', 'b')
+        assert source.execute('MIGRATE', '127.0.0.1', target.port, '', 0, 1000, 'COPY', 'REPLACE',
+                              'KEYS', 'key:0', 'list') is True
+        assert source.execute('GET', 'key:0') == b'0'
+        assert target.execute('GET', 'key:0') == b'0'
+        assert target.execute('LRANGE', 'list', 0, -1) == [b'b', b'a']
+
+        # The connection to the target is reused
+        assert len(target.execute('CLIENT', 'LIST').decode().split('\r')) == 2
+        # The replica deletes the migrated keys
+        assert source.execute('WAIT', 1, 5000) == 1
+        assert replica.execute('MGET', 'key', 'key:0', 'key:1') == [None, b'0', None]
+        assert replica.execute('LRANGE', 'list', 0, -1) == [b'b', b'a']
+
+        target.stop()
+        error = raises(CommandError, source.execute, 'MIGRATE', '127.0.0.1', target.port, 'key:0', 0, 1000)
+        assert error.args[0] == 'IOERR'
+        assert source.execute('GET', 'key:0') == b'0'
+    finally:
+        servers.stop()
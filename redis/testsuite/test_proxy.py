@@ -0,0 +1,71 @@
+from redis.common.exceptions import CommandError
+from redis.proxy.backend import Backend, split_array
+from redis.proxy.router import HashRing, SlotRouter
+from redis.testsuite.helpers import ServerProcesses, connect, free_port, raises, spawn
+
+
+def test_routers():
+    backends = [Backend('127.0.0.1', port) for port in (7001, 7002, 7003)]
+    slots = SlotRouter(backends)
+    # foo is in slot 12182, bar in slot 5061
+    assert slots.get_backend(b'foo') is backends[2]
+    assert slots.get_backend(b'bar') is backends[0]
+    assert slots.get_backend(b'{bar}foo') is backends[0]
+
+    ring = HashRing(backends)
+    keys = [('key:%d' % i).encode() for i in range(3000)]
+    owners = [ring.get_backend(key) for key in keys]
+    assert all(300 < owners.count(backend) < 1700 for backend in backends)
+    assert ring.get_backend(b'{key:1}a') is ring.get_backend(b'key:1')
+    # Only the keys of the removed backend move
+    smaller = HashRing(backends[:2])
+    assert all(smaller.get_backend(key) is owner for key, owner in zip(keys, owners) if owner is not backends[2])
+
+
+def test_split_array():
+    assert split_array(b'*3\r\n$1\r\na\r\n$-1\r\n*2\r\n:1\r\n+OK\r\n') == [b'$1\r\na\r\n', b'$-1\r\n', b'*2\r\n:1\r\n+OK\r\n']
+
+
+def test_proxy():
+    servers = ServerProcesses()
+    process = connection = None
+    try:
+        backends = [servers.start() for i in range(3)]
+        port = free_port()
+        args = ['-p', str(port)] + ['-b=127.0.0.1:%d' % backend.port for backend in backends]
+        process = spawn('from redis.proxy.cli import main; main()', args)
+        connection = connect(port)
+
+        assert connection.execute('PING') == b'PONG'
+
+        # Pipelined commands are answered in order
+        replies = connection.execute_many([('SET', 'key:%d' % i, i) for i in range(300)] +
+                                          [('GET', 'key:%d' % i) for i in range(300)])
+        assert replies == [True] * 300 + [str(i).encode() for i in range(300)]
+        assert all(b'db0:keys=' in backend.execute('INFO', 'keyspace') for backend in backends)
+        assert backends[2].execute('GET', 'foo') is None
+        connection.execute('SET', 'foo', 'bar')
+        assert backends[2].execute('GET', 'foo') == b'bar'
+
+        # Multi-key commands are split by backend
+        assert connection.execute('MSET', 'a', 1, 'b', 2, 'c', 3, 'foo', 'baz') is True
+        assert connection.execute('MGET', 'foo', 'missing', 'c', 'b', 'a', 'key:7') == \
+            [b'baz', None, b'3', b'2', b'1', b'7']
+        assert connection.execute('DEL', 'a', 'b', 'missing', 'key:0', 'key:1') == 4
+        assert 'different backends' in raises(CommandError, connection.execute, 'MSETNX', 'a', 1, 'b', 2).args[1]
+        assert raises(CommandError, connection.execute, 'LPUSH', 'foo', 'value').args[0] == 'WRONGTYPE'
+        assert 'not supported' in raises(CommandError, connection.execute, 'MULTI').args[1]
+
+        assert connection.execute('FLUSHALL') is True
+        assert connection.execute('MGET', 'foo', 'c') == [None, None]
+        info = connection.execute('INFO').decode()
+        backend_info = [line for line in info.split('\r\n') if line.startswith('backend')]
+        assert len(backend_info) == 3
+        assert all('connected=1' in line and 'latency_p99_usec=' in line for line in backend_info)
+    finally:
+        if connection is not None:
+            connection.close()
+        if process is not None:
+            process.kill()
+            process.wait()
+        servers.stop()
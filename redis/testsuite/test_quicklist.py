@@ -0,0 +1,88 @@
+import pickle
+import random
+
+from redis.common.objects import OBJECT_OVERHEAD
+from redis.common.quicklist import QuickList
+from redis.server_impl import server
+
+c = server.get_embedded_client()
+
+
+def test_quicklist():
+    rand = random.Random(42)
+    # Small chunks, so the operations cross chunk boundaries
+    items = QuickList(range(10), chunk_size=4)
+    expected = list(range(10))
+    for i in range(3000):
+        op = rand.randrange(9)
+        if op == 0:
+            items.appendleft(i)
+            expected.insert(0, i)
+        elif op == 1:
+            items.append(i)
+            expected.append(i)
+        elif op == 2 and expected:
+            assert items.popleft() == expected.pop(0)
+        elif op == 3 and expected:
+            assert items.pop() == expected.pop()
+        elif op == 4:
+            index = rand.randint(0, len(expected))
+            items.insert(index, i)
+            expected.insert(index, i)
+        elif op == 5 and expected:
+            index = rand.randrange(-len(expected), len(expected))
+            assert items[index] == expected[index]
+            items[index] = -i
+            expected[index] = -i
+        elif op == 6:
+            start, stop = rand.randint(-5, len(expected) + 5), rand.randint(-5, len(expected) + 5)
+            assert items[start:stop] == expected[start:stop]
+        elif op == 7 and expected:
+            index = rand.randrange(len(expected))
+            del items[index]
+            del expected[index]
+        elif op == 8 and rand.random() < 0.05:
+            start, stop = rand.randint(-5, 5), rand.randint(len(expected) - 5, len(expected))
+            assert sorted(items.trim(start, stop) + expected[start:stop]) == sorted(expected)
+            expected = expected[start:stop]
+        assert len(items) == len(expected)
+        assert all(items.chunks)
+    assert list(items) == expected
+    assert list(reversed(items)) == expected[::-1]
+    assert pickle.loads(pickle.dumps(items)) == items
+    assert pickle.loads(pickle.dumps(items)).chunk_size == 4
+
+
+def test_quicklist_remove():
+    items = QuickList([1, 2, 1, 3, 1, 4, 1, 5, 1], chunk_size=4)
+    assert items.remove(1, 2) == [1, 1]
+    assert list(items) == [2, 3, 1, 4, 1, 5, 1]
+    assert items.remove(1, -2) == [1, 1]
+    assert list(items) == [2, 3, 1, 4, 5]
+    assert items.remove(9) == []
+    assert items.remove(1) == [1]
+    assert list(items) == [2, 3, 4, 5] and len(items) == 4
+
+
+def test_list_commands():
+    # Long enough for several chunks
+    c.execute('FLUSHALL')
+    c.execute('LPUSH', 'list', *range(300))
+    assert c.execute('LRANGE', 'list', 0, 4) == [b'299', b'298', b'297', b'296', b'295']
+    assert c.execute('LRANGE', 'list', 125, 130) == [str(i).encode() for i in range(174, 168, -1)]
+    assert c.execute('LINDEX', 'list', -1) == b'0'
+    assert c.execute('LINSERT', 'list', 'AFTER', '0', 'tail') == 301
+    assert c.execute('LINSERT', 'list', 'BEFORE', '150', 'x') == 302
+    c.execute('LSET', 'list', 1, 'x')
+    assert c.execute('LREM', 'list', -1, 'x') == 1
+    assert c.execute('LRANGE', 'list', 0, 2) == [b'299', b'x', b'297']
+    c.execute('LTRIM', 'list', 1, -1)
+    assert c.execute('LRANGE', 'list', 0, -1) == [b'x'] + [str(i).encode() for i in range(297, -1, -1)]
+    assert c.execute('LPOP', 'list') == b'x'
+    assert c.execute('LLEN', 'list') == 298
+
+    obj = server.default_database().key_space[b'list']
+    assert len(obj.value.chunks) > 2
+    assert obj.memory == OBJECT_OVERHEAD + obj.value_memory(obj.value)
+    assert c.execute('OBJECT', 'ENCODING', 'list') == b'quicklist'
+    c.execute('FLUSHALL')
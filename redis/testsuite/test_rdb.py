@@ -0,0 +1,225 @@
+import errno
+import os
+import tempfile
+import time
+
+from redis.common.crc64 import crc64
+from redis.common.exceptions import CommandError
+from redis.server import rdb
+from redis.server_impl import server
+from redis.testsuite.helpers import configured, raises
+
+c = server.get_embedded_client()
+
+
+def test_crc64():
+    assert crc64(b'123456789') == 0xe9c6d914c4b8d9ca
+    assert crc64(b'56789', crc64(b'1234')) == crc64(b'123456789')
+    data = bytes(range(256)) * 5
+    assert crc64(data[:777], 0) == crc64(data[700:777], crc64(data[:700]))
+
+
+def fill():
+    c.execute('FLUSHALL')
+    c.execute('SET', 'small', 42)
+    c.execute('SET', 'negative', -100000)
+    c.execute('SET', 'big', 2 ** 40)
+    c.execute('SET', 'text', 'hello world')
+    c.execute('SET', 'long', 'x' * 20000)
+    c.execute('SET', 'volatile', 'value', 'EX', 100)
+    c.execute('LPUSH', 'list', 'a', 'b', 'c')
+    server.get_database(3).set_key(b'other', server.default_database().key_space[b'text'])
+
+
+def check():
+    assert c.execute('GET', 'small') == b'42'
+    assert c.execute('OBJECT', 'ENCODING', 'small') == b'int'
+    assert c.execute('GET', 'negative') == b'-100000'
+    assert c.execute('GET', 'big') == str(2 ** 40).encode()
+    assert c.execute('GET', 'text') == b'hello world'
+    assert c.execute('GET', 'long') == b'x' * 20000
+    assert c.execute('GET', 'volatile') == b'value'
+    assert 99 < server.default_database().expires[b'volatile'] - time.time() <= 100
+    assert c.execute('LRANGE', 'list', 0, -1) == [b'c', b'b', b'a']
+    assert server.get_database(3).key_space[b'other'].get_bytes() == b'hello world'
+
+
+def test_save_and_load():
+    with tempfile.TemporaryDirectory() as directory, configured(c, ('dir', directory)):
+        try:
+            fill()
+            changes = dict(server.get_info_sections())['Persistence'][0][1]
+            assert changes > 0
+            assert c.execute('SAVE') is True
+            assert c.execute('LASTSAVE') >= int(time.time()) - 1
+            assert b'rdb_changes_since_last_save:0' in c.execute('INFO', 'persistence')
+
+            c.execute('FLUSHALL')
+            server.rdb_load()
+            check()
+
+            # A corrupt snapshot is refused
+            path = os.path.join(directory, 'dump.rdb')
+            with open(path, 'r+b') as stream:
+                stream.seek(30)
+                byte = stream.read(1)
+                stream.seek(30)
+                stream.write(bytes((byte[0] ^ 1,)))
+            raises(rdb.RDBError, server.rdb_load)
+        finally:
+            c.execute('FLUSHALL')
+
+
+def test_unknown_opcode():
+    # A string entry, then an opcode that is neither a value type nor a known opcode
+    reader = rdb.RDBReader(bytes((rdb.OPCODE_SELECTDB, 0, rdb.TYPE_STRING, 1)) + b'k' + bytes((1,)) + b'v' +
+                           bytes((0x42, 1)) + b'k')
+    entries = reader.read_entries()
+    idnum, key, obj, expire_time = next(entries)
+    assert (idnum, key, obj.get_bytes(), expire_time) == (0, b'k', b'v', None)
+    assert 'unknown opcode 66 at offset 7' in str(raises(rdb.RDBError, next, entries))
+
+
+def test_bgsave_and_schedule():
+    with tempfile.TemporaryDirectory() as directory, configured(c, ('dir', directory), ('save', '')):
+        try:
+            fill()
+            assert c.execute('BGSAVE') == b'Background saving started'
+            assert 'already in progress' in raises(CommandError, c.execute, 'BGSAVE').args[1]
+            server.check_rdb_child(wait=True)
+            assert server.rdb_child_pid is None
+            assert server.rdb_last_save_ok
+
+            c.execute('FLUSHALL')
+            server.rdb_load()
+            check()
+
+            # 1 change in 60 seconds: the snapshot is written once the last one is 60 seconds old
+            c.execute('CONFIG', 'SET', 'save', '60 1')
+            server.rdb_cron()
+            assert server.rdb_child_pid is None
+            c.execute('SET', 'small', 43)
+            server.rdb_cron()
+            assert server.rdb_child_pid is None
+            server.lastsave -= 60
+            server.rdb_cron()
+            assert server.rdb_child_pid is not None
+            server.check_rdb_child(wait=True)
+            assert server.rdb_last_save_ok
+            assert c.execute('INFO', 'persistence').count(b'rdb_changes_since_last_save:0') == 1
+        finally:
+            c.execute('FLUSHALL')
+
+
+def test_bgsave_fork_failure():
+    def fork():
+        raise OSError(errno.ENOMEM, 'Cannot allocate memory')
+
+    with tempfile.TemporaryDirectory() as directory, configured(c, ('dir', directory), ('save', '1 1')):
+        real_fork = os.fork
+        os.fork = fork
+        try:
+            c.execute('SET', 'key', 'value')
+            server.lastsave -= 1
+            # A failed fork is a failed save, it does not stop the cron
+            server.rdb_cron()
+            assert server.rdb_child_pid is None
+            assert not server.rdb_last_save_ok
+            assert b'rdb_last_bgsave_status:err' in c.execute('INFO', 'persistence')
+            error = raises(CommandError, c.execute, 'BGSAVE')
+            assert error.args == ('ERR', 'Background saving failed to start, see the server log')
+        finally:
+            os.fork = real_fork
+            server.rdb_last_save_ok = True
+            c.execute('FLUSHALL')
+
+
+def test_dump_and_restore():
+    c.execute('FLUSHALL')
+    try:
+        c.execute('SET', 'int', 12)
+        c.execute('SET', 'text', 'hello')
+        c.execute('LPUSH', 'list', 'a', 'b')
+        # Small integers take 2 bytes, plus the type, version and checksum
+        assert len(c.execute('DUMP', 'int')) == 13
+        assert c.execute('DUMP', 'missing') is None
+
+        for key in ('int', 'text', 'list'):
+            payload = c.execute('DUMP', key)
+            assert c.execute('RESTORE', key + ':copy', 0, payload) is True
+            assert c.execute('DUMP', key + ':copy') == payload
+        assert c.execute('OBJECT', 'ENCODING', 'int:copy') == b'int'
+        assert c.execute('LRANGE', 'list:copy', 0, -1) == [b'b', b'a']
+
+        payload = c.execute('DUMP', 'text')
+        assert raises(CommandError, c.execute, 'RESTORE', 'int', 0, payload).args[0] == 'BUSYKEY'
+        assert c.execute('RESTORE', 'int', 5000, payload, 'REPLACE', 'IDLETIME', 100) is True
+        assert c.execute('OBJECT', 'IDLETIME', 'int') >= 100
+        assert c.execute('GET', 'int') == b'hello'
+        assert 4 < server.default_database().expires[b'int'] - time.time() <= 5
+
+        expire_ms = int((time.time() + 100) * 1000)
+        assert c.execute('RESTORE', 'abs', expire_ms, payload, 'ABSTTL') is True
+        assert server.default_database().expires[b'abs'] == expire_ms / 1000.0
+        # Already expired
+        assert c.execute('RESTORE', 'gone', 1, payload, 'ABSTTL') is True
+        assert c.execute('GET', 'gone') is None
+
+        corrupt = payload[:1] + b'X' + payload[2:]
+        assert 'checksum' in raises(CommandError, c.execute, 'RESTORE', 'corrupt', 0, corrupt).args[1]
+        assert 'syntax' in raises(CommandError, c.execute, 'RESTORE', 'corrupt', 0, payload, 'BAD').args[1]
+    finally:
+        c.execute('FLUSHALL')
+
+
+def test_lazy_load():
+    with tempfile.TemporaryDirectory() as directory, \
+            configured(c, ('dir', directory), ('rdb-lazy-load', 'yes'), ('rdb-key-index', 'yes')):
+        try:
+            fill()
+            for i in range(500):
+                c.execute('SET', 'key:%d' % i, i)
+            c.execute('SET', 'expired', 'value', 'PX', 1)
+            assert c.execute('SAVE') is True
+
+            c.execute('FLUSHALL')
+            time.sleep(0.002)
+            server.rdb_load()
+            snapshot = server.loading_snapshot
+            db = server.default_database()
+            assert isinstance(db.key_space, rdb.LazySnapshotKeyspace)
+            assert len(db.key_space) == 507
+            assert snapshot.pending == 508
+            assert b'expired' not in db.key_space
+            assert b'loading_lazy:1' in c.execute('INFO', 'persistence')
+
+            # Loaded on access
+            assert c.execute('GET', 'key:42') == b'42'
+            assert snapshot.stat_loaded_on_access == 1
+            c.execute('SET', 'key:43', 'replaced')
+            c.execute('DEL', 'key:44')
+            assert snapshot.pending == 505
+
+            while snapshot.hydrate(100):
+                pass
+            assert server.loading_snapshot is None
+            assert not isinstance(db.key_space, rdb.LazySnapshotKeyspace)
+            check()
+            assert c.execute('GET', 'key:43') == b'replaced'
+            assert c.execute('GET', 'key:44') is None
+            assert c.execute('GET', 'key:499') == b'499'
+            info = c.execute('INFO', 'persistence')
+            assert b'loading_lazy:0' in info
+            assert b'loading_time_to_fully_loaded_ms:-1' not in info
+            used_memory = db.used_memory
+
+            # Without the key index, the snapshot is fully loaded, and accounted the same
+            c.execute('CONFIG', 'SET', 'rdb-key-index', 'no')
+            assert c.execute('SAVE') is True
+            c.execute('FLUSHALL')
+            server.rdb_load()
+            assert server.loading_snapshot is None
+            check()
+            assert db.used_memory == used_memory
+        finally:
+            c.execute('FLUSHALL')
@@ -0,0 +1,81 @@
+from redis.common.exceptions import CommandError
+from redis.server.replication import ReplicationBacklog
+from redis.testsuite.helpers import ServerProcesses, raises, wait_for
+
+
+def test_backlog():
+    backlog = ReplicationBacklog(10, 100)
+    backlog.append(b'abcdef')
+    assert backlog.read(100) == b'abcdef'
+    assert backlog.read(103) == b'def'
+    backlog.append(b'ghijkl')
+    assert (backlog.start, backlog.end) == (102, 112)
+    assert backlog.read(102) == b'cdefghijkl'
+    assert backlog.read(101) is None
+    assert backlog.read(112) == b''
+    backlog.append(b'0123456789abc')
+    assert backlog.read(115) == b'3456789abc'
+
+
+def test_replication():
+    servers = ServerProcesses()
+    try:
+        primary = servers.start()
+        primary.execute('SET', 'before', 'sync')
+        primary.execute('LPUSH', 'list', 'a', 'b')
+        replicas = [servers.start('--replicaof', '127.0.0.1 %d' % primary.port) for i in range(2)]
+        for replica in replicas:
+            wait_for(lambda: replica.info()['master_link_status'] == 'up')
+        assert primary.info()['connected_slaves'] == '2'
+
+        primary.execute('SET', 'volatile', 'value', 'EX', 100)
+        primary.execute('APPEND', 'before', '!')
+        assert primary.execute('WAIT', 2, 5000) == 2
+        for replica in replicas:
+            assert replica.execute('GET', 'before') == b'sync!'
+            assert replica.execute('LRANGE', 'list', 0, -1) == [b'b', b'a']
+            assert replica.execute('GET', 'volatile') == b'value'
+            assert raises(CommandError, replica.execute, 'SET', 'key', 'value').args[0] == 'READONLY'
+
+        info = primary.info()
+        assert info['role'] == 'master'
+        assert info['slave0'].endswith('state=online,offset=%s,lag=0,lag_bytes=0' % info['master_repl_offset'])
+        assert replicas[0].info()['slave_repl_offset'] == info['master_repl_offset']
+        # Nobody acknowledges what was not propagated
+        assert primary.execute('WAIT', 3, 100) == 2
+    finally:
+        servers.stop()
+
+
+def test_partial_resync():
+    servers = ServerProcesses()
+    try:
+        primary = servers.start('--repl-ping-replica-period', '1')
+        replica = servers.start('--replicaof', '127.0.0.1 %d' % primary.port)
+        wait_for(lambda: replica.info()['master_link_status'] == 'up')
+        for i in range(100):
+            primary.execute('SET', 'key:%d' % i, i)
+        assert primary.execute('WAIT', 1, 5000) == 1
+
+        # The replica reconnects and gets the commands it missed from the backlog
+        link = [line for line in primary.execute('CLIENT', 'LIST').decode().split('\r')
+                if 'flags=S' in line][0]
+        primary.execute('CLIENT', 'KILL', link.split()[0][len('addr='):])
+        primary.execute('SET', 'missed', 'value')
+        wait_for(lambda: replica.info()['master_link_status'] == 'up')
+        assert primary.execute('WAIT', 1, 5000) == 1
+        assert replica.execute('GET', 'missed') == b'value'
+        stats = primary.execute('INFO', 'stats')
+        assert b'sync_full:1' in stats
+        assert b'sync_partial_ok:1' in stats
+
+        # Promoted, it keeps the data, and the id of the history it shares with its old primary
+        replid = primary.info()['master_replid']
+        assert replica.execute('REPLICAOF', 'NO', 'ONE') is True
+        info = replica.info()
+        assert info['role'] == 'master'
+        assert info['master_replid2'] == replid
+        replica.execute('SET', 'writable', 'yes')
+        assert replica.execute('GET', 'key:99') == b'99'
+    finally:
+        servers.stop()
@@ -0,0 +1,210 @@
+import random
+
+from redis.common.exceptions import CommandError
+from redis.server_impl import server
+from redis.server.keyspace import KEYSPACE_BACKENDS, DictKeyspace, Keyspace, RadixKeyspace, ScanCursors
+from redis.server.rdb import LazySnapshotKeyspace
+from redis.testsuite.helpers import raises
+
+c = server.get_embedded_client()
+
+
+def scan_all(keyspace, count, between_calls=None):
+    cursor, found = 0, set()
+    while True:
+        cursor, keys = keyspace.scan(cursor, count)
+        found.update(keys)
+        if cursor == 0:
+            return found
+        if between_calls is not None:
+            between_calls()
+
+
+def test_keyspace_engines():
+    for engine in list(KEYSPACE_BACKENDS.values()) + [LazySnapshotKeyspace]:
+        assert issubclass(engine, Keyspace)
+
+    def define_engine():
+        class IncompleteKeyspace(dict, Keyspace):
+            def scan(self, cursor, count, prefix=b''):
+                return 0, list(self)
+    # Refused when defined, not once a configuration selects it
+    error = str(raises(TypeError, define_engine))
+    assert 'IncompleteKeyspace does not implement' in error
+    assert 'sample' in error and 'scan' not in error
+
+
+def test_keyspace_index():
+    keyspace = DictKeyspace()
+    for i in range(1000):
+        keyspace[b'key:%d' % i] = i
+    for i in range(0, 1000, 2):
+        del keyspace[b'key:%d' % i]
+    assert keyspace.pop(b'key:1') == 1
+    assert keyspace.pop(b'key:1', None) is None
+    assert scan_all(keyspace, 10) == set(keyspace)
+
+
+def test_scan_guarantee_while_resizing():
+    keyspace = DictKeyspace()
+    stable = set(b'stable:%d' % i for i in range(500))
+    for key in stable:
+        keyspace[key] = True
+
+    added = []
+
+    def mutate():
+        # Grow and shrink the table between calls, so the scan crosses several rehashings
+        if len(added) < 3000 and random.random() < 0.7:
+            for i in range(50):
+                key = b'added:%d' % len(added)
+                keyspace[key] = True
+                added.append(key)
+        else:
+            for i in range(50):
+                if added:
+                    del keyspace[added.pop()]
+
+    for i in range(20):
+        assert stable <= scan_all(keyspace, 5, mutate)
+
+
+def test_scan_command():
+    c.execute('FLUSHDB')
+    for i in range(100):
+        c.execute('SET', 'scan:string:%d' % i, 'value')
+        c.execute('LPUSH', 'scan:list:%d' % i, 'value')
+
+    cursor, found = b'0', []
+    while True:
+        cursor, keys = c.execute('SCAN', cursor, 'COUNT', 20)
+        assert len(keys) < 60
+        found += keys
+        if cursor == b'0':
+            break
+    assert len(set(found)) == 200
+
+    cursor, found = b'0', []
+    while True:
+        cursor, keys = c.execute('SCAN', cursor, 'MATCH', 'scan:*:1?', 'TYPE', 'list')
+        found += keys
+        if cursor == b'0':
+            break
+    assert sorted(found) == sorted(b'scan:list:%d' % i for i in range(10, 20))
+
+    assert c.execute('TYPE', 'scan:list:1') == b'list'
+    assert c.execute('TYPE', 'notexists') == b'none'
+
+
+def test_radix_keyspace():
+    keyspace = RadixKeyspace()
+    keys = [b'', b'a', b'ab', b'abc', b'abd', b'b', b'session:eu:1', b'session:eu:12', b'session:us:1']
+    for key in reversed(keys):
+        keyspace[key] = key
+    assert list(keyspace) == keys
+    assert keyspace[b'abc'] == b'abc'
+    assert b'abe' not in keyspace and b'session' not in keyspace
+
+    assert keyspace.pop(b'ab') == b'ab'
+    del keyspace[b'session:eu:1']
+    assert keyspace.pop(b'session:eu:1', None) is None
+    assert len(keyspace) == 7
+    assert list(keyspace.iter_prefix(b'session:')) == [b'session:eu:12', b'session:us:1']
+    assert list(keyspace.iter_prefix(b'ses')) == [b'session:eu:12', b'session:us:1']
+    assert list(keyspace.iter_prefix(b'x')) == []
+
+    for key in list(keyspace):
+        del keyspace[key]
+    assert len(keyspace) == 0
+    assert keyspace.root.children is None
+
+
+def test_radix_scan():
+    keyspace = RadixKeyspace()
+    for i in range(1000):
+        keyspace[b'user:%d' % i] = i
+        keyspace[b'item:%d' % i] = i
+
+    cursor, found, cursors = 0, [], ScanCursors()
+    while True:
+        cursor, keys = keyspace.scan(cursor, 7, b'user:', cursors)
+        found += keys
+        # Keys added and removed behind the cursor do not affect the iteration
+        keyspace[b'user:0:%d' % len(found)] = True
+        keyspace.pop(b'item:%d' % len(found), None)
+        if cursor == 0:
+            break
+    assert found[:1000] == sorted(b'user:%d' % i for i in range(1000))
+    assert len(found) == len(set(found))
+
+
+def test_radix_scan_cursors():
+    keyspace = RadixKeyspace()
+    keys = [b'session:eu-west:user:%06d' % i for i in range(100)]
+    for key in keys:
+        keyspace[key] = key
+
+    # Cursors are 64 bits ids, not the keys they resume after, and the scans of the other clients do
+    # not drop them
+    cursors, others = ScanCursors(), ScanCursors()
+    cursor, found = 0, []
+    while True:
+        cursor, batch = keyspace.scan(cursor, 10, b'session:', cursors)
+        found += batch
+        for i in range(2000):
+            keyspace.scan(0, 1, b'', others)
+        if cursor == 0:
+            break
+        assert 0 < cursor < 1 << 64
+    assert found == keys
+    assert not cursors
+
+    cursor, batch = keyspace.scan(0, 10, b'session:', cursors)
+    assert raises(ValueError, keyspace.scan, cursor, 10, b'session:', others)
+    assert raises(ValueError, keyspace.scan, cursor, 10, b'', cursors)
+    # A call can be retried until the next cursor is used
+    following, batch = keyspace.scan(cursor, 10, b'session:', cursors)
+    assert keyspace.scan(cursor, 10, b'session:', cursors)[1] == batch == keys[10:20]
+    keyspace.scan(following, 10, b'session:', cursors)
+    assert raises(ValueError, keyspace.scan, cursor, 10, b'session:', cursors)
+
+
+def test_radix_deep_keys():
+    # Every key is a prefix of the next one, the tree is as deep as there are keys
+    keyspace = RadixKeyspace()
+    keys = [b'a' * i for i in range(1, 1201)]
+    for key in keys:
+        keyspace[key] = key
+    assert [key for key, value in keyspace.items()] == keys
+    assert list(keyspace.iter_prefix(b'a' * 1000)) == keys[999:]
+    cursors = ScanCursors()
+    assert keyspace.scan(0, 10, b'', cursors)[1] == keys[:10]
+    cursor, found = 0, []
+    while True:
+        cursor, batch = keyspace.scan(cursor, 500, b'', cursors)
+        found += batch
+        if cursor == 0:
+            break
+    assert found == keys
+
+
+def test_keys_command():
+    c.execute('FLUSHDB')
+    for backend in ('radix', 'dict'):
+        c.execute('CONFIG', 'SET', 'keyspace-backend', backend)
+        for i in range(20):
+            c.execute('SET', 'session:eu:%d' % i, 'value')
+            c.execute('SET', 'session:us:%d' % i, 'value')
+        assert sorted(c.execute('KEYS', 'session:eu:1*')) == sorted(
+            [b'session:eu:1'] + [b'session:eu:%d' % i for i in range(10, 20)])
+        assert len(c.execute('KEYS', '*')) == 40
+
+        cursor, found = b'0', []
+        while True:
+            cursor, keys = c.execute('SCAN', cursor, 'MATCH', 'session:us:*', 'COUNT', 5)
+            found += keys
+            if cursor == b'0':
+                break
+        assert sorted(found) == sorted(b'session:us:%d' % i for i in range(20))
+        if backend == 'radix':
+            assert 'invalid cursor' in raises(CommandError, c.execute, 'SCAN', 12345).args[1]
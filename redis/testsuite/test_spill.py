@@ -0,0 +1,94 @@
+import tempfile
+
+from redis.server_impl import server
+from redis.server.keyspace import SpillKeyspace
+from redis.testsuite.helpers import configured
+
+c = server.get_embedded_client()
+
+
+def test_spill_keyspace():
+    c.execute('FLUSHALL')
+    c.execute('SET', 'before', 'value')
+    c.execute('CONFIG', 'SET', 'spill-memory', '100kb')
+    c.execute('CONFIG', 'SET', 'keyspace-backend', 'spill')
+    try:
+        key_space = server.default_database().key_space
+        assert isinstance(key_space, SpillKeyspace)
+        for i in range(1000):
+            c.execute('SET', 'key:%d' % i, str(i) * 1000)
+        c.execute('LPUSH', 'list', 'a', 'b')
+        c.execute('ECHO', 'between commands')
+        assert key_space.memory <= 100 * 1024
+        assert key_space.spilled > 800
+        assert len(key_space) == 1002
+
+        # Keys on disk are loaded back on access
+        assert c.execute('GET', 'before') == b'value'
+        assert c.execute('GET', 'key:0') == b'0' * 1000
+        assert c.execute('APPEND', 'key:1', 'x') == 1001
+        assert c.execute('DEL', 'key:2') == 1
+        assert c.execute('GET', 'key:2') is None
+        assert c.execute('TYPE', 'key:3') == b'string'
+        assert c.execute('SET', 'key:4', 'new') is True
+        for i in range(5, 1000):
+            c.execute('GET', 'key:%d' % i)
+        assert c.execute('GET', 'key:1') == b'1' * 1000 + b'x'
+        assert c.execute('GET', 'key:4') == b'new'
+        assert c.execute('LRANGE', 'list', 0, -1) == [b'b', b'a']
+
+        cursor, found = 0, []
+        while True:
+            cursor, keys = c.execute('SCAN', cursor, 'COUNT', 100)
+            found += keys
+            if int(cursor) == 0:
+                break
+        assert len(set(found)) == 1001
+
+        c.execute('CONFIG', 'SET', 'keyspace-backend', 'dict')
+        assert c.execute('GET', 'key:999') == b'9' * 3000
+        assert len(server.default_database().key_space) == 1001
+    finally:
+        c.execute('CONFIG', 'SET', 'keyspace-backend', 'dict')
+        c.execute('CONFIG', 'SET', 'spill-memory', '64mb')
+
+
+def test_save_spilled_keys():
+    with tempfile.TemporaryDirectory() as directory, \
+            configured(c, ('dir', directory), ('save', ''), ('spill-memory', '100kb'),
+                       ('keyspace-backend', 'spill')):
+        try:
+            c.execute('FLUSHALL')
+            key_space = server.default_database().key_space
+            for i in range(1000):
+                c.execute('SET', 'key:%d' % i, str(i) * 1000)
+            c.execute('ECHO', 'between commands')
+            spilled = key_space.spilled
+            assert spilled > 800
+
+            # Saving reads the objects on disk without loading them back in memory
+            assert c.execute('SAVE') is True
+            assert key_space.spilled == spilled
+            assert key_space.memory <= 100 * 1024
+
+            # The child reads the disk through its own connection, the rows of the keys the parent
+            # replaces meanwhile are kept until it exits
+            assert c.execute('BGSAVE') == b'Background saving started'
+            for i in range(0, 1000, 2):
+                c.execute('SET', 'key:%d' % i, 'new')
+            server.check_rdb_child(wait=True)
+            assert server.rdb_last_save_ok
+            assert not key_space.stale
+            c.execute('ECHO', 'between commands')
+            assert key_space.memory <= 100 * 1024
+            for i in range(1000):
+                value = b'new' if i % 2 == 0 else str(i).encode() * 1000
+                assert c.execute('GET', 'key:%d' % i) == value
+
+            c.execute('FLUSHALL')
+            server.rdb_load()
+            assert len(server.default_database().key_space) == 1000
+            for i in range(1000):
+                assert c.execute('GET', 'key:%d' % i) == str(i).encode() * 1000
+        finally:
+            c.execute('FLUSHALL')
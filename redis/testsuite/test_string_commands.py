@@ -82,3 +82,27 @@ def test_setnx():
     time.sleep(1)
     assert c.execute(b'SETNX key val\r\n') == b':1\r\n'
     assert c.execute(b'GET key\r\n') == b'$3\r\nval\r\n'
+
+
+def test_encodings():
+    assert c.execute(b'SET counter 12345\r\n') == b'+OK\r\n'
+    assert c.execute(b'OBJECT ENCODING counter\r\n') == b'$3\r\nint\r\n'
+    assert c.execute(b'INCR counter\r\n') == b'$5\r\n12346\r\n'
+    assert c.execute(b'GET counter\r\n') == b'$5\r\n12346\r\n'
+    assert c.execute(b'APPEND counter x\r\n') == b':6\r\n'
+    assert c.execute(b'OBJECT ENCODING counter\r\n') == b'$6\r\nembstr\r\n'
+
+    # Only the canonical representation of an integer is stored as an int
+    assert c.execute(b'SET padded 007\r\n') == b'+OK\r\n'
+    assert c.execute(b'GET padded\r\n') == b'$3\r\n007\r\n'
+    assert c.execute(b'OBJECT ENCODING padded\r\n') == b'$6\r\nembstr\r\n'
+    assert c.execute(b'SET big 99999999999999999999\r\n') == b'+OK\r\n'
+    assert c.execute(b'OBJECT ENCODING big\r\n') == b'$6\r\nembstr\r\n'
+    assert c.execute(('SET long %s\r\n' % ('x' * 45)).encode()) == b'+OK\r\n'
+    assert c.execute(b'OBJECT ENCODING long\r\n') == b'$3\r\nraw\r\n'
+
+    # Small integers are shared
+    assert c.execute(b'SET small 42\r\n') == b'+OK\r\n'
+    assert c.execute(b'SET other 42\r\n') == b'+OK\r\n'
+    key_space = server.default_database().key_space
+    assert key_space[b'small'].get_bytes() is key_space[b'other'].get_bytes()
@@ -0,0 +1,70 @@
+import time
+from redis.server_impl import server
+
+c = server.get_test_client()
+other = server.get_test_client()
+
+
+def test_multi_exec():
+    assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+    assert c.execute(b'SET txkey hello\r\n') == b'+QUEUED\r\n'
+    assert c.execute(b'GET txkey\r\n') == b'+QUEUED\r\n'
+    assert c.execute(b'EXEC\r\n') == b'*2\r\n+OK\r\n$5\r\nhello\r\n'
+
+
+def test_discard():
+    assert c.execute(b'DISCARD\r\n') == b'-ERR DISCARD without MULTI\r\n'
+    assert c.execute(b'SET txkey hello\r\n') == b'+OK\r\n'
+    assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+    assert c.execute(b'SET txkey world\r\n') == b'+QUEUED\r\n'
+    assert c.execute(b'DISCARD\r\n') == b'+OK\r\n'
+    assert c.execute(b'GET txkey\r\n') == b'$5\r\nhello\r\n'
+
+
+def test_watch_unmodified():
+    assert c.execute(b'SET txkey hello\r\n') == b'+OK\r\n'
+    assert c.execute(b'WATCH txkey\r\n') == b'+OK\r\n'
+    assert other.execute(b'GET txkey\r\n') == b'$5\r\nhello\r\n'
+    assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+    assert c.execute(b'WATCH txkey\r\n') == b'-ERR WATCH inside MULTI is not allowed\r\n'
+    assert c.execute(b'SET txkey world\r\n') == b'+QUEUED\r\n'
+    assert c.execute(b'EXEC\r\n') == b'*1\r\n+OK\r\n'
+    assert not server.default_database().watched_keys
+
+
+def test_watch_modified():
+    for modification in (b'SET txkey other\r\n', b'APPEND txkey !\r\n', b'DEL txkey\r\n',
+                         b'EXPIRE txkey 100\r\n', b'FLUSHDB\r\n'):
+        assert c.execute(b'SET txkey hello\r\n') == b'+OK\r\n'
+        assert c.execute(b'WATCH txkey\r\n') == b'+OK\r\n'
+        other.execute(modification)
+        assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+        assert c.execute(b'SET txkey world\r\n') == b'+QUEUED\r\n'
+        assert c.execute(b'EXEC\r\n') == b'*-1\r\n'
+        assert c.execute(b'GET txkey\r\n') != b'$5\r\nworld\r\n'
+
+
+def test_watch_created_and_deleted():
+    assert c.execute(b'DEL txkey\r\n') in (b':0\r\n', b':1\r\n')
+    assert c.execute(b'WATCH txkey\r\n') == b'+OK\r\n'
+    assert other.execute(b'SET txkey hello\r\n') == b'+OK\r\n'
+    assert other.execute(b'DEL txkey\r\n') == b':1\r\n'
+    assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+    assert c.execute(b'EXEC\r\n') == b'*-1\r\n'
+
+
+def test_watch_expired():
+    assert c.execute(b'SET txkey hello PX 100\r\n') == b'+OK\r\n'
+    assert c.execute(b'WATCH txkey\r\n') == b'+OK\r\n'
+    time.sleep(0.2)
+    assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+    assert c.execute(b'EXEC\r\n') == b'*-1\r\n'
+
+
+def test_unwatch():
+    assert c.execute(b'SET txkey hello\r\n') == b'+OK\r\n'
+    assert c.execute(b'WATCH txkey\r\n') == b'+OK\r\n'
+    assert other.execute(b'SET txkey world\r\n') == b'+OK\r\n'
+    assert c.execute(b'UNWATCH\r\n') == b'+OK\r\n'
+    assert c.execute(b'MULTI\r\n') == b'+OK\r\n'
+    assert c.execute(b'EXEC\r\n') == b'*0\r\n'
@@ -44,7 +44,9 @@ setup(
     keywords=p.title,
     entry_points={
         'console_scripts': [
-            'redis-server=redis.server_impl:server_main'
+            'redis-server=redis.server_impl:server_main',
+            'redis-cli=redis.client.cli:main',
+            'redis-proxy=redis.proxy.cli:main',
         ]
     },
     classifiers=[